@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import sys
+import json
+import hashlib
+import argparse
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+warnings.filterwarnings("ignore")
+
+# shapefile side car files are compared through their .shp.
+sidecar_list = ['.dbf', '.shx', '.prj', '.cpg', '.sbn', '.sbx', '.qix', '.fingerprint']
+
+
+def cmd_args_fn():
+    p = argparse.ArgumentParser(
+        description="""Compare two pipeline export trees - file names, csv and shapefile attributes and geometries.""")
+
+    p.add_argument("old_dir", type=str, help="Reference export directory.")
+
+    p.add_argument("new_dir", type=str, help="Export directory to check against the reference.")
+
+    p.add_argument("-t", "--tolerance", type=float,
+                   help="Absolute tolerance for coordinates and numeric attributes (in the layer units).",
+                   default=1e-6)
+
+    p.add_argument("-k", "--keys", type=str,
+                   help="Comma separated key columns, first one present and unique in both files is used.",
+                   default="meta_key,uid_feature,uid,UID")
+
+    p.add_argument("-ig", "--ignore", type=str, help="Comma separated columns to ignore.",
+                   default="Unnamed: 0,Unnamed: 0.1,index,FID")
+
+    p.add_argument("-b", "--bytes", action='store_true',
+                   help="Also compare the content (sha1) of files that are not csv or shapefiles (i.e. photos).")
+
+    p.add_argument("-w", "--workers", type=int, help="Number of worker processes (0 = cpu count).", default=0)
+
+    p.add_argument("-e", "--examples", type=int, help="Maximum example differences reported per file.", default=5)
+
+    p.add_argument("-o", "--output", type=str, help="Path for the json report (optional).", default=None)
+
+    cmd_args = p.parse_args()
+
+    return cmd_args
+
+
+def list_tree_fn(root):
+    """ List the files below a directory.
+
+    :param root: string object containing the directory path.
+    :return: set object containing the file paths relative to root ('/' separated).
+    """
+
+    path_set = set()
+    for dir_path, dirs, files in os.walk(root):
+        for name in files:
+            path_set.add(os.path.relpath(os.path.join(dir_path, name), root).replace(os.sep, '/'))
+
+    return path_set
+
+
+def read_table_fn(path):
+    """ Read a csv or shapefile (None if it cannot be read). """
+
+    try:
+        if path.lower().endswith('.shp'):
+            return gpd.read_file(path)
+        return pd.read_csv(path, low_memory=False)
+    except Exception:
+        return None
+
+
+def key_column_fn(old_df, new_df, key_list):
+    """ Return the first key column present and unique in both tables (None = compare rows in sorted order). """
+
+    for key in key_list:
+        if key in old_df.columns and key in new_df.columns and old_df[key].is_unique and new_df[key].is_unique:
+            return key
+
+    return None
+
+
+def align_fn(old_df, new_df, key, column_list):
+    """ Align both tables on the key column (or on a stable sort of the shared columns).
+
+    :return: old and new dataframes with the same index, the keys only in old and the keys only in new.
+    """
+
+    if key is not None:
+        old_df = old_df.set_index(old_df[key].astype(str))
+        new_df = new_df.set_index(new_df[key].astype(str))
+        missing = old_df.index.difference(new_df.index)
+        extra = new_df.index.difference(old_df.index)
+        common = old_df.index.intersection(new_df.index)
+        return old_df.loc[common], new_df.loc[common], list(missing), list(extra)
+
+    sort_list = [i for i in column_list if i != 'geometry']
+    old_df = old_df.iloc[np.lexsort([old_df[i].astype(str).values for i in reversed(sort_list)])] \
+        if sort_list else old_df
+    new_df = new_df.iloc[np.lexsort([new_df[i].astype(str).values for i in reversed(sort_list)])] \
+        if sort_list else new_df
+    n = min(len(old_df.index), len(new_df.index))
+    old_df, new_df = old_df.iloc[:n].reset_index(drop=True), new_df.iloc[:n].reset_index(drop=True)
+
+    return old_df, new_df, [], []
+
+
+def column_diff_fn(old_series, new_series, tolerance):
+    """ Boolean mask of the rows that differ - numbers within tolerance and matching blanks are equal. """
+
+    old_number = pd.to_numeric(old_series, errors='coerce')
+    new_number = pd.to_numeric(new_series, errors='coerce')
+    numeric = old_number.notna().values & new_number.notna().values
+
+    old_text = old_series.astype(str).where(old_series.notna(), '').values
+    new_text = new_series.astype(str).where(new_series.notna(), '').values
+    differ = old_text != new_text
+    differ[numeric] = ~np.isclose(old_number.values[numeric], new_number.values[numeric], rtol=0, atol=tolerance)
+
+    return differ
+
+
+def wkt_series_fn(series):
+    """ Parse a csv geometry column.
+
+    :param series: pandas series object containing wkt text.
+    :return: geopandas geoseries object (None where blank or not wkt) and pandas series object containing the values
+    that are not wkt (None elsewhere).
+    """
+
+    from shapely import wkt
+
+    geometry_list, text_list = [], []
+    for value in series:
+        geometry = None
+        if isinstance(value, str) and value.strip():
+            try:
+                geometry = wkt.loads(value)
+            except Exception:
+                pass
+        geometry_list.append(geometry)
+        text_list.append(value if geometry is None and not pd.isna(value) else None)
+
+    return gpd.GeoSeries(geometry_list, index=series.index), pd.Series(text_list, index=series.index, dtype=object)
+
+
+def compare_table_fn(old_path, new_path, key_list, ignore_list, tolerance, example_limit):
+    """ Compare two csv files or two shapefiles.
+
+    :return result_dict: dictionary object describing the differences (status 'same' or 'different').
+    """
+
+    old_df, new_df = read_table_fn(old_path), read_table_fn(new_path)
+    result_dict = {'kind': 'shapefile' if old_path.lower().endswith('.shp') else 'csv', 'status': 'same',
+                   'rows_old': None, 'rows_new': None, 'key': None, 'missing_keys': 0, 'extra_keys': 0,
+                   'columns_only_old': [], 'columns_only_new': [], 'cell_differences': 0,
+                   'geometry_differences': 0, 'crs_differs': False, 'examples': []}
+
+    if old_df is None or new_df is None:
+        result_dict.update({'status': 'different', 'examples': ['unreadable: {0}'.format(
+            'old' if old_df is None else 'new')]})
+        return result_dict
+
+    old_df = old_df.drop(columns=[i for i in ignore_list if i in old_df.columns])
+    new_df = new_df.drop(columns=[i for i in ignore_list if i in new_df.columns])
+    result_dict.update({'rows_old': len(old_df.index), 'rows_new': len(new_df.index),
+                        'columns_only_old': sorted(set(old_df.columns) - set(new_df.columns)),
+                        'columns_only_new': sorted(set(new_df.columns) - set(old_df.columns))})
+
+    # column order is ignored - only the shared columns are compared.
+    column_list = sorted(set(old_df.columns) & set(new_df.columns))
+    key = key_column_fn(old_df, new_df, key_list)
+    old_df, new_df, missing, extra = align_fn(old_df, new_df, key, column_list)
+    result_dict.update({'key': key, 'missing_keys': len(missing), 'extra_keys': len(extra)})
+    example_list = ['missing key {0}'.format(i) for i in missing[:example_limit]] + \
+                   ['extra key {0}'.format(i) for i in extra[:example_limit]]
+
+    for column in column_list:
+        if column == 'geometry':
+            continue
+        differ = column_diff_fn(old_df[column], new_df[column], tolerance)
+        result_dict['cell_differences'] += int(differ.sum())
+        for position in np.nonzero(differ)[0][:max(0, example_limit - len(example_list))]:
+            example_list.append('{0} [{1}]: {2!r} -> {3!r}'.format(column, old_df.index[position],
+                                                                   old_df[column].iloc[position],
+                                                                   new_df[column].iloc[position]))
+
+    if 'geometry' in column_list:
+        if isinstance(old_df, gpd.GeoDataFrame) and isinstance(new_df, gpd.GeoDataFrame):
+            old_crs, new_crs = old_df.crs, new_df.crs
+            result_dict['crs_differs'] = bool((old_crs is None) != (new_crs is None) or
+                                              (old_crs is not None and not old_crs == new_crs))
+            old_geometry = gpd.GeoSeries(old_df.geometry.values, index=old_df.index)
+            new_geometry = gpd.GeoSeries(new_df.geometry.values, index=old_df.index)
+            text_differ = np.zeros(len(old_df.index), dtype=bool)
+        else:
+            # csv outputs written from geodataframes hold the geometry as wkt text.
+            old_geometry, old_text = wkt_series_fn(old_df['geometry'])
+            new_geometry, new_text = wkt_series_fn(new_df['geometry'])
+            new_geometry.index = new_text.index = old_df.index
+            # values that are not wkt are compared as text.
+            text_differ = column_diff_fn(old_text, new_text, tolerance)
+
+        both_empty = old_geometry.isna().values & new_geometry.isna().values
+        equal = (old_geometry.geom_equals_exact(new_geometry, tolerance).fillna(False).values | both_empty) & \
+            ~text_differ
+        result_dict['geometry_differences'] = int((~equal).sum())
+        for position in np.nonzero(~equal)[0][:max(0, example_limit - len(example_list))]:
+            example_list.append('geometry [{0}]: {1} -> {2}'.format(
+                old_df.index[position], str(old_df['geometry'].iloc[position])[:80],
+                str(new_df['geometry'].iloc[position])[:80]))
+
+    result_dict['examples'] = example_list
+    if (result_dict['rows_old'] != result_dict['rows_new'] or missing or extra or result_dict['columns_only_old'] or
+            result_dict['columns_only_new'] or result_dict['cell_differences'] or
+            result_dict['geometry_differences'] or result_dict['crs_differs']):
+        result_dict['status'] = 'different'
+
+    return result_dict
+
+
+def file_hash_fn(path, block_size=1048576):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha1.update(block)
+
+    return sha1.hexdigest()
+
+
+def compare_file_fn(job):
+    """ Compare one file present in both trees (process pool worker).
+
+    :param job: list object containing the relative path, both roots and the comparison options.
+    :return result_dict: dictionary object describing the differences.
+    """
+
+    rel_path, old_root, new_root, key_list, ignore_list, tolerance, compare_bytes, example_limit = job
+    old_path = os.path.join(old_root, *rel_path.split('/'))
+    new_path = os.path.join(new_root, *rel_path.split('/'))
+    extension = os.path.splitext(rel_path)[1].lower()
+
+    if extension in ['.csv', '.shp']:
+        result_dict = compare_table_fn(old_path, new_path, key_list, ignore_list, tolerance, example_limit)
+    else:
+        result_dict = {'kind': 'file', 'status': 'same', 'examples': []}
+        if compare_bytes and file_hash_fn(old_path) != file_hash_fn(new_path):
+            result_dict.update({'status': 'different', 'examples': ['content differs']})
+
+    result_dict['path'] = rel_path
+
+    return result_dict
+
+
+def main_routine(old_dir, new_dir, tolerance=1e-6, key_list=None, ignore_list=None, compare_bytes=False, workers=0,
+                 example_limit=5, output=None):
+    """ Compare two export trees and print the differences.
+
+    :return report_dict: dictionary object containing the file name differences and one result per compared file.
+    """
+
+    key_list = key_list or ['meta_key', 'uid_feature', 'uid', 'UID']
+    ignore_list = ignore_list or []
+
+    old_set, new_set = list_tree_fn(old_dir), list_tree_fn(new_dir)
+    only_old, only_new = sorted(old_set - new_set), sorted(new_set - old_set)
+
+    job_list = []
+    for rel_path in sorted(old_set & new_set):
+        stem, extension = os.path.splitext(rel_path)
+        if extension.lower() in sidecar_list and (stem + '.shp') in old_set:
+            continue
+        job_list.append([rel_path, old_dir, new_dir, key_list, ignore_list, tolerance, compare_bytes, example_limit])
+
+    if len(job_list) < 8 or workers == 1:
+        result_list = [compare_file_fn(job) for job in job_list]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or None) as executor:
+            result_list = list(executor.map(compare_file_fn, job_list, chunksize=4))
+
+    different_list = [i for i in result_list if i['status'] != 'same']
+
+    for rel_path in only_old:
+        print(' - only in old: ', rel_path)
+    for rel_path in only_new:
+        print(' - only in new: ', rel_path)
+    for result in different_list:
+        print(' - differs: {0} ({1}; rows {2} -> {3}; cells {4}; geometries {5})'.format(
+            result['path'], result['kind'], result.get('rows_old'), result.get('rows_new'),
+            result.get('cell_differences', 0), result.get('geometry_differences', 0)))
+        for example in result['examples']:
+            print('      ', example)
+
+    print('\n - files compared: {0}  different: {1}  only in old: {2}  only in new: {3}'.format(
+        len(result_list), len(different_list), len(only_old), len(only_new)))
+
+    report_dict = {'old_dir': old_dir, 'new_dir': new_dir, 'tolerance': tolerance, 'only_old': only_old,
+                   'only_new': only_new, 'results': result_list,
+                   'equivalent': not (only_old or only_new or different_list)}
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report_dict, f, indent=2, default=str)
+
+    return report_dict
+
+
+if __name__ == "__main__":
+    cmd_args = cmd_args_fn()
+    report = main_routine(cmd_args.old_dir, cmd_args.new_dir, cmd_args.tolerance,
+                          [i.strip() for i in cmd_args.keys.split(',') if i.strip()],
+                          [i.strip() for i in cmd_args.ignore.split(',') if i.strip()], cmd_args.bytes,
+                          cmd_args.workers, cmd_args.examples, cmd_args.output)
+    sys.exit(0 if report['equivalent'] else 1)
@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import argparse
+import warnings
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+warnings.filterwarnings("ignore")
+
+# GROUP_FEATURE:FEATURE value -> relative frequency in a season of field data.
+feature_weight_dict = {"infrastructure": 0.40, "weed": 0.15, "erosion": 0.08, "clearing": 0.05, "paddock": 0.05,
+                       "woody_thickening": 0.05, "feral_animal": 0.07, "fire": 0.04, "sinkhole": 0.02,
+                       "unidentified_species": 0.05, "other_feature": 0.04}
+
+# INFRA:INF_FEAT value -> relative frequency and the ODK choices of each infrastructure type.
+infra_weight_dict = {"water_point": 0.45, "point": 0.30, "line": 0.25}
+water_list = ["bore", "dam", "pump_out_point", "trough", "water_tank", "turkey_nest", "waterhole"]
+point_list = ["stock_yard", "underground_mine", "quarry", "landing_ground", "general_building", "homestead", "gate"]
+line_list = ["fence", "cleared_line", "water_pipeline"]
+
+condition_list = ["Not recorded", "abandoned", "disused"]
+erosion_list = ["scalding", "windsheeting", "watersheeting", "rilling", "gully"]
+severity_list = ["low", "moderate", "high"]
+stability_list = ["stable", "active"]
+land_use_list = ["grazing", "horticulture", "land_use_other"]
+clear_type_list = ["chained", "blade_ploughed", "pulled"]
+feral_list = ["camel", "rabbit", "donkey", "horse", "pig", "buffalo", "nat_herb"]
+evidence_list = ["sighted", "dung", "tracks", "damage"]
+density_list = ["1", "2", "3", "4"]
+fire_dict = {"FIRE:NORTH_FF": ["NFF_absent", "since_last_growth_event", "before_last_growth_event"],
+             "FIRE:NORTH_FI": ["NFI_absent", "low_cool", "low_moderate", "moderate", "moderate_high", "high"],
+             "FIRE:SOUTH_FF": ["SFF_absent", "<1", "1-2", "2-10", ">10"],
+             "FIRE:SOUTH_FI": ["SFI_absent", "cool", "hot"]}
+device_list = ["collect:Gnm9lqtfIboIrxNE", "collect:zzQ3bCDHV1tzliXv", "collect:9W3UalGBI3mI9cW1",
+               "collect:rr2cQ91GYiI5JlU9", "collect:6MhPLIBuLwa5AXGd", "collect:vi7AXBEUVNrexQLM"]
+
+unidentified_column_list = [
+    "PLANT_COLLECTING:SAMPLE_YN_GROUP:ID_DETAILS_YN", "PLANT_COLLECTING:SAMPLE_YN_GROUP:YN_FLR_SP1",
+    "PLANT_COLLECTING:GROUP_SAMPLE:SAMPLE1:FLORA_SAMPLE_LABEL1", "PLANT_COLLECTING:GROUP_SAMPLE:SAMPLE2:YN_FLR_SP2",
+    "PLANT_COLLECTING:GROUP_SAMPLE:SAMPLE2:FLORA_SAMPLE_LABEL2", "PLANT_COLLECTING:GROUP_SAMPLE:SAMPLE3:YN_FLR_SP3",
+    "PLANT_COLLECTING:GROUP_SAMPLE:SAMPLE3:FLORA_SAMPLE_LABEL3", "PLANT_COLLECTING:PLANT_ID:FRUIT_SEEDS:FRUIT_DESC",
+    "PLANT_COLLECTING:PLANT_ID:GRASS_HEAD:WEED_SECTION", "PLANT_COLLECTING:PLANT_ID:PLANT_CORK:BARK_BLAZE_COLOUR",
+    "PLANT_COLLECTING:PLANT_ID:PLANT_CORK:BARK_TYPE", "PLANT_COLLECTING:PLANT_ID:PLANT_FLOWER:FLW_CLR",
+    "PLANT_COLLECTING:PLANT_ID:PLANT_FLOWER:FLW_CLR_OTHER", "PLANT_COLLECTING:PLANT_ID:PLANT_FOLIAGE:LEAF_DESC",
+    "PLANT_COLLECTING:PLANT_ID:PLANT_HABIT:FLORA_NOTE1", "PLANT_COLLECTING:PLANT_ID:PLANT_HABIT:GROW_HABIT",
+    "PLANT_COLLECTING:PLANT_ID:PLANT_HABIT:HEIGHT", "PLANT_COLLECTING:PLANT_ID:PLANT_OTHER:DESC_H_P",
+    "PLANT_COLLECTING:PLANT_ID:PLANT_OTHER:HAIR_PRICK", "PLANT_COLLECTING:PLANT_ID:PLANT_OTHER:ODOUR",
+    "PLANT_COLLECTING:PLANT_ID:PLANT_OTHER:ODOUR_DESC", "PLANT_COLLECTING:PLANT_ID:PLANT_OTHER:SAP_LATEX",
+    "PLANT_COLLECTING:PLANT_ID:PLANT_ROOTS:PERENNIAL", "PLANT_COLLECTING:PLANT_ID:PLANT_ROOTS:ROOT_SYS",
+    "PLANT_COLLECTING:PLANT_ID:SPECIES_ABUNDANCE:SPECIES_DENSITY",
+    "PLANT_COLLECTING:PLANT_ID:SPECIES_ABUNDANCE:SPEC_SIZE"]
+
+unidentified_photo_list = [
+    "PLANT_COLLECTING:GROUP_SAMPLE:SAMPLE1:PHOTO_FLORA_SAMP1", "PLANT_COLLECTING:GROUP_SAMPLE:SAMPLE2:PHOTO_FLORA_SAMP2",
+    "PLANT_COLLECTING:GROUP_SAMPLE:SAMPLE3:PHOTO_FLORA_SAMP3", "PLANT_COLLECTING:PLANT_ID:FRUIT_SEEDS:PHOTO_FLORA_FRUIT",
+    "PLANT_COLLECTING:PLANT_ID:FRUIT_SEEDS:PHOTO_FLORA_SEED", "PLANT_COLLECTING:PLANT_ID:GRASS_HEAD:PHOTO_FLORA_AWN",
+    "PLANT_COLLECTING:PLANT_ID:GRASS_HEAD:PHOTO_FLORA_SPIKELET",
+    "PLANT_COLLECTING:PLANT_ID:GRASS_HEAD:PHOTO_GRASS_SEED_HEAD",
+    "PLANT_COLLECTING:PLANT_ID:PLANT_CORK:PHOTO_BLAZE_COLOUR", "PLANT_COLLECTING:PLANT_ID:PLANT_CORK:PHOTO_FLORA_BARK",
+    "PLANT_COLLECTING:PLANT_ID:PLANT_FLOWER:PHOTO_FLORA_FLOWER",
+    "PLANT_COLLECTING:PLANT_ID:PLANT_FLOWER:PHOTO_FLORA_FLW_CLUSTER",
+    "PLANT_COLLECTING:PLANT_ID:PLANT_FOLIAGE:PHOTO_FLORA_LEAF", "PLANT_COLLECTING:PLANT_ID:PLANT_OTHER:PHOTO_H_P",
+    "PLANT_COLLECTING:PLANT_ID:PLANT_OTHER:PHOTO_SAP", "PLANT_COLLECTING:PLANT_ID:PLANT_ROOTS:PHOTO_FLORA_ROOTS"]
+
+
+def cmd_args_fn():
+    p = argparse.ArgumentParser(
+        description="""Generate a synthetic RMB_Mapping_v1_results.csv scattered over the Pastoral Estate.""")
+
+    p.add_argument("-n", "--submissions", type=int, help="Number of form submissions (rows).", default=1000)
+
+    p.add_argument("-o", "--output_dir", type=str, help="Directory for the results csv.", default=os.getcwd())
+
+    p.add_argument("-pe", "--pastoral_estate", type=str, help="Path to the NT_Pastoral_Estate shapefile.",
+                   default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets',
+                                        'shapefiles', 'NT_Pastoral_Estate.shp'))
+
+    p.add_argument("-p", "--properties", type=int, help="Number of properties the submissions are scattered over.",
+                   default=20)
+
+    p.add_argument("-u", "--photo_url", type=str, help="Base url of the photo server.",
+                   default="http://127.0.0.1:8765")
+
+    p.add_argument("-ph", "--photo_rate", type=float, help="Probability that each photo field holds a url.",
+                   default=0.6)
+
+    p.add_argument("-s", "--start_date", type=str, help="First inspection date (YYYY-MM-DD).", default="2021-04-01")
+
+    p.add_argument("-d", "--days", type=int, help="Length of the field season in days.", default=150)
+
+    p.add_argument("-seed", "--seed", type=int, help="Random seed (outputs are reproducible).", default=1)
+
+    p.add_argument("-ver", "--version", type=str, help="ODK form version (file name).", default="v1")
+
+    cmd_args = p.parse_args()
+
+    return cmd_args
+
+
+def choice_fn(rng, value_list, n, weight_list=None):
+    """ Draw n values from value_list (optionally weighted) as a numpy object array. """
+
+    weights = None
+    if weight_list is not None:
+        weights = np.asarray(weight_list, dtype=float)
+        weights = weights / weights.sum()
+
+    return np.asarray(value_list, dtype=object)[rng.choice(len(value_list), size=n, p=weights)]
+
+
+def sample_points_fn(rng, estate_gdf, n):
+    """ Scatter n points over the property polygons (rejection sampling within each property bounding box).
+
+    :param rng: numpy random generator object.
+    :param estate_gdf: geo-dataframe object containing the selected properties (EPSG:4326).
+    :param n: integer object containing the number of points.
+    :return point_df: pandas dataframe object containing lat, lon, PROPERTY, PROP_TAG and DISTRICT.
+    """
+
+    count_array = np.bincount(rng.integers(0, len(estate_gdf.index), size=n), minlength=len(estate_gdf.index))
+    frame_list = []
+    for (index, row), count in zip(estate_gdf.iterrows(), count_array):
+        if count == 0:
+            continue
+        minx, miny, maxx, maxy = row.geometry.bounds
+        lon_list, lat_list = [], []
+        remaining = count
+        while remaining > 0:
+            batch = max(remaining * 3, 64)
+            lon = rng.uniform(minx, maxx, batch)
+            lat = rng.uniform(miny, maxy, batch)
+            inside = gpd.GeoSeries(gpd.points_from_xy(lon, lat), crs=estate_gdf.crs).within(row.geometry).values
+            lon_list.append(lon[inside][:remaining])
+            lat_list.append(lat[inside][:remaining])
+            remaining -= int(min(inside.sum(), remaining))
+
+        frame_list.append(pd.DataFrame({'lon': np.concatenate(lon_list), 'lat': np.concatenate(lat_list),
+                                        'PROPERTY': row['PROPERTY'], 'PROP_TAG': row['PROP_TAG'],
+                                        'DISTRICT': row['DISTRICT']}))
+
+    point_df = pd.concat(frame_list, ignore_index=True)
+
+    return point_df.iloc[rng.permutation(len(point_df.index))].reset_index(drop=True)
+
+
+def offset_fn(rng, lat, lon, max_m):
+    """ Move points a random distance (up to max_m metres) in a random direction. """
+
+    distance = rng.uniform(0, max_m, len(lat))
+    bearing = rng.uniform(0, 2 * np.pi, len(lat))
+    new_lat = lat + (distance * np.cos(bearing)) / 111320.0
+    new_lon = lon + (distance * np.sin(bearing)) / (111320.0 * np.cos(np.radians(lat)))
+
+    return new_lat, new_lon
+
+
+def photo_column_fn(rng, base_url, key_array, column, rate):
+    """ Photo urls (or NaN) for one photo field - the url path is unique per submission and field. """
+
+    present = rng.random(len(key_array)) < rate
+    url = np.array(['{0}/view/binaryData/{1}/{2}.jpg'.format(base_url, key, column.rsplit(':', 1)[-1])
+                    for key in key_array], dtype=object)
+
+    return np.where(present, url, np.nan)
+
+
+def generate_fn(estate_gdf, n, base_url, rng, start_date, days, photo_rate=0.6, property_columns=False):
+    """ Build a synthetic ODK Mapping results dataframe.
+
+    :param estate_gdf: geo-dataframe object containing the properties to scatter the submissions over (EPSG:4326).
+    :param n: integer object containing the number of submissions.
+    :param base_url: string object containing the photo server url.
+    :param rng: numpy random generator object.
+    :param start_date: datetime object containing the first inspection day.
+    :param days: integer object containing the length of the field season.
+    :param photo_rate: float object containing the probability that a photo field holds a url.
+    :param property_columns: boolean object - add the PROPERTY, PROP_TAG and DISTRICT columns that step2_1 joins on
+    (fixtures for the step2_x extractors).
+    :return df: pandas dataframe object with the RMB_Mapping results columns.
+    """
+
+    point_df = sample_points_fn(rng, estate_gdf, n)
+    feature = choice_fn(rng, list(feature_weight_dict.keys()), n, list(feature_weight_dict.values()))
+    infra = np.where(feature == 'infrastructure',
+                     choice_fn(rng, list(infra_weight_dict.keys()), n, list(infra_weight_dict.values())), np.nan)
+
+    start = [start_date + timedelta(days=int(d), seconds=int(s))
+             for d, s in zip(rng.integers(0, days, n), rng.integers(25200, 61200, n))]
+    key_array = np.array(['uuid:{0:08x}-{1:04x}-4{2:03x}-a{3:03x}-{4:012x}'.format(*i) for i in zip(
+        rng.integers(0, 2 ** 32, n), rng.integers(0, 2 ** 16, n), rng.integers(0, 2 ** 12, n),
+        rng.integers(0, 2 ** 12, n), rng.integers(0, 2 ** 48, n))], dtype=object)
+
+    column_dict = {
+        "SUBMISSION_DATE": [i.strftime('%Y-%m-%dT%H:%M:%S.000+09:30') for i in start],
+        "START": [i.strftime('%Y-%m-%dT%H:%M:%S.000+09:30') for i in start],
+        "END": [(i + timedelta(minutes=5)).strftime('%Y-%m-%dT%H:%M:%S.000+09:30') for i in start],
+        "DEVICEID": choice_fn(rng, device_list, n),
+        "GROUP_FEATURE:FEATURE": feature,
+        "INFRA:INF_FEAT": infra,
+        "INFRA:WAT_OBJ": np.where(infra == 'water_point', choice_fn(rng, water_list, n), np.nan),
+        "INFRA:PNT_OBJ": np.where(infra == 'point', choice_fn(rng, point_list, n), np.nan),
+        "INFRA:LINE_OBJ": np.where(infra == 'line', choice_fn(rng, line_list, n), np.nan),
+        "INFRA:OTHER_FEAT": np.where(feature == 'other_feature', 'other_feature_note', np.nan),
+        "FEATURE_ATTRIB:OUTSIDE": choice_fn(rng, ['inside', 'outside'], n, [0.9, 0.1]),
+        "FEATURE_ATTRIB:INF_LABEL": np.where(rng.random(n) < 0.5, choice_fn(rng, ['North', 'South', 'Wattle', 'Red'], n),
+                                             np.nan),
+        "FEATURE_ATTRIB:COND_LABEL": np.where(rng.random(n) < 0.3, choice_fn(rng, condition_list[1:], n), np.nan),
+        "FEATURE_ATTRIB:FREE_TEXT": np.where(rng.random(n) < 0.3, 'synthetic comment', np.nan),
+        "GROUP_COORDINATES:SITE_GPS1:Latitude": point_df['lat'].values,
+        "GROUP_COORDINATES:SITE_GPS1:Longitude": point_df['lon'].values,
+        "GROUP_COORDINATES:SITE_GPS1:Altitude": rng.uniform(150, 600, n).round(1),
+        "GROUP_COORDINATES:SITE_GPS1:Accuracy": rng.uniform(2, 15, n).round(1),
+        "GROUP_COORDINATES:OFF1_DIST": np.where(rng.random(n) < 0.4, rng.integers(5, 200, n), 0),
+        "GROUP_COORDINATES:BEARING1": rng.integers(0, 360, n),
+    }
+
+    # infrastructure lines - GPS2 ... GPS10 follow a random walk from GPS1; unused vertices are empty.
+    line = infra == 'line'
+    vertex_count = rng.integers(2, 11, n)
+    lat, lon = point_df['lat'].values, point_df['lon'].values
+    for i in range(2, 11):
+        lat, lon = offset_fn(rng, lat, lon, 800)
+        used = line & (vertex_count >= i)
+        prefix = "GROUP_LINE:GPS{0}_GROUP:".format(i)
+        column_dict[prefix + "SITE_GPS{0}:Latitude".format(i)] = np.where(used, lat, np.nan)
+        column_dict[prefix + "SITE_GPS{0}:Longitude".format(i)] = np.where(used, lon, np.nan)
+        column_dict[prefix + "SITE_GPS{0}:Accuracy".format(i)] = np.where(used, rng.uniform(2, 15, n).round(1), np.nan)
+        column_dict[prefix + "OFF{0}_DIST".format(i)] = np.where(used, 0, np.nan)
+        column_dict[prefix + "BEARING{0}".format(i)] = np.where(used, 0, np.nan)
+
+    for column in ["GROUP_PHOTO:PHOTO1", "GROUP_PHOTO:PHOTO2", "GROUP_PHOTO:PHOTO3"]:
+        column_dict[column] = photo_column_fn(rng, base_url, key_array, column, photo_rate)
+
+    clearing = (feature == 'clearing') | (feature == 'paddock')
+    column_dict.update({
+        "FEAT_ATTRIB:CLEAR_TYPE": np.where(feature == 'clearing', choice_fn(rng, clear_type_list, n), np.nan),
+        "FEAT_ATTRIB:CLEAR_AGE": np.where(feature == 'clearing', rng.integers(1, 30, n), np.nan),
+        "FEAT_ATTRIB:LAND_USE": np.where(clearing, choice_fn(rng, land_use_list, n), np.nan),
+        "FEAT_ATTRIB:LU_OTHER": np.where(clearing, 'other land use', np.nan),
+        "FEAT_ATTRIB:PDK_NAME": np.where(clearing, choice_fn(rng, ['Horse', 'Bore', 'House', 'Creek'], n), np.nan),
+        "FEAT_ATTRIB:ERO_TYPE": np.where(feature == 'erosion', choice_fn(rng, erosion_list, n), np.nan),
+        "FEAT_ATTRIB:SINK_DIAM": np.where(feature == 'sinkhole', rng.integers(1, 40, n), np.nan),
+        "FEAT_ATTRIB:WOOD_THICK": np.where(feature == 'woody_thickening', choice_fn(rng, density_list, n), np.nan),
+        "FEAT_ATTRIB:WT_BOT": np.where(feature == 'woody_thickening', 'Acacia aneura', np.nan),
+        "FEAT_ATTRIB:WT_COMMON": np.where(feature == 'woody_thickening', 'Mulga', np.nan),
+        "FERAL_MAIN:FERAL_OTHER_EVID": np.where(feature == 'feral_animal', 'nan', np.nan),
+        "WEEDS:GROUP_WEED1:WEED1": np.where(feature == 'weed', choice_fn(
+            rng, ['parkinsonia_aculeata', 'mimosa_pigra', 'hyptis_suaveolens', 'other_weed'], n), np.nan),
+        "WEEDS:GROUP_WEED1:WEED1_OTHER": np.where(feature == 'weed', 'calotropis_procera', np.nan),
+        "WEEDS:GROUP_WEED1:SPECIES_SIZE1": np.where(feature == 'weed', rng.integers(1, 50, n), np.nan),
+        "WEEDS:GROUP_WEED1:SPECIES_DENSITY1": np.where(feature == 'weed', choice_fn(rng, density_list, n), np.nan),
+    })
+
+    for erosion in ['SCALD', 'WIND', 'WAT', 'RIL', 'GULL']:
+        column_dict["FEAT_ATTRIB:{0}_SEV".format(erosion)] = np.where(feature == 'erosion',
+                                                                      choice_fn(rng, severity_list, n), np.nan)
+        column_dict["FEAT_ATTRIB:{0}_STAB".format(erosion)] = np.where(feature == 'erosion',
+                                                                       choice_fn(rng, stability_list, n), np.nan)
+
+    for i, animal in enumerate(feral_list):
+        column_dict["FERAL_MAIN:FERAL{0}".format(i + 1)] = np.where(feature == 'feral_animal', animal, np.nan)
+        column_dict["FERAL_MAIN:FERAL{0}_EVID".format(i + 1)] = np.where(feature == 'feral_animal',
+                                                                         choice_fn(rng, evidence_list, n), np.nan)
+
+    for column, value_list in fire_dict.items():
+        column_dict[column] = np.where(feature == 'fire', choice_fn(rng, value_list, n), np.nan)
+
+    unidentified = feature == 'unidentified_species'
+    for column in unidentified_column_list:
+        column_dict[column] = np.where(unidentified, 'yes' if column.rsplit(':', 1)[-1].startswith(
+            ('YN_', 'ID_')) else 'synthetic', np.nan)
+    for column in unidentified_photo_list:
+        column_dict[column] = np.where(unidentified,
+                                       photo_column_fn(rng, base_url, key_array, column, photo_rate), np.nan)
+
+    column_dict["meta:instanceID"] = key_array
+    column_dict["meta:instanceName"] = ['{0}_{1}'.format(f, i) for f, i in zip(feature, range(1, n + 1))]
+    column_dict["KEY"] = key_array
+
+    if property_columns:
+        for column in ['PROPERTY', 'PROP_TAG', 'DISTRICT']:
+            column_dict[column] = point_df[column].values
+
+    return pd.DataFrame(column_dict)
+
+
+def main_routine(n=1000, output_dir=None, pastoral_estate=None, properties=20, photo_url="http://127.0.0.1:8765",
+                 photo_rate=0.6, start_date="2021-04-01", days=150, seed=1, version="v1"):
+    """ Write a synthetic RMB_Mapping_<version>_results.csv.
+
+    :return output_path: string object containing the path to the csv.
+    :return estate_df: pandas dataframe object containing the PROPERTY, PROP_TAG and DISTRICT of the properties used.
+    """
+
+    rng = np.random.default_rng(seed)
+    estate_gdf = gpd.read_file(pastoral_estate).to_crs(epsg=4326)
+    estate_gdf = estate_gdf[estate_gdf.geometry.notna()]
+    index = rng.choice(len(estate_gdf.index), size=min(properties, len(estate_gdf.index)), replace=False)
+    estate_gdf = estate_gdf.iloc[np.sort(index)]
+
+    df = generate_fn(estate_gdf, n, photo_url, rng, datetime.strptime(start_date, '%Y-%m-%d'), days, photo_rate)
+
+    output_dir = output_dir or os.getcwd()
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    output_path = os.path.join(output_dir, "RMB_Mapping_{0}_results.csv".format(version))
+    df.to_csv(output_path, index=False)
+
+    print(' - synthetic submissions: ', len(df.index), ' properties: ', len(estate_gdf.index), ' -> ', output_path)
+
+    return output_path, pd.DataFrame(estate_gdf[['PROPERTY', 'PROP_TAG', 'DISTRICT']])
+
+
+if __name__ == "__main__":
+    cmd_args = cmd_args_fn()
+    main_routine(cmd_args.submissions, cmd_args.output_dir, cmd_args.pastoral_estate, cmd_args.properties,
+                 cmd_args.photo_url, cmd_args.photo_rate, cmd_args.start_date, cmd_args.days, cmd_args.seed,
+                 cmd_args.version)
@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import sys
+import json
+import time
+import argparse
+import warnings
+import importlib
+import contextlib
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+warnings.filterwarnings("ignore")
+
+benchmark_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(benchmark_dir)
+code_dir = os.path.join(repo_dir, 'code')
+
+# row extractors - [case name, module, function, GROUP_FEATURE:FEATURE rows it receives (None = all), arguments after
+# the row ('clean' = string_clean_capital_fn, 'weeds' = the weeds_list dataframe)].
+extractor_list = [
+    ['step2_1.date_time_fn', 'step2_1_mapping_processing_workflow', 'date_time_fn', None, []],
+    ['step2_1.meta_data_fn', 'step2_1_mapping_processing_workflow', 'meta_data_fn', None, []],
+    ['step2_1.gps_points_fn', 'step2_1_mapping_processing_workflow', 'gps_points_fn', None, []],
+    ['step2_1.photo_url_extraction_fn', 'step2_1_mapping_processing_workflow', 'photo_url_extraction_fn', None, []],
+    ['step2_1.label_comment_fn', 'step2_1_mapping_processing_workflow', 'label_comment_fn', None, ['clean']],
+    ['step2_2.infrastructure_line_fn', 'step2_2_infrastructure_mapping', 'infrastructure_line_fn', 'infrastructure',
+     []],
+    ['step2_2.infrastructure_water_point_fn', 'step2_2_infrastructure_mapping', 'infrastructure_water_point_fn',
+     'infrastructure', ['clean']],
+    ['step2_3.clearing_fn', 'step2_3_clearing_mapping', 'clearing_fn', 'clearing', ['clean']],
+    ['step2_4.paddock_fn', 'step2_4_paddock_mapping', 'paddock_fn', 'paddock', ['clean']],
+    ['step2_5.erosion_fn', 'step2_5_erossion_mapping', 'erosion_fn', 'erosion', []],
+    ['step2_6.weed_fn', 'step2_6_weeds_mapping', 'weed_fn', 'weed', ['clean', 'weeds']],
+    ['step2_6.device_id_fn', 'step2_6_weeds_mapping', 'device_id_fn', 'weed', []],
+    ['step2_7.woody_thickening_fn', 'step2_7_woody_thickening_mapping', 'woody_thickening_fn', 'woody_thickening',
+     ['clean']],
+    ['step2_8.feral_fn', 'step2_8_feral_animals_mapping', 'feral_fn', 'feral_animal', ['clean']],
+    ['step2_9.fire_fn', 'step2_9_fire_mapping', 'fire_fn', 'fire', []],
+    ['step2_10.sink_hole_fn', 'step2_10_sinkhole_mapping', 'sink_hole_fn', 'sinkhole', ['clean']],
+    ['step2_11.unidentified_species_fn', 'step2_11_unidentified_species_mapping', 'unidentified_species_fn',
+     'unidentified_species', ['clean']],
+    ['step2_12.other_feature_fn', 'step2_12_other_feature_mapping', 'other_feature_fn', 'other_feature', ['clean']],
+]
+
+
+def cmd_args_fn():
+    p = argparse.ArgumentParser(
+        description="""Time the step2_x extractors and step3/4 compile functions in isolation on fixture data.""")
+
+    p.add_argument("-n", "--scales", type=str, help="Comma separated fixture row counts.", default="100,1000,10000")
+
+    p.add_argument("-r", "--repeat", type=int, help="Timed repetitions per case (the minimum is reported).", default=3)
+
+    p.add_argument("-c", "--cases", type=str, help="Only run cases whose name contains this text (i.e. step2_6).",
+                   default=None)
+
+    p.add_argument("-o", "--output_dir", type=str, help="Directory for the result json files.",
+                   default=os.path.join(benchmark_dir, 'results'))
+
+    p.add_argument("-b", "--baseline", type=str, help="Baseline json to compare against.",
+                   default=os.path.join(benchmark_dir, 'results', 'micro_baseline.json'))
+
+    p.add_argument("-sb", "--save_baseline", action='store_true', help="Store this run as the baseline.")
+
+    p.add_argument("-th", "--threshold", type=float,
+                   help="Flag a regression when a case is this fraction slower than the baseline.", default=0.2)
+
+    p.add_argument("-md", "--min_delta", type=float,
+                   help="Ignore differences smaller than this many seconds (timer noise).", default=0.005)
+
+    p.add_argument("-seed", "--seed", type=int, help="Fixture random seed.", default=1)
+
+    cmd_args = p.parse_args()
+
+    return cmd_args
+
+
+def raw_fixture_fn(n, seed):
+    """ Synthetic ODK results with the property columns step2_1 joins on (see generate_odk_results).
+
+    :param n: integer object containing the number of rows.
+    :param seed: integer object containing the random seed.
+    :return: pandas dataframe object.
+    """
+
+    import generate_odk_results
+
+    rng = np.random.default_rng(seed)
+    estate_gdf = gpd.read_file(os.path.join(repo_dir, 'assets', 'shapefiles', 'NT_Pastoral_Estate.shp'))
+    estate_gdf = estate_gdf[estate_gdf.geometry.notna()].to_crs(epsg=4326)
+    estate_gdf = estate_gdf.iloc[np.sort(rng.choice(len(estate_gdf.index), size=min(20, len(estate_gdf.index)),
+                                                    replace=False))]
+
+    return generate_odk_results.generate_fn(estate_gdf, n, 'http://127.0.0.1:8765', rng, datetime(2021, 4, 1), 150,
+                                            property_columns=True)
+
+
+def feature_fixture_fn(raw_df, feature, n, seed):
+    """ n rows of one feature type (resampled from raw_df, so every scale holds the same mix of values). """
+
+    if feature is None:
+        subset_df = raw_df
+    else:
+        subset_df = raw_df[raw_df["GROUP_FEATURE:FEATURE"] == feature]
+        if feature == 'infrastructure':
+            subset_df = subset_df[subset_df["INFRA:INF_FEAT"] == 'line']
+
+    return subset_df.sample(n, replace=len(subset_df.index) < n, random_state=seed).reset_index(drop=True)
+
+
+def clean_points_fixture_fn(raw_df):
+    """ The clean feature csv columns written by the step2_x main routines (input of the step3/4 compile modules). """
+
+    df = pd.DataFrame({
+        "feature_group": "Water", "feature": raw_df["GROUP_FEATURE:FEATURE"].values,
+        "label": raw_df["FEATURE_ATTRIB:INF_LABEL"].astype(str).values,
+        "condition": raw_df["FEATURE_ATTRIB:COND_LABEL"].astype(str).values,
+        "comment": raw_df["FEATURE_ATTRIB:FREE_TEXT"].astype(str).values,
+        "date_rec": raw_df["START"].str[:10].values, "district": raw_df["DISTRICT"].values,
+        "property": raw_df["PROPERTY"].values, "prop_code": raw_df["PROP_TAG"].values,
+        "photo1": raw_df["GROUP_PHOTO:PHOTO1"].astype(str).values,
+        "photo2": raw_df["GROUP_PHOTO:PHOTO2"].astype(str).values,
+        "photo3": raw_df["GROUP_PHOTO:PHOTO3"].astype(str).values,
+        "weed_bot": raw_df["WEEDS:GROUP_WEED1:WEED1"].astype(str).values, "weed_comm": "Parkinsonia",
+        "recorder": raw_df["DEVICEID"].values, "weed_size": raw_df["WEEDS:GROUP_WEED1:SPECIES_SIZE1"].values,
+        "weed_den": raw_df["WEEDS:GROUP_WEED1:SPECIES_DENSITY1"].values, "year": 2021, "datum": "wgs84",
+        "meta_key": raw_df["meta:instanceID"].values})
+
+    for i in range(1, 11):
+        if i == 1:
+            prefix, gps = "GROUP_COORDINATES:", "SITE_GPS1"
+            dist, bear = "OFF1_DIST", "BEARING1"
+        else:
+            prefix, gps = "GROUP_LINE:GPS{0}_GROUP:".format(i), "SITE_GPS{0}".format(i)
+            dist, bear = "OFF{0}_DIST".format(i), "BEARING{0}".format(i)
+        df["lat{0}".format(i)] = raw_df["{0}{1}:Latitude".format(prefix, gps)].fillna(0).values
+        df["lon{0}".format(i)] = raw_df["{0}{1}:Longitude".format(prefix, gps)].fillna(0).values
+        df["acc{0}".format(i)] = raw_df["{0}{1}:Accuracy".format(prefix, gps)].fillna(0).values
+        df["dist{0}".format(i)] = raw_df[prefix + dist].fillna(0).values
+        df["bear{0}".format(i)] = raw_df[prefix + bear].fillna(0).values
+
+    return df
+
+
+def weeds_df_fn():
+    # loaded exactly as step2_6_weeds_mapping.main_routine loads it.
+    weeds = pd.read_csv(os.path.join(repo_dir, 'assets', 'weeds_list.csv'), delimiter="\t", header=None)
+    weeds.fillna("XXXX", inplace=True)
+    weeds.columns = (["botanical", "common"])
+
+    return weeds
+
+
+def extractor_case_fn(module_name, function_name, argument_list, fixture_df, context_dict):
+    """ Return a callable that applies one row extractor to every fixture row (rows are materialised up front so
+    only the extractor is timed, not iterrows). """
+
+    function = getattr(importlib.import_module(module_name), function_name)
+    extra = [context_dict[i] for i in argument_list]
+    row_list = [row for index, row in fixture_df.iterrows()]
+
+    def run_fn():
+        for row in row_list:
+            function(row, *extra)
+
+    return run_fn
+
+
+def compile_case_list_fn(scale_raw_df, seed):
+    """ [name, callable] pairs for the step3_1 and step4_1 compile functions at one scale. """
+
+    import step3_1_compile_line_infrastructure
+    import step4_1_points_orig_to_destination
+
+    line_df = clean_points_fixture_fn(feature_fixture_fn(scale_raw_df, 'infrastructure', len(scale_raw_df.index),
+                                                         seed))
+    line_df.insert(0, "uid_feature", line_df.index + 1)
+    uid_frame_list = [line_df.iloc[[i]] for i in range(len(line_df.index))]
+
+    def select_features_fn():
+        for uid_subset_df in uid_frame_list:
+            step3_1_compile_line_infrastructure.select_features_fn(uid_subset_df, uid_subset_df["uid_feature"].iloc[0])
+
+    def uid_loop_fn():
+        # the step3_1 main_routine loop - a boolean filter of the whole frame per feature, then select_features_fn.
+        for uif_number in line_df.uid_feature.unique():
+            uid_subset_df = line_df[line_df["uid_feature"] == uif_number]
+            step3_1_compile_line_infrastructure.select_features_fn(uid_subset_df, uif_number)
+
+    point_df = clean_points_fixture_fn(scale_raw_df)
+
+    def select_infra_features_fn():
+        step4_1_points_orig_to_destination.select_infra_features_fn(point_df.copy())
+
+    def select_weeds_features_fn():
+        step4_1_points_orig_to_destination.select_weeds_features_fn(point_df.copy())
+
+    return [['step3_1.select_features_fn', select_features_fn], ['step3_1.uid_loop', uid_loop_fn],
+            ['step4_1.select_infra_features_fn', select_infra_features_fn],
+            ['step4_1.select_weeds_features_fn', select_weeds_features_fn]]
+
+
+def time_fn(run_fn, repeat):
+    """ Run a case repeat times with its console output discarded.
+
+    :return: list object containing the elapsed seconds of each run.
+    """
+
+    elapsed_list = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run_fn()
+            elapsed_list.append(time.perf_counter() - start)
+
+    return elapsed_list
+
+
+def run_cases_fn(scale_list, repeat, seed, case_filter=None):
+    """ Time every case at every scale.
+
+    :return result_dict: dictionary object - {case name: {scale: {min_s, median_s, per_row_us}}}.
+    """
+
+    if code_dir not in sys.path:
+        sys.path.insert(0, code_dir)
+    import step2_1_mapping_processing_workflow
+
+    context_dict = {'clean': step2_1_mapping_processing_workflow.string_clean_capital_fn, 'weeds': weeds_df_fn()}
+    # one pool large enough for the biggest scale - each scale resamples it.
+    raw_df = raw_fixture_fn(max(max(scale_list), 2000), seed)
+
+    result_dict = {}
+
+    def record_fn(name, scale, run_fn):
+        elapsed_list = time_fn(run_fn, repeat)
+        result_dict.setdefault(name, {})[str(scale)] = {
+            'min_s': round(min(elapsed_list), 6), 'median_s': round(float(np.median(elapsed_list)), 6),
+            'per_row_us': round(min(elapsed_list) / scale * 1e6, 3)}
+        print(' - {0:<42} {1:>8} rows {2:>10.4f}s'.format(name, scale, min(elapsed_list)))
+
+    for scale in scale_list:
+        for name, module_name, function_name, feature, argument_list in extractor_list:
+            if case_filter and case_filter not in name:
+                continue
+            fixture_df = feature_fixture_fn(raw_df, feature, scale, seed)
+            record_fn(name, scale, extractor_case_fn(module_name, function_name, argument_list, fixture_df,
+                                                     context_dict))
+
+        scale_raw_df = feature_fixture_fn(raw_df, None, scale, seed)
+        for name, run_fn in compile_case_list_fn(scale_raw_df, seed):
+            if case_filter and case_filter not in name:
+                continue
+            record_fn(name, scale, run_fn)
+
+    return result_dict
+
+
+def compare_fn(result_dict, baseline_dict, threshold, min_delta):
+    """ Compare a run with the baseline.
+
+    :return compare_list: list object containing [case, scale, baseline s, current s, ratio, regression] lists.
+    """
+
+    compare_list = []
+    for name, scale_dict in sorted(result_dict.items()):
+        for scale, stat_dict in sorted(scale_dict.items(), key=lambda i: int(i[0])):
+            base = baseline_dict.get(name, {}).get(scale)
+            if base is None:
+                continue
+            current, previous = stat_dict['min_s'], base['min_s']
+            ratio = current / previous if previous > 0 else float('inf')
+            regression = current > previous * (1 + threshold) and (current - previous) > min_delta
+            compare_list.append([name, int(scale), previous, current, round(ratio, 2), regression])
+
+    return compare_list
+
+
+def main_routine(scale_list, repeat=3, case_filter=None, output_dir=None, baseline_path=None, save_baseline=False,
+                 threshold=0.2, min_delta=0.005, seed=1):
+    """ Run the micro benchmarks, write micro_<timestamp>.json and compare with the baseline.
+
+    :return regression_list: list object containing the comparisons flagged as regressions.
+    """
+
+    result_dict = run_cases_fn(scale_list, repeat, seed, case_filter)
+
+    run_dict = {'created': datetime.now().isoformat(), 'python': sys.version.split()[0],
+                'pandas': pd.__version__, 'repeat': repeat, 'seed': seed, 'results': result_dict}
+
+    output_dir = output_dir or os.path.join(benchmark_dir, 'results')
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    output_path = os.path.join(output_dir, 'micro_{0}.json'.format(datetime.now().strftime('%Y%m%d_%H%M%S')))
+    with open(output_path, 'w') as f:
+        json.dump(run_dict, f, indent=2)
+    print(' - results: ', output_path)
+
+    regression_list = []
+    if baseline_path and os.path.isfile(baseline_path):
+        with open(baseline_path) as f:
+            baseline_dict = json.load(f).get('results', {})
+
+        compare_list = compare_fn(result_dict, baseline_dict, threshold, min_delta)
+        print('\n{0:<42}{1:>8}{2:>12}{3:>12}{4:>8}'.format('case', 'rows', 'baseline s', 'current s', 'ratio'))
+        for name, scale, previous, current, ratio, regression in compare_list:
+            print('{0:<42}{1:>8}{2:>12.4f}{3:>12.4f}{4:>8}{5}'.format(name, scale, previous, current, ratio,
+                                                                      '  REGRESSION' if regression else ''))
+        regression_list = [i for i in compare_list if i[-1]]
+        print('\n - {0} of {1} comparisons slower than the baseline by more than {2:.0%}'.format(
+            len(regression_list), len(compare_list), threshold))
+
+    if save_baseline and baseline_path:
+        if os.path.isfile(baseline_path) and case_filter:
+            # a filtered run only replaces the cases it measured.
+            with open(baseline_path) as f:
+                merged_dict = json.load(f)
+            merged_dict['results'].update(result_dict)
+            run_dict = dict(run_dict, results=merged_dict['results'])
+        with open(baseline_path, 'w') as f:
+            json.dump(run_dict, f, indent=2)
+        print(' - baseline saved: ', baseline_path)
+
+    return regression_list
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, benchmark_dir)
+    cmd_args = cmd_args_fn()
+    regressions = main_routine([int(i) for i in cmd_args.scales.split(',')], cmd_args.repeat, cmd_args.cases,
+                               cmd_args.output_dir, cmd_args.baseline, cmd_args.save_baseline, cmd_args.threshold,
+                               cmd_args.min_delta, cmd_args.seed)
+    sys.exit(1 if regressions else 0)
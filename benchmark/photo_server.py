@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import io
+import time
+import random
+import hashlib
+import argparse
+import warnings
+import threading
+from PIL import Image
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+warnings.filterwarnings("ignore")
+
+# server behaviour - set by main_routine / start_server_fn before the first request.
+config_dict = {'latency': 0.0, 'bandwidth': 0.0, 'error_rate': 0.0, 'duplicate_rate': 0.0, 'size': 640,
+               'quality': 85}
+stats_dict = {'requests': 0, 'errors': 0, 'bytes_sent': 0}
+stats_lock = threading.Lock()
+image_cache = {}
+
+
+def cmd_args_fn():
+    p = argparse.ArgumentParser(
+        description="""Serve deterministic synthetic jpegs in place of the ODK Aggregate photo urls.""")
+
+    p.add_argument("-p", "--port", type=int, help="Port to listen on.", default=8765)
+
+    p.add_argument("-l", "--latency", type=float, help="Seconds added before each response.", default=0.0)
+
+    p.add_argument("-bw", "--bandwidth", type=float, help="Per connection bandwidth in MB per second (0 = unlimited).",
+                   default=0.0)
+
+    p.add_argument("-er", "--error_rate", type=float, help="Fraction of requests answered with a 503.", default=0.0)
+
+    p.add_argument("-dr", "--duplicate_rate", type=float,
+                   help="Fraction of urls that return one shared image (exercises the photo de-duplication).",
+                   default=0.0)
+
+    p.add_argument("-sz", "--size", type=int, help="Image width in pixels.", default=640)
+
+    cmd_args = p.parse_args()
+
+    return cmd_args
+
+
+def image_bytes_fn(path):
+    """ Render the jpeg for a url path - the same path always returns the same bytes.
+
+    :param path: string object containing the requested url path.
+    :return: bytes object containing the jpeg.
+    """
+
+    seed = int(hashlib.sha1(path.encode('utf-8')).hexdigest()[:8], 16)
+    if (seed % 10000) / 10000.0 < config_dict['duplicate_rate']:
+        seed = 0
+
+    if seed in image_cache:
+        return image_cache[seed]
+
+    rng = random.Random(seed)
+    width = config_dict['size']
+    height = int(width * 0.75)
+    # a coarse random grid scaled up - compresses like a real photo far better than noise does.
+    tile = Image.new('RGB', (16, 12))
+    tile.putdata([(rng.randint(60, 200), rng.randint(60, 180), rng.randint(30, 140)) for _ in range(16 * 12)])
+    image = tile.resize((width, height), Image.BILINEAR)
+
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=config_dict['quality'])
+    data = buffer.getvalue()
+    if len(image_cache) < 4096:
+        image_cache[seed] = data
+
+    return data
+
+
+class PhotoHandler(BaseHTTPRequestHandler):
+    """ Answer every GET with a synthetic jpeg, applying the configured latency, bandwidth and error rate. """
+
+    def do_GET(self):
+        with stats_lock:
+            stats_dict['requests'] += 1
+
+        if config_dict['latency'] > 0:
+            time.sleep(config_dict['latency'])
+
+        if config_dict['error_rate'] > 0 and random.random() < config_dict['error_rate']:
+            with stats_lock:
+                stats_dict['errors'] += 1
+            self.send_error(503)
+            return
+
+        data = image_bytes_fn(self.path)
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+
+        chunk_size = 65536
+        bandwidth = config_dict['bandwidth'] * 1048576.0
+        for start in range(0, len(data), chunk_size):
+            self.wfile.write(data[start:start + chunk_size])
+            if bandwidth > 0:
+                time.sleep(chunk_size / bandwidth)
+
+        with stats_lock:
+            stats_dict['bytes_sent'] += len(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadedServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_server_fn(port=8765, **config):
+    """ Start the photo server on a daemon thread.
+
+    :param port: integer object containing the port (0 = any free port).
+    :param config: latency, bandwidth, error_rate, duplicate_rate, size and quality overrides.
+    :return server: server object (server.server_address[1] is the port, call server.shutdown() to stop).
+    :return thread: thread object serving requests.
+    """
+
+    config_dict.update(config)
+    server = ThreadedServer(('127.0.0.1', port), PhotoHandler)
+    thread = threading.Thread(target=server.serve_forever, name='photo_server')
+    thread.daemon = True
+    thread.start()
+
+    return server, thread
+
+
+def main_routine(port=8765, latency=0.0, bandwidth=0.0, error_rate=0.0, duplicate_rate=0.0, size=640):
+    server, thread = start_server_fn(port, latency=latency, bandwidth=bandwidth, error_rate=error_rate,
+                                     duplicate_rate=duplicate_rate, size=size)
+    print(' - photo server listening on http://127.0.0.1:{0} (ctrl-c to stop)'.format(server.server_address[1]))
+
+    try:
+        while thread.is_alive():
+            thread.join(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+    print(' - requests: ', stats_dict['requests'], ' errors: ', stats_dict['errors'], ' MB sent: ',
+          round(stats_dict['bytes_sent'] / 1048576.0, 2))
+
+
+if __name__ == "__main__":
+    cmd_args = cmd_args_fn()
+    main_routine(cmd_args.port, cmd_args.latency, cmd_args.bandwidth, cmd_args.error_rate, cmd_args.duplicate_rate,
+                 cmd_args.size)
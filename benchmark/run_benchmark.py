@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import warnings
+import threading
+import subprocess
+from glob import glob
+from datetime import datetime
+
+warnings.filterwarnings("ignore")
+
+benchmark_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(benchmark_dir)
+code_dir = os.path.join(repo_dir, 'code')
+
+
+def cmd_args_fn():
+    p = argparse.ArgumentParser(
+        description="""Run the RMB Mapping pipeline end to end on synthetic data and record its cost.""")
+
+    p.add_argument("-n", "--sizes", type=str, help="Comma separated submission counts (i.e. 1000,10000,100000).",
+                   default="1000")
+
+    p.add_argument("-p", "--properties", type=int, help="Number of properties the submissions are scattered over.",
+                   default=20)
+
+    p.add_argument("-ph", "--photo_rate", type=float, help="Probability that each photo field holds a url.",
+                   default=0.6)
+
+    p.add_argument("-l", "--latency", type=float, help="Photo server latency per request (seconds).", default=0.0)
+
+    p.add_argument("-bw", "--bandwidth", type=float, help="Photo server bandwidth per connection (MB/s, 0 = unlimited).",
+                   default=0.0)
+
+    p.add_argument("-er", "--error_rate", type=float, help="Fraction of photo requests that fail.", default=0.0)
+
+    p.add_argument("-dr", "--duplicate_rate", type=float, help="Fraction of photo urls sharing one image.",
+                   default=0.05)
+
+    p.add_argument("-o", "--output_dir", type=str, help="Directory for the benchmark result json files.",
+                   default=os.path.join(benchmark_dir, 'results'))
+
+    p.add_argument("-k", "--keep", action='store_true', help="Keep the temporary working tree.")
+
+    p.add_argument("-seed", "--seed", type=int, help="Random seed.", default=1)
+
+    cmd_args = p.parse_args()
+
+    return cmd_args
+
+
+def count_tree_fn(path):
+    """ Count the files and bytes below a directory.
+
+    :return: dictionary object containing the file count, byte count and the file count per extension.
+    """
+
+    file_count, byte_count, extension_dict = 0, 0, {}
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            file_count += 1
+            try:
+                byte_count += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+            extension = os.path.splitext(name)[1].lower() or '<none>'
+            extension_dict[extension] = extension_dict.get(extension, 0) + 1
+
+    return {'files': file_count, 'bytes': byte_count, 'extensions': extension_dict}
+
+
+def build_tree_fn(root, estate_df):
+    """ Create the Pastoral_Districts, infrastructure, transition and export directories of a benchmark run.
+
+    :param root: string object containing the temporary working directory.
+    :param estate_df: pandas dataframe object containing the PROPERTY, PROP_TAG and DISTRICT of the properties.
+    :return path_dict: dictionary object containing the directory paths passed to step1_1.
+    """
+
+    sys.path.insert(0, code_dir)
+    import property_directory_resolver
+
+    path_dict = {name: os.path.join(root, name) for name in ['home', 'raw_odk', 'outputs', 'Pastoral_Districts',
+                                                             'Pastoral_Infrastructure', 'transition']}
+    for path in path_dict.values():
+        os.makedirs(path)
+
+    for prop_name, prop_tag, district in zip(estate_df.PROPERTY, estate_df.PROP_TAG, estate_df.DISTRICT):
+        prop_dir = os.path.join(path_dict['Pastoral_Districts'],
+                                property_directory_resolver.district_dir_name_fn(district),
+                                '{0}_{1}'.format(prop_tag, str(prop_name).title().replace(' ', '_')))
+        os.makedirs(os.path.join(prop_dir, 'Infrastructure'))
+
+    return path_dict
+
+
+class PeakMemory(object):
+    """ Poll the resident set size of a process tree (psutil) while the pipeline runs. """
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._poll, name='peak_memory')
+        self.thread.daemon = True
+
+    def _poll(self):
+        try:
+            import psutil
+        except ImportError:
+            return
+        try:
+            process = psutil.Process(self.pid)
+        except psutil.Error:
+            return
+
+        while not self.stop_event.is_set():
+            try:
+                rss = process.memory_info().rss
+                for child in process.children(recursive=True):
+                    try:
+                        rss += child.memory_info().rss
+                    except psutil.Error:
+                        pass
+            except psutil.Error:
+                break
+            self.peak = max(self.peak, rss)
+            self.stop_event.wait(self.interval)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+        if self.peak == 0:
+            # psutil is not installed - fall back to the largest finished child (Linux reports kilobytes).
+            try:
+                import resource
+                self.peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+            except ImportError:
+                pass
+
+        return self.peak
+
+
+def latest_report_fn(home_dir, after):
+    """ Load the newest run report written by run_instrumentation (None if the run did not get that far). """
+
+    report_list = [i for i in glob(os.path.join(home_dir, '.rmb_mapping_cache', 'run_reports', '*.json'))
+                   if os.path.getmtime(i) >= after]
+    if not report_list:
+        return None
+
+    with open(max(report_list, key=os.path.getmtime)) as f:
+        return json.load(f)
+
+
+def run_size_fn(n, cmd_args, photo_url):
+    """ Generate n submissions, run step1_1 over them and collect the measurements.
+
+    :return result_dict: dictionary object containing the run measurements.
+    """
+
+    import generate_odk_results
+
+    root = tempfile.mkdtemp(prefix='rmb_benchmark_{0}_'.format(n))
+    try:
+        generate_start = time.time()
+        csv_path, estate_df = generate_odk_results.main_routine(
+            n, os.path.join(root, 'raw_odk'), os.path.join(repo_dir, 'assets', 'shapefiles', 'NT_Pastoral_Estate.shp'),
+            cmd_args.properties, photo_url, cmd_args.photo_rate, "2021-04-01", 150, cmd_args.seed)
+        generate_seconds = time.time() - generate_start
+
+        path_dict = build_tree_fn(os.path.join(root, 'tree'), estate_df)
+        shutil.move(csv_path, path_dict['raw_odk'])
+
+        env = dict(os.environ)
+        env.update({'HOME': path_dict['home'], 'USERPROFILE': path_dict['home'], 'USERNAME': 'benchmark',
+                    'USER': 'benchmark'})
+
+        command = [sys.executable, 'step1_1_initiate_mapping_pipeline.py',
+                   '-d', path_dict['raw_odk'], '-x', path_dict['outputs'],
+                   '-pd', path_dict['Pastoral_Districts'], '-i', path_dict['Pastoral_Infrastructure'],
+                   '-td', path_dict['transition'], '-r', 'local', '-s', '2021-01-01', '-e', '2021-12-31',
+                   '-w', os.path.join(repo_dir, 'assets', 'weeds_list.csv'),
+                   '-a', os.path.join(repo_dir, 'assets', 'shapefiles', 'templates')]
+
+        print(' - running the pipeline on {0} submissions ...'.format(n))
+        log_path = os.path.join(root, 'pipeline.log')
+        start = time.time()
+        with open(log_path, 'w') as log:
+            process = subprocess.Popen(command, cwd=code_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+            memory = PeakMemory(process.pid).start()
+            return_code = process.wait()
+            peak_rss = memory.stop()
+        wall_seconds = time.time() - start
+
+        with open(log_path) as f:
+            log_tail = f.read().splitlines()[-20:]
+
+        report_dict = latest_report_fn(path_dict['home'], start) or {}
+
+        result_dict = {
+            'submissions': n,
+            'properties': len(estate_df.index),
+            'return_code': return_code,
+            'generate_seconds': round(generate_seconds, 3),
+            'wall_seconds': round(wall_seconds, 3),
+            'submissions_per_second': round(n / wall_seconds, 2) if wall_seconds > 0 else None,
+            'peak_rss_mb': round(peak_rss / 1048576.0, 1),
+            'stages': report_dict.get('stages', []),
+            'counters': report_dict.get('counters', {}),
+            'trees': {name: count_tree_fn(path_dict[name]) for name in
+                      ['outputs', 'Pastoral_Districts', 'transition', 'home']},
+            'log_tail': log_tail if return_code != 0 else [],
+        }
+
+    finally:
+        if cmd_args.keep:
+            print(' - working tree kept: ', root)
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    return result_dict
+
+
+def print_table_fn(result_list):
+    print('\n{0:>10} {1:>10} {2:>12} {3:>10} {4:>10} {5:>8}'.format(
+        'rows', 'wall (s)', 'rows / s', 'peak MB', 'files out', 'status'))
+    for result in result_list:
+        print('{0:>10} {1:>10} {2:>12} {3:>10} {4:>10} {5:>8}'.format(
+            result['submissions'], result['wall_seconds'], result['submissions_per_second'], result['peak_rss_mb'],
+            result['trees']['outputs']['files'] + result['trees']['Pastoral_Districts']['files'],
+            'ok' if result['return_code'] == 0 else 'failed'))
+
+    for result in result_list:
+        if not result['stages']:
+            continue
+        print('\n{0} submissions - slowest stages:'.format(result['submissions']))
+        # run_instrumentation writes the stages slowest first.
+        for stage in result['stages'][:10]:
+            print('   {0:<45} {1:>10}s {2:>8} calls'.format(stage['name'], stage['total_s'], stage['calls']))
+
+
+def main_routine(size_list, cmd_args):
+    """ Benchmark the pipeline at each size and write benchmark/results/end_to_end_<timestamp>.json. """
+
+    import photo_server
+
+    server, thread = photo_server.start_server_fn(0, latency=cmd_args.latency, bandwidth=cmd_args.bandwidth,
+                                                  error_rate=cmd_args.error_rate,
+                                                  duplicate_rate=cmd_args.duplicate_rate)
+    photo_url = 'http://127.0.0.1:{0}'.format(server.server_address[1])
+
+    result_list = []
+    try:
+        for n in size_list:
+            result_list.append(run_size_fn(n, cmd_args, photo_url))
+    finally:
+        server.shutdown()
+
+    if not os.path.isdir(cmd_args.output_dir):
+        os.makedirs(cmd_args.output_dir)
+    output_path = os.path.join(cmd_args.output_dir, 'end_to_end_{0}.json'.format(
+        datetime.now().strftime('%Y%m%d_%H%M%S')))
+    with open(output_path, 'w') as f:
+        json.dump({'created': datetime.now().isoformat(), 'platform': sys.platform, 'python': sys.version.split()[0],
+                   'photo_server': dict(photo_server.config_dict, **photo_server.stats_dict),
+                   'results': result_list}, f, indent=2)
+
+    print_table_fn(result_list)
+    print('\n - benchmark results: ', output_path)
+
+    return result_list
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, benchmark_dir)
+    cmd_args = cmd_args_fn()
+    main_routine([int(i) for i in cmd_args.sizes.split(',')], cmd_args)
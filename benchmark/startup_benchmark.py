@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import warnings
+import subprocess
+from datetime import datetime
+
+warnings.filterwarnings("ignore")
+
+benchmark_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(benchmark_dir)
+code_dir = os.path.join(repo_dir, 'code')
+
+# modules a start up that only parses and checks arguments should not import.
+heavy_module_list = ['numpy', 'pandas', 'geopandas', 'fiona', 'shapely', 'pyproj', 'matplotlib', 'selenium', 'docx',
+                     'PIL']
+
+
+def cmd_args_fn():
+    p = argparse.ArgumentParser(
+        description="""Time the cold start of the pipeline entry point (--help, argument errors and dry runs).""")
+
+    p.add_argument("-r", "--repeat", type=int, help="Timed runs per case (the minimum and median are reported).",
+                   default=5)
+
+    p.add_argument("-l", "--limit", type=float, help="Seconds a case may take before it is flagged.", default=1.0)
+
+    p.add_argument("-t", "--top", type=int, help="Number of slowest imports listed per case.", default=8)
+
+    p.add_argument("-o", "--output_dir", type=str, help="Directory for the result json files.",
+                   default=os.path.join(benchmark_dir, 'results'))
+
+    cmd_args = p.parse_args()
+
+    return cmd_args
+
+
+def case_list_fn(odk_dir):
+    """ The start up cases - [name, command line arguments, True if the case is held to the time limit].
+
+    :param odk_dir: string object containing an empty directory used as the directory_odk of the dry run.
+    """
+
+    script = 'step1_1_initiate_mapping_pipeline.py'
+    case_list = [['help', [script, '-h'], True],
+                 ['invalid_arguments', [script, '-s', '2021-13-01'], True],
+                 ['dry_run_offline', [script, '--dry_run', '-r', 'offline', '-d', odk_dir], True],
+                 ['dry_run_remote_auto', [script, '--dry_run', '-r', 'remote_auto'], True],
+                 ['import_entry_point', ['-c', 'import step1_1_initiate_mapping_pipeline'], True],
+                 # reference - the cost the lazy imports keep out of the cases above.
+                 ['import_pandas_geopandas', ['-c', 'import pandas, geopandas'], False]]
+
+    return case_list
+
+
+def run_case_fn(argument_list, home_dir, import_time=False):
+    """ Start one interpreter in the code directory and wait for it to exit.
+
+    :param argument_list: list object containing the interpreter arguments.
+    :param home_dir: string object containing the HOME used (keeps the local cache out of the user profile).
+    :param import_time: boolean object - True runs the interpreter with -X importtime.
+    :return: float object containing the wall time, integer object containing the return code and string object
+    containing the standard error.
+    """
+
+    env = dict(os.environ, HOME=home_dir, USERPROFILE=home_dir)
+    command = [sys.executable] + (['-X', 'importtime'] if import_time else []) + argument_list
+
+    start = time.perf_counter()
+    process = subprocess.run(command, cwd=code_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                             universal_newlines=True)
+    seconds = time.perf_counter() - start
+
+    return seconds, process.returncode, process.stderr
+
+
+def import_profile_fn(stderr, top):
+    """ Summarise the -X importtime output of one run.
+
+    :param stderr: string object containing the standard error of a -X importtime run.
+    :param top: integer object containing the number of slowest top level imports returned.
+    :return: list object containing [module, cumulative seconds] lists (slowest first) and list object containing the
+    heavy modules that were imported.
+    """
+
+    import_list = []
+    module_set = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        module_set.add(name.strip().split('.')[0])
+        # top level imports are not indented.
+        if not name[1:].startswith(' '):
+            import_list.append([name.strip(), int(cumulative) / 1e6])
+
+    import_list.sort(key=lambda i: -i[1])
+    heavy_list = [i for i in heavy_module_list if i in module_set]
+
+    return import_list[:top], heavy_list
+
+
+def main_routine(repeat=5, limit=1.0, top=8, output_dir=None):
+    """ Time each start up case, write startup_<timestamp>.json and flag the cases slower than limit.
+
+    :return slow_list: list object containing the names of the flagged cases.
+    """
+
+    home_dir = tempfile.mkdtemp(prefix='startup_home_')
+    odk_dir = tempfile.mkdtemp(prefix='startup_odk_')
+
+    result_dict = {}
+    slow_list = []
+    print('{0:<26}{1:>8}{2:>10}{3:>10}  {4}'.format('case', 'exit', 'min s', 'median s', 'heavy modules imported'))
+    for name, argument_list, limited in case_list_fn(odk_dir):
+        time_list = []
+        for _ in range(max(1, repeat)):
+            seconds, returncode, _ = run_case_fn(argument_list, home_dir)
+            time_list.append(seconds)
+        time_list.sort()
+        _, _, stderr = run_case_fn(argument_list, home_dir, import_time=True)
+        import_list, heavy_list = import_profile_fn(stderr, top)
+
+        flagged = limited and (time_list[0] > limit or heavy_list)
+        if flagged:
+            slow_list.append(name)
+        result_dict[name] = {'arguments': argument_list, 'exit_code': returncode, 'min_s': round(time_list[0], 4),
+                             'median_s': round(time_list[len(time_list) // 2], 4), 'heavy_modules': heavy_list,
+                             'slowest_imports': import_list}
+        print('{0:<26}{1:>8}{2:>10.3f}{3:>10.3f}  {4}{5}'.format(name, returncode, time_list[0],
+                                                                 time_list[len(time_list) // 2],
+                                                                 ', '.join(heavy_list) or '-',
+                                                                 '  SLOW' if flagged else ''))
+
+    run_dict = {'created': datetime.now().isoformat(), 'python': sys.version.split()[0], 'repeat': repeat,
+                'limit_s': limit, 'results': result_dict}
+
+    output_dir = output_dir or os.path.join(benchmark_dir, 'results')
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    output_path = os.path.join(output_dir, 'startup_{0}.json'.format(datetime.now().strftime('%Y%m%d_%H%M%S')))
+    with open(output_path, 'w') as f:
+        json.dump(run_dict, f, indent=2)
+    print('\n - {0} of {1} limited cases slower than {2} s or importing heavy modules'.format(
+        len(slow_list), len([i for i in case_list_fn(odk_dir) if i[2]]), limit))
+    print(' - results: ', output_path)
+
+    import shutil
+    shutil.rmtree(home_dir, ignore_errors=True)
+    shutil.rmtree(odk_dir, ignore_errors=True)
+
+    return slow_list
+
+
+if __name__ == "__main__":
+    cmd_args = cmd_args_fn()
+    slow = main_routine(cmd_args.repeat, cmd_args.limit, cmd_args.top, cmd_args.output_dir)
+    sys.exit(1 if slow else 0)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Import modules
+from __future__ import print_function, division
+import os
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('geopandas')
+pytest.importorskip('shapely')
+
+import compare_exports
+
+
+def write_csv_fn(path, geometry_list):
+    """ Write a csv shaped like infra_line_dest_52_to_GDA94.csv (attributes and a wkt geometry column). """
+
+    pd.DataFrame({'uid': range(len(geometry_list)), 'FEATURE': 'Fence', 'geometry': geometry_list}).to_csv(
+        path, index=False)
+
+
+def test_csv_geometry_same(tmp_path):
+    geometry_list = ['LINESTRING (131.5 -19.2, 131.6 -19.3)', 'POINT (132.1 -18.7)']
+    write_csv_fn(str(tmp_path / 'old.csv'), geometry_list)
+    write_csv_fn(str(tmp_path / 'new.csv'), geometry_list)
+
+    result_dict = compare_exports.compare_table_fn(str(tmp_path / 'old.csv'), str(tmp_path / 'new.csv'), ['uid'], [],
+                                                   1e-6, 5)
+
+    assert result_dict['status'] == 'same'
+    assert result_dict['geometry_differences'] == 0
+
+
+def test_csv_geometry_different(tmp_path):
+    for tree, geometry_list in [('old', ['POINT (132.1 -18.7)', 'POINT (132.2 -18.8)', 'not wkt']),
+                                ('new', ['POINT (132.1 -18.7)', 'POINT (132.3 -18.8)', 'not wkt either'])]:
+        os.makedirs(str(tmp_path / tree / 'infra_lines'))
+        write_csv_fn(str(tmp_path / tree / 'infra_lines' / 'infra_line_dest_52_to_GDA94.csv'), geometry_list)
+
+    # the process pool worker - a plain csv geometry column must not raise.
+    result_dict = compare_exports.compare_file_fn(['infra_lines/infra_line_dest_52_to_GDA94.csv',
+                                                   str(tmp_path / 'old'), str(tmp_path / 'new'), ['uid'], [], 1e-6,
+                                                   False, 5])
+
+    assert result_dict['status'] == 'different'
+    assert result_dict['geometry_differences'] == 2
+    assert result_dict['cell_differences'] == 0
+    assert not result_dict['crs_differs']
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import re
+import sys
+import shutil
+import argparse
+import threading
+import subprocess
+import warnings
+from datetime import datetime
+
+warnings.filterwarnings("ignore")
+
+delete_marker = '.__delete__'
+
+# run directories created by step1_1 (temporary_dir and export_file_path_fn): <user>_<YYYYMMDD>_<HHMM>
+run_dir_regex = re.compile(r'^(?P<user>.+)_(?P<date>\d{8})_(?P<time>\d{4})$')
+
+thread_list = []
+
+
+def cmd_args_fn():
+    p = argparse.ArgumentParser(
+        description="""Reclaim directories left by earlier or crashed RMB mapping runs.""")
+
+    p.add_argument('-d', '--directory', action='append', help='Directory holding run directories (repeatable) - '
+                                                              'defaults to your home directory.')
+
+    p.add_argument('-u', '--user', type=str, help='Only reclaim run directories of this user id.', default=None)
+
+    p.add_argument('-m', '--max_age_hours', type=float, help='Reclaim run directories older than this (hours).',
+                   default=24)
+
+    p.add_argument('-p', '--purge_only', action='store_true',
+                   help='Only delete directories already renamed aside for deletion.')
+
+    cmd_args = p.parse_args()
+
+    if not cmd_args.directory:
+        cmd_args.directory = [os.path.expanduser('~')]
+
+    return cmd_args
+
+
+def rename_aside_fn(path):
+    """ Rename a directory to <path>.__delete__<timestamp> so the name is free immediately.
+
+    :param path: string object containing the directory path.
+    :return aside_path: string object containing the new path (the original path if the rename failed).
+    """
+
+    aside_path = '{0}{1}{2}'.format(path.rstrip('\\/'), delete_marker, datetime.now().strftime('%Y%m%d%H%M%S%f'))
+    try:
+        os.rename(path, aside_path)
+    except OSError:
+        aside_path = path
+
+    return aside_path
+
+
+def remove_tree_fn(path):
+    """ Delete a directory tree, clearing read only flags (Windows) and ignoring files that are still in use. """
+
+    def on_error(func, error_path, exc_info):
+        try:
+            os.chmod(error_path, 0o777)
+            func(error_path)
+        except OSError:
+            pass
+
+    shutil.rmtree(path, onerror=on_error)
+
+
+def start_background_fn(path_list, mode='process'):
+    """ Delete directory trees without blocking the caller.
+
+    :param path_list: list object containing the directory paths (already renamed aside).
+    :param mode: string object - 'process' (detached interpreter, continues after the pipeline exits) or 'thread'
+    (daemon thread - anything unfinished is purged on the next run).
+    """
+
+    path_list = [i for i in path_list if os.path.isdir(i)]
+    if not path_list:
+        return
+
+    if mode == 'process':
+        command = [sys.executable, os.path.abspath(__file__), '--purge_only']
+        for path in set(os.path.dirname(i) for i in path_list):
+            command.extend(['--directory', path])
+        creation_flags = 0
+        if os.name == 'nt':
+            creation_flags = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        try:
+            subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.DEVNULL, close_fds=True, creationflags=creation_flags)
+            return
+        except OSError:
+            pass
+
+    for path in path_list:
+        thread = threading.Thread(target=remove_tree_fn, args=(path,), name='cleanup')
+        thread.daemon = True
+        thread.start()
+        thread_list.append((thread, path))
+
+
+def handoff_fn():
+    """ Pass deletions still running on daemon threads to a detached process before the pipeline exits. """
+
+    path_list = [path for thread, path in thread_list if thread.is_alive()]
+    del thread_list[:]
+    start_background_fn(path_list, 'process')
+
+
+def defer_remove_fn(path, mode='process'):
+    """ Rename a directory aside and delete it in the background.
+
+    :param path: string object containing the directory path.
+    :param mode: string object - 'process' or 'thread' (see start_background_fn).
+    :return aside_path: string object containing the path being deleted.
+    """
+
+    if not os.path.isdir(path):
+        return path
+
+    aside_path = rename_aside_fn(path)
+    start_background_fn([aside_path], mode)
+
+    return aside_path
+
+
+def purge_fn(directory):
+    """ Delete every directory in directory that was renamed aside for deletion by an earlier run.
+
+    :param directory: string object containing the parent directory.
+    :return removed_list: list object containing the paths removed.
+    """
+
+    removed_list = []
+    if not os.path.isdir(directory):
+        return removed_list
+
+    for entry in os.scandir(directory):
+        if entry.is_dir() and delete_marker in entry.name:
+            remove_tree_fn(entry.path)
+            removed_list.append(entry.path)
+
+    return removed_list
+
+
+def abandoned_run_dirs_fn(directory, user=None, max_age_hours=24, now=None):
+    """ List the run directories (<user>_<YYYYMMDD>_<HHMM>) older than max_age_hours.
+
+    :param directory: string object containing the parent directory (home or export directory).
+    :param user: string object containing the user id (None = any user).
+    :param max_age_hours: float object containing the minimum age in hours.
+    :param now: datetime object (default = now).
+    :return dir_list: list object containing the paths of the abandoned run directories.
+    """
+
+    now = now or datetime.now()
+    dir_list = []
+    if not os.path.isdir(directory):
+        return dir_list
+
+    for entry in os.scandir(directory):
+        match = run_dir_regex.match(entry.name)
+        if not entry.is_dir() or not match:
+            continue
+        if user is not None and match.group('user') != str(user):
+            continue
+        try:
+            created = datetime.strptime(match.group('date') + match.group('time'), '%Y%m%d%H%M')
+        except ValueError:
+            continue
+        if (now - created).total_seconds() > max_age_hours * 3600.0:
+            dir_list.append(entry.path)
+
+    return dir_list
+
+
+def housekeeping_fn(directory_list, user=None, max_age_hours=24, mode='process', exclude_list=None):
+    """ Purge directories renamed aside by earlier runs and reclaim abandoned run directories in the background.
+
+    :param directory_list: list object containing the parent directories to search.
+    :param user: string object containing the user id (None = any user).
+    :param max_age_hours: float object containing the minimum age of an abandoned run directory in hours.
+    :param mode: string object - 'process' or 'thread' (see start_background_fn).
+    :param exclude_list: list object containing run directories to keep (i.e. those of a run being resumed).
+    :return aside_list: list object containing the paths scheduled for deletion.
+    """
+
+    exclude_list = [os.path.normcase(os.path.abspath(i)) for i in exclude_list or []]
+
+    aside_list = []
+    for directory in directory_list:
+        if not os.path.isdir(directory):
+            continue
+        aside_list.extend(entry.path for entry in os.scandir(directory)
+                          if entry.is_dir() and delete_marker in entry.name)
+        for path in abandoned_run_dirs_fn(directory, user, max_age_hours):
+            if os.path.normcase(os.path.abspath(path)) in exclude_list:
+                continue
+            print(' - reclaiming abandoned run directory: ', path)
+            aside_list.append(rename_aside_fn(path))
+
+    start_background_fn(aside_list, mode)
+
+    return aside_list
+
+
+def main_routine():
+    cmd_args = cmd_args_fn()
+
+    if cmd_args.purge_only:
+        for directory in cmd_args.directory:
+            purge_fn(directory)
+    else:
+        for directory in cmd_args.directory:
+            for path in abandoned_run_dirs_fn(directory, cmd_args.user, cmd_args.max_age_hours):
+                print(' - reclaiming: ', path)
+                remove_tree_fn(rename_aside_fn(path))
+            purge_fn(directory)
+
+
+if __name__ == "__main__":
+    main_routine()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import shutil
+import threading
+import warnings
+
+warnings.filterwarnings("ignore")
+
+snapshot_dict = {}
+snapshot_lock = threading.Lock()
+
+
+def norm_path_fn(path):
+    """ Normalise a path for use as a snapshot key (case insensitive on Windows).
+
+    :param path: string object containing a directory or file path.
+    :return: string object containing the normalised path.
+    """
+
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+class DirectorySnapshot(object):
+    """ In memory snapshot of a directory tree (i.e. U:\\Pastoral_Districts on the working drive).
+
+    Each directory is listed once (os.scandir) the first time it, or one of its children, is queried; later
+    existence and listing queries are answered from memory. Directories created or removed through the snapshot update
+    it, so a run sees its own changes without listing the network drive again.
+    """
+
+    def __init__(self, root):
+        """
+        :param root: string object containing the path to the top of the tree.
+        """
+
+        self.root = norm_path_fn(root)
+        self.lock = threading.RLock()
+        self.listing_dict = {}
+        self.pending_set = set()
+        self.scan_count = 0
+        self.mkdir_count = 0
+
+    def _within_root(self, key):
+        return key == self.root or key.startswith(self.root.rstrip(os.sep) + os.sep)
+
+    def _listing(self, key):
+        """ Return the cached listing of a directory (normalised name -> (name, is directory)), or None if it does not
+        exist. """
+
+        if key in self.listing_dict:
+            return self.listing_dict[key]
+
+        parent = os.path.dirname(key)
+        if key != self.root and parent != key and self._within_root(parent):
+            parent_listing = self._listing(parent)
+            entry = None if parent_listing is None else parent_listing.get(os.path.normcase(os.path.basename(key)))
+            if entry is None or not entry[1]:
+                self.listing_dict[key] = None
+                return None
+
+        try:
+            listing = dict((os.path.normcase(entry.name), (entry.name, entry.is_dir())) for entry in os.scandir(key))
+        except (FileNotFoundError, NotADirectoryError):
+            listing = None
+        self.scan_count += 1
+        self.listing_dict[key] = listing
+
+        return listing
+
+    def _entry(self, path):
+        key = norm_path_fn(path)
+        parent = os.path.dirname(key)
+        if key == self.root or not self._within_root(parent):
+            listing = self._listing(key)
+            return None if listing is None else True
+
+        parent_listing = self._listing(parent)
+        if parent_listing is None:
+            return None
+
+        entry = parent_listing.get(os.path.normcase(os.path.basename(key)))
+
+        return None if entry is None else entry[1]
+
+    def exists(self, path):
+        """ :return: boolean object - True if the file or directory exists. """
+
+        with self.lock:
+            return self._entry(path) is not None
+
+    def isdir(self, path):
+        """ :return: boolean object - True if the directory exists. """
+
+        with self.lock:
+            return self._entry(path) is True
+
+    def isfile(self, path):
+        """ :return: boolean object - True if the file exists. """
+
+        with self.lock:
+            return self._entry(path) is False
+
+    def listdir(self, path):
+        """ :return: list object containing the names of all entries ([] if path does not exist). """
+
+        with self.lock:
+            listing = self._listing(norm_path_fn(path)) or {}
+            return sorted(name for name, is_dir in listing.values())
+
+    def list_dirs(self, path):
+        """ :return: list object containing the paths of the sub-directories of path. """
+
+        with self.lock:
+            listing = self._listing(norm_path_fn(path)) or {}
+            return [os.path.join(path, name) for name, is_dir in sorted(listing.values()) if is_dir]
+
+    def list_files(self, path):
+        """ :return: list object containing the paths of the files within path. """
+
+        with self.lock:
+            listing = self._listing(norm_path_fn(path)) or {}
+            return [os.path.join(path, name) for name, is_dir in sorted(listing.values()) if not is_dir]
+
+    def makedirs(self, path):
+        """ Create a directory and any missing parents, checking existence against the snapshot.
+
+        :param path: string object containing the directory path.
+        :return path: string object containing the directory path.
+        """
+
+        with self.lock:
+            key = norm_path_fn(path)
+            missing_list = []
+            while self._entry(key) is None:
+                missing_list.append(key)
+                parent = os.path.dirname(key)
+                if parent == key:
+                    break
+                key = parent
+
+            for key in reversed(missing_list):
+                try:
+                    os.mkdir(key)
+                    self.mkdir_count += 1
+                except FileExistsError:
+                    pass
+                self._add(key, True)
+                self.listing_dict[key] = {}
+
+        return path
+
+    def queue_makedirs(self, path):
+        """ Queue a directory for creation by flush (i.e. all the folders required by one property). """
+
+        with self.lock:
+            self.pending_set.add(norm_path_fn(path))
+
+    def flush(self):
+        """ Create all queued directories - parents first, one mkdir per missing directory.
+
+        :return created: integer object containing the number of directories created.
+        """
+
+        with self.lock:
+            before = self.mkdir_count
+            for key in sorted(self.pending_set, key=lambda i: (i.count(os.sep), i)):
+                self.makedirs(key)
+            self.pending_set = set()
+
+            return self.mkdir_count - before
+
+    def _add(self, key, is_dir):
+        parent = os.path.dirname(key)
+        listing = self.listing_dict.get(parent)
+        if listing is not None:
+            listing[os.path.normcase(os.path.basename(key))] = (os.path.basename(key), is_dir)
+
+    def add_file(self, path):
+        """ Record a file written outside the snapshot (i.e. by a copy). """
+
+        with self.lock:
+            self._add(norm_path_fn(path), False)
+
+    def discard_file(self, path):
+        """ Record a file removed or renamed outside the snapshot (i.e. by a publish). """
+
+        with self.lock:
+            self._discard(norm_path_fn(path))
+
+    def remove_file(self, path):
+        """ Delete a file and remove it from the snapshot. """
+
+        with self.lock:
+            os.remove(path)
+            self._discard(norm_path_fn(path))
+
+    def rmdir(self, path):
+        """ Delete an empty directory and remove it from the snapshot (OSError if it is not empty). """
+
+        with self.lock:
+            os.rmdir(path)
+            self._discard(norm_path_fn(path))
+
+    def remove_empty_dirs(self, path):
+        """ Delete the empty sub-directories of path (deepest first) using the snapshot listings.
+
+        :param path: string object containing the directory path.
+        """
+
+        with self.lock:
+            for dir_path in self.list_dirs(path):
+                self.remove_empty_dirs(dir_path)
+                if not self.listdir(dir_path):
+                    try:
+                        self.rmdir(dir_path)
+                    except OSError:
+                        # the directory changed outside the snapshot - list it again next time.
+                        self.invalidate(dir_path)
+
+    def rmtree(self, path):
+        """ Delete a directory tree and remove it from the snapshot. """
+
+        with self.lock:
+            shutil.rmtree(path)
+            self._discard(norm_path_fn(path))
+
+    def _discard(self, key):
+        parent = os.path.dirname(key)
+        listing = self.listing_dict.get(parent)
+        if listing is not None:
+            listing.pop(os.path.normcase(os.path.basename(key)), None)
+        prefix = key.rstrip(os.sep) + os.sep
+        for cached in [i for i in self.listing_dict if i == key or i.startswith(prefix)]:
+            del self.listing_dict[cached]
+
+    def invalidate(self, path=None):
+        """ Forget the cached listings below path (None = the whole tree) so they are listed again on the next query.
+        """
+
+        with self.lock:
+            if path is None:
+                self.listing_dict = {}
+            else:
+                key = norm_path_fn(path)
+                prefix = key.rstrip(os.sep) + os.sep
+                for cached in [i for i in self.listing_dict if i == key or i.startswith(prefix)]:
+                    del self.listing_dict[cached]
+                # the parent listing holds the entry itself.
+                self.listing_dict.pop(os.path.dirname(key), None)
+
+
+def get_snapshot_fn(root):
+    """ Return the shared snapshot for a directory tree (one per root per run).
+
+    :param root: string object containing the path to the top of the tree.
+    :return snapshot: DirectorySnapshot object.
+    """
+
+    key = norm_path_fn(root)
+    with snapshot_lock:
+        if key not in snapshot_dict:
+            snapshot_dict[key] = DirectorySnapshot(root)
+
+    return snapshot_dict[key]
+
+
+def snapshot_for_path_fn(path):
+    """ Return the shared snapshot whose root contains path (None if the path is outside every snapshot).
+
+    :param path: string object containing a directory or file path.
+    :return snapshot: DirectorySnapshot object or None.
+    """
+
+    key = norm_path_fn(path)
+    with snapshot_lock:
+        for snapshot in snapshot_dict.values():
+            if snapshot._within_root(key):
+                return snapshot
+
+    return None
@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import time
+import threading
+import itertools
+import queue
+import warnings
+from concurrent.futures import Future
+import run_instrumentation
+from urllib import request
+from urllib.parse import urlparse
+
+warnings.filterwarnings("ignore")
+
+# priority classes - lower values are downloaded first.
+DOCUMENT = 0
+INFRASTRUCTURE = 1
+POI = 2
+
+priority_name_dict = {DOCUMENT: 'document', INFRASTRUCTURE: 'infrastructure', POI: 'poi'}
+
+scheduler = None
+scheduler_lock = threading.Lock()
+scheduler_config_dict = {'max_bandwidth': None, 'per_host': 4, 'max_workers': 8, 'report_interval': 15}
+
+
+class TokenBucket(object):
+    """ Thread safe token bucket limiting the combined download rate of all worker threads. """
+
+    def __init__(self, rate, capacity=None):
+        """
+        :param rate: float object containing the permitted rate in bytes per second (None or 0 = unlimited).
+        :param capacity: float object containing the burst size in bytes (default = one second of transfer).
+        """
+
+        self.rate = float(rate) if rate else 0.0
+        self.capacity = float(capacity) if capacity else self.rate
+        self.tokens = self.capacity
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def consume(self, n_bytes):
+        """ Block until n_bytes may be transferred.
+
+        :param n_bytes: integer object containing the number of bytes about to be transferred.
+        """
+
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= n_bytes or self.tokens >= self.capacity:
+                    self.tokens -= n_bytes
+                    return
+                wait = (n_bytes - self.tokens) / self.rate
+            time.sleep(min(wait, 1.0))
+
+
+class DownloadScheduler(object):
+    """ Priority download queue shared by all photo download modules.
+
+    Jobs are taken in priority order (DOCUMENT, INFRASTRUCTURE, POI - then submission order), limited to per_host
+    concurrent connections per server and a global bandwidth cap, and streamed to a temporary file that is renamed
+    into place once complete.
+    """
+
+    def __init__(self, max_bandwidth=None, per_host=4, max_workers=8, report_interval=15, chunk_size=65536,
+                 timeout=60):
+        """
+        :param max_bandwidth: float object containing the bandwidth cap in bytes per second (None = unlimited).
+        :param per_host: integer object containing the maximum concurrent connections to one host.
+        :param max_workers: integer object containing the number of download threads.
+        :param report_interval: integer object containing the seconds between progress reports (0 = silent).
+        :param chunk_size: integer object containing the number of bytes read at a time.
+        :param timeout: integer object containing the connection timeout in seconds.
+        """
+
+        self.bucket = TokenBucket(max_bandwidth)
+        self.per_host = max(1, int(per_host))
+        self.max_workers = max(1, int(max_workers))
+        self.report_interval = report_interval
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+        self.job_queue = queue.PriorityQueue()
+        self.counter = itertools.count()
+        self.host_dict = {}
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.skipped = 0
+        self.failed_list = []
+        self.bytes_done = 0
+        self.priority_count_dict = dict((i, 0) for i in priority_name_dict)
+        self.start_time = time.time()
+
+        self.stopped = False
+        self.thread_list = []
+        for n in range(self.max_workers):
+            thread = threading.Thread(target=self._worker, name='download_{0}'.format(n))
+            thread.daemon = True
+            thread.start()
+            self.thread_list.append(thread)
+
+        if self.report_interval:
+            reporter = threading.Thread(target=self._reporter, name='download_reporter')
+            reporter.daemon = True
+            reporter.start()
+
+    def _host_semaphore(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.host_dict:
+                self.host_dict[host] = threading.BoundedSemaphore(self.per_host)
+            return self.host_dict[host]
+
+    def submit(self, url, output_str, priority=POI):
+        """ Queue a download.
+
+        :param url: string object containing the photo url.
+        :param output_str: string object containing the output path.
+        :param priority: integer object containing the priority class (DOCUMENT, INFRASTRUCTURE or POI).
+        :return future: concurrent.futures.Future object resolved with the output path once downloaded.
+        """
+
+        future = Future()
+        with self.lock:
+            self.pending += 1
+            self.submitted += 1
+            self.priority_count_dict[priority] = self.priority_count_dict.get(priority, 0) + 1
+        self.job_queue.put((priority, next(self.counter), url, output_str, future))
+
+        return future
+
+    def download(self, url, output_str, priority=DOCUMENT):
+        """ Queue a download and wait for it (i.e. a document needs the photo now).
+
+        :return output_str: string object containing the output path.
+        """
+
+        return self.submit(url, output_str, priority).result()
+
+    def _fetch(self, url, output_str):
+        if os.path.isfile(output_str):
+            return 0, True
+
+        temp_str = '{0}.{1}.part'.format(output_str, threading.current_thread().name)
+        n_bytes = 0
+        with self._host_semaphore(url):
+            response = request.urlopen(url, timeout=self.timeout)
+            try:
+                with open(temp_str, 'wb') as f:
+                    while True:
+                        self.bucket.consume(self.chunk_size)
+                        block = response.read(self.chunk_size)
+                        if not block:
+                            break
+                        f.write(block)
+                        n_bytes += len(block)
+                        with self.lock:
+                            self.bytes_done += len(block)
+            finally:
+                response.close()
+
+        os.replace(temp_str, output_str)
+
+        return n_bytes, False
+
+    def _worker(self):
+        while True:
+            priority, _, url, output_str, future = self.job_queue.get()
+            if url is None:
+                break
+
+            try:
+                n_bytes, exists = self._fetch(url, output_str)
+            except Exception as err:
+                temp_str = '{0}.{1}.part'.format(output_str, threading.current_thread().name)
+                if os.path.exists(temp_str):
+                    os.remove(temp_str)
+                with self.lock:
+                    self.failed_list.append((url, output_str, str(err)))
+                run_instrumentation.count_fn('network_requests')
+                run_instrumentation.count_fn('downloads_failed')
+                future.set_exception(err)
+            else:
+                with self.lock:
+                    if exists:
+                        self.skipped += 1
+                    else:
+                        self.completed += 1
+                if not exists:
+                    run_instrumentation.count_fn('network_requests')
+                    run_instrumentation.count_fn('files_created')
+                    run_instrumentation.count_fn('bytes_downloaded', n_bytes)
+                future.set_result(output_str)
+            finally:
+                with self.lock:
+                    self.pending -= 1
+                    if self.pending == 0:
+                        self.idle.notify_all()
+
+    def progress(self):
+        """ Summarise the download progress.
+
+        :return progress_dict: dictionary object containing counts, bytes, throughput (MB/s) and eta (seconds).
+        """
+
+        with self.lock:
+            elapsed = max(time.time() - self.start_time, 1e-6)
+            finished = self.completed + self.skipped + len(self.failed_list)
+            throughput = self.bytes_done / elapsed
+            mean_size = self.bytes_done / self.completed if self.completed else 0
+            eta = (self.pending * mean_size / throughput) if throughput and mean_size else None
+
+            progress_dict = {'submitted': self.submitted, 'finished': finished, 'completed': self.completed,
+                             'skipped': self.skipped, 'failed': len(self.failed_list), 'pending': self.pending,
+                             'bytes': self.bytes_done, 'mb_per_sec': round(throughput / 1048576.0, 3),
+                             'eta_sec': None if eta is None else int(eta)}
+
+        return progress_dict
+
+    def reset(self):
+        """ Start a new wait cycle - the finished counts, bytes and failures are cleared (downloads still pending are
+        counted in the new cycle).
+
+        :return failed_list: list object containing the (url, output path, error) of the failures cleared.
+        """
+
+        with self.lock:
+            failed_list = self.failed_list
+            self.failed_list = []
+            self.submitted = self.pending
+            self.completed = 0
+            self.skipped = 0
+            self.bytes_done = 0
+            self.start_time = time.time()
+
+        return failed_list
+
+    def _reporter(self):
+        last_bytes = 0
+        while not self.stopped:
+            time.sleep(self.report_interval)
+            progress_dict = self.progress()
+            # the byte count restarts with each wait cycle (reset).
+            last_bytes = min(last_bytes, progress_dict['bytes'])
+            if progress_dict['pending'] == 0:
+                continue
+
+            rate = (progress_dict['bytes'] - last_bytes) / float(self.report_interval) / 1048576.0
+            last_bytes = progress_dict['bytes']
+            eta = progress_dict['eta_sec']
+            print(' -- downloads: {0}/{1} ({2} pending) {3:.2f} MB/s  eta: {4}'.format(
+                progress_dict['finished'], progress_dict['submitted'], progress_dict['pending'], rate,
+                'unknown' if eta is None else '{0}m {1:02d}s'.format(eta // 60, eta % 60)))
+
+    def wait(self, timeout=None):
+        """ Block until every queued download has finished.
+
+        :param timeout: float object containing the maximum seconds to wait (None = no limit).
+        :return progress_dict: dictionary object created by progress.
+        """
+
+        with self.idle:
+            if self.pending:
+                self.idle.wait_for(lambda: self.pending == 0, timeout)
+
+        return self.progress()
+
+    def shutdown(self):
+        """ Wait for the queue to drain and stop the worker threads. """
+
+        self.wait()
+        self.stopped = True
+        for n in range(len(self.thread_list)):
+            self.job_queue.put((99, next(self.counter), None, None, None))
+        for thread in self.thread_list:
+            thread.join()
+
+
+def configure_fn(max_bandwidth=None, per_host=4, max_workers=8, report_interval=15):
+    """ Set the shared scheduler settings (step1_1 command arguments) - an active scheduler is drained and replaced.
+
+    :param max_bandwidth: float object containing the bandwidth cap in MB per second (None or 0 = unlimited).
+    :param per_host: integer object containing the maximum concurrent connections to one host.
+    :param max_workers: integer object containing the number of download threads.
+    :param report_interval: integer object containing the seconds between progress reports (0 = silent).
+    """
+
+    global scheduler
+
+    with scheduler_lock:
+        if scheduler is not None:
+            scheduler.shutdown()
+            scheduler = None
+
+        scheduler_config_dict.update({'max_bandwidth': max_bandwidth * 1048576.0 if max_bandwidth else None,
+                                      'per_host': per_host, 'max_workers': max_workers,
+                                      'report_interval': report_interval})
+
+
+def get_scheduler_fn():
+    """ Return the shared scheduler, starting it on first use.
+
+    :return scheduler: DownloadScheduler object.
+    """
+
+    global scheduler
+
+    with scheduler_lock:
+        if scheduler is None:
+            scheduler = DownloadScheduler(**scheduler_config_dict)
+
+    return scheduler
+
+
+def submit_fn(url, output_str, priority=POI):
+    """ Queue a download on the shared scheduler without waiting for it.
+
+    :return future: concurrent.futures.Future object.
+    """
+
+    return get_scheduler_fn().submit(url, output_str, priority)
+
+
+def download_fn(url, output_str, priority=DOCUMENT):
+    """ Download through the shared scheduler and wait for the file.
+
+    :return output_str: string object containing the output path.
+    """
+
+    return get_scheduler_fn().download(url, output_str, priority)
+
+
+def wait_fn():
+    """ Wait for all queued downloads and report failures (called by step2_1 before the outputs are filed) - the
+    counts and failures cover the downloads since the previous wait and are then reset for the next run.
+
+    :return progress_dict: dictionary object created by DownloadScheduler.progress.
+    """
+
+    if scheduler is None:
+        return {}
+
+    progress_dict = scheduler.wait()
+    failed_list = scheduler.reset()
+    print(' - photos downloaded: ', progress_dict['completed'], ' already present: ', progress_dict['skipped'],
+          ' failed: ', progress_dict['failed'], ' MB: ', round(progress_dict['bytes'] / 1048576.0, 2))
+    for url, output_str, err in failed_list:
+        print(' -- photo download failed: ', url, err)
+
+    return progress_dict
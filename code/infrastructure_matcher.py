@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import warnings
+from glob import glob
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+warnings.filterwarnings("ignore")
+
+# export feature directory -> infrastructure_mirror layer holding the existing features.
+feature_layer_dict = {"infra_points": "points", "infra_water_points": "points", "infra_lines": "lines"}
+
+match_column_list = ['row', 'FEATURE', 'LABEL', 'PROP_TAG', 'MATCH_ID', 'MATCH_FEAT', 'MATCH_LABEL', 'MATCH_DIST',
+                     'MATCH_OVER', 'FEAT_AGREE']
+
+
+def read_new_features_fn(feature_dir):
+    """ Read the GDA94 outputs of one property feature (both zones) into one geo-dataframe.
+
+    :param feature_dir: string object containing the path to the export feature directory.
+    :return gdf: geo-dataframe object (None when there are no features).
+    """
+
+    shape_list = sorted(glob(os.path.join(feature_dir, 'shapefile', '*dest*_to_GDA94.shp')))
+    if not shape_list:
+        shape_list = sorted(glob(os.path.join(feature_dir, 'shapefile', '*_to_GDA94.shp')))
+
+    gdf_list = [gpd.read_file(i) for i in shape_list]
+    gdf_list = [i for i in gdf_list if len(i.index) > 0]
+    if not gdf_list:
+        return None
+
+    return gpd.GeoDataFrame(pd.concat(gdf_list, ignore_index=True), crs=gdf_list[0].crs)
+
+
+def feature_agree_fn(new_series, existing_series):
+    """ Compare FEATURE values ignoring case and surrounding spaces (vectorised).
+
+    :return: numpy array object containing 1 where the features agree, otherwise 0.
+    """
+
+    new_ = new_series.astype(str).str.strip().str.upper().values
+    existing_ = existing_series.astype(str).str.strip().str.upper().values
+
+    return (new_ == existing_).astype(int)
+
+
+def nearest_fn(new_xy, existing_xy):
+    """ Find the nearest existing point to every new point in one query.
+
+    :param new_xy: numpy array object (n, 2) containing the new point coordinates (metres).
+    :param existing_xy: numpy array object (m, 2) containing the existing point coordinates (metres).
+    :return distance: numpy array object containing the distance to the nearest existing point.
+    :return index: numpy array object containing the position of the nearest existing point.
+    """
+
+    try:
+        from scipy.spatial import cKDTree
+        distance, index = cKDTree(existing_xy).query(new_xy, k=1)
+    except ImportError:
+        # without scipy - the distance matrix is small for a single property.
+        distance_matrix = np.hypot(new_xy[:, None, 0] - existing_xy[None, :, 0],
+                                   new_xy[:, None, 1] - existing_xy[None, :, 1])
+        index = distance_matrix.argmin(axis=1)
+        distance = distance_matrix[np.arange(len(new_xy)), index]
+
+    return distance, index
+
+
+def match_points_fn(new_gdf, existing_gdf, max_distance_m=50):
+    """ Tag each new point with its nearest existing infrastructure point.
+
+    :param new_gdf: geo-dataframe object containing the new (Raw) points.
+    :param existing_gdf: geo-dataframe object containing the existing (corporate) points of the property.
+    :param max_distance_m: float object containing the distance beyond which no match is recorded.
+    :return match_df: pandas dataframe object containing the match_column_list columns.
+    """
+
+    match_df = pd.DataFrame({'row': np.arange(len(new_gdf.index))})
+    for column in ['FEATURE', 'LABEL', 'PROP_TAG']:
+        match_df[column] = new_gdf[column].values if column in new_gdf.columns else np.nan
+    for column in match_column_list[4:]:
+        match_df[column] = np.nan
+
+    if existing_gdf is None or len(existing_gdf.index) == 0:
+        return match_df
+
+    new_albers = new_gdf.geometry.to_crs(epsg=3577).centroid
+    existing_albers = existing_gdf.geometry.to_crs(epsg=3577).centroid
+    new_xy = np.column_stack([new_albers.x.values, new_albers.y.values])
+    existing_xy = np.column_stack([existing_albers.x.values, existing_albers.y.values])
+
+    distance, index = nearest_fn(new_xy, existing_xy)
+    matched = distance <= max_distance_m
+    nearest_df = existing_gdf.iloc[index].reset_index(drop=True)
+
+    match_df['MATCH_ID'] = np.where(matched, index, -1)
+    match_df['MATCH_FEAT'] = nearest_df['FEATURE'].where(matched).values
+    match_df['MATCH_LABEL'] = nearest_df['LABEL'].where(matched).values if 'LABEL' in nearest_df.columns else np.nan
+    match_df['MATCH_DIST'] = np.round(distance, 1)
+    match_df['FEAT_AGREE'] = np.where(matched, feature_agree_fn(match_df['FEATURE'], nearest_df['FEATURE']), 0)
+
+    return match_df
+
+
+def match_lines_fn(new_gdf, existing_gdf, buffer_m=10):
+    """ Tag each new line with the existing line it overlaps most, using a buffered line index.
+
+    :param new_gdf: geo-dataframe object containing the new lines.
+    :param existing_gdf: geo-dataframe object containing the existing (corporate) lines of the property.
+    :param buffer_m: float object containing the buffer (metres) applied to the existing lines.
+    :return match_df: pandas dataframe object containing the match_column_list columns (MATCH_OVER is the fraction
+    of the new line within the buffer, MATCH_DIST the Hausdorff distance).
+    """
+
+    match_df = pd.DataFrame({'row': np.arange(len(new_gdf.index))})
+    for column in ['FEATURE', 'LABEL', 'PROP_TAG']:
+        match_df[column] = new_gdf[column].values if column in new_gdf.columns else np.nan
+    for column in match_column_list[4:]:
+        match_df[column] = np.nan
+
+    if existing_gdf is None or len(existing_gdf.index) == 0:
+        return match_df
+
+    new_albers = gpd.GeoDataFrame({'row': match_df['row'].values},
+                                  geometry=new_gdf.geometry.to_crs(epsg=3577).values, crs='EPSG:3577')
+    existing_albers = existing_gdf.to_crs(epsg=3577).reset_index(drop=True)
+    buffer_gdf = gpd.GeoDataFrame({'MATCH_ID': np.arange(len(existing_albers.index))},
+                                  geometry=existing_albers.buffer(buffer_m).values, crs='EPSG:3577')
+
+    # candidate pairs from the spatial index of the buffered existing lines.
+    try:
+        pair_df = gpd.sjoin(new_albers, buffer_gdf, how='inner', predicate='intersects')
+    except TypeError:
+        # geopandas < 0.10
+        pair_df = gpd.sjoin(new_albers, buffer_gdf, how='inner', op='intersects')
+    if len(pair_df.index) == 0:
+        return match_df
+
+    new_geometry = pair_df.geometry.values
+    buffer_geometry = buffer_gdf.geometry.values[pair_df['MATCH_ID'].values]
+    existing_geometry = existing_albers.geometry.values[pair_df['MATCH_ID'].values]
+    pair_df['MATCH_OVER'] = [n.intersection(b).length / n.length if n.length > 0 else 0.0
+                             for n, b in zip(new_geometry, buffer_geometry)]
+    pair_df['MATCH_DIST'] = [n.hausdorff_distance(e) for n, e in zip(new_geometry, existing_geometry)]
+
+    best_df = pair_df.sort_values('MATCH_OVER', ascending=False).drop_duplicates('row').set_index('row')
+    row = best_df.index.values
+    existing_df = existing_albers.iloc[best_df['MATCH_ID'].values].reset_index(drop=True)
+
+    match_df.loc[row, 'MATCH_ID'] = best_df['MATCH_ID'].values
+    match_df.loc[row, 'MATCH_OVER'] = np.round(best_df['MATCH_OVER'].values, 2)
+    match_df.loc[row, 'MATCH_DIST'] = np.round(best_df['MATCH_DIST'].values, 1)
+    match_df.loc[row, 'MATCH_FEAT'] = existing_df['FEATURE'].values
+    if 'LABEL' in existing_df.columns:
+        match_df.loc[row, 'MATCH_LABEL'] = existing_df['LABEL'].values
+    match_df['MATCH_ID'] = match_df['MATCH_ID'].fillna(-1).astype(int)
+    match_df['FEAT_AGREE'] = 0
+    match_df.loc[row, 'FEAT_AGREE'] = feature_agree_fn(match_df.loc[row, 'FEATURE'], existing_df['FEATURE'])
+
+    return match_df
+
+
+def main_routine(export_dir, infrastructure_directory, max_distance_m=50, buffer_m=10):
+    """ Match the new infrastructure of every property in the export directory to the existing corporate features.
+
+    Each property feature receives csv\\<feature>_existing_match.csv (one row per new feature, in shapefile order);
+    the shapefiles are not changed so they still match the Server_Upload templates.
+
+    :param export_dir: string object containing the path to the primary export directory.
+    :param infrastructure_directory: string object containing the path to the corporate infrastructure layers.
+    :param max_distance_m: float object containing the point match distance in metres.
+    :param buffer_m: float object containing the line buffer in metres.
+    :return summary_df: pandas dataframe object containing the new, matched and agreeing counts per property feature.
+    """
+
+    import infrastructure_mirror
+    mirror = infrastructure_mirror.get_mirror_fn(infrastructure_directory)
+
+    summary_list = []
+    for entry in sorted(os.scandir(export_dir), key=lambda i: i.name):
+        if not entry.is_dir():
+            continue
+
+        for feature, layer in feature_layer_dict.items():
+            feature_dir = os.path.join(entry.path, feature)
+            if not os.path.isdir(feature_dir):
+                continue
+
+            new_gdf = read_new_features_fn(feature_dir)
+            if new_gdf is None or 'PROP_TAG' not in new_gdf.columns:
+                continue
+
+            # the existing features of the property, read from the local mirror.
+            existing_list = [mirror.load_property(prop_tag=prop_tag, layer_list=[layer])[layer]
+                             for prop_tag in new_gdf['PROP_TAG'].dropna().unique()]
+            existing_list = [i for i in existing_list if i is not None and len(i.index) > 0]
+            existing_gdf = gpd.GeoDataFrame(pd.concat(existing_list, ignore_index=True),
+                                            crs=existing_list[0].crs) if existing_list else None
+
+            if layer == 'lines':
+                match_df = match_lines_fn(new_gdf, existing_gdf, buffer_m)
+            else:
+                match_df = match_points_fn(new_gdf, existing_gdf, max_distance_m)
+
+            csv_dir = os.path.join(feature_dir, 'csv')
+            if not os.path.isdir(csv_dir):
+                os.makedirs(csv_dir)
+            match_df.to_csv(os.path.join(csv_dir, feature + '_existing_match.csv'), index=False)
+
+            summary_list.append([entry.name, feature, len(match_df.index), int((match_df['MATCH_ID'] >= 0).sum()),
+                                 int(match_df['FEAT_AGREE'].sum())])
+
+    summary_df = pd.DataFrame(summary_list, columns=['property', 'feature', 'new', 'matched', 'agree'])
+    if len(summary_df.index) > 0:
+        print(' - existing infrastructure matches: ', int(summary_df['matched'].sum()), ' of ',
+              int(summary_df['new'].sum()), ' new features (', int(summary_df['agree'].sum()), ' same feature).')
+
+    return summary_df
+
+
+if __name__ == "__main__":
+    main_routine(os.getcwd(), r'U:\Pastoral_Infrastructure\Lib_Corporate\Data\ESRI')
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import re
+import json
+import pickle
+import hashlib
+import importlib.util
+import threading
+import warnings
+from glob import glob
+import pandas as pd
+import geopandas as gpd
+import stage_scheduler
+
+warnings.filterwarnings("ignore")
+
+# layer key -> corporate shapefile suffix (matches the step6_1 directory_dict).
+layer_dict = {"points": "Points", "lines": "Lines", "polygons": "Polys_Other", "paddocks": "Polys_Paddocks"}
+
+manifest_name = 'mirror_manifest.json'
+mirror_dict = {}
+mirror_lock = threading.Lock()
+
+
+def columnar_format_fn():
+    """ Return the partition file format - parquet when pyarrow is installed, otherwise pickle.
+
+    :return: string object containing the file extension ('parquet' or 'pkl').
+    """
+
+    if importlib.util.find_spec('pyarrow') is not None:
+        return 'parquet'
+
+    return 'pkl'
+
+
+def source_state_fn(shape_path):
+    """ Return the size and modified time of a shapefile (.shp and .dbf) - unchanged state means no refresh.
+
+    :param shape_path: string object containing the path to the .shp file.
+    :return: list object containing [size, mtime] for the .shp and .dbf files.
+    """
+
+    state_list = []
+    for path in [shape_path, os.path.splitext(shape_path)[0] + '.dbf']:
+        try:
+            stat = os.stat(path)
+            state_list.append([stat.st_size, stat.st_mtime])
+        except OSError:
+            state_list.append(None)
+
+    return state_list
+
+
+def partition_name_fn(prop_tag):
+    """ Convert a PROP_TAG value to a partition file name (missing tags are stored as _NONE). """
+
+    name = re.sub(r'[^A-Z0-9]', '', str(prop_tag).upper()) if pd.notna(prop_tag) else ''
+
+    return name or '_NONE'
+
+
+class InfrastructureMirror(object):
+    """ Local copy of the corporate infrastructure layers, partitioned by PROP_TAG.
+
+    Each layer is stored as one file per property (parquet or pickle) with a manifest holding the source state, the
+    content fingerprint, bounds and property names of every partition. A layer is only re-read from the corporate
+    drive when its source shapefiles change, and only partitions whose fingerprint changed are rewritten. Refreshes and
+    reads hold the mirror lock, so a stage never reads a partition while another rewrites it.
+    """
+
+    def __init__(self, infrastructure_directory, mirror_dir=None):
+        """
+        :param infrastructure_directory: string object containing the path to the corporate infrastructure layers.
+        :param mirror_dir: string object containing the path to the local mirror directory (None = default).
+        """
+
+        import property_directory_resolver
+
+        self.source = infrastructure_directory
+        if mirror_dir is None:
+            source_hash = hashlib.sha1(
+                os.path.normcase(os.path.abspath(infrastructure_directory)).encode('utf-8')).hexdigest()[:12]
+            mirror_dir = os.path.join(property_directory_resolver.default_cache_dir_fn(),
+                                      'infrastructure_mirror_{0}'.format(source_hash))
+        self.mirror_dir = mirror_dir
+        self.lock = threading.RLock()
+        self.file_format = columnar_format_fn()
+        self.manifest = self.load_manifest()
+        self.refreshed = set()
+
+    def manifest_path(self):
+        return os.path.join(self.mirror_dir, manifest_name)
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path(), 'r') as f:
+                manifest = json.load(f)
+        except (IOError, OSError, ValueError):
+            return {'format': self.file_format, 'geopandas': gpd.__version__, 'layer_dict': {}}
+
+        # partitions written by another format or geopandas version are rebuilt.
+        if manifest.get('format') != self.file_format or manifest.get('geopandas') != gpd.__version__:
+            return {'format': self.file_format, 'geopandas': gpd.__version__, 'layer_dict': {}}
+
+        return manifest
+
+    def save_manifest(self):
+        manifest_path = self.manifest_path()
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    def partition_path(self, layer, name):
+        return os.path.join(self.mirror_dir, layer, '{0}.{1}'.format(name, self.file_format))
+
+    def write_partition(self, gdf, path):
+        if self.file_format == 'parquet':
+            gdf.to_parquet(path + '.tmp')
+        else:
+            with open(path + '.tmp', 'wb') as f:
+                pickle.dump(gdf, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+
+    def read_partition(self, path):
+        if self.file_format == 'parquet':
+            return gpd.read_parquet(path)
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def source_list(self, layer):
+        return sorted(glob("{0}\\*{1}.shp".format(self.source, layer_dict[layer])))
+
+    def refresh_layer(self, layer, force=False):
+        """ Re-partition one layer when its source shapefiles have changed.
+
+        :param layer: string object containing the layer key (points, lines, polygons or paddocks).
+        :param force: boolean object - re-read the source even when it is unchanged.
+        :return changed: integer object containing the number of partitions written or removed.
+        """
+
+        import step6_1_download_adjacent_infrastructure
+
+        with self.lock:
+            source_list = self.source_list(layer)
+            state_dict = dict((path, source_state_fn(path)) for path in source_list)
+            layer_manifest = self.manifest['layer_dict'].get(layer, {'state_dict': {}, 'partition_dict': {}})
+
+            if not force and layer_manifest['state_dict'] == state_dict and layer in self.manifest['layer_dict']:
+                self.refreshed.add(layer)
+                return 0
+
+            print(' - refreshing the local infrastructure mirror: ', layer)
+            with stage_scheduler.gis_lock:
+                gdf_list = [gpd.read_file(path) for path in source_list]
+            gdf_list = [gdf for gdf in gdf_list if len(gdf.index) > 0]
+
+            partition_dict = {}
+            changed = 0
+            layer_dir = os.path.join(self.mirror_dir, layer)
+            if not os.path.isdir(layer_dir):
+                os.makedirs(layer_dir)
+
+            if gdf_list:
+                layer_gdf = gpd.GeoDataFrame(pd.concat(gdf_list, ignore_index=True), crs=gdf_list[0].crs)
+                name_series = layer_gdf['PROP_TAG'].map(partition_name_fn)
+
+                for name, gdf in layer_gdf.groupby(name_series, sort=False):
+                    gdf = gdf.reset_index(drop=True)
+                    fingerprint = step6_1_download_adjacent_infrastructure.partition_fingerprint_fn(gdf)
+                    path = self.partition_path(layer, name)
+                    previous = layer_manifest['partition_dict'].get(name, {})
+                    if previous.get('fingerprint') != fingerprint or not os.path.isfile(path):
+                        self.write_partition(gdf, path)
+                        changed += 1
+
+                    property_list = sorted(set(str(i).upper() for i in gdf['PROPERTY'].dropna().unique()))
+                    partition_dict[name] = {'fingerprint': fingerprint, 'count': len(gdf.index),
+                                            'bounds': [float(i) for i in gdf.total_bounds],
+                                            'property_list': property_list}
+
+            # partitions of properties no longer in the source.
+            for name in set(layer_manifest['partition_dict']) - set(partition_dict):
+                path = self.partition_path(layer, name)
+                if os.path.isfile(path):
+                    os.remove(path)
+                changed += 1
+
+            self.manifest['layer_dict'][layer] = {'state_dict': state_dict, 'partition_dict': partition_dict}
+            self.save_manifest()
+            self.refreshed.add(layer)
+
+            print(' - ', layer, ': ', len(partition_dict), ' partitions, ', changed, ' changed.')
+
+            return changed
+
+    def refresh(self, layer_list=None, force=False):
+        """ Refresh the listed layers (default all). """
+
+        for layer in layer_list or list(layer_dict.keys()):
+            self.refresh_layer(layer, force)
+
+    def partition_dict(self, layer):
+        with self.lock:
+            if layer not in self.refreshed:
+                self.refresh_layer(layer)
+
+            return self.manifest['layer_dict'][layer]['partition_dict']
+
+    def read_name_list(self, layer, name_list):
+        gdf_list = [self.read_partition(self.partition_path(layer, name)) for name in name_list]
+        if not gdf_list:
+            return None
+
+        return gpd.GeoDataFrame(pd.concat(gdf_list, ignore_index=True), crs=gdf_list[0].crs)
+
+    def load_property(self, prop_tag=None, property_name=None, layer_list=None):
+        """ Load the infrastructure of one property from the mirror.
+
+        :param prop_tag: string object containing the property tag (PROP_TAG).
+        :param property_name: string object containing the property name (used when prop_tag is None).
+        :param layer_list: list object containing the layer keys (default all).
+        :return gdf_dict: dictionary object mapping each layer key to a geo-dataframe (None when there is no data).
+        """
+
+        with self.lock:
+            gdf_dict = {}
+            for layer in layer_list or list(layer_dict.keys()):
+                partition_dict = self.partition_dict(layer)
+                if prop_tag is not None:
+                    name_list = [partition_name_fn(prop_tag)]
+                else:
+                    name = str(property_name).upper()
+                    name_list = [key for key, value in partition_dict.items() if name in value['property_list']]
+
+                gdf = self.read_name_list(layer, [i for i in name_list if i in partition_dict])
+                if gdf is not None and prop_tag is None:
+                    gdf = gdf[gdf['PROPERTY'].astype(str).str.upper() == str(property_name).upper()]
+                gdf_dict[layer] = gdf
+
+            return gdf_dict
+
+    def load_layer(self, layer, property_list=None):
+        """ Load a whole layer (or the partitions holding the listed property names) from the mirror.
+
+        :param layer: string object containing the layer key.
+        :param property_list: list object containing property names (None = all properties).
+        :return gdf: geo-dataframe object (None when the layer has no data).
+        """
+
+        with self.lock:
+            partition_dict = self.partition_dict(layer)
+            if property_list is None:
+                name_list = sorted(partition_dict.keys())
+            else:
+                property_set = set(str(i).upper() for i in property_list)
+                name_list = sorted(key for key, value in partition_dict.items()
+                                   if property_set.intersection(value['property_list']))
+
+            return self.read_name_list(layer, name_list)
+
+    def query_bbox(self, layer, bbox):
+        """ Load the features of a layer within a bounding box - only partitions whose bounds intersect are read.
+
+        :param layer: string object containing the layer key.
+        :param bbox: list object containing [minx, miny, maxx, maxy] in the layer coordinate reference system.
+        :return gdf: geo-dataframe object (None when no partition intersects).
+        """
+
+        with self.lock:
+            minx, miny, maxx, maxy = bbox
+            name_list = sorted(key for key, value in self.partition_dict(layer).items()
+                               if value['bounds'][0] <= maxx and value['bounds'][2] >= minx
+                               and value['bounds'][1] <= maxy and value['bounds'][3] >= miny)
+
+            gdf = self.read_name_list(layer, name_list)
+            if gdf is not None:
+                gdf = gdf.cx[minx:maxx, miny:maxy]
+
+            return gdf
+
+
+def get_mirror_fn(infrastructure_directory, mirror_dir=None):
+    """ Return the shared mirror for a corporate infrastructure directory (one per path per run).
+
+    :param infrastructure_directory: string object containing the path to the corporate infrastructure layers.
+    :param mirror_dir: string object containing the path to the local mirror directory (None = default).
+    :return mirror: InfrastructureMirror object.
+    """
+
+    key = os.path.normcase(os.path.abspath(infrastructure_directory))
+    with mirror_lock:
+        if key not in mirror_dict:
+            mirror_dict[key] = InfrastructureMirror(infrastructure_directory, mirror_dir)
+
+    return mirror_dict[key]
+
+
+def main_routine(infrastructure_directory, force=False):
+    """ Refresh the local infrastructure mirror.
+
+    :param infrastructure_directory: string object containing the path to the corporate infrastructure layers.
+    :param force: boolean object - re-read every layer even when unchanged.
+    :return mirror: InfrastructureMirror object.
+    """
+
+    mirror = get_mirror_fn(infrastructure_directory)
+    mirror.refresh(force=force)
+
+    return mirror
+
+
+if __name__ == "__main__":
+    main_routine(r'U:\Pastoral_Infrastructure\Lib_Corporate\Data\ESRI')
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import sys
+import time
+import types
+import importlib
+import threading
+
+# seconds spent importing each module loaded through a LazyModule (written to the run report).
+import_time_dict = {}
+import_lock = threading.RLock()
+
+
+class LazyModule(types.ModuleType):
+    """ Stand in for a module that is imported the first time one of its attributes is used.
+
+    pd = lazy_import_fn('pandas') at module level costs nothing until pd.read_csv (or any other attribute) is first
+    used, so --help, argument errors and dry runs return without loading pandas, geopandas and their dependencies.
+    """
+
+    def __init__(self, name):
+        super(LazyModule, self).__init__(name)
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with import_lock:
+                module = self.__dict__['_module']
+                if module is None:
+                    start = time.time()
+                    module = importlib.import_module(self.__name__)
+                    import_time_dict[self.__name__] = round(time.time() - start, 3)
+                    self.__dict__['_module'] = module
+
+        return module
+
+    def __getattr__(self, attr):
+        # only called for attributes the stand in does not hold - every module attribute.
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return '<lazy module {0} ({1})>'.format(self.__name__, state)
+
+
+def lazy_import_fn(name):
+    """ Return a module, or a stand in that imports it on first use when it has not been imported yet.
+
+    :param name: string object containing the module name (i.e. 'geopandas').
+    :return: module object or LazyModule object.
+    """
+
+    if name in sys.modules:
+        return sys.modules[name]
+
+    return LazyModule(name)
+
+
+def is_loaded_fn(module):
+    """ :return: boolean object - True if the module (or the module behind a stand in) has been imported. """
+
+    if isinstance(module, LazyModule):
+        return module.__dict__['_module'] is not None
+
+    return True
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import re
+import warnings
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+warnings.filterwarnings("ignore")
+
+# exif tag numbers (PIL.ExifTags.TAGS / GPSTAGS).
+orientation_tag = 274
+date_time_original_tag = 36867
+gps_info_tag = 34853
+
+index_column_list = ['path', 'property', 'feature_dir', 'date_label', 'uid', 'photo_num', 'exif_lat', 'exif_lon',
+                     'exif_date', 'exif_time', 'orientation']
+
+# {Property}_{YYYYMMDD}_{Feature}_uid{uid}_photo{n}.jpg - step4_3 specimen photos are not numbered (..._photo.jpg).
+photo_name_regex = re.compile(r'_(\d{8})_.*_uid(\d+)_photo(\d*)\.jpg$', re.IGNORECASE)
+
+
+def gps_degrees_fn(value, ref):
+    """ Convert an exif GPS (degrees, minutes, seconds) rational triplet to signed decimal degrees.
+
+    :param value: tuple object containing the degrees, minutes and seconds (rationals or (num, den) tuples).
+    :param ref: string object containing the hemisphere reference (N, S, E or W).
+    :return degrees: float object containing the decimal degrees.
+    """
+
+    dms_list = []
+    for i in value:
+        if isinstance(i, tuple):
+            dms_list.append(float(i[0]) / float(i[1]) if i[1] else 0.0)
+        else:
+            dms_list.append(float(i))
+
+    degrees = dms_list[0] + dms_list[1] / 60.0 + dms_list[2] / 3600.0
+    if ref in ('S', 'W', b'S', b'W'):
+        degrees = -degrees
+
+    return degrees
+
+
+def read_exif_fn(file_path):
+    """ Read the GPS position, capture time and orientation of a photograph (process pool worker).
+
+    Only the exif block is parsed - the image data is not decoded.
+
+    :param file_path: string object containing the path to the photograph.
+    :return exif_list: list object containing the exif latitude, longitude, date (YYYYMMDD), time (HH:MM:SS) and
+    orientation (NaN where a value is not recorded or the file is unreadable).
+    """
+
+    lat = lon = np.nan
+    exif_date = exif_time = ''
+    orientation = np.nan
+
+    try:
+        with Image.open(file_path) as image:
+            exif_dict = image._getexif() or {}
+    except Exception:
+        exif_dict = {}
+
+    if orientation_tag in exif_dict:
+        orientation = exif_dict[orientation_tag]
+
+    date_time = exif_dict.get(date_time_original_tag)
+    if date_time:
+        date_time = str(date_time).strip()
+        exif_date = date_time[:10].replace(':', '')
+        exif_time = date_time[11:19]
+
+    gps_dict = exif_dict.get(gps_info_tag) or {}
+    try:
+        if 2 in gps_dict and 4 in gps_dict:
+            lat = gps_degrees_fn(gps_dict[2], gps_dict.get(1, 'N'))
+            lon = gps_degrees_fn(gps_dict[4], gps_dict.get(3, 'E'))
+    except (TypeError, ValueError, ZeroDivisionError, IndexError):
+        lat = lon = np.nan
+
+    exif_list = [lat, lon, exif_date, exif_time, orientation]
+
+    return exif_list
+
+
+def index_photo_fn(file_path):
+    """ Parse the photograph file name and read its exif block (process pool worker).
+
+    Photograph names are created by the step4_x modules: {Property}_{YYYYMMDD}_{Feature}_uid{uid}_photo{n}.jpg - an
+    unnumbered photo (step4_3 ..._uid{uid}_photo.jpg) is recorded as photo 1 and a name without a uid (i.e. the
+    step4_3 sample{n}_{name}_photo.jpg) with an empty uid.
+
+    :param file_path: string object containing the path to the photograph.
+    :return index_list: list object containing one row of the exif index (index_column_list).
+    """
+
+    photo_dir = os.path.dirname(file_path)
+    feature_dir = os.path.basename(os.path.dirname(photo_dir))
+    property_dir = os.path.basename(os.path.dirname(os.path.dirname(photo_dir)))
+
+    match = photo_name_regex.search(os.path.basename(file_path))
+    if match:
+        date_label, uid, photo_num = match.group(1), match.group(2), int(match.group(3) or 1)
+    else:
+        date_label, uid, photo_num = '', '', 0
+
+    index_list = [file_path, property_dir, feature_dir, date_label, uid, photo_num] + read_exif_fn(file_path)
+
+    return index_list
+
+
+def build_exif_index_fn(photo_list, max_workers=None):
+    """ Read the exif block of a list of photographs in a process pool.
+
+    :param photo_list: list object containing the paths to the photographs.
+    :param max_workers: integer object containing the number of worker processes (None = cpu count).
+    :return index_df: pandas dataframe object containing one row per photograph (index_column_list).
+    """
+
+    # small batches are read in this process - starting the pool costs more than the reading.
+    if len(photo_list) < 32:
+        index_list = [index_photo_fn(file_path) for file_path in photo_list]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            index_list = list(executor.map(index_photo_fn, photo_list, chunksize=32))
+
+    index_df = pd.DataFrame(index_list, columns=index_column_list)
+
+    return index_df
+
+
+def offset_point_fn(lat, lon, distance_m, bearing):
+    """ Calculate the destination of a distance and bearing offset from an origin (vectorised, spherical earth).
+
+    :param lat: numpy array object containing the origin latitudes (decimal degrees).
+    :param lon: numpy array object containing the origin longitudes (decimal degrees).
+    :param distance_m: numpy array object containing the offset distances (metres).
+    :param bearing: numpy array object containing the offset bearings (degrees from north).
+    :return dest_lat, dest_lon: numpy array objects containing the destination latitudes and longitudes.
+    """
+
+    radius = 6371008.8
+    lat_r = np.radians(lat)
+    lon_r = np.radians(lon)
+    bear_r = np.radians(bearing)
+    angle = np.asarray(distance_m, dtype=float) / radius
+
+    dest_lat_r = np.arcsin(np.sin(lat_r) * np.cos(angle) + np.cos(lat_r) * np.sin(angle) * np.cos(bear_r))
+    dest_lon_r = lon_r + np.arctan2(np.sin(bear_r) * np.sin(angle) * np.cos(lat_r),
+                                    np.cos(angle) - np.sin(lat_r) * np.sin(dest_lat_r))
+
+    return np.degrees(dest_lat_r), np.degrees(dest_lon_r)
+
+
+def haversine_fn(lat1, lon1, lat2, lon2):
+    """ Calculate the great circle distance between two sets of points (vectorised).
+
+    :param lat1: numpy array object containing the first latitudes (decimal degrees).
+    :param lon1: numpy array object containing the first longitudes (decimal degrees).
+    :param lat2: numpy array object containing the second latitudes (decimal degrees).
+    :param lon2: numpy array object containing the second longitudes (decimal degrees).
+    :return distance_m: numpy array object containing the distances in metres (NaN where a coordinate is missing).
+    """
+
+    lat1, lon1, lat2, lon2 = [np.radians(np.asarray(i, dtype=float)) for i in (lat1, lon1, lat2, lon2)]
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+
+    return 2.0 * 6371008.8 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def uid_key_fn(series):
+    """ Normalise uid values to the text of their integer value - a csv uid column read as float (12.0) and the uid
+    parsed from a photograph name ('12') both become '12'; a missing or non numeric uid becomes ''.
+
+    :param series: pandas series object containing the uid values.
+    :return: pandas series object containing the uid text.
+    """
+
+    uid = pd.to_numeric(series, errors='coerce')
+
+    return uid.map(lambda value: '' if pd.isnull(value) else str(int(value)))
+
+
+def cross_check_fn(exif_df, photo_df, uid_column, max_distance_m=100):
+    """ Join the exif index of one feature to its photo csv and flag location and date mismatches.
+
+    The photograph position is compared to the feature's offset point (lat1/lon1 moved dist1 metres on bear1), the
+    same location the step4_1 module exports.
+
+    :param exif_df: pandas dataframe object containing the exif index rows of one property feature.
+    :param photo_df: pandas dataframe object containing the feature photo csv (step4_1 / step3_1).
+    :param uid_column: string object containing the photo csv uid column (uid or uid_feature).
+    :param max_distance_m: float object containing the distance (metres) beyond which a location is flagged.
+    :return check_df: pandas dataframe object containing the exif index joined to the offset point and flags.
+    """
+
+    # the uid of each side is normalised before the join (i.e. a float uid column read from the csv).
+    exif_df = exif_df.copy()
+    exif_df['uid'] = uid_key_fn(exif_df['uid'])
+    photo_df = photo_df.copy()
+    photo_df['uid'] = uid_key_fn(photo_df[uid_column])
+    for column in ['lat1', 'lon1', 'dist1', 'bear1']:
+        if column not in photo_df.columns:
+            photo_df[column] = np.nan
+
+    photo_df = photo_df.loc[photo_df['uid'] != '', ['uid', 'lat1', 'lon1', 'dist1', 'bear1']].drop_duplicates('uid')
+    check_df = exif_df.merge(photo_df, on='uid', how='left')
+
+    dest_lat, dest_lon = offset_point_fn(check_df['lat1'].values.astype(float),
+                                         check_df['lon1'].values.astype(float),
+                                         check_df['dist1'].fillna(0).values.astype(float),
+                                         check_df['bear1'].fillna(0).values.astype(float))
+    check_df['dest_lat'] = dest_lat
+    check_df['dest_lon'] = dest_lon
+    check_df['exif_dist_m'] = haversine_fn(check_df['exif_lat'], check_df['exif_lon'], dest_lat, dest_lon).round(1)
+
+    # photographs whose name carries no uid cannot be joined to a feature.
+    check_df['loc_flag'] = np.select([check_df['exif_lat'].isnull(), check_df['uid'] == '',
+                                      check_df['dest_lat'].isnull(), check_df['exif_dist_m'] > max_distance_m],
+                                     ['No GPS', 'No uid', 'No feature location', 'Mismatch'], 'OK')
+    check_df['date_flag'] = np.where(check_df['exif_date'] == '', 'No date',
+                                     np.where(check_df['exif_date'] != check_df['date_label'], 'Mismatch', 'OK'))
+
+    return check_df
+
+
+def main_routine(export_dir, feature_list, max_workers=None, max_distance_m=100):
+    """ Index the exif blocks of all photographs downloaded during this run and cross check them against the features.
+
+    The run index (photo_exif_index.csv) is written to the export directory and each property feature with photographs
+    receives csv\\<feature>_photo_exif.csv.
+
+    :param export_dir: string object containing the path to the primary export directory.
+    :param feature_list: list object containing the feature directory names.
+    :param max_workers: integer object containing the number of worker processes (None = cpu count).
+    :param max_distance_m: float object containing the distance (metres) beyond which a location is flagged.
+    :return index_df: pandas dataframe object containing the exif index.
+    """
+
+    photo_list = []
+    for feature in feature_list:
+        photo_list.extend(glob(os.path.join(export_dir, '*', feature, 'photos', '*.jpg')))
+
+    if len(photo_list) == 0:
+        return pd.DataFrame(columns=index_column_list)
+
+    # call the build_exif_index_fn function to read every photograph in one pool.
+    index_df = build_exif_index_fn(photo_list, max_workers)
+    index_df.to_csv(os.path.join(export_dir, 'photo_exif_index.csv'), index=False)
+
+    loc_mismatch = 0
+    date_mismatch = 0
+    for (property_dir, feature), exif_df in index_df.groupby(['property', 'feature_dir']):
+        photo_csv = os.path.join(export_dir, property_dir, feature, 'csv', feature + '_photo.csv')
+        if not os.path.isfile(photo_csv):
+            continue
+
+        photo_df = pd.read_csv(photo_csv)
+        uid_column = 'uid_feature' if feature == 'infra_lines' else 'uid'
+        if uid_column not in photo_df.columns:
+            continue
+
+        # call the cross_check_fn function to join the photographs to the offset points.
+        check_df = cross_check_fn(exif_df, photo_df, uid_column, max_distance_m)
+        check_df.to_csv(os.path.join(export_dir, property_dir, feature, 'csv', feature + '_photo_exif.csv'),
+                        index=False)
+
+        loc_mismatch += int((check_df['loc_flag'] == 'Mismatch').sum())
+        date_mismatch += int((check_df['date_flag'] == 'Mismatch').sum())
+
+    print(' - photos exif indexed: ', len(index_df.index), ' location mismatches: ', loc_mismatch,
+          ' date mismatches: ', date_mismatch)
+
+    return index_df
+
+
+if __name__ == "__main__":
+    main_routine(os.getcwd(), [])
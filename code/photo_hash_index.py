@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Import modules
+from __future__ import print_function, division
+import os
+import hashlib
+import warnings
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+warnings.filterwarnings("ignore")
+
+
+def byte_hash_fn(file_path, block_size=1048576):
+    """ Calculate the sha1 digest of a file.
+
+    :param file_path: string object containing the path to the file.
+    :param block_size: integer object containing the number of bytes read at a time.
+    :return digest: string object containing the hexadecimal sha1 digest.
+    """
+
+    sha1 = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha1.update(block)
+
+    return sha1.hexdigest()
+
+
+def dhash_fn(file_path, hash_size=8):
+    """ Calculate the difference (perceptual) hash of an image.
+
+    The image is reduced to a (hash_size + 1) x hash_size greyscale thumbnail and each bit records whether a pixel is
+    brighter than its right hand neighbour, so re-encoded, resized or lightly edited copies produce close hashes.
+
+    :param file_path: string object containing the path to the image.
+    :param hash_size: integer object containing the hash width and height (8 = 64 bit hash).
+    :return dhash: integer object containing the perceptual hash.
+    """
+
+    with Image.open(file_path) as image:
+        thumbnail = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = np.asarray(thumbnail, dtype=np.int16)
+
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    dhash = 0
+    for bit in bits:
+        dhash = (dhash << 1) | int(bit)
+
+    return dhash
+
+
+def hash_photo_fn(file_path):
+    """ Calculate the byte and perceptual hash of a photograph (process pool worker).
+
+    :param file_path: string object containing the path to the photograph.
+    :return hash_list: list object containing the path, file size, sha1 digest and dhash (-1 if unreadable).
+    """
+
+    try:
+        dhash = dhash_fn(file_path)
+    except (IOError, OSError, ValueError):
+        # unreadable or truncated image (PIL UnidentifiedImageError is an OSError).
+        dhash = -1
+
+    hash_list = [file_path, os.path.getsize(file_path), byte_hash_fn(file_path), dhash]
+
+    return hash_list
+
+
+def build_photo_index_fn(photo_list, max_workers=None):
+    """ Hash a list of photographs in a process pool.
+
+    :param photo_list: list object containing the paths to the photographs.
+    :param max_workers: integer object containing the number of worker processes (None = cpu count).
+    :return index_df: pandas dataframe object containing the path, size, sha1 and dhash of each photograph.
+    """
+
+    # small batches are hashed in this process - starting the pool costs more than the hashing.
+    if len(photo_list) < 32:
+        hash_list = [hash_photo_fn(file_path) for file_path in photo_list]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            hash_list = list(executor.map(hash_photo_fn, photo_list, chunksize=16))
+
+    index_df = pd.DataFrame(hash_list, columns=['path', 'size', 'sha1', 'dhash'])
+
+    return index_df
+
+
+def exact_duplicates_fn(index_df):
+    """ Identify byte identical photographs.
+
+    :param index_df: pandas dataframe object created by build_photo_index_fn.
+    :return duplicate_df: pandas dataframe object containing path, duplicate_of, kind and distance for every copy
+    after the first (sorted by path) of each sha1 digest.
+    """
+
+    sorted_df = index_df.sort_values('path')
+    canonical = sorted_df.groupby('sha1')['path'].transform('first')
+    duplicate_df = pd.DataFrame({'path': sorted_df['path'], 'duplicate_of': canonical})
+    duplicate_df = duplicate_df[duplicate_df['path'] != duplicate_df['duplicate_of']]
+    duplicate_df['kind'] = 'exact'
+    duplicate_df['distance'] = 0
+
+    return duplicate_df.reset_index(drop=True)
+
+
+def hamming_distance_fn(hash_array, dhash):
+    """ Calculate the bit distance between one hash and an array of hashes.
+
+    :param hash_array: numpy array object (uint64) containing perceptual hashes.
+    :param dhash: integer object containing the perceptual hash to compare.
+    :return distance: numpy array object containing the number of differing bits.
+    """
+
+    xor = np.bitwise_xor(hash_array, np.uint64(dhash))
+    distance = np.unpackbits(xor.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+    return distance
+
+
+def near_duplicates_fn(index_df, max_distance=6):
+    """ Identify visually similar photographs that are not byte identical.
+
+    :param index_df: pandas dataframe object created by build_photo_index_fn.
+    :param max_distance: integer object containing the maximum number of differing hash bits (of 64).
+    :return duplicate_df: pandas dataframe object containing path, duplicate_of, kind and distance.
+    """
+
+    unique_df = index_df[index_df['dhash'] >= 0].sort_values('path').drop_duplicates('sha1')
+    path_list = unique_df['path'].tolist()
+    hash_array = unique_df['dhash'].astype(np.uint64).values
+
+    near_list = []
+    for i in range(len(path_list) - 1):
+        # compare each photograph with those after it - every pair is tested once.
+        distance = hamming_distance_fn(hash_array[i + 1:], hash_array[i])
+        for j in np.nonzero(distance <= max_distance)[0]:
+            near_list.append([path_list[i + 1 + j], path_list[i], 'near', int(distance[j])])
+
+    duplicate_df = pd.DataFrame(near_list, columns=['path', 'duplicate_of', 'kind', 'distance'])
+
+    return duplicate_df
+
+
+def link_duplicates_fn(duplicate_df, index_df):
+    """ Replace exact duplicate photographs in the local export directory with hard links to the first copy.
+
+    Photographs are left untouched where the file system does not support hard links. The links only save space in
+    the export directory - sync_engine copies each photograph to the working drive as an independent file.
+
+    :param duplicate_df: pandas dataframe object created by exact_duplicates_fn.
+    :param index_df: pandas dataframe object created by build_photo_index_fn.
+    :return bytes_saved: integer object containing the number of bytes no longer stored twice (export directory).
+    """
+
+    size_dict = dict(zip(index_df['path'], index_df['size']))
+    bytes_saved = 0
+
+    for path, duplicate_of in zip(duplicate_df['path'], duplicate_df['duplicate_of']):
+        temp_path = path + '.link'
+        try:
+            os.link(duplicate_of, temp_path)
+            os.replace(temp_path, path)
+            bytes_saved += size_dict[path]
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    return bytes_saved
+
+
+def main_routine(property_dir, max_workers=None, max_distance=6):
+    """ Index the photographs of one property export directory, link exact duplicates and report near duplicates.
+
+    The report (photo_duplicates.csv) is written to the property export directory. The sha1 digests are reused by
+    sync_engine to compare content with the working drive manifest; duplicates are still copied to the working drive
+    as separate files.
+
+    :param property_dir: string object containing the path to the property export directory.
+    :param max_workers: integer object containing the number of worker processes (None = cpu count).
+    :param max_distance: integer object containing the maximum perceptual hash distance of a near duplicate.
+    :return index_df: pandas dataframe object containing the path, size, sha1 and dhash of each photograph.
+    """
+
+    photo_list = glob(os.path.join(property_dir, '*', 'photos', '*.jpg'))
+
+    if len(photo_list) == 0:
+        return pd.DataFrame(columns=['path', 'size', 'sha1', 'dhash'])
+
+    # call the build_photo_index_fn function to hash all photographs.
+    index_df = build_photo_index_fn(photo_list, max_workers)
+
+    exact_df = exact_duplicates_fn(index_df)
+    near_df = near_duplicates_fn(index_df, max_distance)
+
+    bytes_saved = link_duplicates_fn(exact_df, index_df)
+
+    report_df = pd.concat([exact_df, near_df], ignore_index=True)
+    report_df.to_csv(os.path.join(property_dir, 'photo_duplicates.csv'), index=False)
+
+    print(' - photos indexed: ', len(index_df.index), ' exact duplicates: ', len(exact_df.index),
+          ' near duplicates: ', len(near_df.index), ' MB linked (export directory): ',
+          round(bytes_saved / 1048576.0, 2))
+
+    return index_df
+
+
+if __name__ == "__main__":
+    main_routine(os.getcwd())
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import threading
+import warnings
+from glob import glob
+
+warnings.filterwarnings("ignore")
+
+
+def mtime_fn(path):
+    """ Return the modification time of an asset file - a shapefile is modified when any of its side car files are.
+
+    :param path: string object containing the path to the asset file.
+    :return mtime: float object containing the latest modification time.
+    """
+
+    if path.lower().endswith('.shp'):
+        return max(os.path.getmtime(i) for i in glob(os.path.splitext(path)[0] + '.*'))
+
+    return os.path.getmtime(path)
+
+
+class PipelineSession(object):
+    """ Pipeline assets held between runs - for the notebooks and repeated runs from one interpreter.
+
+    The Pastoral Estate (and its WGS84 projection), Inspection_Details.csv, contact_details.csv, weeds_list.csv, the
+    species request template and the property identification of the ODK results are loaded on first use and reused
+    until their files are modified, so only the first run() pays for them.
+
+    session = PipelineSession(remote_desktop='offline', directory_odk=r'Z:\\raw_odk')
+    session.run(properties=['ROCKHAMPTON DOWNS'], features=['weeds'])
+    """
+
+    def __init__(self, asset_root=None, argument_list=None, **option_dict):
+        """
+        :param asset_root: string object containing the path to the assets directory (default: ..\\assets of the
+        current working directory, as used by step1_1).
+        :param argument_list: list object containing step1_1 command line arguments (i.e. ['-r', 'offline']).
+        :param option_dict: step1_1 command arguments (long names, i.e. remote_desktop='offline') - the remaining
+        arguments take the step1_1 defaults.
+        """
+
+        import step1_1_initiate_mapping_pipeline
+
+        self.args = step1_1_initiate_mapping_pipeline.cmd_args_fn(argument_list or [])
+        for key, value in option_dict.items():
+            if not hasattr(self.args, key):
+                raise ValueError('{0} is not a step1_1 command argument.'.format(key))
+            setattr(self.args, key, value)
+
+        if asset_root is None:
+            asset_root = os.path.join(os.path.dirname(os.getcwd()), 'assets')
+        self.path_dict = {'pastoral_estate': os.path.join(asset_root, 'shapefiles', 'NT_Pastoral_Estate.shp'),
+                          'inspection_details': os.path.join(asset_root, 'csv', 'Inspection_Details.csv'),
+                          'contact_details': os.path.join(asset_root, 'contact_details.csv')}
+
+        self.asset_dict = {}
+        self.load_count_dict = {}
+        self.lock = threading.RLock()
+        self.run_count = 0
+
+    def asset(self, name, path, loader, version=None):
+        """ Load an asset once and return the cached object until the file (or version) is modified - the
+        replaced object is released, one object is held per name.
+
+        :param name: string object containing the asset name (one path may hold several assets).
+        :param path: string object containing the path to the asset file.
+        :param loader: function that reads the file path and returns the loaded object.
+        :param version: hashable object containing any other loader input the object depends on (i.e. dates).
+        :return: object returned by loader.
+        """
+
+        mtime = mtime_fn(path)
+        with self.lock:
+            cached = self.asset_dict.get(name)
+            if cached is None or cached[0] != (path, mtime, version):
+                # release the previous object before loading its replacement.
+                self.asset_dict.pop(name, None)
+                self.asset_dict[name] = ((path, mtime, version), loader(path))
+                self.load_count_dict[name] = self.load_count_dict.get(name, 0) + 1
+
+            return self.asset_dict[name][1]
+
+    @property
+    def pastoral_estate(self):
+        import geopandas as gpd
+        return self.asset('pastoral_estate', self.path_dict['pastoral_estate'], gpd.read_file)
+
+    @property
+    def pastoral_estate_4326(self):
+        # the projection is repeated only when the shapefile changes.
+        return self.asset('pastoral_estate_4326', self.path_dict['pastoral_estate'],
+                          lambda path: self.pastoral_estate.to_crs("EPSG:4326"))
+
+    @property
+    def inspection_details(self):
+        import pandas as pd
+        return self.asset('inspection_details', self.path_dict['inspection_details'], pd.read_csv)
+
+    @property
+    def utm_dict(self):
+        inspection_details_df = self.inspection_details
+        return dict(zip(inspection_details_df.Property, inspection_details_df.UTM_Zone))
+
+    @property
+    def contact_details(self):
+        import pandas as pd
+        return self.asset('contact_details', self.path_dict['contact_details'], pd.read_csv)
+
+    @property
+    def weeds(self):
+        # held by step2_6 - the cache is shared with the weeds extraction when it runs in this process.
+        import step2_6_weeds_mapping
+        return step2_6_weeds_mapping.weeds_list_fn(self.args.weeds_list)
+
+    @property
+    def species_template(self):
+        # held by step4_3 - the cache is shared with the unidentified species documents.
+        import step4_3_unidentified_doc
+        return step4_3_unidentified_doc.cached_asset_fn(step4_3_unidentified_doc.species_template_path,
+                                                        step4_3_unidentified_doc.read_bytes_fn)
+
+    def odk_csv(self):
+        """ :return: string object containing the path to the ODK Mapping Results csv of the session form version. """
+
+        return os.path.join(self.args.directory_odk, "RMB_Mapping_{0}_results.csv".format(self.args.version))
+
+    def district_df(self, start_date, end_date, temp_dir):
+        """ Return the ODK results filtered by date with the property and district of each record - identified again
+        only when the results csv or the Pastoral Estate is modified, or the dates change.
+
+        :param start_date: string object containing the start date the records are filtered from.
+        :param end_date: string object containing the end date the records are filtered to.
+        :param temp_dir: string object containing the run temporary directory (property identification outputs).
+        :return: pandas dataframe object returned by step2_1.odk_property_df_fn.
+        """
+
+        import step2_1_mapping_processing_workflow
+
+        def loader(path):
+            return step2_1_mapping_processing_workflow.odk_property_df_fn(
+                path, start_date, end_date, self.pastoral_estate, temp_dir, self.pastoral_estate_4326)
+
+        # one dataframe is held per results csv - a new date range (i.e. watch mode end date moving on each day) or
+        # Pastoral Estate replaces it rather than adding another copy.
+        odk_csv = self.odk_csv()
+        version = (start_date, end_date, mtime_fn(self.path_dict['pastoral_estate']))
+
+        return self.asset('district_df:{0}'.format(odk_csv), odk_csv, loader, version)
+
+    def warm(self):
+        """ Load every asset now rather than on first use (i.e. before timing a run). """
+
+        import step4_3_unidentified_doc
+
+        name_list = ['pastoral_estate', 'pastoral_estate_4326', 'inspection_details', 'contact_details', 'weeds']
+        if os.path.isfile(step4_3_unidentified_doc.species_template_path):
+            name_list.append('species_template')
+        for name in name_list:
+            getattr(self, name)
+
+    def run(self, properties=None, features=None, start_date=None, end_date=None):
+        """ Process the ODK Mapping Results for some (or all) properties and feature classes.
+
+        :param properties: string object or list object containing the property names (None = the property_enquire
+        argument, "ALL" = every property).
+        :param features: list object containing the export feature names - step1_1.feature_list (None = all).
+        :param start_date: string object containing the start date filter (None = the start_date argument).
+        :param end_date: string object containing the end date filter (None = the end_date argument).
+        :return property_processed_list: list object containing the property names processed.
+        """
+
+        import step1_1_initiate_mapping_pipeline as step1_1
+        import step2_1_mapping_processing_workflow
+        import download_scheduler
+        import deferred_cleanup
+        import run_instrumentation
+
+        args = self.args
+        properties = args.property_enquire if properties is None else properties
+        feature_list = list(step1_1.feature_list) if features is None else list(features)
+        unknown_list = [i for i in feature_list if i not in step1_1.feature_list]
+        if unknown_list:
+            raise ValueError('Unknown features: {0} - use {1}.'.format(unknown_list, step1_1.feature_list))
+        start_date = start_date or args.start_date
+        end_date = end_date or args.end_date
+
+        if not os.path.isfile(self.odk_csv()):
+            raise IOError('ODK Mapping Results csv not located: {0}'.format(self.odk_csv()))
+
+        self.run_count += 1
+        run_instrumentation.start_run_fn()
+        download_scheduler.configure_fn(args.max_bandwidth, args.host_connections, args.download_threads)
+
+        final_user = step1_1.user_id_fn(args.remote_desktop)
+        primary_temp_dir, final_user = step1_1.temporary_dir(final_user)
+        primary_export_dir = step1_1.export_file_path_fn(args.export_dir, final_user)
+
+        property_processed_list = step2_1_mapping_processing_workflow.main_routine(
+            self.odk_csv(), primary_temp_dir, self.pastoral_estate, feature_list, primary_export_dir, start_date,
+            end_date, args.pastoral_districts_directory, args.weeds_list, properties, self.contact_details,
+            args.transition_dir, args.infrastructure_directory, args.assets_dir, args.remote_desktop, self.utm_dict,
+            args.force_refresh, args.stage_threads, args.stage_processes,
+            district_df=self.district_df(start_date, end_date, primary_temp_dir),
+            append_field_data=args.append_field_data)
+
+        deferred_cleanup.defer_remove_fn(primary_temp_dir)
+        if args.remote_desktop != 'offline':
+            # the outputs have been filed - remove the faulty "All" directories and the export directory.
+            step1_1.remove_all_dirs_fn(args.pastoral_districts_directory)
+            deferred_cleanup.defer_remove_fn(primary_export_dir)
+        else:
+            print('Outputs (not filed): ', primary_export_dir)
+
+        run_instrumentation.finish_run_fn({'arguments': vars(args), 'session_run': self.run_count,
+                                           'properties': properties, 'features': feature_list})
+
+        return property_processed_list
+
+    def summary(self):
+        """ :return: dictionary object containing the number of times each session asset has been loaded. """
+
+        with self.lock:
+            return dict(self.load_count_dict)
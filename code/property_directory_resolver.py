@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import re
+import json
+import hashlib
+import threading
+import warnings
+
+warnings.filterwarnings("ignore")
+
+# Pastoral_Districts directory names that differ from the pastoral estate DISTRICT field.
+district_alias_dict = {'NORTHERN_ALICE_SPRINGS': 'Northern_Alice', 'SOUTHERN_ALICE_SPRINGS': 'Southern_Alice'}
+
+# property names that are filed under another property directory (pastoral estate name -> directory name).
+# Case only differences (i.e. Mckinlay_River / McKinlay_River) are handled by normalise_name_fn.
+property_alias_dict = {'TIPPERARY WEST': 'TIPPERARY', 'TIPPERARY EAST': 'TIPPERARY'}
+
+resolver_dict = {}
+resolver_lock = threading.Lock()
+
+
+def default_cache_dir_fn():
+    """ Return the local pipeline cache directory (created when required).
+
+    :return cache_dir: string object containing the path to the cache directory.
+    """
+
+    cache_dir = os.path.join(os.path.expanduser('~'), '.rmb_mapping_cache')
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    return cache_dir
+
+
+def normalise_name_fn(name):
+    """ Reduce a property name to upper case letters and digits so that spacing, underscores, hyphens and case do not
+    affect matching (i.e. 'Mckinlay_River', 'McKinlay River' -> 'MCKINLAYRIVER').
+
+    :param name: string object containing a property name or directory name.
+    :return: string object containing the normalised name.
+    """
+
+    return re.sub(r'[^A-Z0-9]', '', str(name).upper())
+
+
+def canonical_property_fn(property_name):
+    """ Apply the property aliases to a pastoral estate or export directory property name.
+
+    :param property_name: string object containing the property name (any case, spaces or underscores).
+    :return: string object containing the upper case property name the directory is filed under.
+    """
+
+    name = str(property_name).replace('_', ' ').strip().upper()
+
+    return property_alias_dict.get(name, name)
+
+
+def district_dir_name_fn(district):
+    """ Convert a pastoral estate DISTRICT value to its Pastoral_Districts directory name.
+
+    :param district: string object containing the district name (i.e. 'Northern Alice Springs').
+    :return: string object containing the directory name (i.e. 'Northern_Alice').
+    """
+
+    district_ = str(district).strip().title().replace(' ', '_')
+
+    return district_alias_dict.get(district_.upper(), district_)
+
+
+class PropertyDirectoryResolver(object):
+    """ Index of the property directories ({PROP_TAG}_{Property_Name}) within the Pastoral_Districts directory.
+
+    The tree is scanned once (districts -> property directories) and the index is cached on disk; the cache is reused
+    while the modified times of the districts directory and each district directory are unchanged (adding or removing
+    a property directory updates its district modified time).
+    """
+
+    def __init__(self, pastoral_districts_path, cache_dir=None):
+        """
+        :param pastoral_districts_path: string object containing the path to the Pastoral_Districts directory.
+        :param cache_dir: string object containing the path to the local cache directory (None = default).
+        """
+
+        self.root = pastoral_districts_path
+        self.cache_dir = cache_dir
+        self.lock = threading.RLock()
+        self.entry_list = []
+        self.tag_dict = {}
+        self.name_dict = {}
+        self.loaded = False
+
+    def cache_path(self):
+        cache_dir = self.cache_dir or default_cache_dir_fn()
+        root_hash = hashlib.sha1(os.path.normcase(os.path.abspath(self.root)).encode('utf-8')).hexdigest()[:12]
+
+        return os.path.join(cache_dir, 'property_index_{0}.json'.format(root_hash))
+
+    def scan(self):
+        """ Scan the Pastoral_Districts directory (one listing per district, shared with the directory_snapshot).
+
+        :return entry_list: list object containing [district directory, property directory] lists.
+        :return mtime_dict: dictionary object containing the modified time of the root and each district directory.
+        """
+
+        import directory_snapshot
+        snapshot = directory_snapshot.get_snapshot_fn(self.root)
+
+        entry_list = []
+        mtime_dict = {'': os.stat(self.root).st_mtime}
+        for district_path in snapshot.list_dirs(self.root):
+            district = os.path.basename(district_path)
+            mtime_dict[district] = os.stat(district_path).st_mtime
+            for prop_path in snapshot.list_dirs(district_path):
+                entry_list.append([district, os.path.basename(prop_path)])
+
+        return entry_list, mtime_dict
+
+    def load_cache(self):
+        """ Read the on disk index if it is still valid.
+
+        :return entry_list: list object or None when the cache is missing or stale.
+        """
+
+        try:
+            with open(self.cache_path(), 'r') as f:
+                cache_dict = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        mtime_dict = cache_dict.get('mtime_dict', {})
+        try:
+            if os.stat(self.root).st_mtime != mtime_dict.get(''):
+                return None
+            for district, mtime in mtime_dict.items():
+                if district and os.stat(os.path.join(self.root, district)).st_mtime != mtime:
+                    return None
+        except OSError:
+            return None
+
+        return cache_dict.get('entry_list')
+
+    def save_cache(self, entry_list, mtime_dict):
+        try:
+            cache_path = self.cache_path()
+            with open(cache_path + '.tmp', 'w') as f:
+                json.dump({'root': self.root, 'mtime_dict': mtime_dict, 'entry_list': entry_list}, f)
+            os.replace(cache_path + '.tmp', cache_path)
+        except (IOError, OSError):
+            pass
+
+    def build(self, entry_list):
+        self.entry_list = entry_list
+        self.tag_dict = {}
+        self.name_dict = {}
+        for district, prop_dir in entry_list:
+            path = os.path.join(self.root, district, prop_dir)
+            if '_' in prop_dir:
+                tag, name = prop_dir.split('_', 1)
+                self.tag_dict.setdefault(tag.upper(), path)
+            else:
+                name = prop_dir
+            self.name_dict.setdefault(normalise_name_fn(name), path)
+            self.name_dict.setdefault(normalise_name_fn(prop_dir), path)
+        self.loaded = True
+
+    def load(self, refresh=False):
+        """ Build the index from the disk cache or a fresh scan.
+
+        :param refresh: boolean object - True forces a scan.
+        """
+
+        with self.lock:
+            entry_list = None if refresh else self.load_cache()
+            if entry_list is None:
+                entry_list, mtime_dict = self.scan()
+                self.save_cache(entry_list, mtime_dict)
+            self.build(entry_list)
+
+    def resolve(self, property_name=None, prop_tag=None):
+        """ Return the property directory for a property tag and/or property name.
+
+        The tag is matched first (unique); the name is matched on its normalised form after the aliases are applied,
+        so one property cannot match part of another property's name.
+
+        :param property_name: string object containing the property name (estate name or export directory name).
+        :param prop_tag: string object containing the PROP_TAG value.
+        :return path: string object containing the property directory path or None if it was not found.
+        """
+
+        with self.lock:
+            if not self.loaded:
+                self.load()
+
+            path = None
+            if prop_tag is not None and str(prop_tag).strip():
+                path = self.tag_dict.get(str(prop_tag).strip().upper())
+            if path is None and property_name is not None:
+                path = self.name_dict.get(normalise_name_fn(canonical_property_fn(property_name)))
+
+        return path
+
+    def property_path_list(self):
+        """ Return the path of every property directory.
+
+        :return: list object containing the property directory paths.
+        """
+
+        with self.lock:
+            if not self.loaded:
+                self.load()
+
+            return [os.path.join(self.root, district, prop_dir) for district, prop_dir in self.entry_list]
+
+
+def get_resolver_fn(pastoral_districts_path, cache_dir=None):
+    """ Return the shared resolver for a Pastoral_Districts directory (one per path per run).
+
+    :param pastoral_districts_path: string object containing the path to the Pastoral_Districts directory.
+    :param cache_dir: string object containing the path to the local cache directory (None = default).
+    :return resolver: PropertyDirectoryResolver object.
+    """
+
+    key = os.path.normcase(os.path.abspath(pastoral_districts_path))
+    with resolver_lock:
+        if key not in resolver_dict:
+            resolver_dict[key] = PropertyDirectoryResolver(pastoral_districts_path, cache_dir)
+
+    return resolver_dict[key]
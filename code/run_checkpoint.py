@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import json
+import shutil
+import hashlib
+import threading
+import warnings
+from glob import glob
+from datetime import datetime
+
+warnings.filterwarnings("ignore")
+
+
+def checkpoint_dir_fn():
+    import property_directory_resolver
+
+    checkpoint_dir = os.path.join(property_directory_resolver.default_cache_dir_fn(), 'checkpoints')
+    if not os.path.isdir(checkpoint_dir):
+        os.makedirs(checkpoint_dir)
+
+    return checkpoint_dir
+
+
+def fingerprint_fn(path_list, pattern='*', skip_list=('photos',)):
+    """ Fingerprint the files below a list of directories (relative path, size and modified time of each file).
+
+    :param path_list: list object containing the directories (missing directories are recorded as missing).
+    :param pattern: string object containing the glob pattern of the file names included.
+    :param skip_list: list object containing directory names not descended into (photos arrive after the stage).
+    :return: string object containing the hexadecimal sha1 digest.
+    """
+
+    from fnmatch import fnmatch
+
+    sha1 = hashlib.sha1()
+    for path in sorted(path_list):
+        if not os.path.isdir(path):
+            sha1.update('missing:{0}\n'.format(path).encode('utf-8'))
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(i for i in dirs if i not in skip_list)
+            for name in sorted(files):
+                if not fnmatch(name, pattern):
+                    continue
+                file_path = os.path.join(root, name)
+                stat = os.stat(file_path)
+                sha1.update('{0}|{1}|{2}\n'.format(os.path.relpath(file_path, path), stat.st_size,
+                                                   int(stat.st_mtime)).encode('utf-8'))
+
+    return sha1.hexdigest()
+
+
+def empty_dir_fn(path, keep_pattern=None, skip_list=('photos',)):
+    """ Remove the contents of a directory (the directory and its sub-directories are kept).
+
+    :param path: string object containing the directory path (created if missing).
+    :param keep_pattern: string object containing a glob pattern of file names to keep (None = remove every file).
+    :param skip_list: list object containing directory names left untouched (downloaded photos are reused).
+    """
+
+    from fnmatch import fnmatch
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+        return
+
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [i for i in dirs if i not in skip_list]
+        for name in files:
+            if keep_pattern is None or not fnmatch(name, keep_pattern):
+                os.remove(os.path.join(root, name))
+
+
+class RunCheckpoint(object):
+    """ Durable record (<run_id>.jsonl) of the pipeline units a run has started, finished or failed.
+
+    Every state change is appended as one json line and flushed to disk, so the record survives a crash at any
+    point; the last line written for a unit is its state. The first line holds the run details needed to resume
+    (temporary and export directories, the ODK results copy and the command arguments).
+    """
+
+    def __init__(self, run_id, checkpoint_dir=None):
+        """
+        :param run_id: string object containing the run identifier (run_instrumentation run id).
+        :param checkpoint_dir: string object containing the checkpoint directory (None = default).
+        """
+
+        self.run_id = run_id
+        self.path = os.path.join(checkpoint_dir or checkpoint_dir_fn(), '{0}.jsonl'.format(run_id))
+        self.lock = threading.Lock()
+        self.header = {}
+        self.unit_dict = {}
+
+    def load(self):
+        """ Read the checkpoint file (a partly written last line is ignored).
+
+        :return: RunCheckpoint object (self).
+        """
+
+        self.header, self.unit_dict = {}, {}
+        if not os.path.isfile(self.path):
+            return self
+
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('type') == 'run':
+                    self.header = record
+                else:
+                    self.unit_dict[record['unit']] = record
+
+        return self
+
+    def append(self, record):
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record, default=str) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def write_header(self, header_dict):
+        """ Record the run details (first line of a new checkpoint). """
+
+        self.header = dict(header_dict, type='run', run_id=self.run_id, created=datetime.now().isoformat())
+        self.append(self.header)
+
+    def record(self, unit, status, fingerprint=None, error=None):
+        """ Record the state of a unit - 'started', 'pending' (finished, awaiting confirmation), 'done' or 'failed'.
+
+        :param unit: string object containing the unit name (stage task name, i.e. 'step3:PROPERTY:weeds').
+        :param status: string object containing the unit state.
+        :param fingerprint: string object containing the fingerprint of the unit outputs.
+        :param error: string object containing the error raised by the unit.
+        """
+
+        record = {'unit': unit, 'status': status, 'time': datetime.now().isoformat()}
+        if fingerprint is not None:
+            record['fingerprint'] = fingerprint
+        if error is not None:
+            record['error'] = error
+
+        with self.lock:
+            self.unit_dict[unit] = record
+        self.append(record)
+
+    def status(self, unit):
+        return self.unit_dict.get(unit, {}).get('status')
+
+    def is_complete(self, unit, fingerprint=None):
+        """ Return True if the unit finished in an earlier attempt and its outputs are unchanged since. """
+
+        record = self.unit_dict.get(unit, {})
+        if record.get('status') != 'done':
+            return False
+
+        return fingerprint is None or record.get('fingerprint') == fingerprint
+
+    def is_finished(self):
+        """ Return True if the run reached its end ('run' unit done - its temporary and export directories have been
+        removed and it cannot be resumed). """
+
+        return self.status('run') == 'done'
+
+    def summary(self):
+        """ Return a dictionary object counting the units in each state. """
+
+        count_dict = {}
+        for record in self.unit_dict.values():
+            count_dict[record['status']] = count_dict.get(record['status'], 0) + 1
+
+        return count_dict
+
+
+def start_fn(run_id, header_dict):
+    """ Create the checkpoint of a new run.
+
+    :param run_id: string object containing the run identifier.
+    :param header_dict: dictionary object containing the run details (see RunCheckpoint).
+    :return checkpoint: RunCheckpoint object.
+    """
+
+    checkpoint = RunCheckpoint(run_id)
+    checkpoint.write_header(header_dict)
+
+    return checkpoint
+
+
+def load_all_fn(checkpoint_dir=None):
+    """ Load every checkpoint, newest first.
+
+    :param checkpoint_dir: string object containing the checkpoint directory (None = default).
+    :return checkpoint_list: list object containing RunCheckpoint objects (checkpoints without a header are skipped).
+    """
+
+    checkpoint_dir = checkpoint_dir or checkpoint_dir_fn()
+    path_list = sorted(glob(os.path.join(checkpoint_dir, '*.jsonl')), key=os.path.getmtime, reverse=True)
+
+    checkpoint_list = []
+    for path in path_list:
+        checkpoint = RunCheckpoint(os.path.splitext(os.path.basename(path))[0], checkpoint_dir).load()
+        if checkpoint.header:
+            checkpoint_list.append(checkpoint)
+
+    return checkpoint_list
+
+
+def unfinished_dir_list_fn(checkpoint_dir=None):
+    """ List the temporary and export directories of every run that can still be resumed (kept by housekeeping).
+
+    :param checkpoint_dir: string object containing the checkpoint directory (None = default).
+    :return dir_list: list object containing the directory paths.
+    """
+
+    dir_list = []
+    for checkpoint in load_all_fn(checkpoint_dir):
+        if not checkpoint.is_finished():
+            dir_list.extend(checkpoint.header[key] for key in ['temp_dir', 'export_dir'] if checkpoint.header.get(key))
+
+    return dir_list
+
+
+def prune_fn(checkpoint_dir=None):
+    """ Delete the checkpoints of finished runs.
+
+    :param checkpoint_dir: string object containing the checkpoint directory (None = default).
+    :return removed_list: list object containing the run ids removed.
+    """
+
+    removed_list = []
+    for checkpoint in load_all_fn(checkpoint_dir):
+        if checkpoint.is_finished():
+            try:
+                os.remove(checkpoint.path)
+                removed_list.append(checkpoint.run_id)
+            except OSError:
+                pass
+
+    return removed_list
+
+
+def latest_run_id_fn():
+    """ Return the run id of the newest unfinished checkpoint (None if there are none). """
+
+    for checkpoint in load_all_fn():
+        if not checkpoint.is_finished():
+            return checkpoint.run_id
+
+    return None
+
+
+def resume_fn(run_id):
+    """ Load the checkpoint of an interrupted run.
+
+    :param run_id: string object containing the run identifier ('latest' = the newest unfinished checkpoint).
+    :return checkpoint: RunCheckpoint object.
+    """
+
+    if run_id == 'latest':
+        run_id = latest_run_id_fn()
+
+    checkpoint = RunCheckpoint(run_id).load() if run_id else None
+    if checkpoint is None or not checkpoint.header:
+        raise ValueError('no checkpoint found for run: {0} ({1})'.format(run_id, checkpoint_dir_fn()))
+
+    for key in ['temp_dir', 'export_dir', 'odk_csv']:
+        if not os.path.exists(checkpoint.header.get(key) or ''):
+            raise ValueError('run {0} cannot be resumed - {1} no longer exists: {2}'.format(
+                checkpoint.run_id, key, checkpoint.header.get(key)))
+
+    print(' - resuming run {0}: {1}'.format(checkpoint.run_id, checkpoint.summary()))
+
+    return checkpoint
+
+
+def snapshot_odk_fn(odk_csv, temp_dir):
+    """ Copy the ODK results csv into the run temporary directory so a resumed run reads the same submissions.
+
+    :return: string object containing the path to the copy and string object containing its sha1 digest.
+    """
+
+    output = os.path.join(temp_dir, os.path.basename(odk_csv))
+    shutil.copy2(odk_csv, output)
+
+    sha1 = hashlib.sha1()
+    with open(output, 'rb') as f:
+        for block in iter(lambda: f.read(1048576), b''):
+            sha1.update(block)
+
+    return output, sha1.hexdigest()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import json
+import time
+import inspect
+import functools
+import threading
+import warnings
+from datetime import datetime
+
+warnings.filterwarnings("ignore")
+
+# argument names recorded on the spans of decorated stages.
+stage_attr_list = ['feature', 'feature_name', 'prop_name', 'property_name']
+
+run_dict = {'run_id': None, 'start': None, 'started': None}
+span_list = []
+counter_dict = {}
+run_lock = threading.Lock()
+thread_local = threading.local()
+
+
+class Span(object):
+    """ Timed section of the pipeline (a step, property or feature iteration).
+
+    Spans nest per thread: counts recorded while a span is open are added to the span and to the run totals.
+    """
+
+    def __init__(self, name, attr_dict=None):
+        stack = span_stack_fn()
+        self.name = name
+        self.attr_dict = attr_dict or {}
+        self.parent = stack[-1] if stack else None
+        self.counter_dict = {}
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+        with run_lock:
+            self.span_id = len(span_list)
+            span_list.append(self)
+        stack.append(self)
+
+    def end(self, error=None):
+        if self.duration is not None:
+            return
+        self.duration = time.time() - self.start
+        self.error = error
+        stack = span_stack_fn()
+        if self in stack:
+            stack.remove(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end(None if exc_type is None else exc_type.__name__)
+        return False
+
+    def to_dict(self):
+        return {'id': self.span_id, 'parent': None if self.parent is None else self.parent.span_id,
+                'name': self.name, 'attributes': self.attr_dict,
+                'start_s': round(self.start - (run_dict['start'] or self.start), 3),
+                'duration_s': None if self.duration is None else round(self.duration, 3),
+                'counters': self.counter_dict, 'error': self.error}
+
+
+def span_stack_fn():
+    """ Return the open spans of the current thread (innermost last). """
+
+    if not hasattr(thread_local, 'stack'):
+        thread_local.stack = []
+
+    return thread_local.stack
+
+
+def start_run_fn(run_id=None):
+    """ Reset the spans and counters at the start of a pipeline run.
+
+    :param run_id: string object containing the run identifier (default YYYYMMDD_HHMMSS).
+    :return run_id: string object containing the run identifier.
+    """
+
+    with run_lock:
+        del span_list[:]
+        counter_dict.clear()
+        run_dict['start'] = time.time()
+        run_dict['started'] = datetime.now().isoformat()
+        run_dict['run_id'] = run_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+    thread_local.stack = []
+
+    return run_dict['run_id']
+
+
+def span_fn(name, **attr_dict):
+    """ Open a timed span - use as a context manager or call end() on the returned Span. """
+
+    return Span(name, attr_dict)
+
+
+def stage_fn(name):
+    """ Decorator recording each call of a pipeline stage as a span (feature and property arguments included).
+
+    :param name: string object containing the stage name (i.e. 'step3_1').
+    """
+
+    def decorator(function):
+        try:
+            signature = inspect.signature(function)
+        except (TypeError, ValueError):
+            signature = None
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            attr_dict = {}
+            if signature is not None:
+                try:
+                    bound = signature.bind_partial(*args, **kwargs).arguments
+                    attr_dict = dict((key, str(bound[key])) for key in stage_attr_list if key in bound)
+                except TypeError:
+                    pass
+            with Span(name, attr_dict):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count_fn(name, value=1):
+    """ Add to a run counter (rows_in, rows_out, files_created, bytes_written, network_requests ...) and to the
+    innermost open span of the calling thread.
+    """
+
+    with run_lock:
+        counter_dict[name] = counter_dict.get(name, 0) + value
+        stack = span_stack_fn()
+        if stack:
+            stack[-1].counter_dict[name] = stack[-1].counter_dict.get(name, 0) + value
+
+
+def process_task_fn(function, args=(), kwargs=None):
+    """ Run a function in a worker process and return the counters it recorded with its result - the spans and
+    counters of a worker process are not seen by the parent (see record_span_fn).
+
+    :param function: module level function object.
+    :param args: tuple object containing the positional arguments.
+    :param kwargs: dictionary object containing the keyword arguments.
+    :return: list object containing the function result and a dictionary object containing the counters.
+    """
+
+    # worker processes are reused - each task starts with empty counters.
+    start_run_fn()
+    result = function(*args, **(kwargs or {}))
+
+    return [result, dict(counter_dict)]
+
+
+def record_span_fn(name, attr_dict, start, duration, worker_counter_dict=None, error=None):
+    """ Record a span timed in the parent for a stage run in a worker process and add the worker counters to the span
+    and the run totals.
+
+    :param name: string object containing the span name (None = counters only).
+    :param attr_dict: dictionary object containing the span attributes.
+    :param start: float object containing the start time (time.time()).
+    :param duration: float object containing the duration in seconds.
+    :param worker_counter_dict: dictionary object returned by process_task_fn.
+    :param error: string object containing the error type name.
+    """
+
+    worker_counter_dict = worker_counter_dict or {}
+    if name is not None:
+        span = Span(name, attr_dict)
+        span.end(error)
+        span.start = start
+        span.duration = duration
+        span.counter_dict.update(worker_counter_dict)
+
+    with run_lock:
+        for key, value in worker_counter_dict.items():
+            counter_dict[key] = counter_dict.get(key, 0) + value
+
+
+def stage_summary_fn():
+    """ Aggregate the spans by name.
+
+    :return summary_list: list object containing [name, calls, total s, mean s, max s] lists, slowest first.
+    """
+
+    total_dict = {}
+    for span in list(span_list):
+        if span.duration is None:
+            continue
+        calls, total, longest = total_dict.get(span.name, (0, 0.0, 0.0))
+        total_dict[span.name] = (calls + 1, total + span.duration, max(longest, span.duration))
+
+    summary_list = [[name, calls, round(total, 2), round(total / calls, 3), round(longest, 2)]
+                    for name, (calls, total, longest) in total_dict.items()]
+    summary_list.sort(key=lambda i: i[2], reverse=True)
+
+    return summary_list
+
+
+def report_dir_fn():
+    import property_directory_resolver
+
+    report_dir = os.path.join(property_directory_resolver.default_cache_dir_fn(), 'run_reports')
+    if not os.path.isdir(report_dir):
+        os.makedirs(report_dir)
+
+    return report_dir
+
+
+def write_report_fn(report_dir=None, extra_dict=None):
+    """ Write the machine readable run report (<run_id>.json).
+
+    :param report_dir: string object containing the output directory (default ~/.rmb_mapping_cache/run_reports).
+    :param extra_dict: dictionary object containing additional run details (i.e. the command arguments).
+    :return report_path: string object containing the path to the report.
+    """
+
+    report_dir = report_dir or report_dir_fn()
+    report_path = os.path.join(report_dir, '{0}.json'.format(run_dict['run_id'] or 'run'))
+
+    with run_lock:
+        report = {'run_id': run_dict['run_id'], 'started': run_dict['started'],
+                  'duration_s': round(time.time() - (run_dict['start'] or time.time()), 3),
+                  'counters': dict(counter_dict),
+                  'stages': [dict(zip(['name', 'calls', 'total_s', 'mean_s', 'max_s'], i))
+                             for i in stage_summary_fn()],
+                  'spans': [span.to_dict() for span in span_list]}
+    if extra_dict:
+        report.update(extra_dict)
+
+    with open(report_path + '.tmp', 'w') as f:
+        json.dump(report, f, indent=1, default=str)
+    os.replace(report_path + '.tmp', report_path)
+
+    return report_path
+
+
+def print_summary_fn(limit=25):
+    """ Print the stage timing and counter table. """
+
+    print('=' * 50)
+    print('Run summary: ', run_dict['run_id'], ' - ', round(time.time() - (run_dict['start'] or time.time()), 1), 's')
+    print('{0:<40}{1:>8}{2:>12}{3:>10}{4:>10}'.format('stage', 'calls', 'total s', 'mean s', 'max s'))
+    for name, calls, total, mean, longest in stage_summary_fn()[:limit]:
+        print('{0:<40}{1:>8}{2:>12}{3:>10}{4:>10}'.format(name[:39], calls, total, mean, longest))
+    for name in sorted(counter_dict):
+        print(' - {0}: {1}'.format(name, counter_dict[name]))
+    print('=' * 50)
+
+
+def finish_run_fn(extra_dict=None):
+    """ Close any open spans, write the run report and print the summary table.
+
+    :return report_path: string object containing the path to the report (None if it could not be written).
+    """
+
+    for span in list(span_stack_fn())[::-1]:
+        span.end()
+
+    try:
+        report_path = write_report_fn(extra_dict=extra_dict)
+    except (IOError, OSError):
+        report_path = None
+
+    print_summary_fn()
+    if report_path:
+        print('Run report: ', report_path)
+
+    return report_path
@@ -0,0 +1,416 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import json
+import warnings
+from glob import glob
+
+warnings.filterwarnings("ignore")
+
+# Server_Download layers step6_1 writes for every adjacent property.
+server_download_layer_list = ["points", "lines", "polygons", "paddocks"]
+
+# files a compiled export feature writes besides its photos (csv and shapefile - the shapefile counted once).
+feature_file_count = 2
+
+
+def read_results_fn(odk_csv, start_date, end_date):
+    """ Read the ODK Mapping Results csv and filter it by date (as step2_1 does, nothing is written).
+
+    :param odk_csv: string object containing the path to the results csv.
+    :param start_date: string object containing the start date the records are filtered from.
+    :param end_date: string object containing the end date the records are filtered to.
+    :return date_df: pandas dataframe object containing the submissions within the dates.
+    """
+
+    import pandas as pd
+
+    df = pd.read_csv(odk_csv)
+    date_df = df[(df["START"] > start_date) & (df["START"] < end_date)]
+
+    return date_df
+
+
+def assign_property_fn(date_df, pastoral_estate):
+    """ Identify the property and district of each submission (one spatial join - no files are written).
+
+    :param date_df: pandas dataframe object returned by read_results_fn.
+    :param pastoral_estate: geo-dataframe object containing the Pastoral Estate.
+    :return property_df: pandas dataframe object with PROPERTY and DISTRICT columns (UNKNOWN outside the estate).
+    """
+
+    import geopandas as gpd
+
+    point_gdf = gpd.GeoDataFrame(
+        date_df, geometry=gpd.points_from_xy(date_df["GROUP_COORDINATES:SITE_GPS1:Longitude"],
+                                             date_df["GROUP_COORDINATES:SITE_GPS1:Latitude"]), crs=4326)
+    estate_gdf = pastoral_estate.to_crs("EPSG:4326")[["PROPERTY", "DISTRICT", "geometry"]]
+
+    try:
+        joined = gpd.sjoin(point_gdf, estate_gdf, how="left", predicate="within")
+    except TypeError:
+        # geopandas < 0.10
+        joined = gpd.sjoin(point_gdf, estate_gdf, how="left", op="within")
+
+    # a point on a shared boundary is kept once.
+    joined = joined[~joined.index.duplicated(keep="first")]
+    property_df = date_df.copy()
+    property_df["PROPERTY"] = joined["PROPERTY"].fillna("UNKNOWN")
+    property_df["DISTRICT"] = joined["DISTRICT"].fillna("UNKNOWN")
+
+    return property_df
+
+
+def select_properties_fn(property_df, prop_enquire):
+    """ Keep the submissions step2_1 would process for the property_enquire argument.
+
+    :param property_df: pandas dataframe object returned by assign_property_fn.
+    :param prop_enquire: string object or list object containing the property name(s) ("ALL" or "ALL_ODK" = all).
+    :return property_df: pandas dataframe object containing the selected submissions.
+    """
+
+    prop_enquire_list = [prop_enquire] if isinstance(prop_enquire, str) else list(prop_enquire)
+    if set(prop_enquire_list) & {"ALL", "ALL_ODK"}:
+        return property_df
+
+    return property_df[property_df["PROPERTY"].isin(prop_enquire_list) | (property_df["PROPERTY"] == "UNKNOWN")]
+
+
+def export_feature_fn(property_df):
+    """ Name the export feature (feature_list) each submission is compiled into.
+
+    :param property_df: pandas dataframe object containing the submissions.
+    :return export_series: pandas series object containing the export feature (None = no active step2_x module).
+    """
+
+    import step2_1_mapping_processing_workflow
+
+    compile_feature_dict = step2_1_mapping_processing_workflow.compile_feature_dict
+    feature = property_df["GROUP_FEATURE:FEATURE"].astype(str)
+    export_series = feature.map(lambda i: compile_feature_dict[i][0] if i in compile_feature_dict else None)
+
+    # step2_2 splits infrastructure on INFRA:INF_FEAT - line, point, anything else is a water point.
+    if "INFRA:INF_FEAT" in property_df.columns:
+        inf_feat = property_df["INFRA:INF_FEAT"].astype(str)
+        infrastructure = feature == "infrastructure"
+        export_series[infrastructure & (inf_feat == "line")] = "infra_lines"
+        export_series[infrastructure & (inf_feat == "point")] = "infra_points"
+        export_series[infrastructure & ~inf_feat.isin(["line", "point"])] = "infra_water_points"
+
+    return export_series
+
+
+def line_vertex_fn(property_df):
+    """ Count the vertices of each infrastructure line (the site point and each recorded GPS2 - GPS10 point).
+
+    :param property_df: pandas dataframe object containing the submissions.
+    :return: pandas series object containing the vertex count of each submission.
+    """
+
+    import pandas as pd
+
+    vertex_series = pd.Series(1, index=property_df.index)
+    for i in range(2, 11):
+        column = "GROUP_LINE:GPS{0}_GROUP:SITE_GPS{0}:Latitude".format(i)
+        if column in property_df.columns:
+            latitude = pd.to_numeric(property_df[column], errors="coerce")
+            vertex_series += (latitude.notna() & (latitude != 0)).astype(int)
+
+    return vertex_series
+
+
+def photo_count_fn(property_df):
+    """ Count the photographs attached to each submission.
+
+    :param property_df: pandas dataframe object containing the submissions.
+    :return: pandas series object containing the number of photo urls of each submission.
+    """
+
+    import pandas as pd
+
+    photo_series = pd.Series(0, index=property_df.index)
+    for column in ["GROUP_PHOTO:PHOTO1", "GROUP_PHOTO:PHOTO2", "GROUP_PHOTO:PHOTO3"]:
+        if column in property_df.columns:
+            value = property_df[column].astype(str).str.strip()
+            photo_series += (property_df[column].notna() & ~value.isin(["", "nan", "None"])).astype(int)
+
+    return photo_series
+
+
+def plan_table_fn(property_df):
+    """ Summarise the work per property and export feature.
+
+    :param property_df: pandas dataframe object containing the selected submissions.
+    :return plan_df: pandas dataframe object containing property, district, feature, export_feature, submissions,
+    line_vertices, photos and output_files columns.
+    """
+
+    import pandas as pd
+
+    work_df = pd.DataFrame({"property": property_df["PROPERTY"], "district": property_df["DISTRICT"],
+                            "feature": property_df["GROUP_FEATURE:FEATURE"].astype(str),
+                            "export_feature": export_feature_fn(property_df).fillna("(not processed)"),
+                            "photos": photo_count_fn(property_df)})
+    work_df["line_vertices"] = line_vertex_fn(property_df).where(work_df["export_feature"] == "infra_lines", 0)
+
+    plan_df = work_df.groupby(["property", "district", "feature", "export_feature"]).agg(
+        submissions=("photos", "size"), line_vertices=("line_vertices", "sum"), photos=("photos", "sum")).reset_index()
+    processed = plan_df["export_feature"] != "(not processed)"
+    plan_df["output_files"] = (feature_file_count + plan_df["photos"]).where(processed, 0)
+
+    return plan_df
+
+
+def server_download_fn(plan_df, prop_enquire, pastoral_estate, remote_desktop):
+    """ List the Server_Download partitions (adjacent property x layer) step6_1 would refresh.
+
+    :param plan_df: pandas dataframe object returned by plan_table_fn.
+    :param prop_enquire: string object or list object containing the property_enquire argument.
+    :param pastoral_estate: geo-dataframe object containing the Pastoral Estate.
+    :param remote_desktop: string object containing the remote_desktop argument (offline = no refresh).
+    :return adjacent_dict: dictionary object mapping each processed property to its adjacent properties.
+    :return partitions: integer object containing the number of property layer partitions refreshed (at most).
+    """
+
+    if remote_desktop == "offline":
+        return {}, 0
+
+    prop_enquire_list = [prop_enquire] if isinstance(prop_enquire, str) else list(prop_enquire)
+    if "ALL" in prop_enquire_list:
+        return {}, len(pastoral_estate["PROPERTY"].unique()) * len(server_download_layer_list)
+
+    if "ALL_ODK" in prop_enquire_list or not isinstance(prop_enquire, str):
+        property_list = plan_df["property"].unique().tolist()
+    else:
+        property_list = prop_enquire_list
+
+    # the 500 m buffer of step6_1.buffer_fn - in memory, no buffer shapefiles are written.
+    albers = pastoral_estate.to_crs(epsg=3577)
+    adjacent_dict = {}
+    for prop_name in property_list:
+        property_gdf = albers[albers["PROPERTY"] == prop_name]
+        if len(property_gdf.index) == 0:
+            continue
+        buffer = property_gdf.buffer(500).unary_union
+        adjacent_dict[prop_name] = sorted(albers.loc[albers.intersects(buffer), "PROPERTY"].unique().tolist())
+
+    adjacent_set = set(i for adjacent_list in adjacent_dict.values() for i in adjacent_list)
+
+    return adjacent_dict, len(adjacent_set) * len(server_download_layer_list)
+
+
+def history_fn(report_dir=None, limit=20):
+    """ Collect the stage timings of the latest run reports (~/.rmb_mapping_cache/run_reports).
+
+    :param report_dir: string object containing the run report directory (None = default, not created if missing).
+    :param limit: integer object containing the number of most recent reports used.
+    :return rate_dict: dictionary object mapping (unit, key) to [seconds, count] totals - ('row', ODK feature),
+    ('extract', ODK feature), ('compile', export feature), ('photo', None), ('stage', stage name) and
+    ('wall', None) (run seconds per second of modelled stage time).
+    :return report_count: integer object containing the number of reports read.
+    """
+
+    report_dir = report_dir or os.path.join(os.path.expanduser('~'), '.rmb_mapping_cache', 'run_reports')
+    report_list = sorted(glob(os.path.join(report_dir, '*.json')), key=os.path.getmtime)[-limit:]
+
+    rate_dict = {}
+
+    def add_fn(key, seconds, count=1):
+        total = rate_dict.setdefault(key, [0.0, 0])
+        total[0] += seconds
+        total[1] += count
+
+    report_count = 0
+    for report_path in report_list:
+        try:
+            with open(report_path) as f:
+                report = json.load(f)
+        except (IOError, OSError, ValueError):
+            continue
+        report_count += 1
+
+        modelled = 0.0
+        wait_seconds = 0.0
+        for span in report.get('spans', []):
+            seconds = span.get('duration_s')
+            if seconds is None or span.get('error'):
+                continue
+            name = span.get('name', '')
+            attr_dict = span.get('attributes') or {}
+            if name == 'step2_1_feature':
+                add_fn(('extract', attr_dict.get('feature')), seconds)
+                if attr_dict.get('rows'):
+                    add_fn(('row', attr_dict.get('feature')), seconds, int(attr_dict['rows']))
+            elif name.startswith('step3_') and 'feature' in attr_dict:
+                add_fn(('compile', attr_dict['feature']), seconds)
+            elif name == 'download_wait':
+                wait_seconds += seconds
+            elif name in ['step5_1_file_outputs_to_working_drive', 'step6_1_download_adjacent_infrastructure']:
+                add_fn(('stage', name), seconds)
+            else:
+                continue
+            modelled += seconds
+
+        downloads = report.get('counters', {}).get('network_requests', 0)
+        if wait_seconds and downloads:
+            add_fn(('photo', None), wait_seconds, downloads)
+        if modelled and report.get('duration_s'):
+            add_fn(('wall', None), report['duration_s'], modelled)
+
+    return rate_dict, report_count
+
+
+def estimate_fn(plan_df, rate_dict, remote_desktop):
+    """ Estimate the stage time of each plan row from the recorded timings.
+
+    :param plan_df: pandas dataframe object returned by plan_table_fn.
+    :param rate_dict: dictionary object returned by history_fn.
+    :param remote_desktop: string object containing the remote_desktop argument (offline = no filing or refresh).
+    :return plan_df: pandas dataframe object with an estimate_s column (NaN = no recorded timing).
+    :return total_s: float object containing the estimated stage seconds (filing and Server_Download included).
+    :return missing_list: list object containing the units without a recorded timing.
+    """
+
+    def mean_fn(key):
+        total = rate_dict.get(key)
+        return total[0] / total[1] if total and total[1] else None
+
+    missing_set = set()
+    estimate_list = []
+    extract_seen = set()
+    for row in plan_df.itertuples():
+        if row.export_feature == "(not processed)":
+            estimate_list.append(0.0)
+            continue
+
+        seconds = 0.0
+        # one extraction per property and ODK feature - it is charged to the first of its export features.
+        if (row.property, row.feature) not in extract_seen:
+            extract_seen.add((row.property, row.feature))
+            rows = plan_df[(plan_df["property"] == row.property) & (plan_df["feature"] == row.feature)]
+            per_row, per_call = mean_fn(('row', row.feature)), mean_fn(('extract', row.feature))
+            if per_row is not None:
+                seconds += per_row * rows["submissions"].sum()
+            elif per_call is not None:
+                seconds += per_call
+            else:
+                missing_set.add('extract ' + row.feature)
+
+        per_call = mean_fn(('compile', row.export_feature))
+        if per_call is not None:
+            seconds += per_call
+        else:
+            missing_set.add('compile ' + row.export_feature)
+
+        per_photo = mean_fn(('photo', None))
+        if row.photos and per_photo is not None:
+            seconds += per_photo * row.photos
+        elif row.photos:
+            missing_set.add('photo download')
+
+        estimate_list.append(seconds)
+
+    plan_df = plan_df.copy()
+    plan_df["estimate_s"] = estimate_list
+    total_s = float(sum(estimate_list))
+
+    if remote_desktop != "offline":
+        for name in ['step5_1_file_outputs_to_working_drive', 'step6_1_download_adjacent_infrastructure']:
+            per_call = mean_fn(('stage', name))
+            if per_call is not None:
+                total_s += per_call
+            else:
+                missing_set.add(name)
+
+    return plan_df, total_s, sorted(missing_set)
+
+
+def print_plan_fn(plan_df, adjacent_dict, partitions, total_s, wall_ratio, missing_list, report_count):
+    """ Print the plan tables. """
+
+    print("=" * 50)
+    print("Run plan - nothing has been created, downloaded or filed.")
+    print("{0:<28}{1:<22}{2:>7}{3:>9}{4:>8}{5:>8}{6:>10}".format(
+        'property', 'export feature', 'subs', 'vertices', 'photos', 'files', 'est s'))
+    for row in plan_df.sort_values(["property", "export_feature"]).itertuples():
+        print("{0:<28}{1:<22}{2:>7}{3:>9}{4:>8}{5:>8}{6:>10.1f}".format(
+            row.property[:27], row.export_feature[:21], row.submissions, row.line_vertices, row.photos,
+            row.output_files, row.estimate_s))
+
+    print("-" * 92)
+    print("{0:<50}{1:>7}{2:>9}{3:>8}{4:>8}{5:>10.1f}".format(
+        'total ({0} properties)'.format(plan_df["property"].nunique()), plan_df["submissions"].sum(),
+        plan_df["line_vertices"].sum(), plan_df["photos"].sum(), plan_df["output_files"].sum(),
+        plan_df["estimate_s"].sum()))
+
+    print("=" * 50)
+    for prop_name, adjacent_list in sorted(adjacent_dict.items()):
+        print(" - {0}: {1} adjacent properties".format(prop_name, len(adjacent_list)))
+    print(" - Server_Download partitions to refresh (property x layer, at most): ", partitions)
+
+    if report_count:
+        print(" - estimated stage time: {0:.0f} s from {1} run reports".format(total_s, report_count))
+        if wall_ratio is not None:
+            print(" - estimated run time: {0:.0f} s (recorded run time per stage second: {1:.2f})".format(
+                total_s * wall_ratio, wall_ratio))
+        if missing_list:
+            print(" - no recorded timing (not in the estimate): ", ", ".join(missing_list))
+    else:
+        print(" - no run reports recorded yet - run times cannot be estimated.")
+    print("=" * 50)
+
+
+def main_routine(odk_csv, pastoral_estate, start_date, end_date, prop_enquire, remote_desktop, report_dir=None):
+    """ Report the work a run would do - per property and export feature: submissions, line vertices, photographs,
+    output files and estimated time, and the Server_Download partitions to refresh. Nothing is created, downloaded
+    or written to the working drive.
+
+    :param odk_csv: string object containing the path to the ODK Mapping Results csv.
+    :param pastoral_estate: string object containing the path to the Pastoral Estate shapefile (or the geo-dataframe).
+    :param start_date: string object containing the start date filter.
+    :param end_date: string object containing the end date filter.
+    :param prop_enquire: string object or list object containing the property_enquire argument.
+    :param remote_desktop: string object containing the remote_desktop argument.
+    :param report_dir: string object containing the run report directory (None = default).
+    :return plan_df: pandas dataframe object containing the plan table.
+    """
+
+    if isinstance(pastoral_estate, str):
+        import geopandas as gpd
+        pastoral_estate = gpd.read_file(pastoral_estate)
+
+    date_df = read_results_fn(odk_csv, start_date, end_date)
+    property_df = select_properties_fn(assign_property_fn(date_df, pastoral_estate), prop_enquire)
+
+    plan_df = plan_table_fn(property_df)
+    adjacent_dict, partitions = server_download_fn(plan_df, prop_enquire, pastoral_estate, remote_desktop)
+
+    rate_dict, report_count = history_fn(report_dir)
+    plan_df, total_s, missing_list = estimate_fn(plan_df, rate_dict, remote_desktop)
+    wall = rate_dict.get(('wall', None))
+    wall_ratio = wall[0] / wall[1] if wall and wall[1] else None
+
+    print_plan_fn(plan_df, adjacent_dict, partitions, total_s, wall_ratio, missing_list, report_count)
+
+    return plan_df
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import time
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+import run_instrumentation
+
+warnings.filterwarnings("ignore")
+
+# GDAL (fiona), pyproj and matplotlib are not thread safe - thread stages hold this lock around the calls that use them.
+gis_lock = threading.RLock()
+
+
+class Task(object):
+    """ One pipeline stage - a function call with the named resources it reads (inputs) and writes (outputs). """
+
+    def __init__(self, name, function, args=(), kwargs=None, inputs=(), outputs=(), pool='thread', span_name=None,
+                 span_attr=None, resumable=False, fingerprint=None, reset=None, confirmed_by=None, always=False,
+                 lock=None):
+        """
+        :param name: string object containing the unique task name.
+        :param function: module level function object (process tasks must be picklable).
+        :param args: tuple object containing the positional arguments.
+        :param kwargs: dictionary object containing the keyword arguments.
+        :param inputs: list object containing the resources the task reads - it waits for every task producing them.
+        :param outputs: list object containing the resources the task writes.
+        :param pool: string object - 'thread' or 'process' (process tasks run in threads when no process pool).
+        :param span_name: string object containing the run_instrumentation span name (process tasks are timed in the
+        parent and their counters returned with the result).
+        :param span_attr: dictionary object containing the span attributes.
+        :param resumable: boolean object - record the task in the run checkpoint and skip it when it finished in an
+        earlier attempt (and every task it depends on was skipped too).
+        :param fingerprint: function object returning the fingerprint of the task outputs (None = not checked).
+        :param reset: function object clearing partial outputs before a task recorded earlier is run again.
+        :param confirmed_by: string object containing the name of a later task that must also finish before this task
+        is recorded as done (i.e. the photo download wait for the compile stages).
+        :param always: boolean object - run once the tasks it depends on have finished, even if one of them failed.
+        :param lock: lock object held while a thread task runs (i.e. gis_lock).
+        """
+
+        self.name = name
+        self.function = function
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.pool = pool
+        self.span_name = span_name
+        self.span_attr = span_attr or {}
+        self.resumable = resumable
+        self.fingerprint = fingerprint
+        self.reset = reset
+        self.confirmed_by = confirmed_by
+        self.always = always
+        self.lock = lock
+        self.fingerprint_value = None
+        self.state = 'pending'
+        self.result = None
+        self.error = None
+        self.duration = None
+
+
+def run_task_fn(task):
+    """ Run a thread pool task inside its instrumentation span. """
+
+    if task.lock is not None:
+        with task.lock:
+            return run_span_fn(task)
+
+    return run_span_fn(task)
+
+
+def run_span_fn(task):
+    if task.span_name is None:
+        return task.function(*task.args, **task.kwargs)
+
+    with run_instrumentation.span_fn(task.span_name, **task.span_attr):
+        return task.function(*task.args, **task.kwargs)
+
+
+class StageScheduler(object):
+    """ Run pipeline stages in dependency order, independent stages concurrently.
+
+    A task depends on every other task that lists one of its inputs as an output; inputs no task produces are taken as
+    already available. Ready tasks are started in the order they were added. When a task fails the tasks depending on
+    it are skipped, the running tasks are allowed to finish and the first error is raised.
+
+    With a run checkpoint, resumable tasks are recorded as they start, finish and fail; a task that finished in an
+    earlier attempt with unchanged outputs is skipped ('cached') unless a task it depends on has to run again.
+    """
+
+    def __init__(self, max_threads=4, max_processes=0, checkpoint=None):
+        """
+        :param max_threads: integer object containing the number of worker threads (1 = one stage at a time).
+        :param max_processes: integer object containing the number of worker processes (0 = no process pool).
+        :param checkpoint: run_checkpoint.RunCheckpoint object (None = nothing recorded or skipped).
+        """
+
+        self.max_threads = max(1, int(max_threads))
+        self.max_processes = max(0, int(max_processes))
+        self.checkpoint = checkpoint
+        self.task_list = []
+        self.task_dict = {}
+
+    def add(self, name, function, args=(), kwargs=None, inputs=(), outputs=(), pool='thread', span_name=None,
+            span_attr=None, resumable=False, fingerprint=None, reset=None, confirmed_by=None, always=False, lock=None):
+        """ Declare a task (see Task).
+
+        :return task: Task object.
+        """
+
+        if name in self.task_dict:
+            raise ValueError('duplicate task name: {0}'.format(name))
+
+        task = Task(name, function, args, kwargs, inputs, outputs, pool, span_name, span_attr, resumable, fingerprint,
+                    reset, confirmed_by, always, lock)
+        self.task_list.append(task)
+        self.task_dict[name] = task
+
+        return task
+
+    def dependency_dict(self):
+        """ Resolve the task dependencies from the declared inputs and outputs.
+
+        :return depend_dict: dictionary object mapping each task name to the set of task names it waits for.
+        """
+
+        producer_dict = {}
+        for task in self.task_list:
+            for resource in task.outputs:
+                producer_dict.setdefault(resource, []).append(task.name)
+
+        depend_dict = {}
+        for task in self.task_list:
+            depend_dict[task.name] = set(name for resource in task.inputs for name in producer_dict.get(resource, [])
+                                         if name != task.name)
+
+        return depend_dict
+
+    def check(self):
+        """ Raise a ValueError if the tasks contain a dependency cycle.
+
+        :return depend_dict: dictionary object created by dependency_dict.
+        """
+
+        depend_dict = self.dependency_dict()
+        remaining_dict = dict((name, set(depend)) for name, depend in depend_dict.items())
+        while remaining_dict:
+            ready = [name for name, depend in remaining_dict.items() if not depend]
+            if not ready:
+                raise ValueError('dependency cycle between tasks: {0}'.format(', '.join(sorted(remaining_dict))))
+            for name in ready:
+                del remaining_dict[name]
+            for depend in remaining_dict.values():
+                depend.difference_update(ready)
+
+        return depend_dict
+
+    def run(self):
+        """ Execute every task.
+
+        :return result_dict: dictionary object mapping task names to their return values.
+        """
+
+        depend_dict = self.check()
+        use_processes = self.max_processes > 0 and any(task.pool == 'process' for task in self.task_list)
+
+        thread_pool = ThreadPoolExecutor(max_workers=self.max_threads)
+        process_pool = ProcessPoolExecutor(max_workers=self.max_processes) if use_processes else None
+        running_dict = {}
+        start_dict = {}
+        process_set = set()
+
+        try:
+            while True:
+                for task in self.task_list:
+                    if task.state != 'pending':
+                        continue
+                    state_list = [self.task_dict[name].state for name in depend_dict[task.name]]
+                    if not all(state in ['done', 'cached', 'failed', 'skipped'] for state in state_list):
+                        continue
+                    if not task.always and any(state in ['failed', 'skipped'] for state in state_list):
+                        task.state = 'skipped'
+                        print(' - stage skipped (an input failed): ', task.name)
+                    elif self.cached(task, state_list):
+                        task.state = 'cached'
+                        print(' - stage completed in an earlier attempt: ', task.name)
+                    else:
+                        self.start(task)
+                        task.state = 'running'
+                        start_dict[task.name] = time.time()
+                        if task.pool == 'process' and process_pool is not None:
+                            future = process_pool.submit(run_instrumentation.process_task_fn, task.function,
+                                                         task.args, task.kwargs)
+                            process_set.add(future)
+                        else:
+                            future = thread_pool.submit(run_task_fn, task)
+                        running_dict[future] = task
+
+                if not running_dict:
+                    break
+
+                done, not_done = wait(list(running_dict), return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running_dict.pop(future)
+                    in_process = future in process_set
+                    process_set.discard(future)
+                    task.duration = time.time() - start_dict[task.name]
+                    try:
+                        task.result = future.result()
+                        if in_process:
+                            task.result, worker_counter_dict = task.result
+                            in_process = False
+                            run_instrumentation.record_span_fn(task.span_name, task.span_attr, start_dict[task.name],
+                                                               task.duration, worker_counter_dict)
+                        task.state = 'done'
+                        self.finish(task)
+                    except Exception as error:
+                        if in_process:
+                            run_instrumentation.record_span_fn(task.span_name, task.span_attr, start_dict[task.name],
+                                                               task.duration, error=type(error).__name__)
+                        task.error = error
+                        task.state = 'failed'
+                        print(' - stage failed: ', task.name, ' - ', repr(error))
+                        if self.checkpoint is not None and task.resumable:
+                            self.checkpoint.record(task.name, 'failed', error=repr(error))
+        finally:
+            thread_pool.shutdown(wait=True)
+            if process_pool is not None:
+                process_pool.shutdown(wait=True)
+
+        failed_list = [task for task in self.task_list if task.state == 'failed']
+        if failed_list:
+            raise failed_list[0].error
+
+        return dict((task.name, task.result) for task in self.task_list)
+
+    def cached(self, task, state_list):
+        """ Return True if a resumable task can be skipped - it finished in an earlier attempt, its outputs are
+        unchanged and none of the tasks it depends on ran again. """
+
+        if self.checkpoint is None or not task.resumable:
+            return False
+        if not all(state == 'cached' for state in state_list):
+            return False
+
+        return self.checkpoint.is_complete(task.name, task.fingerprint() if task.fingerprint else None)
+
+    def start(self, task):
+        """ Clear the partial outputs of a task recorded by an earlier attempt and record the start. """
+
+        if self.checkpoint is None or not task.resumable:
+            return
+
+        if self.checkpoint.status(task.name) is not None and task.reset is not None:
+            task.reset()
+        self.checkpoint.record(task.name, 'started')
+
+    def finish(self, task):
+        """ Record a finished task, and the tasks awaiting its confirmation. """
+
+        if self.checkpoint is None:
+            return
+
+        if task.resumable:
+            task.fingerprint_value = task.fingerprint() if task.fingerprint else None
+            self.checkpoint.record(task.name, 'pending' if task.confirmed_by else 'done', task.fingerprint_value)
+
+        for waiting in self.task_list:
+            if waiting.confirmed_by == task.name and waiting.resumable and waiting.state == 'done':
+                self.checkpoint.record(waiting.name, 'done', waiting.fingerprint_value)
+
+    def summary(self):
+        """ Return [name, state, seconds] lists in the order the tasks were added. """
+
+        return [[task.name, task.state, None if task.duration is None else round(task.duration, 2)]
+                for task in self.task_list]
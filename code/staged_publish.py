@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import json
+import time
+import shutil
+import warnings
+
+warnings.filterwarnings("ignore")
+
+staging_suffix = '.__staging__'
+aside_suffix = '.__replaced__'
+journal_name = '.publish_journal.json'
+
+
+class PublishError(OSError):
+    """ Raised when one or more file groups could not be published - those groups keep their live contents and their
+    staged files (and the journal) are kept for the next run to retry. """
+
+    def __init__(self, published_list, failed_list, error):
+        """
+        :param published_list: list object containing the live paths that were published or removed.
+        :param failed_list: list object containing the live paths that were not published or removed.
+        :param error: OSError object raised by the last failed group.
+        """
+
+        OSError.__init__(self, 'publish failed for {0} files ({1}): {2}'.format(
+            len(failed_list), error, ', '.join(failed_list)))
+        self.published_list = published_list
+        self.failed_list = failed_list
+        self.error = error
+
+
+def group_key_fn(path):
+    """ Create the publish group of a file - its directory and name before the first '.', so a shapefile and its
+    sidecar files (.shp, .dbf, .shx, .prj, .cpg, .shp.xml) are published together.
+
+    :param path: string object containing the live path.
+    :return: string object containing the group key.
+    """
+
+    return os.path.join(os.path.dirname(path), os.path.basename(path).split('.')[0].lower())
+
+
+def rename_fn(src, dest, attempts=10, wait=0.5):
+    """ Rename a file over its destination, retrying while it is locked (i.e. open in the GIS on Windows).
+
+    :param src: string object containing the current path.
+    :param dest: string object containing the new path.
+    :param attempts: integer object containing the number of attempts.
+    :param wait: float object containing the seconds between attempts.
+    """
+
+    for n in range(attempts):
+        try:
+            os.replace(src, dest)
+            return
+        except PermissionError:
+            if n == attempts - 1:
+                raise
+            time.sleep(wait)
+
+
+def zone_cleanup_fn(raw_path, feature_list, utm_code, publisher):
+    """ Remove the csv and shapefile outputs of the other UTM zone from a Field_Data Raw directory (photos are kept).
+
+    :param raw_path: string object containing the path to the live Raw directory.
+    :param feature_list: list object containing the feature names.
+    :param utm_code: string or integer object containing the property UTM zone (i.e. 53).
+    :param publisher: StagedPublish object - live files are removed on commit, staged files immediately.
+    :return removed: integer object containing the number of files removed.
+    """
+
+    removed = 0
+    for feature in feature_list:
+        for file_type in ['csv', 'shapefile']:
+            for delete_file in publisher.list_files(os.path.join(raw_path, feature, file_type)):
+                file = os.path.basename(delete_file)
+                if str(utm_code) not in file and 'photo' not in file:
+                    print(' -- delete: ', file)
+                    publisher.remove_file(delete_file)
+                    removed += 1
+
+    return removed
+
+
+class StagedPublish(object):
+    """ Publish the outputs of one property to the working drive file by file.
+
+    Files written by the run are redirected to <target>.__staging__ (same volume as the live target), so the staging
+    directories only ever hold the new or changed files of this run. commit publishes the staged files and removals
+    by renames, one file group (a shapefile and its sidecar files) at a time, and rolls back a group that fails - GIS
+    users never see a partially copied file or a shapefile with sidecar files from different runs. A journal in the
+    property directory lets the next run finish a commit that was interrupted or failed.
+    """
+
+    def __init__(self, property_dir, target_list, snapshot=None):
+        """
+        :param property_dir: string object containing the path to the property directory (journal location).
+        :param target_list: list object containing the paths to the live directories to be published.
+        :param snapshot: DirectorySnapshot object containing the property directory.
+        """
+
+        self.property_dir = property_dir
+        self.target_list = list(target_list)
+        self.snapshot = snapshot
+        self.journal_path = os.path.join(property_dir, journal_name)
+        self.remove_set = set()
+
+    def staging_dir(self, target):
+        return target + staging_suffix
+
+    def staged_path(self, path):
+        """ Map a live destination path to its staging path (paths outside the targets are returned unchanged).
+
+        :param path: string object containing the live path.
+        :return: string object containing the path to write to.
+        """
+
+        for target in self.target_list:
+            if path == target or path[len(target):len(target) + 1] in ('\\', '/') and path.startswith(target):
+                return self.staging_dir(target) + path[len(target):]
+
+        return path
+
+    def live_path(self, staged):
+        """ Map a staging path back to its live path.
+
+        :param staged: string object containing the staging path.
+        :return: string object containing the live path.
+        """
+
+        for target in self.target_list:
+            staging = self.staging_dir(target)
+            if staged == staging or staged[len(staging):len(staging) + 1] in ('\\', '/') and \
+                    staged.startswith(staging):
+                return target + staged[len(staging):]
+
+        return staged
+
+    def _isfile(self, path):
+        return self.snapshot.isfile(path) if self.snapshot is not None else os.path.isfile(path)
+
+    def _list_files(self, dir_path):
+        if self.snapshot is not None:
+            return self.snapshot.list_files(dir_path)
+
+        return [i.path for i in os.scandir(dir_path) if i.is_file()] if os.path.isdir(dir_path) else []
+
+    def _remove(self, path):
+        if not os.path.exists(path):
+            return
+        if self.snapshot is not None:
+            self.snapshot.rmtree(path)
+        else:
+            shutil.rmtree(path)
+
+    def staged_files(self):
+        """ :return: list object containing the (staged path, live path) of every file written by this run. """
+
+        pair_list = []
+        for target in self.target_list:
+            for root, dirnames, filenames in os.walk(self.staging_dir(target)):
+                for file in filenames:
+                    staged = os.path.join(root, file)
+                    pair_list.append((staged, self.live_path(staged)))
+
+        return pair_list
+
+    def list_files(self, dir_path):
+        """ List the files of a live directory as they will be after commit (live and staged, less removals).
+
+        :param dir_path: string object containing the live directory path.
+        :return file_list: list object containing the live paths.
+        """
+
+        file_set = set(self._list_files(dir_path))
+        staged_dir = self.staged_path(dir_path)
+        if staged_dir != dir_path and os.path.isdir(staged_dir):
+            file_set.update(self.live_path(i.path) for i in os.scandir(staged_dir) if i.is_file())
+
+        return sorted(file_set - self.remove_set)
+
+    def remove_file(self, path):
+        """ Remove a file on commit (a staged copy written by this run is deleted immediately).
+
+        :param path: string object containing the live path.
+        """
+
+        staged = self.staged_path(path)
+        if staged != path and os.path.isfile(staged):
+            os.remove(staged)
+        if self._isfile(path):
+            self.remove_set.add(path)
+
+    def _publish_group(self, move_list, delete_list):
+        """ Publish one group of files as a unit - the live files being replaced or removed are renamed aside, the
+        staged files renamed into place and the set aside files then deleted. If any rename fails, the renames already
+        made are undone (the live files keep their previous contents and the staged files stay in staging).
+
+        :param move_list: list object containing the (staged path, live path) of the group members written by the run.
+        :param delete_list: list object containing the live paths of the group members to remove.
+        """
+
+        aside_list = []
+        done_list = []
+        try:
+            for live in [i[1] for i in move_list] + delete_list:
+                if os.path.isfile(live):
+                    aside = live + aside_suffix
+                    rename_fn(live, aside)
+                    done_list.append((live, aside))
+                    aside_list.append(aside)
+
+            for staged, live in move_list:
+                if self.snapshot is not None:
+                    self.snapshot.makedirs(os.path.dirname(live))
+                elif not os.path.isdir(os.path.dirname(live)):
+                    os.makedirs(os.path.dirname(live))
+                rename_fn(staged, live)
+                done_list.append((staged, live))
+
+        except OSError:
+            for src, dest in reversed(done_list):
+                os.replace(dest, src)
+            raise
+
+        for aside in aside_list:
+            os.remove(aside)
+        if self.snapshot is not None:
+            for staged, live in move_list:
+                self.snapshot.add_file(live)
+            for live in delete_list:
+                self.snapshot.discard_file(live)
+
+    def _apply(self, move_list, delete_list):
+        """ Publish the staged files and removals group by group (a shapefile and its sidecar files are one group).
+
+        :param move_list: list object containing the (staged path, live path) of the files written by the run.
+        :param delete_list: list object containing the live paths of the files to remove.
+        :return published_list: list object containing the live paths published or removed.
+        """
+
+        group_dict = {}
+        for staged, live in move_list:
+            # a staged file already renamed (journal replay) is no longer in staging.
+            if os.path.isfile(staged):
+                group_dict.setdefault(group_key_fn(live), ([], []))[0].append((staged, live))
+        for live in delete_list:
+            group_dict.setdefault(group_key_fn(live), ([], []))[1].append(live)
+
+        published_list = []
+        failed_list = []
+        error = None
+        for key in sorted(group_dict):
+            group_move_list, group_delete_list = group_dict[key]
+            try:
+                self._publish_group(group_move_list, group_delete_list)
+            except OSError as err:
+                error = err
+                failed_list.extend([i[1] for i in group_move_list] + group_delete_list)
+            else:
+                published_list.extend([i[1] for i in group_move_list] + group_delete_list)
+
+        if failed_list:
+            raise PublishError(published_list, failed_list, error)
+
+        return published_list
+
+    def recover(self):
+        """ Complete a commit recorded in the journal and remove the staging leftovers of a failed run. """
+
+        if os.path.isfile(self.journal_path):
+            try:
+                with open(self.journal_path, 'r') as f:
+                    journal_dict = json.load(f)
+            except (IOError, OSError, ValueError):
+                journal_dict = {}
+
+            # files already renamed are no longer in staging and are skipped - a group that fails again raises
+            # PublishError and the staging directories and journal are kept.
+            self._apply(journal_dict.get('move', []), journal_dict.get('delete', []))
+            os.remove(self.journal_path)
+
+        for target in self.target_list:
+            self._remove(self.staging_dir(target))
+
+    def prepare(self):
+        """ Recover from earlier runs and create the (empty) staging directories - the live targets are not copied. """
+
+        self.recover()
+        self.remove_set = set()
+
+        for target in self.target_list:
+            staging = self.staging_dir(target)
+            if self.snapshot is not None:
+                self.snapshot.makedirs(staging)
+            else:
+                os.makedirs(staging)
+
+    def commit(self):
+        """ Rename the staged files over their live copies and remove the files marked for deletion, one file group
+        at a time, then remove the staging directories.
+
+        A group that cannot be published (i.e. a file locked for longer than the retries) is rolled back to its live
+        contents; the other groups are still published and PublishError is raised with both lists. The staging
+        directories and the journal are then kept, so the next run (prepare) retries the failed groups.
+
+        :return published_list: list object containing the live paths published or removed.
+        """
+
+        move_list = self.staged_files()
+        delete_list = sorted(self.remove_set)
+        with open(self.journal_path, 'w') as f:
+            json.dump({'move': move_list, 'delete': delete_list}, f)
+
+        published_list = self._apply(move_list, delete_list)
+
+        for target in self.target_list:
+            self._remove(self.staging_dir(target))
+        os.remove(self.journal_path)
+        self.remove_set = set()
+
+        return published_list
@@ -27,14 +27,30 @@ import argparse
 import shutil
 import sys
 import warnings
+import run_instrumentation
+import lazy_import
 from glob import glob
-import pandas as pd
-import geopandas as gpd
+
+# pandas and geopandas are imported when a stage first uses them - --help, argument errors and dry runs return without
+# loading them.
+pd = lazy_import.lazy_import_fn('pandas')
+gpd = lazy_import.lazy_import_fn('geopandas')
 
 warnings.filterwarnings("ignore")
 
+remote_desktop_list = ["remote_auto", "remote", "local", "offline"]
+
+# command arguments a resumed run takes from the checkpoint of the interrupted run (same data, filters and outputs).
+resume_argument_list = ["directory_odk", "export_dir", "pastoral_districts_directory", "version", "remote_desktop",
+                        "start_date", "end_date", "weeds_list", "property_enquire", "infrastructure_directory",
+                        "transition_dir", "assets_dir"]
+
+# list of the ODK Mapping feature classes (export feature directories).
+feature_list = ["infra_lines", "infra_points", "infra_water_points", "clearing", "paddock", "erosion", "weeds",
+                "woody_thickening", "feral_animals", "fire", "sinkhole", "unidentified", "other_feature"]
+
 
-def cmd_args_fn():
+def cmd_args_fn(argument_list=None):
     p = argparse.ArgumentParser(
         description="""Process raw RMB Mapping result csv -> csv, shapefiles.""")
 
@@ -83,17 +99,158 @@ def cmd_args_fn():
     p.add_argument('-a', '--assets_dir', type=str, help='Directory path containing required shapefile structure.',
                    default=r'E:\DEPWS\code\rangeland_monitoring\rmb_mapping_pipeline\assets\shapefiles\templates')
 
+    p.add_argument('-bw', '--max_bandwidth', type=float,
+                   help='Photo download bandwidth cap in MB per second (0 = unlimited).', default=0)
+
+    p.add_argument('-hc', '--host_connections', type=int,
+                   help='Maximum concurrent photo downloads from one server.', default=4)
+
+    p.add_argument('-dt', '--download_threads', type=int, help='Number of photo download threads.', default=8)
+
+    p.add_argument('-fr', '--force_refresh', action='store_true',
+                   help='Rewrite every Server_Download shapefile, even when the corporate data is unchanged.')
+
+    p.add_argument('-af', '--append_field_data', action='store_true',
+                   help='Append the Server_Upload field data to the refreshed Server_Download data (step6_2).')
+
+    p.add_argument('-st', '--stage_threads', type=int,
+                   help='Number of pipeline stages run at once (1 = one stage at a time).', default=4)
+
+    p.add_argument('-sp', '--stage_processes', type=int,
+                   help='Number of processes for the feature extraction stages (0 = use the stage threads).',
+                   default=0)
+
+    p.add_argument('-rs', '--resume', type=str,
+                   help='Resume an interrupted run - the run id printed at its start (or latest, the newest unfinished '
+                        'run); finished stages are skipped.', default=None)
+
+    p.add_argument('-dr', '--dry_run', action='store_true',
+                   help='Check the arguments and paths and print what a run would do - nothing is created, '
+                        'downloaded or filed.')
+
+    p.add_argument('-pl', '--plan', action='store_true',
+                   help='Report the submissions, line vertices, photos, output files and Server_Download partitions '
+                        'per property and feature, with estimated run times - nothing is created, downloaded or filed.')
 
-    cmd_args = p.parse_args()
+
+    cmd_args = p.parse_args(argument_list)
 
     if cmd_args.directory_odk is None:
         p.print_help()
 
         sys.exit()
 
+    # call the validate_args_fn function - invalid values end the script before any module or file is loaded.
+    error_list = validate_args_fn(cmd_args)
+    if error_list:
+        p.error('; '.join(error_list))
+
     return cmd_args
 
 
+def validate_args_fn(cmd_args):
+    """ Check the command argument values (no files are read).
+
+    :param cmd_args: argparse namespace object containing the command arguments.
+    :return error_list: list object containing a description of each invalid value.
+    """
+
+    error_list = []
+    for key in ["start_date", "end_date"]:
+        try:
+            datetime.strptime(str(getattr(cmd_args, key)), "%Y-%m-%d")
+        except ValueError:
+            error_list.append("{0} must be a date (YYYY-MM-DD): {1}".format(key, getattr(cmd_args, key)))
+
+    if not error_list and cmd_args.start_date > cmd_args.end_date:
+        error_list.append("start_date {0} is after end_date {1}".format(cmd_args.start_date, cmd_args.end_date))
+
+    if cmd_args.remote_desktop not in remote_desktop_list:
+        error_list.append("remote_desktop must be one of {0}: {1}".format(", ".join(remote_desktop_list),
+                                                                        cmd_args.remote_desktop))
+
+    for key, minimum in [("stage_threads", 1), ("stage_processes", 0), ("download_threads", 1),
+                         ("host_connections", 1), ("max_bandwidth", 0), ("time_sleep", 0)]:
+        if getattr(cmd_args, key) < minimum:
+            error_list.append("{0} must be at least {1}: {2}".format(key, minimum, getattr(cmd_args, key)))
+
+    return error_list
+
+
+def path_error_list_fn(cmd_args, resume=False):
+    """ Check the files and directories the selected workflow needs.
+
+    :param cmd_args: argparse namespace object containing the command arguments.
+    :param resume: boolean object - True when a run is resumed (the results csv is read from the run checkpoint).
+    :return error_list: list object containing a description of each missing file or directory.
+    """
+
+    check_list = [("weeds_list", cmd_args.weeds_list, os.path.isfile)]
+
+    if not resume and cmd_args.remote_desktop != "remote_auto":
+        odk_csv = os.path.join(cmd_args.directory_odk, "RMB_Mapping_{0}_results.csv".format(cmd_args.version))
+        check_list.append(("ODK Mapping Results csv", odk_csv, os.path.isfile))
+    if cmd_args.remote_desktop == "remote_auto":
+        check_list.append(("chrome_driver", cmd_args.chrome_driver, os.path.isfile))
+    if cmd_args.remote_desktop != "offline":
+        check_list.append(("pastoral_districts_directory", cmd_args.pastoral_districts_directory, os.path.isdir))
+        check_list.append(("infrastructure_directory", cmd_args.infrastructure_directory, os.path.isdir))
+
+    for search_criteria, folder in [("NT_Pastoral_Estate.shp", "{0}\\{1}".format("assets", "shapefiles")),
+                                    ("contact_details.csv", "assets"),
+                                    ("Inspection_Details.csv", "{0}\\{1}".format("assets", "csv"))]:
+        path = assets_search_fn(search_criteria, folder) or "{0}\\{1}\\{2}".format(
+            os.path.dirname(os.getcwd()), folder, search_criteria)
+        check_list.append((search_criteria, path, os.path.isfile))
+
+    error_list = ["{0} not located: {1}".format(name, path) for name, path, check_fn in check_list
+                  if not check_fn(path)]
+
+    return error_list
+
+
+def dry_run_fn(cmd_args, error_list, checkpoint=None):
+    """ Print what a run with these arguments would do - nothing is created, downloaded or filed.
+
+    :param cmd_args: argparse namespace object containing the command arguments.
+    :param error_list: list object returned by path_error_list_fn.
+    :param checkpoint: run_checkpoint.RunCheckpoint object of the run being resumed (None = new run).
+    """
+
+    print("=" * 50)
+    print("Dry run - the following run would be started:")
+    if checkpoint is not None:
+        print(" - resume run {0} in {1}: {2}".format(checkpoint.run_id, checkpoint.header['temp_dir'],
+                                                     checkpoint.summary()))
+    elif cmd_args.remote_desktop == "remote_auto":
+        print(" - download RMB_Mapping_{0} from ODK Aggregate (chrome driver: {1})".format(
+            cmd_args.version, cmd_args.chrome_driver))
+    else:
+        print(" - process {0}".format(os.path.join(cmd_args.directory_odk,
+                                                    "RMB_Mapping_{0}_results.csv".format(cmd_args.version))))
+    print(" - records from {0} to {1}, property: {2}".format(cmd_args.start_date, cmd_args.end_date,
+                                                             cmd_args.property_enquire))
+    print(" - outputs to a new run directory in {0}".format(cmd_args.export_dir))
+    if cmd_args.remote_desktop == "offline":
+        print(" - outputs are not filed and Server_Download is not refreshed (offline)")
+    else:
+        print(" - outputs filed to {0}, Server_Download refreshed from {1}{2}".format(
+            cmd_args.pastoral_districts_directory, cmd_args.infrastructure_directory,
+            " (all layers rewritten)" if cmd_args.force_refresh else ""))
+        if cmd_args.append_field_data:
+            print(" - Server_Upload field data appended to Server_Download")
+    print(" - {0} stage threads, {1} extraction processes, {2} download threads".format(
+        cmd_args.stage_threads, cmd_args.stage_processes, cmd_args.download_threads))
+
+    print("=" * 50)
+    if error_list:
+        print("The run would fail:")
+        for error in error_list:
+            print(" - " + error)
+    else:
+        print("All required files and directories were located.")
+
+
 def user_id_fn(remote_desktop):
     """ Extract the users id stripping of the adm when on the remote desktop.
 
@@ -180,10 +337,12 @@ def export_file_path_fn(primary_export_dir, final_user):
     return export_dir_path
 
 
+@run_instrumentation.stage_fn('step1_1_odk_export_csv_checker')
 def odk_export_csv_checker_fn(dir_path, search_criteria, primary_temp_dir, pastoral_estate, feature_list,
                               primary_export_dir, start_date, end_date, pastoral_districts_path, weeds_bot_com,
                               property_enquire, user_df, transition_dir, infrastructure_directory, assets_dir,
-                              remote_desktop):
+                              remote_desktop, utm_dict=None, force_refresh=False, stage_threads=4,
+                              stage_processes=0, checkpoint=None, append_field_data=False):
     """ Search for the ODK Mapping Results csv, if located this function call the step2_1_mapping_processing_workflow
     script. If none is located (i.e. was not located or was purged (0 observations).
 
@@ -203,6 +362,12 @@ def odk_export_csv_checker_fn(dir_path, search_criteria, primary_temp_dir, pasto
     :param search_criteria: string object containing the raw odk file name and type.
     :param primary_temp_dir: string object path to the created output directory (date_time).
     :param pastoral_estate: string object containing the file path to the pastoral estate shapefile.
+    :param utm_dict: dictionary object mapping property names to their UTM zone (Inspection_Details.csv).
+    :param force_refresh: boolean object - rewrite Server_Download shapefiles even when unchanged.
+    :param stage_threads: integer object containing the number of pipeline stages run at once.
+    :param stage_processes: integer object containing the number of feature extraction processes (0 = threads).
+    :param checkpoint: run_checkpoint.RunCheckpoint object recording (and on resume skipping) the finished stages.
+    :param append_field_data: boolean object - append the Server_Upload field data to Server_Download (step6_2).
     """
 
     file_path = ("{0}\\{1}".format(dir_path, search_criteria))
@@ -222,7 +387,9 @@ def odk_export_csv_checker_fn(dir_path, search_criteria, primary_temp_dir, pasto
                                                          primary_export_dir, start_date, end_date,
                                                          pastoral_districts_path, weeds_bot_com, property_enquire,
                                                          user_df, transition_dir, infrastructure_directory, assets_dir,
-                                                         remote_desktop)
+                                                         remote_desktop, utm_dict, force_refresh,
+                                                         stage_threads, stage_processes, checkpoint,
+                                                         append_field_data=append_field_data)
 
     return property_processed_list
 
@@ -246,6 +413,66 @@ def assets_search_fn(search_criteria, folder):
     return files
 
 
+def remove_all_dirs_fn(pastoral_districts_path):
+    """ Search the district directories for faulty "ALL" property directories and delete them.
+
+    :param pastoral_districts_path: string object containing the path to the Pastoral Districts directory.
+    """
+
+    import directory_snapshot
+    # the snapshot already holds the listings made while filing - the clean up below adds no further directory walks.
+    snapshot = directory_snapshot.get_snapshot_fn(pastoral_districts_path)
+
+    # search for faulty directory and delete it
+    # walk to the district directory
+    for dist_path in snapshot.list_dirs(pastoral_districts_path):
+        for path_ in snapshot.list_dirs(dist_path):
+            n = os.path.basename(path_)
+            if "ALL_" in n:
+                # print("n: ", n)
+                # print("A directory with all has been located")
+                snapshot.rmtree(path_)
+            elif "All_" in n:
+                # print("n: ", n)
+                # print("A directory with all has been located")
+                snapshot.rmtree(path_)
+            else:
+                pass
+
+
+def plan_fn(cmd_args, error_list, checkpoint=None):
+    """ Report the work a run with these arguments would do (run_planner) - nothing is created, downloaded or filed.
+
+    :param cmd_args: argparse namespace object containing the command arguments.
+    :param error_list: list object returned by path_error_list_fn.
+    :param checkpoint: run_checkpoint.RunCheckpoint object of the run being resumed (None = new run).
+    """
+
+    if checkpoint is not None:
+        # the results csv copied at the start of the interrupted run.
+        odk_csv = checkpoint.header['odk_csv']
+    else:
+        odk_csv = os.path.join(cmd_args.directory_odk, "RMB_Mapping_{0}_results.csv".format(cmd_args.version))
+        if cmd_args.remote_desktop == "remote_auto":
+            print("Planning from the results csv already downloaded - ODK Aggregate is not contacted.")
+
+    pastoral_estate_ = assets_search_fn("NT_Pastoral_Estate.shp", "{0}\\{1}".format("assets", "shapefiles"))
+    if not os.path.isfile(odk_csv) or not pastoral_estate_:
+        print("A plan needs the ODK Mapping Results csv and NT_Pastoral_Estate.shp:")
+        for error in error_list:
+            print(" - " + error)
+        sys.exit(1)
+
+    import run_planner
+    run_planner.main_routine(odk_csv, pastoral_estate_, cmd_args.start_date, cmd_args.end_date,
+                             cmd_args.property_enquire, cmd_args.remote_desktop)
+
+    if error_list:
+        print("The run would fail:")
+        for error in error_list:
+            print(" - " + error)
+
+
 def main_routine():
     """ This pipeline either downloads the latest ODK Mapping Results csv or searches through a directory defined by
     command argument "remote_desktop". Following the discovery of the ODK Mapping Results csv, the script filters the
@@ -280,6 +507,33 @@ def main_routine():
 
     # read in the command arguments
     cmd_args = cmd_args_fn()
+
+    # a resumed run repeats the interrupted run - its data filters and directories are taken from the checkpoint.
+    import run_checkpoint
+    checkpoint = None
+    if cmd_args.resume:
+        checkpoint = run_checkpoint.resume_fn(cmd_args.resume)
+        for key in resume_argument_list:
+            setattr(cmd_args, key, checkpoint.header['arguments'][key])
+
+    # call the path_error_list_fn function - missing inputs end the script before anything is created or downloaded.
+    error_list = path_error_list_fn(cmd_args, checkpoint is not None)
+    if cmd_args.plan:
+        plan_fn(cmd_args, error_list, checkpoint)
+        sys.exit(0)
+
+    if cmd_args.dry_run:
+        dry_run_fn(cmd_args, error_list, checkpoint)
+        sys.exit(1 if error_list else 0)
+
+    if error_list:
+        for error in error_list:
+            print(" - " + error)
+        sys.exit(1)
+
+    # time every stage of this run (report written to ~/.rmb_mapping_cache/run_reports).
+    run_id = run_instrumentation.start_run_fn()
+    setup_span = run_instrumentation.span_fn('step1_1_setup')
     directory_odk = cmd_args.directory_odk
     primary_export_dir = cmd_args.export_dir
     pastoral_districts_path = cmd_args.pastoral_districts_directory
@@ -294,12 +548,23 @@ def main_routine():
     infrastructure_directory = cmd_args.infrastructure_directory
     transition_dir = cmd_args.transition_dir
     assets_dir = cmd_args.assets_dir
+    max_bandwidth = cmd_args.max_bandwidth
+    host_connections = cmd_args.host_connections
+    download_threads = cmd_args.download_threads
+    force_refresh = cmd_args.force_refresh
+    append_field_data = cmd_args.append_field_data
+    stage_threads = cmd_args.stage_threads
+    stage_processes = cmd_args.stage_processes
 
     print('The following data filters have been applied:')
     print(' - Start date:', start_date)
     print(' - End date: ', end_date)
     print(' - Property name: ', property_enquire)
 
+    # configure the shared photo download scheduler (bandwidth cap and per server connection limit).
+    import download_scheduler
+    download_scheduler.configure_fn(max_bandwidth, host_connections, download_threads)
+
 
     pastoral_estate_ = assets_search_fn("NT_Pastoral_Estate.shp", "{0}\\{1}".format("assets", "shapefiles"))
     pastoral_estate = gpd.read_file(pastoral_estate_)
@@ -312,13 +577,12 @@ def main_routine():
     # list of the current odk files to be processed
     odk_form_list = ["RMB_Mapping_{0}".format(version)]
 
-    # list of the ODK Mapping feature classes.
-    feature_list = ["infra_lines", "infra_points", "infra_water_points", "clearing", "paddock", "erosion", "weeds",
-                    "woody_thickening",
-                    "feral_animals", "fire", "sinkhole", "unidentified", "other_feature"]
-
     # defining the workflow based on the "remote_desktop" variable.
-    if remote_desktop == "remote_auto":
+    if checkpoint is not None:
+        print("Resuming run {0} - the ODK results of the interrupted run are processed again.".format(
+            checkpoint.run_id))
+
+    elif remote_desktop == "remote_auto":
         if remote_desktop == "remote_auto":
             # extract user home directory: thereby, extracting the users NTG id.
             home_dir = os.path.expanduser("~")
@@ -383,21 +647,36 @@ def main_routine():
     # call the user_id_fn function to extract the user id
     final_user = user_id_fn(remote_desktop)
 
-    # call the temporary_dir function to create a temporary folder which will be deleted at the end of the script.
-    primary_temp_dir, final_user = temporary_dir(final_user)
+    # reclaim the run directories of earlier or crashed runs in the background - the directories of every run that
+    # can still be resumed are kept and the checkpoints of finished runs are removed.
+    import deferred_cleanup
+    run_checkpoint.prune_fn()
+    deferred_cleanup.housekeeping_fn([os.path.expanduser("~"), primary_export_dir], final_user,
+                                     exclude_list=run_checkpoint.unfinished_dir_list_fn())
 
-    # call the export_file_path_fn function to create an export directory.
-    primary_export_dir = export_file_path_fn(primary_export_dir, final_user)
+    if checkpoint is not None:
+        # continue in the directories of the interrupted run.
+        primary_temp_dir = checkpoint.header['temp_dir']
+        primary_export_dir = checkpoint.header['export_dir']
+        directory_odk = os.path.dirname(checkpoint.header['odk_csv'])
 
-    # call the odk_export_csv_checker_fn function - search for star transect outputs
-    property_processed_list = odk_export_csv_checker_fn(directory_odk, "RMB_Mapping_" + version + "_results.csv",
-                              primary_temp_dir, pastoral_estate, feature_list, primary_export_dir, start_date, end_date,
-                              pastoral_districts_path, weeds_bot_com, property_enquire, user_df,
-                              transition_dir, infrastructure_directory, assets_dir, remote_desktop)
-
-    print(primary_temp_dir, " has been deleted from your hard drive.")
-    # delete the temp directory and its contents.
-    shutil.rmtree(primary_temp_dir)
+    else:
+        # call the temporary_dir function to create a temporary folder which will be deleted at the end of the script.
+        primary_temp_dir, final_user = temporary_dir(final_user)
+
+        # call the export_file_path_fn function to create an export directory.
+        primary_export_dir = export_file_path_fn(primary_export_dir, final_user)
+
+        # record the run so it can be resumed - the results csv is copied to the temporary directory and read from
+        # there, so a resumed run processes the same submissions.
+        odk_csv = os.path.join(directory_odk, "RMB_Mapping_" + version + "_results.csv")
+        if os.path.exists(odk_csv):
+            odk_csv, odk_sha1 = run_checkpoint.snapshot_odk_fn(odk_csv, primary_temp_dir)
+            directory_odk = primary_temp_dir
+            checkpoint = run_checkpoint.start_fn(run_id, {
+                'temp_dir': primary_temp_dir, 'export_dir': primary_export_dir, 'odk_csv': odk_csv,
+                'odk_sha1': odk_sha1, 'arguments': vars(cmd_args)})
+            print(' - run id: {0} (if the run is interrupted, restart it with --resume {0})'.format(run_id))
 
     inspection_details_df = pd.read_csv(inspection_details)
     #final_prop_list = []
@@ -406,70 +685,35 @@ def main_routine():
         prop_name = i.replace(" ", "_").upper()
         final_prop_list.append(prop_name)'''
 
+    # the property UTM zones - outputs of the other zone are removed from the staged Field_Data before publishing.
     utm_dict = dict(zip(inspection_details_df.Property, inspection_details_df.UTM_Zone))
 
-    district_dict = dict(zip(pastoral_estate.PROPERTY, pastoral_estate.DISTRICT))
-    tag_dict = dict(zip(pastoral_estate.PROPERTY, pastoral_estate.PROP_TAG))
-
-    date_ = datetime.now()
-    year = date_.year
-
-
-    for prop_name_ in property_processed_list:
-        if prop_name_ != "UNKNOWN":
-
-            # print(prop_name_)
-            #prop_name__ = prop_name_.replace(" ", "_")
-            utm_dict_code = utm_dict[prop_name_]
-            # print('utm_dict_code: ', utm_dict_code)
-            district = district_dict[prop_name_]
-            tag = tag_dict[prop_name_]
-            final_property = "{0}_{1}".format(tag.upper(), prop_name_.replace(" ", "_").title())
-            property_dir_path_list = []
-            output_list = ['csv', 'shapefile']
-            for feature in feature_list:
-                for file_type in output_list:
-
-                    dir_path = os.path.join(pastoral_districts_path, district.title(), final_property, 'Infrastructure', 'Field_Data',
-                                 str(year), 'Raw', feature, file_type)
-                    property_dir_path_list.append(dir_path)
+    setup_span.end()
 
+    # call the odk_export_csv_checker_fn function - search for star transect outputs
+    property_processed_list = odk_export_csv_checker_fn(directory_odk, "RMB_Mapping_" + version + "_results.csv",
+                              primary_temp_dir, pastoral_estate, feature_list, primary_export_dir, start_date, end_date,
+                              pastoral_districts_path, weeds_bot_com, property_enquire, user_df,
+                              transition_dir, infrastructure_directory, assets_dir, remote_desktop, utm_dict,
+                              force_refresh, stage_threads, stage_processes, checkpoint, append_field_data)
 
-            for n in property_dir_path_list:
-                #print('n : ', n)
-                for delete_file in glob("{0}\\*".format(n, )):
-                    #print('delete_file: ', delete_file)
-                    path, file = delete_file.rsplit('\\', 1)
-                    if str(utm_dict_code) not in file:
-                        if 'photo' not in file:
-                            print(' -- delete: ', file)
-                            os.remove(delete_file)
-
-    # search for faulty directory and delete it
-    dir_list = next(os.walk(pastoral_districts_path))[1]
-    # walk to the district directory
-    for i in dir_list:
-        dist_path = os.path.join(pastoral_districts_path, i)
-        prop_list = next(os.walk(dist_path))[1]
-        for n in prop_list:
-            if "ALL_" in n:
-                # print("n: ", n)
-                path_ = os.path.join(dist_path, n)
-                # print("A directory with all has been located")
-                shutil.rmtree(path_)
-            elif "All_" in n:
-                # print("n: ", n)
-                path_ = os.path.join(dist_path, n)
-                # print("A directory with all has been located")
-                shutil.rmtree(path_)
-            else:
-                pass
+    if checkpoint is not None:
+        checkpoint.record('run', 'done')
 
+    print(primary_temp_dir, " has been deleted from your hard drive.")
+    # delete the temp directory and its contents (renamed aside and deleted in the background).
+    deferred_cleanup.defer_remove_fn(primary_temp_dir)
 
+    # call the remove_all_dirs_fn function to delete the faulty "All" property directories.
+    remove_all_dirs_fn(pastoral_districts_path)
 
     print(primary_export_dir, " has been deleted from your hard drive - your final outputs have been filed.")
-    # delete the export directory and its contents.
-    shutil.rmtree(primary_export_dir)
+    # delete the export directory and its contents (renamed aside and deleted in the background).
+    deferred_cleanup.defer_remove_fn(primary_export_dir)
+    deferred_cleanup.handoff_fn()
+
+    # write the run report and print the stage timing summary.
+    run_instrumentation.finish_run_fn({'arguments': vars(cmd_args), 'import_s': lazy_import.import_time_dict})
 
 
 if __name__ == "__main__":
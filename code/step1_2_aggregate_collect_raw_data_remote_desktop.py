@@ -19,18 +19,11 @@ SOFTWARE.
 """
 
 # Import modules
-import selenium
-from selenium import webdriver
-from selenium.webdriver.support.select import Select
-from selenium.common.exceptions import NoSuchElementException
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.common.by import By
 import time
 import os
 import shutil
 import sys
+import run_instrumentation
 
 
 def odk_aggregate_log_in_fn(driver):
@@ -57,6 +50,7 @@ def close_diver_fn(driver):
     driver.quit()
 
 
+@run_instrumentation.stage_fn('step1_2_aggregate_collect_raw_data_remote_desktop')
 def main_routine(chrome_driver, odk_form_list, time_sleep):
     """ Script is called when the command argument variable "remote_desktop" is set to "remote_auto".
 
@@ -70,6 +64,13 @@ def main_routine(chrome_driver, odk_form_list, time_sleep):
     :param chrome_driver: string object (command argument) containing the path to the chrome driver extension - used
     when "remote_desktop" is set to "remote_auto"."""
 
+    # selenium is imported here - it is only needed when the results are downloaded (remote_auto).
+    from selenium import webdriver
+    from selenium.webdriver.support.select import Select
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.common.by import By
+
     # define the Chrome Web driver path
     driver = webdriver.Chrome(chrome_driver)
     time.sleep(5)
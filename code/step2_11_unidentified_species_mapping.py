@@ -20,6 +20,7 @@ SOFTWARE.
 
 # Import modules
 import warnings
+import run_instrumentation
 from datetime import datetime
 import pandas as pd
 import numpy as np
@@ -132,6 +133,7 @@ def unidentified_species_fn(row, string_clean_capital_fn):
     return species_list
 
 
+@run_instrumentation.stage_fn('step2_11_unidentified_species_mapping')
 def main_routine(temp_dir, string_clean_capital_fn, feature_df, feature, date_time_fn,
                  gps_points_fn,
                  photo_url_extraction_fn, meta_data_fn, label_comment_fn, feature_group_dict, feature_dict):
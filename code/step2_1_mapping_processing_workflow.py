@@ -20,13 +20,20 @@ SOFTWARE.
 
 # Import modules
 import warnings
+import run_instrumentation
 import geopandas as gpd
 import pandas as pd
 import os
-import matplotlib.pyplot as plt
 
 warnings.filterwarnings("ignore")
 
+# ODK feature class -> the export feature directories (feature_list) its step2_x module writes temp csv files to.
+compile_feature_dict = {"infrastructure": ["infra_lines", "infra_points", "infra_water_points"],
+                        "clearing": ["clearing"], "paddock": ["paddock"], "erosion": ["erosion"], "weed": ["weeds"],
+                        "woody_thickening": ["woody_thickening"], "feral_animal": ["feral_animals"],
+                        "fire": ["fire"], "sinkhole": ["sinkhole"], "unidentified_species": ["unidentified"],
+                        "other_feature": ["other_feature"]}
+
 
 def string_clean_upper_fn(dirty_string):
     """
@@ -294,7 +301,7 @@ def label_comment_fn(row, string_clean_capital_fn):
 '''
 
 
-def property_name_extraction_fn(orig_odk_df, pastoral_estate, directory):
+def property_name_extraction_fn(orig_odk_df, pastoral_estate, directory, pe_gdf_4326=None):
     """
     Identifies which pastoral property each point overlays and inserts the property name and tenure reference two
     columns - if a point is outside of the Pastoral Estate it is classified as:
@@ -304,14 +311,18 @@ def property_name_extraction_fn(orig_odk_df, pastoral_estate, directory):
     :param orig_odk_df: data frame object containing raw odk point data
     :param pastoral_estate: string object containing the path to the Pastoral Estate shapefile.
     :param directory: string object containing the path to the temporary directory.
+    :param pe_gdf_4326: geo-dataframe object containing the Pastoral Estate already projected to WGS84 (None = project
+    pastoral_estate).
     :return final_df: pandas dataframe object containing the raw odk point data with the extracted property name that
     it overlays.
     """
     identify_dir = "{0}\\identify".format(directory)
-    os.makedirs(identify_dir)
+    if not os.path.exists(identify_dir):
+        os.makedirs(identify_dir)
 
     plots_dir = "{0}\\identify_plots".format(directory)
-    os.makedirs(plots_dir)
+    if not os.path.exists(plots_dir):
+        os.makedirs(plots_dir)
 
     # Create a geo-dataframe in the datum WGS84
     gdf = gpd.GeoDataFrame(
@@ -319,7 +330,8 @@ def property_name_extraction_fn(orig_odk_df, pastoral_estate, directory):
                                                  orig_odk_df["GROUP_COORDINATES:SITE_GPS1:Latitude"]), crs=4326)
 
     # project the pastoral estate shapefile to WGS84
-    pe_gdf_4326 = pastoral_estate.to_crs("EPSG:4326")
+    if pe_gdf_4326 is None:
+        pe_gdf_4326 = pastoral_estate.to_crs("EPSG:4326")
 
     odk_all_list = pe_gdf_4326.PROPERTY.unique().tolist()
 
@@ -383,6 +395,42 @@ def district_identify_fn(final_df, pastoral_estate):
     return district_df
 
 
+def odk_property_df_fn(file_path, start_date, end_date, pastoral_estate, primary_temp_dir, pe_gdf_4326=None):
+    """ Read the ODK Mapping Results csv, filter it by date and identify the property and district of each record.
+
+    :param file_path: string object containing the path to the ODK Mapping Results csv.
+    :param start_date: string object containing the start date the records are filtered from.
+    :param end_date: string object containing the end date the records are filtered to.
+    :param pastoral_estate: geo-dataframe object containing the Pastoral Estate.
+    :param primary_temp_dir: string object path to the created output directory (date_time).
+    :param pe_gdf_4326: geo-dataframe object containing the Pastoral Estate already projected to WGS84 (None = project
+    pastoral_estate).
+    :return district_df: pandas dataframe object containing the filtered records with PROPERTY, PROP_TAG and DISTRICT
+    columns.
+    """
+
+    # Read in the star transect csv as a Pandas DataFrame.
+    df = pd.read_csv(file_path)
+    run_instrumentation.count_fn('rows_in', len(df.index))
+
+    df["FEATURE_ATTRIB:FREE_TEXT"] = df["FEATURE_ATTRIB:FREE_TEXT"].fillna('Not recorded')
+    df["FEATURE_ATTRIB:COND_LABEL"] = df["FEATURE_ATTRIB:COND_LABEL"].fillna('Not recorded')
+    df["FEATURE_ATTRIB:INF_LABEL"] = df["FEATURE_ATTRIB:INF_LABEL"].fillna('Not recorded')
+
+    # add a uid column to the dataframe
+    df.insert(0, "orig_uid", "")
+    df["orig_uid"] = df.index + 1
+
+    # filter dataframe based on start and end dates.
+    date_df = df[(df["START"] > start_date) & (df["START"] < end_date)]
+
+    # call the property_name_extraction_fn to determine the property name the feature is located.
+    property_df = property_name_extraction_fn(date_df, pastoral_estate, primary_temp_dir, pe_gdf_4326)
+    district_df = district_identify_fn(property_df, pastoral_estate)
+
+    return district_df
+
+
 def processing_workflow_fn(temp_dir, string_clean_capital_fn, feature_df, feature, feature_group_dict, feature_dict,
                            weeds_bot_com):
     """
@@ -489,6 +537,112 @@ def processing_workflow_fn(temp_dir, string_clean_capital_fn, feature_df, featur
     return temp_dir
 
 
+def compile_feature_fn(feature, temp_dir, export_prop_dir, pastoral_estate, user_df):
+    """
+    Control the compile workflow (step3_x) of one export feature directory (i.e. infra_lines, weeds).
+
+    :param feature: string object containing one of the export feature names (feature_list).
+    :param temp_dir: string object containing the path to the property temporary directory.
+    :param export_prop_dir: string object containing the path to the property export directory.
+    :param pastoral_estate: string object containing the path to the Pastoral Estate shapefile.
+    :param user_df: string object containing the path to the contact_details.csv file.
+    """
+
+    if feature == "infra_lines":
+        import step3_1_compile_line_infrastructure
+        step3_1_compile_line_infrastructure.main_routine(temp_dir, feature, export_prop_dir)
+
+    elif feature == "infra_points":
+
+        import step3_2_compile_points_infrastructure
+        step3_2_compile_points_infrastructure.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
+                                                           user_df)
+
+    elif feature == "infra_water_points":
+        import step3_3_compile_water_points_infrastructure
+        step3_3_compile_water_points_infrastructure.main_routine(temp_dir, feature, export_prop_dir,
+                                                                 pastoral_estate, user_df)
+
+    elif feature == "paddock":
+        import step3_4_compile_points_paddock
+        step3_4_compile_points_paddock.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
+                                                    user_df)
+
+    elif feature == "clearing":
+        import step3_3_compile_points_clearing
+        step3_3_compile_points_clearing.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
+                                                     user_df)
+
+    elif feature == "erosion":
+        import step3_5_compile_points_erosion
+        step3_5_compile_points_erosion.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
+                                                    user_df)
+
+    elif feature == "erosion":
+        import step3_5_compile_points_erosion
+        step3_5_compile_points_erosion.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
+                                                    user_df)
+
+    elif feature == "weeds":
+        import step3_6_compile_points_weeds_update
+        step3_6_compile_points_weeds_update.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
+                                                         user_df)
+
+    elif feature == "woody_thickening":
+        import step3_7_compile_points_woody_thickening
+        step3_7_compile_points_woody_thickening.main_routine(temp_dir, feature, export_prop_dir,
+                                                             pastoral_estate, user_df)
+
+    elif feature == "feral_animals":
+        import step3_8_compile_points_feral_animals
+        step3_8_compile_points_feral_animals.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
+                                                          user_df)
+
+    elif feature == "fire":
+        import step3_9_compile_points_fire
+        step3_9_compile_points_fire.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate, user_df)
+
+    elif feature == "unidentified":
+        import step3_11_compile_points_unidentified
+        step3_11_compile_points_unidentified.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
+                                                          user_df)
+
+    elif feature == "other_feature":
+        import step3_12_compile_points_other_feature
+        step3_12_compile_points_other_feature.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
+                                                           user_df)
+    else:
+        pass
+
+
+def reset_extraction_fn(temp_feature_list):
+    """ Empty the temporary feature directories of an extraction before it is run again (resumed runs).
+
+    :param temp_feature_list: list object containing the temporary feature directory paths the extraction writes to.
+    """
+
+    import run_checkpoint
+    for path in temp_feature_list:
+        run_checkpoint.empty_dir_fn(path)
+
+
+def reset_compile_fn(temp_dir, export_prop_dir, feature):
+    """ Remove the partial outputs of a compile before it is run again (resumed runs) - the extraction csv files and
+    the downloaded photos are kept.
+
+    :param temp_dir: string object containing the path to the property temporary directory.
+    :param export_prop_dir: string object containing the path to the property export directory.
+    :param feature: string object containing one of the export feature names (feature_list).
+    """
+
+    import run_checkpoint
+    run_checkpoint.empty_dir_fn("{0}\\{1}".format(temp_dir, feature), keep_pattern='clean_*.csv')
+    run_checkpoint.empty_dir_fn("{0}\\{1}".format(export_prop_dir, feature))
+
+    if feature == "infra_lines":
+        run_checkpoint.empty_dir_fn("{0}\\lines_point".format(temp_dir))
+
+
 def temp_dir_folders_fn(primary_temp_dir, feature_list, prop_name):
     """
     Create directory tree within the temporary directory based on property name.
@@ -505,15 +659,12 @@ def temp_dir_folders_fn(primary_temp_dir, feature_list, prop_name):
     if not os.path.exists(dir):
         os.mkdir(dir)
 
+    # existing directories are kept - a resumed run reuses the temporary directory of the interrupted run.
     for i in feature_list:
         feature_dir = ("{0}\\{1}".format(dir, i))
-        os.mkdir(feature_dir)
-
-        temp_path = ("{0}\\temp_shape".format(feature_dir))
-        os.mkdir(temp_path)
-
-        shapefile_path = ("{0}\\shapefile".format(feature_dir))
-        os.mkdir(shapefile_path)
+        for path in [feature_dir, "{0}\\temp_shape".format(feature_dir), "{0}\\shapefile".format(feature_dir)]:
+            if not os.path.exists(path):
+                os.mkdir(path)
 
     return dir
 
@@ -534,25 +685,22 @@ def export_dir_folders_fn(export_dir, feature_list, prop_name):
     if not os.path.exists(property_directory):
         os.mkdir(property_directory)
 
+    # existing directories are kept - a resumed run reuses the export directory of the interrupted run.
     for i in feature_list:
         dir = ("{0}\\{1}".format(property_directory, i))
-        os.mkdir(dir)
-
-        shapefile_path = ("{0}\\shapefile".format(dir))
-        os.mkdir(shapefile_path)
-
-        csv_path = ("{0}\\csv".format(dir))
-        os.mkdir(csv_path)
-
-        photos_path = ("{0}\\photos".format(dir))
-        os.mkdir(photos_path)
+        for path in [dir, "{0}\\shapefile".format(dir), "{0}\\csv".format(dir), "{0}\\photos".format(dir)]:
+            if not os.path.exists(path):
+                os.mkdir(path)
 
     return property_directory
 
 
+@run_instrumentation.stage_fn('step2_1_mapping_processing_workflow')
 def main_routine(file_path, primary_temp_dir, pastoral_estate, feature_list, primary_export_dir, start_date, end_date,
                  pastoral_districts_path, weeds_bot_com, prop_enquire, user_df, transition_dir,
-                 infrastructure_directory, assets_dir, remote_desktop):
+                 infrastructure_directory, assets_dir, remote_desktop, utm_dict=None,
+                 force_refresh=False, stage_threads=4, stage_processes=0, checkpoint=None, district_df=None,
+                 append_field_data=False):
 
 
     print('start 2.1')
@@ -560,7 +708,8 @@ def main_routine(file_path, primary_temp_dir, pastoral_estate, feature_list, pri
     Control the ODK Mapping data extraction workflow.
 
     :param pastoral_districts_path:
-    :param prop_enquire:
+    :param prop_enquire: string object containing a property name, or a list object containing property names ("ALL" or
+    "ALL_ODK" = every property).
     :param weeds_bot_com: string object containing the path to the weeds_list.csv file
     - file contains all known botanical and common weeds names.
    :param start_date: string object (command argument) containing the start date that the user wishes to filter the
@@ -572,6 +721,15 @@ def main_routine(file_path, primary_temp_dir, pastoral_estate, feature_list, pri
     :param pastoral_estate: string object containing the path to the Pastoral Estate shapefile.
     :param file_path: string object containing the dir_path concatenated with search_criteria.
     :param primary_temp_dir: string object path to the created output directory (date_time).
+    :param utm_dict: dictionary object mapping property names to their UTM zone (passed to step5_1).
+    :param force_refresh: boolean object - rewrite Server_Download shapefiles even when unchanged (passed to step6_1).
+    :param stage_threads: integer object containing the number of stages run at once (1 = one at a time).
+    :param stage_processes: integer object containing the number of processes for the step2_x extractions (0 = run
+    them on the stage threads).
+    :param checkpoint: run_checkpoint.RunCheckpoint object - stages finished by an earlier attempt are skipped.
+    :param district_df: pandas dataframe object returned by odk_property_df_fn (None = read and identify file_path).
+    :param append_field_data: boolean object - append the Server_Upload field data to the refreshed Server_Download
+    data (step6_2) - off unless requested.
     """
 
     feature_group_dict = {"Bore": "Water Points", "Dam": "Water Points", "Pump out point": "Water Points",
@@ -602,31 +760,23 @@ def main_routine(file_path, primary_temp_dir, pastoral_estate, feature_list, pri
                     'Quarry': 'Quarry', 'General Cultural Feature': 'General Cultural Feature',
                     'Landing Strip': 'Landing Strip'}
 
-    # Read in the star transect csv as a Pandas DataFrame.
-    df = pd.read_csv(file_path)
-
-    df["FEATURE_ATTRIB:FREE_TEXT"] = df["FEATURE_ATTRIB:FREE_TEXT"].fillna('Not recorded')
-    df["FEATURE_ATTRIB:COND_LABEL"] = df["FEATURE_ATTRIB:COND_LABEL"].fillna('Not recorded')
-    df["FEATURE_ATTRIB:INF_LABEL"] = df["FEATURE_ATTRIB:INF_LABEL"].fillna('Not recorded')
+    if district_df is None:
+        # call the odk_property_df_fn function to read the results csv and identify the property of each record.
+        district_df = odk_property_df_fn(file_path, start_date, end_date, pastoral_estate, primary_temp_dir)
 
-    # add a uid column to the dataframe
-    df.insert(0, "orig_uid", "")
-    df["orig_uid"] = df.index + 1
-
-    # filter dataframe based on start and end dates.
-    date_df = df[(df["START"] > start_date) & (df["START"] < end_date)]
-
-    # call the property_name_extraction_fn to determine the property name the feature is located.
-    property_df = property_name_extraction_fn(date_df, pastoral_estate, primary_temp_dir)
-    district_df = district_identify_fn(property_df, pastoral_estate)
+    # a single property name or a list of property names (PipelineSession.run).
+    prop_enquire_list = [prop_enquire] if isinstance(prop_enquire, str) else list(prop_enquire)
+    if not isinstance(prop_enquire, str):
+        # step6_1 refreshes the neighbours of each listed property as it does for ALL_ODK.
+        prop_enquire = "ALL" if "ALL" in prop_enquire_list else "ALL_ODK"
 
     # Determine the property name list
-    if prop_enquire not in ["ALL", "ALL_ODK"]:
+    if not set(prop_enquire_list) & {"ALL", "ALL_ODK"}:
         print("prop enquire is not ALL or ALL_ODK")
         property_df_ = district_df.loc[
-            (district_df["PROPERTY"] == prop_enquire) | (district_df["PROPERTY"] == "UNKNOWN")]
+            (district_df["PROPERTY"].isin(prop_enquire_list)) | (district_df["PROPERTY"] == "UNKNOWN")]
         property_df_.to_csv(r"Z:\Scratch\Rob\property_df_NOT_ALL.csv")
-        odk_all_list = [prop_enquire]
+        odk_all_list = prop_enquire_list
 
     else:
         # print("prop enquire is EITHER ALL or ALL ODK")
@@ -638,11 +788,17 @@ def main_routine(file_path, primary_temp_dir, pastoral_estate, feature_list, pri
 
 
 
-    # loop through the and filter the dataframe based on unique property names
+    import functools
+    import run_checkpoint
+    import stage_scheduler
+    scheduler = stage_scheduler.StageScheduler(stage_threads, stage_processes, checkpoint)
 
+    # loop through the and filter the dataframe based on unique property names - each feature extraction and compile
+    # is declared as a stage; a compile waits only for the extraction that writes its temp csv. The compiles take the
+    # gis_lock only around their fiona, pyproj and matplotlib calls (step3_1, step4_1, step4_3), so a compile waiting
+    # on photo downloads does not hold up the other compiles or the Server_Download refresh.
     processed_property_list = []
     for prop_name in property_df_.PROPERTY.unique():
-        print('=' * 50)
         processed_property_list.append(prop_name)
         print('property name to be processed: ', prop_name)
         prop_df = property_df_.loc[property_df_["PROPERTY"] == prop_name]
@@ -655,94 +811,80 @@ def main_routine(file_path, primary_temp_dir, pastoral_estate, feature_list, pri
 
         # loop through the and filter the dataframe based on unique feature names
         for feature in prop_df["GROUP_FEATURE:FEATURE"].unique():
+            # skip feature classes whose export features are not being processed (PipelineSession.run features).
+            if feature in compile_feature_dict and not set(compile_feature_dict[feature]) & set(feature_list):
+                continue
             feature_df = prop_df[prop_df["GROUP_FEATURE:FEATURE"] == feature]
-
-            temp_dir = processing_workflow_fn(temp_dir, string_clean_capital_fn, feature_df, feature,
-                                              feature_group_dict, feature_dict, weeds_bot_com)
+            temp_feature_list = ["{0}\\{1}".format(temp_dir, i) for i in compile_feature_dict.get(feature, [])]
+
+            scheduler.add('step2:{0}:{1}'.format(prop_name, feature), processing_workflow_fn,
+                          (temp_dir, string_clean_capital_fn, feature_df, feature, feature_group_dict, feature_dict,
+                           weeds_bot_com),
+                          outputs=['temp:{0}:{1}'.format(prop_name, i) for i in compile_feature_dict.get(feature, [])],
+                          pool='process', span_name='step2_1_feature',
+                          span_attr={'property': prop_name, 'feature': feature, 'rows': len(feature_df.index)},
+                          resumable=True,
+                          fingerprint=functools.partial(run_checkpoint.fingerprint_fn, temp_feature_list,
+                                                        'clean_*.csv'),
+                          reset=functools.partial(reset_extraction_fn, temp_feature_list))
 
         for feature in feature_list:
-
-            if feature == "infra_lines":
-                import step3_1_compile_line_infrastructure
-                step3_1_compile_line_infrastructure.main_routine(temp_dir, feature, export_prop_dir)
-
-            elif feature == "infra_points":
-
-                import step3_2_compile_points_infrastructure
-                step3_2_compile_points_infrastructure.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
-                                                                   user_df)
-
-            elif feature == "infra_water_points":
-                import step3_3_compile_water_points_infrastructure
-                step3_3_compile_water_points_infrastructure.main_routine(temp_dir, feature, export_prop_dir,
-                                                                         pastoral_estate, user_df)
-
-            elif feature == "paddock":
-                import step3_4_compile_points_paddock
-                step3_4_compile_points_paddock.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
-                                                            user_df)
-
-            elif feature == "clearing":
-                import step3_3_compile_points_clearing
-                step3_3_compile_points_clearing.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
-                                                             user_df)
-
-            elif feature == "erosion":
-                import step3_5_compile_points_erosion
-                step3_5_compile_points_erosion.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
-                                                            user_df)
-
-            elif feature == "erosion":
-                import step3_5_compile_points_erosion
-                step3_5_compile_points_erosion.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
-                                                            user_df)
-
-            elif feature == "weeds":
-                import step3_6_compile_points_weeds_update
-                step3_6_compile_points_weeds_update.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
-                                                                 user_df)
-
-            elif feature == "woody_thickening":
-                import step3_7_compile_points_woody_thickening
-                step3_7_compile_points_woody_thickening.main_routine(temp_dir, feature, export_prop_dir,
-                                                                     pastoral_estate, user_df)
-
-            elif feature == "feral_animals":
-                import step3_8_compile_points_feral_animals
-                step3_8_compile_points_feral_animals.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
-                                                                  user_df)
-
-            elif feature == "fire":
-                import step3_9_compile_points_fire
-                step3_9_compile_points_fire.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate, user_df)
-
-            elif feature == "unidentified":
-                import step3_11_compile_points_unidentified
-                step3_11_compile_points_unidentified.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
-                                                                  user_df)
-
-            elif feature == "other_feature":
-                import step3_12_compile_points_other_feature
-                step3_12_compile_points_other_feature.main_routine(temp_dir, feature, export_prop_dir, pastoral_estate,
-                                                                   user_df)
-            else:
-                pass
-
-    print('=' * 50)
+            scheduler.add('step3:{0}:{1}'.format(prop_name, feature), compile_feature_fn,
+                          (feature, temp_dir, export_prop_dir, pastoral_estate, user_df),
+                          inputs=['temp:{0}:{1}'.format(prop_name, feature)], outputs=['export'], resumable=True,
+                          fingerprint=functools.partial(run_checkpoint.fingerprint_fn,
+                                                        ["{0}\\{1}".format(export_prop_dir, feature)]),
+                          reset=functools.partial(reset_compile_fn, temp_dir, export_prop_dir, feature),
+                          confirmed_by='download_wait')
+
+    # wait for the photos queued by the step4 modules - the exif index and filing need every photo on disk. The wait
+    # runs even if a compile failed so the photos of the finished compiles are on disk before they are recorded done.
+    import download_scheduler
+    scheduler.add('download_wait', download_scheduler.wait_fn, inputs=['export'], outputs=['photos'],
+                  span_name='download_wait', resumable=True, always=True)
+
+    # call the photo_exif_index main_routine to flag photographs taken away from (or on a different day to) the feature.
+    import photo_exif_index
+    scheduler.add('photo_exif_index', photo_exif_index.main_routine, (primary_export_dir, feature_list),
+                  inputs=['photos'], outputs=['photo_index'], resumable=True)
 
     if remote_desktop != 'offline':
 
+        # call the infrastructure_matcher to link new infrastructure to the existing corporate features (csv outputs).
+        import infrastructure_matcher
+        scheduler.add('infrastructure_matcher', infrastructure_matcher.main_routine,
+                      (primary_export_dir, infrastructure_directory), inputs=['export'], outputs=['matches'],
+                      resumable=True)
+
         import step5_1_file_outputs_to_working_drive
-        step5_1_file_outputs_to_working_drive.main_routine(primary_export_dir, pastoral_districts_path, start_date)
+        scheduler.add('step5_1', step5_1_file_outputs_to_working_drive.main_routine,
+                      (primary_export_dir, pastoral_districts_path, start_date, utm_dict),
+                      inputs=['photos', 'photo_index', 'matches'], outputs=['field_data'], resumable=True)
 
+        # the Server_Download refresh only needs the property list - it runs alongside the compile stages (mirror
+        # refreshes and reads are serialised by the mirror lock).
         import step6_1_download_adjacent_infrastructure
-        step6_1_download_adjacent_infrastructure.main_routine(pastoral_districts_path, start_date, primary_export_dir,
-                                                              prop_enquire, infrastructure_directory, pastoral_estate,
-                                                              odk_all_list)
+        scheduler.add('step6_1', step6_1_download_adjacent_infrastructure.main_routine,
+                      (pastoral_districts_path, start_date, primary_export_dir, prop_enquire,
+                       infrastructure_directory, pastoral_estate, odk_all_list),
+                      {'force_refresh': force_refresh}, outputs=['server_download'], resumable=True)
+
+        if append_field_data:
+            # call the step6_2 main_routine to append the Server_Upload field data to the refreshed Server_Download
+            # data (append_field_data argument only - the merged data replaces the Server_Download shapefiles).
+            import step6_2_append_field_data_to_server_download_data
+            scheduler.add('step6_2', step6_2_append_field_data_to_server_download_data.main_routine,
+                          (pastoral_districts_path, assets_dir),
+                          {'property_list': None if prop_enquire == 'ALL' else odk_all_list,
+                           'infrastructure_directory': infrastructure_directory},
+                          inputs=['server_download'], outputs=['server_download_merged'], resumable=True)
     else:
         print('You are processing offline; as such, outputs will not be filed and no previous infrastructure data will '
               'be downloaded.')
 
+    scheduler.run()
+    print('=' * 50)
+
     # print('['*50)
     # print('pastoral_districts_path: ', pastoral_districts_path)
     return processed_property_list
@@ -21,6 +21,7 @@ SOFTWARE.
 # Import modules
 import pandas as pd
 import warnings
+import run_instrumentation
 warnings.filterwarnings("ignore")
 
 
@@ -101,6 +102,7 @@ def infrastructure_water_point_fn(row, string_clean_capital_fn):
     return feature_type
 
 
+@run_instrumentation.stage_fn('step2_2_infrastructure_mapping')
 def main_routine(temp_dir, string_clean_capital_fn, feature_df, feature, date_time_fn, gps_points_fn,
                  photo_url_extraction_fn, meta_data_fn, label_comment_fn, feature_group_dict, feature_dict):
 
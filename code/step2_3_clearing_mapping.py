@@ -21,6 +21,7 @@ SOFTWARE.
 # Import modules
 import pandas as pd
 import warnings
+import run_instrumentation
 warnings.filterwarnings("ignore")
 
 
@@ -60,6 +61,7 @@ def clearing_fn(row, string_clean_capital_fn):
     return clearing_output
 
 
+@run_instrumentation.stage_fn('step2_3_clearing_mapping')
 def main_routine(temp_dir, string_clean_capital_fn, feature_df, feature, date_time_fn, gps_points_fn,
                  photo_url_extraction_fn, meta_data_fn, label_comment_fn, feature_group_dict, feature_dict):
     """ Extract the clearing variables and export a csv and shapefile.
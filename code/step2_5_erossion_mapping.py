@@ -21,6 +21,7 @@ SOFTWARE.
 # Import modules
 import pandas as pd
 import warnings
+import run_instrumentation
 warnings.filterwarnings("ignore")
 
 
@@ -72,6 +73,7 @@ def concat_list_to_df_fn(list_a):
     return df_concat
 
 
+@run_instrumentation.stage_fn('step2_5_erossion_mapping')
 def main_routine(temp_dir, string_clean_capital_fn, feature_df, feature, date_time_fn, gps_points_fn,
                  photo_url_extraction_fn, meta_data_fn, label_comment_fn, feature_group_dict, feature_dict):
     """ Extract the erosion variables and export a csv and shapefile.
@@ -20,10 +20,38 @@ SOFTWARE.
 
 # Import modules
 
+import os
 import pandas as pd
 import warnings
+import run_instrumentation
 warnings.filterwarnings("ignore")
 
+# weeds_list.csv files read by this process - keyed by file path and validated against the file modification time.
+weeds_cache_dict = {}
+
+
+def weeds_list_fn(weeds_bot_com):
+    """ Read the weeds list once and return the cached dataframe until the file is modified.
+
+    :param weeds_bot_com: pandas dataframe object (returned as is) or string object containing the path to the
+    weeds_list.csv file.
+    :return weeds: pandas dataframe object containing the botanical and common weed names.
+    """
+
+    if isinstance(weeds_bot_com, pd.DataFrame):
+        return weeds_bot_com
+
+    mtime = os.path.getmtime(weeds_bot_com)
+    cached = weeds_cache_dict.get(weeds_bot_com)
+    if cached is None or cached[0] != mtime:
+        # import weeds_list csv which contains all weed botanical and common names from the NT weeds database.
+        weeds = pd.read_csv(weeds_bot_com, delimiter="\t", header=None)
+        weeds.fillna("XXXX", inplace=True)
+        weeds.columns = (["botanical", "common"])
+        weeds_cache_dict[weeds_bot_com] = (mtime, weeds)
+
+    return weeds_cache_dict[weeds_bot_com][1]
+
 
 def property_prop_tag_extraction_fn(row):
     """
@@ -122,13 +150,14 @@ def concat_list_to_df_fn(list_a):
     return df_concat
 
 
+@run_instrumentation.stage_fn('step2_6_weeds_mapping')
 def main_routine(temp_dir, string_clean_capital_fn, feature_df, feature, date_time_fn, gps_points_fn,
                  photo_url_extraction_fn, meta_data_fn, label_comment_fn, feature_group_dict, feature_dict,
                  weeds_bot_com):
     """ Extract the paddock variables and export a csv and shapefile.
 
-    :param weeds_bot_com: string object containing the path to the weeds_list.csv file
-    - file contains all known botanical and common weeds names.
+    :param weeds_bot_com: string object containing the path to the weeds_list.csv file (or the dataframe returned by
+    weeds_list_fn) - file contains all known botanical and common weeds names.
     :param feature_df: pandas dataframe object that has is currently being processed - filtered on property and feature. o
     :param date_time_fn: function created in step2_1 to extract date and time data.
     :param gps_points_fn: function created in step2_1 to extract location data.
@@ -144,11 +173,8 @@ def main_routine(temp_dir, string_clean_capital_fn, feature_df, feature, date_ti
 
     final_weeds_list = []
 
-    # import weeds_list csv which contains all weed botanical and common names from the NT weeds database.
-    weeds = pd.read_csv(weeds_bot_com, delimiter="\t", header=None)
-
-    weeds.fillna("XXXX", inplace=True)
-    weeds.columns = (["botanical", "common"])
+    # call the weeds_list_fn function - the weeds list is read once per process, not once per property.
+    weeds = weeds_list_fn(weeds_bot_com)
 
     feature_df.to_csv("{0}\\weeds.csv".format(temp_dir))
     for index, row in feature_df.iterrows():
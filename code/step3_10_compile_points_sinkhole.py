@@ -21,9 +21,11 @@ SOFTWARE.
 
 # import modules
 import warnings
+import run_instrumentation
 warnings.filterwarnings("ignore")
 
 
+@run_instrumentation.stage_fn('step3_10_compile_points_sinkhole')
 def main_routine(temp_dir, feature, export_dir_path, pastoral_estate, user_df):
     """
 
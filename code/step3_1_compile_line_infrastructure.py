@@ -26,6 +26,8 @@ import math
 import numpy as np
 import geopandas as gpd
 import warnings
+import run_instrumentation
+import stage_scheduler
 
 warnings.filterwarnings("ignore")
 
@@ -191,7 +193,8 @@ def re_project_geo_df_fn(epsg, geo_df):
         crs_name = "not_defined"
 
     # Project DF to epsg value
-    projected_df = geo_df.to_crs(epsg)
+    with stage_scheduler.gis_lock:
+        projected_df = geo_df.to_crs(epsg)
 
     return projected_df, crs_name
 
@@ -208,10 +211,11 @@ def export_shapefile_fn(df, epsg, directory, i, crs_name):
     """
 
     # create offset geoDataFrame and export a shapefile lon lat set to center points.
-    gdf = gpd.GeoDataFrame(
-        df, geometry=gpd.points_from_xy(df["lon"], df["lat"]), crs=epsg)
-    shp_output = ("{0}\\{1}_points{2}.shp".format(directory, str(i), crs_name))
-    gdf.to_file(shp_output, driver="ESRI Shapefile")
+    with stage_scheduler.gis_lock:
+        gdf = gpd.GeoDataFrame(
+            df, geometry=gpd.points_from_xy(df["lon"], df["lat"]), crs=epsg)
+        shp_output = ("{0}\\{1}_points{2}.shp".format(directory, str(i), crs_name))
+        gdf.to_file(shp_output, driver="ESRI Shapefile")
     # print("-", shp_output, str(i))
     return gdf
 
@@ -229,10 +233,11 @@ def export_shapefile_shift_fn(df, epsg, directory, lon, lat, crs_name, i):
     :return gdf: geo-dataframe object created from the pandas dataframe.
     """
     # create offset geoDataFrame and export a shapefile lon lat set to center points.
-    gdf = gpd.GeoDataFrame(
-        df, geometry=gpd.points_from_xy(df[lon], df[lat]), crs=epsg)
-    shp_output = ("{0}\\points_dest_{1}_{2}.shp".format(directory, str(i), crs_name))
-    gdf.to_file(shp_output, driver="ESRI Shapefile")
+    with stage_scheduler.gis_lock:
+        gdf = gpd.GeoDataFrame(
+            df, geometry=gpd.points_from_xy(df[lon], df[lat]), crs=epsg)
+        shp_output = ("{0}\\points_dest_{1}_{2}.shp".format(directory, str(i), crs_name))
+        gdf.to_file(shp_output, driver="ESRI Shapefile")
     # print("-", shp_output)
     return gdf
 
@@ -342,10 +347,11 @@ def export_shapefile_shift2_fn(df, epsg, directory, lon, lat, crs_name, orig):
     """
 
     # create offset geoDataFrame and export a shapefile lon lat set to center points.
-    gdf = gpd.GeoDataFrame(
-        df, geometry=gpd.points_from_xy(df[lon], df[lat]), crs=epsg)
-    shp_output = ("{0}\\points_{1}_{2}.shp".format(directory, orig, crs_name))
-    gdf.to_file(shp_output, driver="ESRI Shapefile")
+    with stage_scheduler.gis_lock:
+        gdf = gpd.GeoDataFrame(
+            df, geometry=gpd.points_from_xy(df[lon], df[lat]), crs=epsg)
+        shp_output = ("{0}\\points_{1}_{2}.shp".format(directory, orig, crs_name))
+        gdf.to_file(shp_output, driver="ESRI Shapefile")
     # print("-", shp_output)
     return gdf
 
@@ -364,17 +370,18 @@ def convert_to_line_fn(df_subset, directory, uif_number, Point, LineString, epsg
     """
     # zip the coordinates into a point object and convert to a GeoData Frame
     geometry = [Point(xy) for xy in zip(df_subset[location + "_easting"], df_subset[location + "_northing"])]
-    geo_df = gpd.GeoDataFrame(df_subset, geometry=geometry, crs=epsg_int)
+    with stage_scheduler.gis_lock:
+        geo_df = gpd.GeoDataFrame(df_subset, geometry=geometry, crs=epsg_int)
 
     geo_df2 = \
     geo_df.groupby(["uid_feature", "feature_group", "feature", "label", "date_rec", "district", "property", "prop_code",
                     "source", "length_m", "display", "comment"])["geometry"].apply(
         lambda x: LineString(x.tolist()))  # "area_km2",
 
-    geo_df2 = gpd.GeoDataFrame(geo_df2, geometry="geometry", crs=epsg_int)
-
-    geo_df2.to_file("{0}\\shapefile\\line_{1}_{2}_{3}.shp".format(directory, str(uif_number), str(epsg_int),
-                                                                  str(location)), driver="ESRI Shapefile")
+    with stage_scheduler.gis_lock:
+        geo_df2 = gpd.GeoDataFrame(geo_df2, geometry="geometry", crs=epsg_int)
+        geo_df2.to_file("{0}\\shapefile\\line_{1}_{2}_{3}.shp".format(directory, str(uif_number), str(epsg_int),
+                                                                      str(location)), driver="ESRI Shapefile")
 
     return geo_df2
 
@@ -418,6 +425,7 @@ def get_distances(coordinates):
     return pd.DataFrame(distances)
 
 
+@run_instrumentation.stage_fn('step3_1_compile_line_infrastructure')
 def main_routine(temp_dir, feature, export_dir_path):
     # import modules
     import pandas as pd
@@ -427,7 +435,8 @@ def main_routine(temp_dir, feature, export_dir_path):
     # create variable directory containing the path to previously exported csv files.
     directory_lines_point = "{0}\\lines_point".format(temp_dir)
 
-    os.mkdir(directory_lines_point)
+    if not os.path.exists(directory_lines_point):
+        os.mkdir(directory_lines_point)
 
     # create variable directory containing the path to previously exported csv files.
     directory = "{0}\\infra_lines".format(temp_dir)
@@ -616,8 +625,9 @@ def main_routine(temp_dir, feature, export_dir_path):
                             else:
                                 dest_wgs84z52_list.append(lines_gdf)
 
-                            lines_gdf.to_file("{0}\\line_output_{1}_WGS84z52.shp".format(directory, location),
-                                              driver="ESRI Shapefile")
+                            with stage_scheduler.gis_lock:
+                                lines_gdf.to_file("{0}\\line_output_{1}_WGS84z52.shp".format(directory, location),
+                                                  driver="ESRI Shapefile")
 
                     for uif_number in df_concat_length_WGS84z53.uid_feature.unique():
                         subset_df = df_concat_length_WGS84z53[df_concat_length_WGS84z53["uid_feature"] == uif_number]
@@ -632,8 +642,9 @@ def main_routine(temp_dir, feature, export_dir_path):
                                 orig_wgs84z53_list.append(lines_gdf)
                             else:
                                 dest_wgs84z53_list.append(lines_gdf)
-                            lines_gdf.to_file("{0}\\line_output_{1}_WGS84z53.shp".format(directory, location),
-                                              driver="ESRI Shapefile")
+                            with stage_scheduler.gis_lock:
+                                lines_gdf.to_file("{0}\\line_output_{1}_WGS84z53.shp".format(directory, location),
+                                                  driver="ESRI Shapefile")
 
                 # --------------------------------------------- Origin -----------------------------------------------------
 
@@ -695,16 +706,20 @@ def main_routine(temp_dir, feature, export_dir_path):
 
                 # print('lines zone 52')
                 df_concat_line_dest_wgs84z52 = concat_list_to_df_fn(dest_wgs84z52_list)
-                df_concat_line_dest_wgs84z52.to_file("{0}\\destination_line__WGS84z52.shp".format(directory),
-                                                     driver="ESRI Shapefile")
+                with stage_scheduler.gis_lock:
+                    df_concat_line_dest_wgs84z52.to_file("{0}\\destination_line__WGS84z52.shp".format(directory),
+                                                         driver="ESRI Shapefile")
 
-                projected_df52 = df_concat_line_dest_wgs84z52.to_crs(epsg=4283)
+                with stage_scheduler.gis_lock:
+                    projected_df52 = df_concat_line_dest_wgs84z52.to_crs(epsg=4283)
                 # print('projected_df52: ', list(projected_df52.columns))
                 projected_df52.to_csv("{0}\\csv\\infra_line_dest_52_to_GDA94.csv".format(export_dir))
-                projected_df52.to_file("{0}\\temp_infra_line_dest_52_to_GDA94.shp".format(temp_dir),
-                                       driver="ESRI Shapefile")
+                with stage_scheduler.gis_lock:
+                    projected_df52.to_file("{0}\\temp_infra_line_dest_52_to_GDA94.shp".format(temp_dir),
+                                           driver="ESRI Shapefile")
 
-                new_proj52 = gpd.read_file("{0}\\temp_infra_line_dest_52_to_GDA94.shp".format(temp_dir))
+                with stage_scheduler.gis_lock:
+                    new_proj52 = gpd.read_file("{0}\\temp_infra_line_dest_52_to_GDA94.shp".format(temp_dir))
 
                 new_proj52.drop(["uid_featur"], axis=1, inplace=True)
                 new_proj52.insert(4, "DATECURR", np.nan)
@@ -721,22 +736,27 @@ def main_routine(temp_dir, feature, export_dir_path):
                 new_proj52.insert(14, 'STATUS', 'Raw')
 
                 # print('new_project52 insert: ', list(new_proj52.columns))
-                new_proj52.to_file("{0}\\shapefile\\infra_line_dest_52_to_GDA94.shp".format(export_dir),
-                                   driver="ESRI Shapefile")
+                with stage_scheduler.gis_lock:
+                    new_proj52.to_file("{0}\\shapefile\\infra_line_dest_52_to_GDA94.shp".format(export_dir),
+                                       driver="ESRI Shapefile")
 
 
                 # print('lines zone 53')
                 df_concat_line_dest_wgs84z53 = concat_list_to_df_fn(dest_wgs84z53_list)
-                df_concat_line_dest_wgs84z53.to_file("{0}\\destination_line_WGS84z53.shp".format(directory),
-                                                     driver="ESRI Shapefile")
+                with stage_scheduler.gis_lock:
+                    df_concat_line_dest_wgs84z53.to_file("{0}\\destination_line_WGS84z53.shp".format(directory),
+                                                         driver="ESRI Shapefile")
 
-                projected_df53 = df_concat_line_dest_wgs84z53.to_crs(epsg=4283)
+                with stage_scheduler.gis_lock:
+                    projected_df53 = df_concat_line_dest_wgs84z53.to_crs(epsg=4283)
                 projected_df53.to_csv(export_dir + "\\csv\\infra_line_dest_53_to_GDA94.csv")
                 # export shapefile to temp folder - not allowing column names to be changed.
-                projected_df53.to_file(temp_dir + "\\temp_infra_line_dest_53_to_GDA94.shp",
-                                       driver="ESRI Shapefile")
+                with stage_scheduler.gis_lock:
+                    projected_df53.to_file(temp_dir + "\\temp_infra_line_dest_53_to_GDA94.shp",
+                                           driver="ESRI Shapefile")
 
-                new_proj53 = gpd.read_file("{0}\\temp_infra_line_dest_53_to_GDA94.shp".format(temp_dir))
+                with stage_scheduler.gis_lock:
+                    new_proj53 = gpd.read_file("{0}\\temp_infra_line_dest_53_to_GDA94.shp".format(temp_dir))
 
                 new_proj53.drop(["uid_featur"], axis=1, inplace=True)
                 new_proj53.insert(4, "DATECURR", np.nan)
@@ -751,16 +771,18 @@ def main_routine(temp_dir, feature, export_dir_path):
                 new_proj53.insert(13, "DELETE", 0)
                 new_proj53.insert(14, 'STATUS', 'Raw')
                 # print('new_project53 insert: ', list(new_proj53.columns))
-                new_proj53.to_file("{0}\\shapefile\\infra_line_dest_53_to_GDA94.shp".format(export_dir),
-                                   driver="ESRI Shapefile")
+                with stage_scheduler.gis_lock:
+                    new_proj53.to_file("{0}\\shapefile\\infra_line_dest_53_to_GDA94.shp".format(export_dir),
+                                       driver="ESRI Shapefile")
 
                 '''import fiona
                 corporate_lines = fiona.open(r"E:\DENR\code\rangeland_monitoring\rmb_mapping_pipeline\assets\shapefiles\output_templates\mapping_pipeline_lines.shp")
                 corp_schema = corporate_lines.schema
                 print(corp_schema)'''
 
-                new_proj53.to_file(r"Z:\Scratch\Zonal_Stats_Pipeline\rmb_infrastructure_upload\test53.shp",
-                                   driver="ESRI Shapefile")  # , schema=corp_schema)
+                with stage_scheduler.gis_lock:
+                    new_proj53.to_file(r"Z:\Scratch\Zonal_Stats_Pipeline\rmb_infrastructure_upload\test53.shp",
+                                       driver="ESRI Shapefile")  # , schema=corp_schema)
                 # ----------------------------------------- distance of shapefile ------------------------------------------
 
                 """import distance
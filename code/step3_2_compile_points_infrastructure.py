@@ -20,10 +20,12 @@ SOFTWARE.
 
 # import modules
 import warnings
+import run_instrumentation
 
 warnings.filterwarnings("ignore")
 
 
+@run_instrumentation.stage_fn('step3_2_compile_points_infrastructure')
 def main_routine(temp_dir, feature, export_dir_path, pastoral_estate, user_df):
 
     """
@@ -20,8 +20,10 @@ SOFTWARE.
 
 # import modules
 import warnings
+import run_instrumentation
 warnings.filterwarnings("ignore")
 
+@run_instrumentation.stage_fn('step3_4_compile_points_paddock')
 def main_routine(temp_dir, feature, export_dir_path, pastoral_estate, user_df):
     """
 
@@ -21,9 +21,11 @@ SOFTWARE.
 
 # import modules
 import warnings
+import run_instrumentation
 warnings.filterwarnings("ignore")
 
 
+@run_instrumentation.stage_fn('step3_7_compile_points_woody_thickening')
 def main_routine(temp_dir, feature, export_dir_path, pastoral_estate, user_df):
     """
 
@@ -28,6 +28,8 @@ import numpy as np
 import geopandas as gpd
 # import modules
 import warnings
+import run_instrumentation
+import stage_scheduler
 
 warnings.filterwarnings("ignore")
 
@@ -178,7 +180,8 @@ def re_project_geo_df_fn(epsg, geo_df):
         crs_output = new_dict
 
     # Project DF to epsg value
-    projected_df = geo_df.to_crs(epsg)
+    with stage_scheduler.gis_lock:
+        projected_df = geo_df.to_crs(epsg)
 
     return projected_df, crs_name
 
@@ -195,10 +198,11 @@ def export_shapefile_fn(df, epsg, directory, i, n, crs_name):
     :return:
     """
     # create offset geoDataFrame and export a shapefile lon lat set to center points.
-    gdf = gpd.GeoDataFrame(
-        df, geometry=gpd.points_from_xy(df["lon" + n], df["lat" + n]), crs=epsg)
-    shp_output = (directory + "\\" + str(i) + "_points" + n + "_" + crs_name + ".shp")
-    gdf.to_file(shp_output, driver="ESRI Shapefile")
+    with stage_scheduler.gis_lock:
+        gdf = gpd.GeoDataFrame(
+            df, geometry=gpd.points_from_xy(df["lon" + n], df["lat" + n]), crs=epsg)
+        shp_output = (directory + "\\" + str(i) + "_points" + n + "_" + crs_name + ".shp")
+        gdf.to_file(shp_output, driver="ESRI Shapefile")
     return gdf
 
 
@@ -215,10 +219,11 @@ def export_shapefile_shift_fn(df, epsg, directory, lon, lat, crs_name, i):
     :return:
     """
     # create offset geoDataFrame and export a shapefile lon lat set to center points.
-    gdf = gpd.GeoDataFrame(
-        df, geometry=gpd.points_from_xy(df[lon], df[lat]), crs=epsg)
-    shp_output = (directory + "\\" + "points_dest" + str(i) + "_" + crs_name + ".shp")
-    gdf.to_file(shp_output, driver="ESRI Shapefile")
+    with stage_scheduler.gis_lock:
+        gdf = gpd.GeoDataFrame(
+            df, geometry=gpd.points_from_xy(df[lon], df[lat]), crs=epsg)
+        shp_output = (directory + "\\" + "points_dest" + str(i) + "_" + crs_name + ".shp")
+        gdf.to_file(shp_output, driver="ESRI Shapefile")
     return gdf
 
 
@@ -235,10 +240,11 @@ def export_shapefile_shift2_fn(df, epsg, directory, lon, lat, crs_name, orig):
     :return:
     """
     # create offset geoDataFrame and export a shapefile lon lat set to center points.
-    gdf = gpd.GeoDataFrame(
-        df, geometry=gpd.points_from_xy(df[lon], df[lat]), crs=epsg)
-    shp_output = (directory + "\\" + "points_" + orig + "_" + crs_name + ".shp")
-    gdf.to_file(shp_output, driver="ESRI Shapefile")
+    with stage_scheduler.gis_lock:
+        gdf = gpd.GeoDataFrame(
+            df, geometry=gpd.points_from_xy(df[lon], df[lat]), crs=epsg)
+        shp_output = (directory + "\\" + "points_" + orig + "_" + crs_name + ".shp")
+        gdf.to_file(shp_output, driver="ESRI Shapefile")
 
     return gdf
 
@@ -327,6 +333,7 @@ def add_destination_variables(projected_gdf, l_sin, l_cos, dest_easting, dest_no
     return projected_gdf
 
 
+@run_instrumentation.stage_fn('step4_1_points_orig_to_destination')
 def main_routine(temp_dir, feature_name, export_dir_path, subset_list, projected_gdf_dest_list,
                  orig_drop_list, dest_drop_list, photo_subset_list, pastoral_estate, user_df):
     """
@@ -384,7 +391,10 @@ def main_routine(temp_dir, feature_name, export_dir_path, subset_list, projected
             df_subset["dist1"] = df_subset["dist1"].fillna(0)
             df_subset["bear1"] = df_subset["bear1"].fillna(0)
             # df_subset.to_csv(r"Z:\Scratch\Zonal_Stats_Pipeline\rmb_mapping\test" + feature_name + ".csv")
-            df_photo = df_subset[photo_subset_list]
+            # carry the origin and offset through to the photo csv for the photo_exif_index location cross check.
+            photo_column_list = photo_subset_list + [i for i in ["lat1", "lon1", "dist1", "bear1"]
+                                                     if i not in photo_subset_list and i in df_subset.columns]
+            df_photo = df_subset[photo_column_list]
             df_photo.to_csv(export_dir + "\\csv\\" + feature_name + "_photo.csv")
 
             dest_gdf_wgsz52_list = []
@@ -540,8 +550,10 @@ def main_routine(temp_dir, feature_name, export_dir_path, subset_list, projected
                 df_dest52_final = df_dest52_final.replace("Nan", np.nan)
 
                 # export shapefile to export directory
-                df_dest52_final.to_file(export_dir + "\\shapefile\\" + feature_name + "_dest_52_to_GDA94.shp",
-                                        driver="ESRI Shapefile")
+                with stage_scheduler.gis_lock:
+                    df_dest52_final.to_file(export_dir + "\\shapefile\\" + feature_name + "_dest_52_to_GDA94.shp",
+                                            driver="ESRI Shapefile")
+                run_instrumentation.count_fn('rows_out', len(df_dest52_final.index))
                 # df_dest52_final['uid'] = df_dest52_final.index + 1
                 df_dest52_final.to_csv(
                     export_dir + "\\csv\\" + feature_name + "_dest_52_to_GDA94.csv")  # , index_col = False)
@@ -638,8 +650,10 @@ def main_routine(temp_dir, feature_name, export_dir_path, subset_list, projected
                 df_dest53_final = df_dest53_final.replace("Nan", np.nan)
 
                 # export shapefile to export directory
-                df_dest53_final.to_file("{0}\\shapefile\\{1}_dest_53_to_GDA94.shp".format(export_dir, feature_name),
-                                        driver="ESRI Shapefile")
+                with stage_scheduler.gis_lock:
+                    df_dest53_final.to_file("{0}\\shapefile\\{1}_dest_53_to_GDA94.shp".format(export_dir, feature_name),
+                                            driver="ESRI Shapefile")
+                run_instrumentation.count_fn('rows_out', len(df_dest53_final.index))
                 # df_dest53_final['uid'] = df_dest52_final.index + 1
                 df_dest53_final.to_csv(
                     "{0}\\csv\\{1}_dest_53_to_GDA94.csv".format(export_dir, feature_name))  # , index_col = False)
@@ -21,10 +21,11 @@ SOFTWARE.
 # Import modules
 from __future__ import print_function, division
 import warnings
+import run_instrumentation
 from glob import glob
 import pandas as pd
 import os
-import urllib
+import download_scheduler
 warnings.filterwarnings("ignore")
 
 
@@ -71,8 +72,9 @@ def date_label_fn(date):
     return date_label
 
 
-def save_photo_fn(photo_url_list, property_name, date, feature, uid, export_dir_path):
-    """Download and save the seven transect photos_fn."""
+def save_photo_fn(photo_url_list, property_name, date, feature, uid, export_dir_path,
+                  priority=download_scheduler.POI):
+    """Queue the feature photos on the shared download scheduler (download_scheduler.wait_fn waits for them)."""
 
     photo_dir_list = []
 
@@ -106,13 +108,14 @@ def save_photo_fn(photo_url_list, property_name, date, feature, uid, export_dir_
                                                                         feature_, str(uid), str(photo_num)))
 
             photo_label_list.append(output_str)
-            urllib.request.urlretrieve(i, output_str)
+            download_scheduler.submit_fn(i, output_str, priority)
         else:
             photo_label_list.append(i)
-    n += 1
+        n += 1
     return photo_label_list
 
 
+@run_instrumentation.stage_fn('step4_2_photo_url_csv')
 def main_routine(export_dir, feature_name):
     """ Extract the site photo urls.
 
@@ -122,6 +125,13 @@ def main_routine(export_dir, feature_name):
              odk aggregate."""
 
     export_dir_path = "{0}\\photos".format(export_dir)
+
+    # infrastructure photos are downloaded ahead of the point of interest photos.
+    if feature_name in ["infra_lines", "infra_points", "infra_water_points"]:
+        priority = download_scheduler.INFRASTRUCTURE
+    else:
+        priority = download_scheduler.POI
+
     for file in glob("{0}\\csv\\*photo.csv".format(export_dir)):
 
         if file:
@@ -136,7 +146,8 @@ def main_routine(export_dir, feature_name):
                     # call photos function
                     photo_url_list, property_name, date, feature, uid = photo_url_extraction_fn(row, feature_name)
 
-                    photo_label_list = save_photo_fn(photo_url_list, property_name, date, feature, uid, export_dir_path)
+                    photo_label_list = save_photo_fn(photo_url_list, property_name, date, feature, uid, export_dir_path,
+                                                     priority)
 
                     total_photo_list.append(photo_label_list)
 
@@ -21,18 +21,77 @@ SOFTWARE.
 # Import modules
 from __future__ import print_function, division
 import warnings
+import run_instrumentation
 from glob import glob
 import pandas as pd
 import os
-import urllib
-from urllib import request
+import io
+import math
+import hashlib
+from collections import OrderedDict
+import download_scheduler
+import stage_scheduler
 from docx import Document
 from docx.shared import Cm
+import numpy as np
 import geopandas as gpd
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
 warnings.filterwarnings("ignore")
 
+species_template_path = r'E:\DEPWS\code\rangeland_monitoring\rmb_mapping_pipeline\assets\species_request.docx'
+contact_details_path = r'E:\DEPWS\code\rangeland_monitoring\rmb_mapping_pipeline\assets\contact_details.csv'
+
+# assets read once per run - keyed by file path and validated against the file modification time.
+asset_cache_dict = {}
+
+
+def cached_asset_fn(file_path, loader):
+    """ Load an asset file once and return the cached object until the file is modified.
+
+    :param file_path: string object containing the path to the asset file.
+    :param loader: function that reads the file path and returns the loaded object.
+    :return asset: object returned by loader.
+    """
+
+    mtime = os.path.getmtime(file_path)
+    cached = asset_cache_dict.get(file_path)
+    if cached is None or cached[0] != mtime:
+        asset_cache_dict[file_path] = (mtime, loader(file_path))
+
+    return asset_cache_dict[file_path][1]
+
+
+def read_bytes_fn(file_path):
+    """ Read a file into memory.
+
+    :param file_path: string object containing the path to the file.
+    :return data: bytes object containing the file contents.
+    """
+
+    with open(file_path, 'rb') as f:
+        data = f.read()
+
+    return data
+
+
+def contact_details_fn(user_df):
+    """ Return the contact details dataframe, reading the csv once when a path is supplied.
+
+    :param user_df: pandas dataframe object or string object containing the path to contact_details.csv.
+    :return contact_df: pandas dataframe object containing the contact details.
+    """
+
+    if isinstance(user_df, pd.DataFrame):
+        contact_df = user_df
+    else:
+        if not user_df or not os.path.isfile(user_df):
+            user_df = contact_details_path
+        contact_df = cached_asset_fn(user_df, pd.read_csv)
+
+    return contact_df
+
 
 def user_id_fn(user_df):
     """ Extract the user id stripping of adm when on the remote desktop.
@@ -86,7 +145,7 @@ def photos_download_fn(uid_df, document, export_dir, sample_label_list):
             sample_name = str(sample_label_list[i]).replace(' ', '_')
 
             output_str = export_dir + '\\sample' + str(i) + '_' + sample_name + '_photo.jpg'
-            request.urlretrieve(sample_photo, output_str)
+            download_scheduler.download_fn(sample_photo, output_str, download_scheduler.DOCUMENT)
             document.add_picture(output_str, width=Cm(6))
             document.add_paragraph('Sample1: , ' + str(sample_label_list[i]))
 
@@ -95,14 +154,107 @@ def photos_download_fn(uid_df, document, export_dir, sample_label_list):
     return document
 
 
+def valid_photo_url_fn(value):
+    """ Check whether a photo field contains a url.
+
+    :param value: object containing the photo field value.
+    :return: boolean object - True if the field holds a url.
+    """
+
+    return str(value) not in ['nan', 'Nan', 'BLANK', '']
+
+
+def photo_path_fn(export_dir, prop_code, date_label, photo_name, uid):
+    """ Create the output path of a specimen photograph.
+
+    :param export_dir: string object containing the path to the photos directory.
+    :param prop_code: string object containing the property tag.
+    :param date_label: string object containing the date label (YYYYMMDD).
+    :param photo_name: string object containing the photo type (i.e. habit1, roots).
+    :param uid: integer object containing the specimen unique identifier.
+    :return output_str: string object containing the photo path.
+    """
+
+    output_str = "{0}\\{1}_{2}_{3}_uid{4}_photo.jpg".format(export_dir.rstrip('\\'), prop_code, date_label,
+                                                          photo_name, str(uid))
+
+    return output_str
+
+
+def specimen_photo_list_fn(uid_df, export_dir, uid, prop_code, date_label):
+    """ List every photograph inserted into a species identification request.
+
+    :param uid_df: geo-dataframe object containing the specimen observation.
+    :param export_dir: string object containing the path to the photos directory.
+    :param uid: integer object containing the specimen unique identifier.
+    :param prop_code: string object containing the property tag.
+    :param date_label: string object containing the date label (YYYYMMDD).
+    :return photo_list: list object containing (url, output path) tuples.
+    """
+
+    photo_list = []
+
+    for n in range(3):
+        url = uid_df['photo' + str(n + 1)].iloc[0]
+        if valid_photo_url_fn(url):
+            photo_list.append((str(url), photo_path_fn(export_dir, prop_code, date_label, 'habit' + str(n + 1), uid)))
+
+        url = uid_df['sample' + str(n + 1) + '_photo'].iloc[0]
+        if valid_photo_url_fn(url):
+            photo_list.append((str(url), photo_path_fn(export_dir, prop_code, date_label, 'sample' + str(n + 1), uid)))
+
+    photo_type_list = ['roots', 'cork', 'cork_colour', 'leaf', 'flower_colour', 'flower_cluster', 'fruit', 'seed',
+                       'latex']
+    if uid_df['habit'].iloc[0] == 'Grass':
+        photo_type_list.extend(['grass_head', 'grass_flower', 'grass_spikelet', 'grass_awn'])
+
+    for photo_type in photo_type_list:
+        url = uid_df[photo_type + '_photo'].iloc[0]
+        if valid_photo_url_fn(url):
+            photo_list.append((str(url), photo_path_fn(export_dir, prop_code, date_label, photo_type, uid)))
+
+    return photo_list
+
+
+def fetch_photo_fn(url, output_str):
+    """ Download a photograph at document priority unless it has already been downloaded (i.e. by prefetch_photos_fn).
+
+    :param url: string object containing the photo url.
+    :param output_str: string object containing the photo output path.
+    :return output_str: string object containing the photo output path.
+    """
+
+    if not os.path.isfile(output_str):
+        download_scheduler.download_fn(url, output_str, download_scheduler.DOCUMENT)
+
+    return output_str
+
+
+def prefetch_photos_fn(photo_list):
+    """ Queue all specimen photographs at document priority (ahead of any queued feature photos) and wait for them.
+
+    Failed downloads are reported and left for fetch_photo_fn to retry while the document is built.
+
+    :param photo_list: list object containing (url, output path) tuples.
+    """
+
+    future_list = [(url, download_scheduler.submit_fn(url, output_str, download_scheduler.DOCUMENT))
+                   for url, output_str in photo_list]
+
+    for url, future in future_list:
+        try:
+            future.result()
+        except Exception as err:
+            print(' -- photo download failed: ', url, err)
+
+
 def photo_download_and_insertion_range_loop_fn(column_name, photo_file_name, text_field, document, uid_df, export_dir,
                                                uid, prop_code, date_label):
     for n in range(3):
 
-        if str(uid_df[column_name + str(n + 1)].iloc[0]) != 'nan':
-            output_str = export_dir + '\\' + prop_code + '_' + date_label + '_' + photo_file_name + '_uid' + str(
-                uid) + '_photo.jpg'
-            request.urlretrieve(str(uid_df[column_name + str(n + 1)].iloc[0]), output_str)
+        if valid_photo_url_fn(uid_df[column_name + str(n + 1)].iloc[0]):
+            output_str = photo_path_fn(export_dir, prop_code, date_label, photo_file_name + str(n + 1), uid)
+            fetch_photo_fn(str(uid_df[column_name + str(n + 1)].iloc[0]), output_str)
             document.add_picture(output_str, width=Cm(6))
             paragraph = document.add_paragraph(text_field + (str(n + 1)))
 
@@ -113,12 +265,11 @@ def photo_download_and_insertion_range_loop2_fn(column_name, column_name_end, ph
                                                 uid_df, export_dir, uid, prop_code, date_label):
     for n in range(3):
 
-        if str(uid_df[column_name + str(n + 1) + '_' + column_name_end].iloc[0]) != 'nan':
+        if valid_photo_url_fn(uid_df[column_name + str(n + 1) + '_' + column_name_end].iloc[0]):
             if n == 0:
                 paragraph = document.add_paragraph('The following samples were taken.')
-            output_str = export_dir + '\\' + prop_code + '-' + date_label + '_' + photo_file_name + '_uid' + str(
-                uid) + '_photo.jpg'
-            request.urlretrieve(str(uid_df[column_name + str(n + 1) + '_' + column_name_end].iloc[0]), output_str)
+            output_str = photo_path_fn(export_dir, prop_code, date_label, photo_file_name + str(n + 1), uid)
+            fetch_photo_fn(str(uid_df[column_name + str(n + 1) + '_' + column_name_end].iloc[0]), output_str)
             document.add_picture(output_str, width=Cm(6))
             paragraph = document.add_paragraph(text_field + (str(n + 1)))
 
@@ -126,14 +277,9 @@ def photo_download_and_insertion_range_loop2_fn(column_name, column_name_end, ph
 
 
 def single_photo_download_and_insertion_fn(photo_type, export_dir, uid, uid_df, document, prop_code, date_label):
-    if str(uid_df[photo_type + '_photo'].iloc[0]) == 'nan':
-        pass
-    elif str(uid_df[photo_type + '_photo'].iloc[0]) == 'Nan':
-        pass
-    else:
-        output_str = export_dir + '\\' + prop_code + '_' + date_label + '_' + photo_type + '_uid' + str(
-            uid) + '_photo.jpg'
-        request.urlretrieve(str(uid_df[photo_type + '_photo'].iloc[0]), output_str)
+    if valid_photo_url_fn(uid_df[photo_type + '_photo'].iloc[0]):
+        output_str = photo_path_fn(export_dir, prop_code, date_label, photo_type, uid)
+        fetch_photo_fn(str(uid_df[photo_type + '_photo'].iloc[0]), output_str)
         document.add_picture(output_str, width=Cm(6))
 
     return document
@@ -189,226 +335,393 @@ def date_label_fn(date):
     return date_label
 
 
-def plot_point_on_property(pastoral_estate, prop_code, export_dir, uid_df, uid):
-    # extract eastings and northing values for geometry feature
-    '''row["easting"] = row["geometry"].x
-    row["northing"] = row["geometry"].y'''
+# rendered property basemaps, keyed by pastoral estate geometry digest and property tag (see property_basemap_fn) -
+# the least recently used are released beyond basemap_cache_size (each holds two ~1400 px RGBA rasters).
+basemap_cache_dict = OrderedDict()
+basemap_cache_size = 8
 
-    prop_gdf = pastoral_estate[pastoral_estate["PROP_TAG"] == prop_code]
 
-    if len(prop_gdf.index) > 0:
+def estate_key_fn(pastoral_estate):
+    """ Digest the pastoral estate projection and geometry - the basemap cache key of an estate, unchanged while the
+    boundaries are unchanged whichever object or file they are read from.
 
-        # extract property name in title case.
-        prop_name = (pastoral_estate.loc[pastoral_estate["PROP_TAG"] == prop_code, "PROPERTY"].item()).title()
+    :param pastoral_estate: geo-dataframe object containing the pastoral estate boundaries.
+    :return estate_key: string object containing the md5 hex digest.
+    """
 
-        # create two subplots
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6), constrained_layout=True)
-        fig.suptitle('Locality and location of unidentified species (' + prop_name + ')', fontsize=20)
+    digest = hashlib.md5(str(pastoral_estate.crs).encode('utf-8'))
+    for geometry in pastoral_estate.geometry:
+        digest.update(b'' if geometry is None else geometry.wkb)
 
-        prop_bounds = prop_gdf.geometry.total_bounds
-        prop_gdf.reset_index(drop=True, inplace=True)
+    return digest.hexdigest()
 
-        # set plot styles
-        pastoral_estate.plot(ax=ax1, facecolor='gray')
-        prop_gdf.plot(ax=ax1, facecolor='red')
 
-        prop_bounds = prop_gdf.geometry.total_bounds
+def map_aspect_fn(gdf, extent):
+    """ Calculate the y/x aspect ratio geopandas applies when plotting a geo-dataframe.
 
-        # set plot extent based on the property +- 0.8 dd.
-        xlim = ([prop_gdf.total_bounds[0] - 0.08, prop_gdf.total_bounds[2] + 0.08])
-        ylim = ([prop_gdf.total_bounds[1] - 0.08, prop_gdf.total_bounds[3] + 0.08])
-        ax2.set_xlim(xlim)
-        ax2.set_ylim(ylim)
-        # set plot styles
-        pastoral_estate.plot(ax=ax2, facecolor='gray')
+    :param gdf: geo-dataframe object being plotted.
+    :param extent: list object containing the plot extent (minx, miny, maxx, maxy).
+    :return aspect: float object containing the aspect ratio (1 for projected data).
+    """
 
-        prop_gdf.plot(ax=ax2, facecolor='red')
+    if gdf.crs is not None and gdf.crs.is_geographic:
+        mid_lat = (extent[1] + extent[3]) / 2.0
+        aspect = 1.0 / math.cos(math.radians(mid_lat))
+    else:
+        aspect = 1.0
+
+    return aspect
+
+
+def render_basemap_fn(pastoral_estate, prop_gdf, extent, aspect, width_px=1400):
+    """ Render the pastoral estate (grey) and the property (red) to an RGBA raster covering extent.
+
+    The figure is drawn with its own Agg canvas and cleared before returning. GeoDataFrame.plot still calls
+    plt.draw() on the current pyplot figure, so callers hold stage_scheduler.gis_lock.
+
+    :param pastoral_estate: geo-dataframe object containing the pastoral estate boundaries.
+    :param prop_gdf: geo-dataframe object containing the property boundary.
+    :param extent: list object containing the raster extent (minx, miny, maxx, maxy).
+    :param aspect: float object containing the y/x aspect ratio of the map.
+    :param width_px: integer object containing the raster width in pixels.
+    :return raster: numpy array object (rows, columns, 4) containing the rendered basemap.
+    """
+
+    x_range = extent[2] - extent[0]
+    y_range = (extent[3] - extent[1]) * aspect
+    height_px = max(int(round(width_px * y_range / x_range)), 1)
+
+    fig = Figure(figsize=(width_px / 100.0, height_px / 100.0), dpi=100)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
 
-        uid_df.plot(ax=ax2, color='black', markersize=8)
+    pastoral_estate.plot(ax=ax, facecolor='gray')
+    prop_gdf.plot(ax=ax, facecolor='red')
 
-        # set the spacing between subplots
-        plt.subplot_tool()
+    # the axes fill the figure so each pixel maps to a known location within extent.
+    ax.set_xlim(extent[0], extent[2])
+    ax.set_ylim(extent[1], extent[3])
+    ax.set_aspect('auto')
 
-        # export plots
-        export_file_str = export_dir + "\\" + prop_code + '_location_uid' + str(uid) + ".jpg"
-        plt.tight_layout()
-        plt.savefig(export_file_str)
+    canvas.draw()
+    raster = np.asarray(canvas.buffer_rgba()).copy()
+    fig.clear()
 
+    return raster
+
+
+def property_basemap_fn(pastoral_estate, prop_gdf, prop_code, estate_key=None):
+    """ Return the locality and zoomed basemaps for a property, rendering them on first use only.
+
+    :param pastoral_estate: geo-dataframe object containing the pastoral estate boundaries.
+    :param prop_gdf: geo-dataframe object containing the property boundary.
+    :param prop_code: string object containing the property tag.
+    :param estate_key: string object returned by estate_key_fn (None = digest pastoral_estate).
+    :return basemap_dict: dictionary object containing a (raster, extent, aspect) tuple for the "locality" and "zoom"
+    panels.
+    """
+
+    if estate_key is None:
+        estate_key = estate_key_fn(pastoral_estate)
+
+    cache_key = (estate_key, prop_code)
+    if cache_key in basemap_cache_dict:
+        basemap_cache_dict.move_to_end(cache_key)
     else:
-        export_file_str = 'nan'
-        prop_name = 'Non_pastoral_property'
-        pass
+
+        # locality panel covers the pastoral estate with a 5% margin (matches the matplotlib autoscale margin).
+        estate_bounds = pastoral_estate.geometry.total_bounds
+        x_margin = (estate_bounds[2] - estate_bounds[0]) * 0.05
+        y_margin = (estate_bounds[3] - estate_bounds[1]) * 0.05
+        locality_extent = [estate_bounds[0] - x_margin, estate_bounds[1] - y_margin,
+                           estate_bounds[2] + x_margin, estate_bounds[3] + y_margin]
+
+        # zoomed panel covers the property +- 0.08 dd.
+        prop_bounds = prop_gdf.geometry.total_bounds
+        zoom_extent = [prop_bounds[0] - 0.08, prop_bounds[1] - 0.08, prop_bounds[2] + 0.08, prop_bounds[3] + 0.08]
+
+        basemap_dict = {}
+        for panel, extent in [('locality', locality_extent), ('zoom', zoom_extent)]:
+            aspect = map_aspect_fn(pastoral_estate, extent)
+            raster = render_basemap_fn(pastoral_estate, prop_gdf, extent, aspect)
+            basemap_dict[panel] = (raster, extent, aspect)
+
+        basemap_cache_dict[cache_key] = basemap_dict
+        while len(basemap_cache_dict) > basemap_cache_size:
+            basemap_cache_dict.popitem(last=False)
+
+    return basemap_cache_dict[cache_key]
+
+
+def plot_point_on_property(pastoral_estate, prop_code, export_dir, uid_df, uid, estate_key=None):
+    """ Export a locality and location map of an unidentified specimen.
+
+    The property basemaps are rendered once (property_basemap_fn); each specimen map composites those rasters and
+    overlays the specimen location.
+
+    :param pastoral_estate: geo-dataframe object containing the pastoral estate boundaries.
+    :param prop_code: string object containing the property tag.
+    :param export_dir: string object containing the path to the photos directory.
+    :param uid_df: geo-dataframe object containing the specimen observation.
+    :param uid: integer object containing the specimen unique identifier.
+    :param estate_key: string object returned by estate_key_fn (None = digest pastoral_estate).
+    :return export_file_str: string object containing the path to the exported map or 'nan'.
+    :return prop_name: string object containing the property name in title case.
+    """
+
+    # the basemap cache and the figures are shared by the compile stage threads - matplotlib is not thread safe.
+    with stage_scheduler.gis_lock:
+        prop_gdf = pastoral_estate[pastoral_estate["PROP_TAG"] == prop_code]
+
+        if len(prop_gdf.index) > 0:
+
+            # extract property name in title case.
+            prop_name = (pastoral_estate.loc[pastoral_estate["PROP_TAG"] == prop_code, "PROPERTY"].item()).title()
+
+            # call the property_basemap_fn function to collect the cached locality and zoomed basemaps.
+            basemap_dict = property_basemap_fn(pastoral_estate, prop_gdf, prop_code, estate_key)
+
+            # create two subplots
+            fig = Figure(figsize=(14, 6), constrained_layout=True)
+            canvas = FigureCanvasAgg(fig)
+            ax1, ax2 = fig.subplots(1, 2)
+            fig.suptitle('Locality and location of unidentified species (' + prop_name + ')', fontsize=20)
+
+            for ax, panel in [(ax1, 'locality'), (ax2, 'zoom')]:
+                raster, extent, aspect = basemap_dict[panel]
+                ax.imshow(raster, extent=(extent[0], extent[2], extent[1], extent[3]), origin='upper',
+                          interpolation='bilinear')
+                ax.set_xlim(extent[0], extent[2])
+                ax.set_ylim(extent[1], extent[3])
+                ax.set_aspect(aspect)
+
+            # overlay the specimen location on the zoomed panel.
+            ax2.scatter(uid_df.geometry.x, uid_df.geometry.y, color='black', s=8, zorder=3)
+
+            # export plots
+            export_file_str = export_dir + "\\" + prop_code + '_location_uid' + str(uid) + ".jpg"
+            canvas.print_figure(export_file_str)
+
+            # release the figure - it is not registered with pyplot, so nothing else holds a reference.
+            fig.clear()
+
+        else:
+            export_file_str = 'nan'
+            prop_name = 'Non_pastoral_property'
+            pass
 
     return export_file_str, prop_name
 
 
-def main_routine(dest52, dest53, export_dir, pastoral_estate, user_df):
-    from docx import Document
-    import numpy as np
-    form_dir = export_dir + '\\request_id_forms'
+def build_species_document_fn(job_dict, template_bytes, officer_list, export_dir, form_dir):
+    """ Build and save the species identification request for one specimen.
 
-    if not os.path.exists(form_dir):
-        os.mkdir(form_dir)
+    All photographs are expected to have been prefetched; any that are missing are downloaded here.
 
-    export_dir = export_dir + "\\photos\\"
-    user_df = pd.read_csv(r'E:\DEPWS\code\rangeland_monitoring\rmb_mapping_pipeline\assets\contact_details.csv')
+    :param job_dict: dictionary object containing the specimen variables (see main_routine).
+    :param template_bytes: bytes object containing the species_request.docx template.
+    :param officer_list: list object containing the officers name, email and phone.
+    :param export_dir: string object containing the path to the photos directory.
+    :param form_dir: string object containing the path to the request_id_forms directory.
+    :return output_path: string object containing the path to the saved document.
+    """
 
-    i = 1
-    for zone_df in [dest52, dest53]:
-        zone_df['uid'] = zone_df.index + 1
-        # unidentified_df = gdf.to_crs(epsg=4283)
+    uid_df = job_dict['uid_df']
+    uid = job_dict['uid']
+    prop_code = job_dict['prop_code']
+    date_label = job_dict['date_label']
+    name, email, phone = officer_list
 
-        # extract eastings and northing values for geometry feature
-        zone_df["longitude"] = zone_df["geometry"].x
-        zone_df["latitude"] = zone_df["geometry"].y
+    document = Document(io.BytesIO(template_bytes))
 
-        for uid in zone_df.uid.unique():
-            # for index, row in unidentified_df.iterrows():
-            uid_df = zone_df[zone_df['uid'] == uid]
+    habit_ = uid_df['habit'].iloc[0]
+    document.add_heading('Species identification request', level=1)
+    paragraph = document.add_paragraph('Division/Branch: Rangeland Monitoring Branch.')
 
-            list(uid_df)
-            date = uid_df['date_rec'].iloc[0]
-            date_label = date_label_fn(date)
+    document.add_paragraph('Officers name: ' + str(name))
+    document.add_paragraph('Phone: ' + str(phone))
+    document.add_paragraph('Email: ' + str(email))
 
-            document = Document(r'E:\DEPWS\code\rangeland_monitoring\rmb_mapping_pipeline\assets\species_request.docx')
+    document.add_heading('Location', level=2)
+    document.add_paragraph('Specimen reference name: ' + str(job_dict['sample_names']))
+    document.add_paragraph('Longitude (GDA94): ' + str(uid_df['longitude'].iloc[0]))
+    document.add_paragraph('Latitude (GDA94): ' + str(uid_df['latitude'].iloc[0]))
 
-            habit_ = uid_df['habit'].iloc[0]
-            prop_code = uid_df['prop_code'].iloc[0]
-            document.add_heading('Species identification request', level=1)
-            paragraph = document.add_paragraph('Division/Branch: Rangeland Monitoring Branch.')
+    if job_dict['location_map'] != 'nan':
+        document.add_picture(job_dict['location_map'], width=Cm(18))
+    # --------------------------------------------- Habit ------------------------------------------------------
+    document.add_heading('Habit', level=2)
+
+    abundance = float(uid_df['abundance'].iloc[0])
+    if float(abundance) > 1:
+        document.add_paragraph('Specimen abundance: ' + str(abundance))
+    else:
+        document.add_paragraph('Specimen abundance: ' + str('Not recorded'))
 
-            # call the user id function to extract the user id
-            name, email, phone = user_id_fn(user_df)
+    density = float(uid_df['density'].iloc[0])
+    if density > 1:
+        document.add_paragraph('Specimen density: ' + str(density))
+    else:
+        document.add_paragraph('Specimen density: ' + str('Not recorded'))
+
+    # call the photo_download_and_insertion_range_loop_fn function to loop through the three possible species photos.
+    document = photo_download_and_insertion_range_loop_fn(
+        'photo', 'habit', 'Figure x: Species in situ', document, uid_df, export_dir, uid, prop_code, date_label)
+
+    # call the photo_download_and_insertion_range_loop2_fn function to loop through the three possible sample photos.
+    photo_download_and_insertion_range_loop2_fn(
+        'sample', 'photo', 'sample', 'Figure x: Sample photograph', document, uid_df, export_dir, uid,
+        prop_code, date_label)
+
+    document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir,
+                                                 ['habit', 'height', 'annual_perennial'], 'No', prop_code,
+                                                 date_label)
+    document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir, ['roots'], 'Yes', prop_code,
+                                                 date_label)
+    document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir, ['cork', 'cork_colour'],
+                                                 'Yes', prop_code, date_label)
+    document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir, ['leaf'], 'Yes', prop_code,
+                                                 date_label)
+    document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir, ['flower_colour'], 'Yes',
+                                                 prop_code, date_label)
+    document = single_photo_download_and_insertion_fn('flower_cluster', export_dir, uid, uid_df, document,
+                                                      prop_code, date_label)
+
+    # ------------------------------------------------ grass ---------------------------------------------------
+
+    if habit_ == 'Grass':
+        document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir, ['grass_head'], 'Yes',
+                                                     prop_code, date_label)
+        document = single_photo_download_and_insertion_fn('grass_flower', export_dir, uid, uid_df, document,
+                                                          prop_code, date_label)
+        document = single_photo_download_and_insertion_fn('grass_spikelet', export_dir, uid, uid_df, document,
+                                                          prop_code, date_label)
+        document = single_photo_download_and_insertion_fn('grass_awn', export_dir, uid, uid_df, document,
+                                                          prop_code, date_label)
+
+    # --------------------------------------------- fruit/seed -------------------------------------------------
+
+    document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir, ['fruit'], 'Yes', prop_code,
+                                                 date_label)
+    document = single_photo_download_and_insertion_fn('seed', export_dir, uid, uid_df, document, prop_code,
+                                                      date_label)
+
+    # ------------------------------------------------ Odour ---------------------------------------------------
+    document.add_heading('Odour', level=2)
+    odour = str(uid_df['odour_yn'].iloc[0])
+
+    if odour == 'Nan':
+        document.add_paragraph('Odour:  ' + str('Not recorded'))
 
-            document.add_paragraph('Officers name: ' + str(name))
-            document.add_paragraph('Phone: ' + str(phone))
-            document.add_paragraph('Email: ' + str(email))
+    else:
+        document.add_paragraph('Odour:  ' + str('odour'))
+        odour_desc = str(uid_df['odour'].iloc[0])
+        if odour_desc != 'Nan':
+            document.add_paragraph('The smell is described as:  ' + str('odour_desc'))
 
-            document.add_heading('Location', level=2)
-            # call the
-            sample_names, sample_label_list = specimen_name_fn(uid_df)
-            document.add_paragraph('Specimen reference name: ' + str(sample_names))
-            longitude = zone_df['longitude'].loc[0]
-            document.add_paragraph('Longitude (GDA94): ' + str(longitude))
-            latitude = zone_df['latitude'].loc[0]
-            document.add_paragraph('Latitude (GDA94): ' + str(latitude))
-
-            output_file_str, prop_name = plot_point_on_property(pastoral_estate, prop_code, export_dir, uid_df, uid)
-            if output_file_str != 'nan':
-                document.add_picture(output_file_str, width=Cm(18))
-            # --------------------------------------------- Habit ------------------------------------------------------
-            document.add_heading('Habit', level=2)
-
-            abundance = float(uid_df['abundance'].iloc[0])
-            if float(abundance) > 1:
-                document.add_paragraph('Specimen abundance: ' + str(abundance))
-            else:
-                document.add_paragraph('Specimen abundance: ' + str('Not recorded'))
-
-            density = float(uid_df['density'].iloc[0])
-            if density > 1:
-                document.add_paragraph('Specimen density: ' + str(density))
-            else:
-                document.add_paragraph('Specimen density: ' + str('Not recorded'))
-
-            # call the photo_download_and_insertion_range_loop_fn function to loop through the three possible species photos.
-            document = photo_download_and_insertion_range_loop_fn(
-                'photo', 'habit', 'Figure x: Species in situ', document, uid_df, export_dir, uid, prop_code, date_label)
-
-            # call the photo_download_and_insertion_range_loop2_fn function to loop through the three possible sample photos.
-            photo_download_and_insertion_range_loop2_fn(
-                'sample', 'photo', 'Sample ', 'Figure x: Sample photograph', document, uid_df, export_dir, uid,
-                prop_code, date_label)
-
-            document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir,
-                                                         ['habit', 'height', 'annual_perennial'], 'No', prop_code,
-                                                         date_label)
-            document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir, ['roots'], 'Yes', prop_code,
-                                                         date_label)
-            document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir, ['cork', 'cork_colour'],
-                                                         'Yes', prop_code, date_label)
-            document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir, ['leaf'], 'Yes', prop_code,
-                                                         date_label)
-            document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir, ['flower_colour'], 'Yes',
-                                                         prop_code, date_label)
-            document = single_photo_download_and_insertion_fn('flower_cluster', export_dir, uid, uid_df, document,
-                                                              prop_code, date_label)
-
-            # ------------------------------------------------ grass ---------------------------------------------------
-
-            if habit_ == 'Grass':
-                document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir, ['grass_head'], 'Yes',
-                                                             prop_code, date_label)
-                document = single_photo_download_and_insertion_fn('grass_flower', export_dir, uid, uid_df, document,
-                                                                  prop_code, date_label)
-                document = single_photo_download_and_insertion_fn('grass_spikelet', export_dir, uid, uid_df, document,
-                                                                  prop_code, date_label)
-                document = single_photo_download_and_insertion_fn('grass_awn', export_dir, uid, uid_df, document,
-                                                                  prop_code, date_label)
-
-            # --------------------------------------------- fruit/seed -------------------------------------------------
-
-            document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir, ['fruit'], 'Yes', prop_code,
-                                                         date_label)
-            document = single_photo_download_and_insertion_fn('seed', export_dir, uid, uid_df, document, prop_code,
-                                                              date_label)
+    # ------------------------------------------------- prickles -----------------------------------------------
 
-            # ------------------------------------------------ Odour ---------------------------------------------------
-            document.add_heading('Odour', level=2)
-            odour = str(uid_df['odour_yn'].iloc[0])
+    document.add_heading('Prickles/Hairs', level=2)
+    prickles = str(uid_df['prickles'].iloc[0])
 
-            if odour == 'Nan':
-                document.add_paragraph('Odour:  ' + str('Not recorded'))
+    if prickles == 'Nan':
+        document.add_paragraph('Prickles/Hairs:  ' + str('Not recorded'))
 
-            else:
-                document.add_paragraph('Odour:  ' + str('odour'))
-                odour_desc = str(uid_df['odour'].iloc[0])
-                if odour_desc != 'Nan':
-                    document.add_paragraph('The smell is described as:  ' + str('odour_desc'))
+    elif prickles == 'Hairs present':
+        document.add_paragraph('Prickles/Hairs:  ' + str(prickles))
+        prick_location = str(uid_df['prickles_location'].iloc[0])
 
-            # ------------------------------------------------- prickles -----------------------------------------------
+        if prick_location != 'Nan':
+            document.add_paragraph('Prickles/Hairs location:  ' + str(prick_location))
 
-            document.add_heading('Prickles/Hairs', level=2)
-            prickles = str(uid_df['prickles'].iloc[0])
+        else:
+            document.add_paragraph('Prickles/Hairs location:  ' + str('Not recorded'))
 
-            if prickles == 'Nan':
-                document.add_paragraph('Prickles/Hairs:  ' + str('Not recorded'))
+    else:
+        document.add_paragraph('Prickles/Hairs:  ' + str(prickles))
+        prick_location = str(uid_df['prickles_location'].iloc[0])
+        if prick_location != 'Nan':
+            document.add_paragraph('Prickles/Hairs location:  ' + str(prick_location))
 
-            elif prickles == 'Hairs present':
-                document.add_paragraph('Prickles/Hairs:  ' + str(prickles))
-                prick_location = str(uid_df['prickles_location'].iloc[0])
+        else:
+            document.add_paragraph('Prickles/Hairs location:  ' + str('Not recorded'))
 
-                if prick_location != 'Nan':
-                    document.add_paragraph('Prickles/Hairs location:  ' + str(prick_location))
+    # --------------------------------------------- latex -----------------------------------------------------
 
-                else:
-                    document.add_paragraph('Prickles/Hairs location:  ' + str('Not recorded'))
+    document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir, ['latex'], 'Yes', prop_code,
+                                                 date_label)
 
-            else:
-                document.add_paragraph('Prickles/Hairs:  ' + str(prickles))
-                prick_location = str(uid_df['prickles_location'].iloc[0])
-                if prick_location != 'Nan':
-                    document.add_paragraph('Prickles/Hairs location:  ' + str(prick_location))
+    output_path = form_dir + '\\Unidentified_species_' + str(uid) + '_' + job_dict['prop_name'].replace(' ', '_') + \
+        '_' + str(job_dict['zone_label']) + '.docx'
+    document.save(output_path)
 
-                else:
-                    document.add_paragraph('Prickles/Hairs location:  ' + str('Not recorded'))
+    return output_path
 
-            # --------------------------------------------- latex -----------------------------------------------------
 
-            document = single_heading_para_photo_list_fn(document, uid_df, uid, export_dir, ['latex'], 'Yes', prop_code,
-                                                         date_label)
+@run_instrumentation.stage_fn('step4_3_unidentified_doc')
+def main_routine(dest52, dest53, export_dir, pastoral_estate, user_df):
+    """ Create a species identification request (docx) for each unidentified specimen.
 
-            if i == 1:
+    The template and contact details are read once, the specimen location maps are rendered (matplotlib), every
+    specimen photograph is prefetched concurrently through the download scheduler at document priority and the
+    documents are then built and saved in turn - python-docx holds the GIL, so a thread pool would not build them any
+    faster.
 
-                zone_label = 'zone52'
-            else:
+    :param dest52: geo-dataframe object containing the unidentified specimens (WGSz52 destination to GDA94).
+    :param dest53: geo-dataframe object containing the unidentified specimens (WGSz53 destination to GDA94).
+    :param export_dir: string object containing the path to the unidentified feature export directory.
+    :param pastoral_estate: geo-dataframe object containing the pastoral estate boundaries.
+    :param user_df: pandas dataframe object or string object containing the path to contact_details.csv.
+    """
 
-                zone_label = 'zone53'
+    form_dir = export_dir + '\\request_id_forms'
 
-            document.save(form_dir + '\\Unidentified_species_' +
-                          str(uid) + '_' + prop_name.replace(' ', '_') + '_' + str(zone_label) + '.docx')
+    if not os.path.exists(form_dir):
+        os.mkdir(form_dir)
 
-        i += 1
+    export_dir = export_dir + "\\photos\\"
+
+    # read the template and officer details once for all specimens.
+    template_bytes = cached_asset_fn(species_template_path, read_bytes_fn)
+    name, email, phone = user_id_fn(contact_details_fn(user_df))
+    officer_list = [name, email, phone]
+
+    # the estate is digested once for the basemap cache rather than for each specimen.
+    estate_key = estate_key_fn(pastoral_estate)
+
+    job_list = []
+    photo_list = []
+    for zone_label, zone_df in [('zone52', dest52), ('zone53', dest53)]:
+        zone_df['uid'] = zone_df.index + 1
+
+        # extract eastings and northing values for geometry feature
+        zone_df["longitude"] = zone_df["geometry"].x
+        zone_df["latitude"] = zone_df["geometry"].y
+
+        for uid in zone_df.uid.unique():
+            uid_df = zone_df[zone_df['uid'] == uid]
+
+            date_label = date_label_fn(uid_df['date_rec'].iloc[0])
+            prop_code = uid_df['prop_code'].iloc[0]
+            sample_names, sample_label_list = specimen_name_fn(uid_df)
+
+            # maps are rendered under the gis_lock - matplotlib is not thread safe.
+            location_map, prop_name = plot_point_on_property(pastoral_estate, prop_code, export_dir, uid_df, uid,
+                                                             estate_key)
+
+            job_list.append({'uid_df': uid_df, 'uid': uid, 'prop_code': prop_code, 'prop_name': prop_name,
+                             'date_label': date_label, 'sample_names': sample_names, 'location_map': location_map,
+                             'zone_label': zone_label})
+
+            photo_list.extend(specimen_photo_list_fn(uid_df, export_dir, uid, prop_code, date_label))
+
+    # call the prefetch_photos_fn function to download all specimen photographs ahead of the feature photos.
+    prefetch_photos_fn(photo_list)
+
+    for job_dict in job_list:
+        output_path = build_species_document_fn(job_dict, template_bytes, officer_list, export_dir, form_dir)
+        print(' - species identification request: ', output_path)
 
 
 if __name__ == '__main__':
@@ -21,10 +21,11 @@ SOFTWARE.
 # Import modules
 from __future__ import print_function, division
 import warnings
+import run_instrumentation
 from glob import glob
 import pandas as pd
 import os
-import urllib
+import download_scheduler
 warnings.filterwarnings("ignore")
 
 
@@ -105,13 +106,14 @@ def save_photo_fn(photo_url_list, property_name, date, feature, uid, export_dir_
                                                                         feature, erosion_type, str(uid), str(photo_num)))
 
             photo_label_list.append(output_str)
-            urllib.request.urlretrieve(i, output_str)
+            download_scheduler.submit_fn(i, output_str, download_scheduler.POI)
         else:
             photo_label_list.append(i)
-    n += 1
+        n += 1
     return photo_label_list
 
 
+@run_instrumentation.stage_fn('step4_5_photo_erosion_csv')
 def main_routine(export_dir, feature_name):
     """ Extract the site photo urls.
 
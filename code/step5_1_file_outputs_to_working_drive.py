@@ -26,8 +26,8 @@ import geopandas as gpd
 from datetime import datetime
 import shutil
 
-from distutils.dir_util import copy_tree
 import warnings
+import run_instrumentation
 warnings.filterwarnings("ignore")
 
 
@@ -345,158 +345,119 @@ def csv_file_workflow_fn(csv_list):
                 prop_df = df.loc[df['property'] == prop]
 
 
-def check_folder_exists_fn(destination, infra_feature_list):
+def check_folder_exists_fn(destination, infra_feature_list, snapshot=None):
     """ Check for and create when necessary year and raw sub-directories within the Infrastructure directory.
 
     :param destination: string object containing the path to destination directory including year.
+    :param snapshot: DirectorySnapshot object of the Pastoral Districts directory (existence checks are answered from
+    memory and the missing directories are created in one batch).
     :return raw path: string object containing the path to the final infrastructure destination folder.
     """
-    # Check for directory.
-    check_folder = os.path.isdir(destination)
-
-    # Create directory if it does not exist.
-    if not check_folder:
-        # create directory
-        os.mkdir(destination)
-        # create sub folder
+    import directory_snapshot
+    if snapshot is None:
+        snapshot = directory_snapshot.get_snapshot_fn(destination)
 
     raw_path = os.path.join(destination, 'Raw')
-    check_folder = os.path.isdir(raw_path)
-    # Create directory if it does not exist.
-    if not check_folder:
-        # create directory
-        os.mkdir(raw_path)
 
     for i in infra_feature_list:
+        snapshot.queue_makedirs(os.path.join(destination, 'Raw', i))
 
-        infra_path = os.path.join(destination, 'Raw', i)
-        check_folder = os.path.isdir(infra_path)
-        # Create directory if it does not exist.
-        if not check_folder:
-            # create directory
-            os.mkdir(infra_path)
+    # create the year, raw and feature directories that do not exist.
+    snapshot.flush()
 
     return raw_path
 
 
-def check_folder_poi_exists_fn(destination, feature_list, year):
+def check_folder_poi_exists_fn(destination, feature_list, year, snapshot=None):
     """ Check for and create when necessary year and raw sub-directories within the Infrastructure directory.
 
     :param year: string object containing the year derived from the start_date search
     :param feature_list:
     :param destination: string object containing the path to destination directory including year.
+    :param snapshot: DirectorySnapshot object of the Pastoral Districts directory (existence checks are answered from
+    memory and the missing directories are created in one batch).
     :return raw path: string object containing the path to the final infrastructure destination folder.
     """
-    # Check for directory.
-    check_folder = os.path.isdir(destination)
-    if not check_folder:
-        # create directory
-        os.mkdir(destination)
+    import directory_snapshot
+    if snapshot is None:
+        snapshot = directory_snapshot.get_snapshot_fn(destination)
 
     year_path = os.path.join(destination, year)
-    check_folder = os.path.isdir(year_path)
-    # Create directory if it does not exist.
-    if not check_folder:
-        # create directory
-        os.mkdir(year_path)
-        # create sub folder
-
     raw_path = os.path.join(year_path, 'Raw')
-    check_folder = os.path.isdir(raw_path)
-    # Create directory if it does not exist.
-    if not check_folder:
-        # create directory
-        os.mkdir(raw_path)
 
     for i in feature_list:
+        snapshot.queue_makedirs(os.path.join(raw_path, i))
 
-        path = os.path.join(raw_path, i)
-        check_folder = os.path.isdir(path)
-        # Create directory if it does not exist.
-        if not check_folder:
-            # create directory
-            os.mkdir(path)
+    # create the poi, year, raw and feature directories that do not exist.
+    snapshot.flush()
 
     return year_path
 
 
-def copy_subdirectories_fn(original_path, raw_path, feature_list):
+def subdirectory_pair_list_fn(original_path, raw_path, feature_list):
+    """ List the files of each feature directory with their destination in the working drive Raw directory.
+
+    :param original_path: string object containing the path to the property export directory.
+    :param raw_path: string object containing the path to the destination Raw directory.
+    :param feature_list: list object containing the feature names.
+    :return pair_list: list object containing (source path, destination path) tuples.
+    """
+
+    pair_list = []
     for i in feature_list:
         directory = os.path.join(original_path, i)
-        #print('-'*50)
-        #print('directory: ', directory)
         dest_dir = os.path.join(raw_path, i)
-        #print('dest_dir: ', dest_dir)
-        #print('-' * 50)
-        copy_tree(directory, dest_dir)
 
+        for root, dirnames, filenames in os.walk(directory):
+            for file in filenames:
+                src = os.path.join(root, file)
+                pair_list.append((src, os.path.join(dest_dir, os.path.relpath(src, directory))))
+
+    return pair_list
 
-def copy_infra_photos_to_photos_fn(original_path, feature_list, destination_infra_photos):
 
-    #print('!'*50)
-    #print('destination_infra_photos; ', destination_infra_photos)
+def infra_photo_pair_list_fn(original_path, feature_list, destination_infra_photos):
+    """ List the infrastructure photographs with their destination in the property Photos\\Infrastructure directory.
 
+    :param original_path: string object containing the path to the property export directory.
+    :param feature_list: list object containing the infrastructure feature names.
+    :param destination_infra_photos: string object containing the path to the Photos\\Infrastructure directory.
+    :return pair_list: list object containing (source path, destination path) tuples.
+    """
+
+    pair_list = []
     for i in feature_list:
         directory = os.path.join(original_path, i, 'photos')
-        #print('-' * 50)
-        #print('directory: ', directory)
-        #print('destination_infr_photos: ', destination_infra_photos)
-        dest_dir = os.path.join(destination_infra_photos, i)
 
         for photo in glob("{0}\\*.jpg".format(directory)):
-            #print('photo: ', photo)
             path, file = photo.rsplit('\\', 1)
+            pair_list.append((photo, os.path.join(destination_infra_photos, i, file)))
 
-            dest_dir = os.path.join(destination_infra_photos, i)
-            #print('dest_dir; ', dest_dir)
+    return pair_list
 
-            check_raw_folder = os.path.isdir(destination_infra_photos)
-            if not check_raw_folder:
-                # create directory
-                os.mkdir(destination_infra_photos)
-
-            check_raw_folder = os.path.isdir(dest_dir)
-            if not check_raw_folder:
-                # create directory
-                os.mkdir(dest_dir)
 
-            dest_output = os.path.join(destination_infra_photos, i, file)
-            #print('dest_output: ', dest_output)
-            shutil.copy(photo, dest_output)
+def poi_photo_pair_list_fn(original_path, feature_list, destination_poi_photos):
+    """ List the point of interest photographs (excluding location maps) with their destination in the property
+    Photos\\Poi directory.
 
+    :param original_path: string object containing the path to the property export directory.
+    :param feature_list: list object containing the point of interest feature names.
+    :param destination_poi_photos: string object containing the path to the Photos\\Poi directory.
+    :return pair_list: list object containing (source path, destination path) tuples.
+    """
 
-def copy_poi_photos_to_photos_fn(original_path, feature_list, destination_poi_photos):
+    pair_list = []
     for i in feature_list:
         directory = os.path.join(original_path, i, 'photos')
-        #print('-' * 50)
-        #print('directory: ', directory)
-        #print('destination_poi_photos: ', destination_poi_photos)
-        dest_dir = os.path.join(destination_poi_photos, i)
 
         for photo in glob("{0}\\*.jpg".format(directory)):
-            #print('photo: ', photo)
             path, file = photo.rsplit('\\', 1)
 
-
             photo_type = file[4:12]
-            #print('photo_type: ', photo_type)
             if photo_type != 'location':
+                pair_list.append((photo, os.path.join(destination_poi_photos, i, file)))
 
-                dest_dir = os.path.join(destination_poi_photos, i)
-
-                check_raw_folder = os.path.isdir(destination_poi_photos)
-                if not check_raw_folder:
-                    # create directory
-                    os.mkdir(destination_poi_photos)
-
-                check_raw_folder = os.path.isdir(dest_dir)
-                if not check_raw_folder:
-                    # create directory
-                    os.mkdir(dest_dir)
-
-                dest_output = os.path.join(destination_poi_photos, i, file)
-                #print('dest_output: ', dest_output)
-                shutil.copy(photo, dest_output)
+    return pair_list
 
 
 def remove_empty_dir(path):
@@ -506,13 +467,27 @@ def remove_empty_dir(path):
         pass
 
 
-def remove_empty_dirs(path):
+def remove_empty_dirs(path, snapshot=None):
+    if snapshot is not None:
+        snapshot.remove_empty_dirs(path)
+        return
+
     for root, dirnames, filenames in os.walk(path, topdown=False):
         for dirname in dirnames:
             remove_empty_dir(os.path.realpath(os.path.join(root, dirname)))
 
 
-def main_routine(output_dir, path, start_date):
+@run_instrumentation.stage_fn('step5_1_file_outputs_to_working_drive')
+def main_routine(output_dir, path, start_date, utm_dict=None):
+    """ File the property outputs to the Pastoral Districts directory - the new or changed files of each property are
+    staged beside its live directories and published by file renames (staged_publish).
+
+    :param output_dir: string object containing the path to the primary export directory.
+    :param path: string object containing the path to the Pastoral Districts directory.
+    :param start_date: string object containing the start date filter (YYYY-MM-DD).
+    :param utm_dict: dictionary object mapping property names to their UTM zone (Inspection_Details.csv) - files of the
+    other zone are removed from the Field_Data Raw directory when it is published.
+    """
 
     # create two lists of feature names
     infra_feature_list = ['infra_lines', 'infra_points', 'infra_water_points']
@@ -526,32 +501,26 @@ def main_routine(output_dir, path, start_date):
     #subfolder_list = next(os.walk(output_dir))[1]
     #print(subfolder_list)
 
-    subfolder_list = os.listdir(output_dir)
+    subfolder_list = [f.name for f in os.scandir(output_dir) if f.is_dir()]
     #print(subfolder_list)
 
-    # extract directory pathways for all subdirectories within the Pastoral Districts directory.
-    property_paths_list = []
-    list_subfolders_with_paths = [f.path for f in os.scandir(path) if f.is_dir()]
-
-    for i in list_subfolders_with_paths:
-        #print('i: ', i)
-        property_paths = [f.path for f in os.scandir(i) if f.is_dir()]
-
-        property_paths_list.extend(property_paths)
+    # call the property_directory_resolver to index the property directories within the Pastoral Districts directory.
+    import property_directory_resolver
+    import directory_snapshot
+    resolver = property_directory_resolver.get_resolver_fn(path)
+    # one in memory listing of the Pastoral Districts tree serves every existence check and mkdir below.
+    snapshot = directory_snapshot.get_snapshot_fn(path)
 
+    publish_failed_list = []
     for prop_dir_ in subfolder_list:
         print('prop_dir_: ', prop_dir_)
         if prop_dir_ != 'Unknown':
-            if prop_dir_ == "Mckinlay_River":
-                prop_dir = "McKinlay_River"
-
-                '''elif prop_dir_ == "Labelle_Downs":
-                prop_dir = "La_Belle_Downs"'''
-            else:
-                prop_dir = prop_dir_
-            print('property_paths_list: ', property_paths_list)
-            print('prop_dir final: ', prop_dir)
-            destination_dir = next((s for s in property_paths_list if prop_dir in s), None)
+            prop_dir = prop_dir_
+            destination_dir = resolver.resolve(prop_dir)
+            print('destination_dir: ', destination_dir)
+            if destination_dir is None:
+                print(' -- property directory not located in ', path, ' - ', prop_dir, ' has not been filed.')
+                continue
 
             # ----------------------------------------- infrastructure -------------------------------------------------
 
@@ -561,34 +530,74 @@ def main_routine(output_dir, path, start_date):
 
             infra_destination = os.path.join(destination_dir, 'Infrastructure', 'Field_Data')
             # call the check_folder_exists_fn function to check and create the correct year and raw sub-folders.
-            raw_path = check_folder_exists_fn(destination_year, infra_feature_list)
+            raw_path = check_folder_exists_fn(destination_year, infra_feature_list, snapshot)
             # join output dir with prop_path
-            original_path = os.path.join(output_dir, prop_dir.title())# due to upper fields
+            original_path = os.path.join(output_dir, prop_dir)
             print('copy the original_path: ', original_path)
-            copy_subdirectories_fn(original_path, raw_path, infra_feature_list)
-            remove_empty_dirs(destination_year)
+            # call the photo_hash_index main_routine to hash the photos (sync comparison) and report duplicates.
+            import photo_hash_index
+            photo_index_df = photo_hash_index.main_routine(original_path)
+            sha1_dict = dict(zip(photo_index_df['path'], photo_index_df['sha1']))
+
+            pair_list = subdirectory_pair_list_fn(original_path, raw_path, infra_feature_list)
 
             #print('INFRASTRUCTURE ' * 50)
             destination_infra_photos = os.path.join(destination_dir, 'Photos', 'Infrastructure')
             #print('destination_infra_photos: ', destination_infra_photos)
 
-            copy_infra_photos_to_photos_fn(original_path, infra_feature_list, destination_infra_photos)
+            pair_list.extend(infra_photo_pair_list_fn(original_path, infra_feature_list, destination_infra_photos))
 
             # --------------------------------------------- poi --------------------------------------------------------
 
             destination_poi = os.path.join(destination_dir, 'General', 'Poi')
             # call the check_folder_exists_fn function to check and create the correct year and raw sub-folders.
-            year_path = check_folder_poi_exists_fn(destination_poi, poi_list, year)
-            # join output dir with prop_path
-            original_path = os.path.join(output_dir, prop_dir.title())
+            year_path = check_folder_poi_exists_fn(destination_poi, poi_list, year, snapshot)
             #print('original_path: ', original_path)
-            copy_subdirectories_fn(original_path, year_path + '\\Raw', poi_list)
-            remove_empty_dirs(year_path)
+            pair_list.extend(subdirectory_pair_list_fn(original_path, year_path + '\\Raw', poi_list))
             #print('POI '*50)
 
             destination_poi_photos = os.path.join(destination_dir, 'Photos', 'Poi')
-            copy_poi_photos_to_photos_fn(original_path, poi_list, destination_poi_photos)
-
+            pair_list.extend(poi_photo_pair_list_fn(original_path, poi_list, destination_poi_photos))
+
+            # new or changed files are written to staging directories beside the live Raw and Photos directories -
+            # nothing below writes to the live directories until commit.
+            import staged_publish
+            publisher = staged_publish.StagedPublish(destination_dir, [raw_path, year_path + '\\Raw',
+                                                                       destination_infra_photos,
+                                                                       destination_poi_photos], snapshot)
+            try:
+                publisher.prepare()
+            except staged_publish.PublishError as err:
+                # the previous run's staged files are still locked - this property is filed by a later run.
+                print(' -- ', prop_dir, ' has not been filed: ', err)
+                publish_failed_list.append(prop_dir)
+                continue
+
+            # call the sync_engine main_routine to copy new or changed files only (manifest in the property directory).
+            import sync_engine
+            stats_dict = sync_engine.main_routine(pair_list, destination_dir, sha1_dict=sha1_dict, snapshot=snapshot,
+                                                  redirect_fn=publisher.staged_path)
+
+            # remove the outputs of the other UTM zone from the staged Field_Data Raw directory.
+            utm_code = None if utm_dict is None else utm_dict.get(prop_dir.replace('_', ' ').upper())
+            if utm_code is not None:
+                staged_publish.zone_cleanup_fn(raw_path, infra_feature_list, utm_code, publisher)
+
+            try:
+                published_list = publisher.commit()
+            except staged_publish.PublishError as err:
+                # the failed file groups keep their live contents and stay staged for the next run.
+                print(' -- ', prop_dir, ' has not been filed: ', err)
+                publish_failed_list.append(prop_dir)
+                published_list = err.published_list
+
+            # only the published copies are recorded - the next run copies the others again.
+            sync_engine.record_published_fn(destination_dir, stats_dict['pending_dict'], published_list)
+            remove_empty_dirs(destination_year, snapshot)
+            remove_empty_dirs(year_path, snapshot)
+
+    if publish_failed_list:
+        raise IOError('outputs not published to the working drive for: {0}'.format(', '.join(publish_failed_list)))
 
 
 if __name__ == "__main__":
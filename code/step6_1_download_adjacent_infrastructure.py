@@ -21,12 +21,16 @@ SOFTWARE.
 # import modules
 from __future__ import print_function, division
 import os
+import hashlib
 from datetime import datetime
 import argparse
 import shutil
 import sys
 import warnings
+import run_instrumentation
+import stage_scheduler
 from glob import glob
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 import geopandas as gpd
 from datetime import datetime
@@ -60,32 +64,10 @@ def property_path_fn(pastoral_districts_path):
     :param path: string object containing the pastoral_districts_path to the Pastoral Districts directory.
     :return prop_list: list object containing the path to all property sub-directories.
     """
-    print('='*50)
-    print('=' * 50)
-    print('=' * 50)
-    print('pastoral_districts_path: ', pastoral_districts_path)
-    # create a list of pastoral districts.
-    dir_list = next(os.walk(pastoral_districts_path))[1]
-    print('dir_list: ', dir_list)
-    prop_list = []
-
-    # loop through districts to get property name
-    for district in dir_list:
-        dist_path = os.path.join(pastoral_districts_path, district)
-
-        property_dir = next(os.walk(dist_path))[1]
-        print('property_dir: ', property_dir)
-
-        # loop through the property names list
-        for prop_name in property_dir:
-            # join the path, district and property name to create a path to each property directory.
-            prop_path = os.path.join(pastoral_districts_path, district, prop_name)
-            print('79_'*50)
-            print('prop_path:: ', prop_path)
-            # append all property paths to a list
-            prop_list.append(prop_path)
-
-    print(prop_list)
+
+    import property_directory_resolver
+    prop_list = property_directory_resolver.get_resolver_fn(pastoral_districts_path).property_path_list()
+
     return prop_list
 
 
@@ -212,41 +194,24 @@ def output_path_fn(prop, gdf, infrastructure_directory, pastoral_districts_path,
     #print('test: ', test)
     if len(test.index) > 0:
 
-        dist = gdf[gdf["PROPERTY"] == prop]["DISTRICT"].values[0]
-
-        dist_ = dist.strip().title().replace(" ", "_")
-
-        if dist_ == 'Northern_Alice_Springs':
-            district = 'Northern_Alice'
-        elif dist_ == 'Southern_Alice_Springs':
-            district = 'Southern_Alice'
-        else:
-            district = dist_
-
         prop_tag = gdf.loc[gdf["PROPERTY"] == prop]["PROP_TAG"].values[0]
-        prop_tag.strip()
-        final_property = "{0}_{1}".format(prop_tag, prop.replace(" ", "_").replace("-", "_").title())
+
+        # call the property_directory_resolver to locate the property directory (PROP_TAG first, then name).
+        import property_directory_resolver
+        property_dir = property_directory_resolver.get_resolver_fn(pastoral_districts_path).resolve(
+            prop, str(prop_tag).strip())
 
         # due to errors in the infrastructure data (incorrect district), pass if directory not found
-        property_dir = os.path.join(pastoral_districts_path, district, final_property)
-        check_dir = os.path.isdir(property_dir)
-        if not check_dir:
+        if property_dir is None:
             key_path = "No_directory"
 
         else:
-            year_path = os.path.join(pastoral_districts_path, district, final_property, "Infrastructure", "Server_Download",
-                                     str(date.today().year))  # , "Raw", key)
-
-            if not os.path.isdir(year_path):
-                os.mkdir(year_path)
-
-            raw_path = "{0}\\Raw".format(year_path)
-            if not os.path.isdir(raw_path):
-                os.mkdir(raw_path)
+            year_path = os.path.join(property_dir, "Infrastructure", "Server_Download", str(date.today().year))
+            key_path = "{0}\\Raw\\{1}".format(year_path, key.title())
 
-            key_path = "{0}\\{1}".format(raw_path, key.title())
-            if not os.path.isdir(key_path):
-                os.mkdir(key_path)
+            # create the year, raw and key directories when required (existence answered by the directory snapshot).
+            import directory_snapshot
+            directory_snapshot.get_snapshot_fn(pastoral_districts_path).makedirs(key_path)
 
     else:
         key_path = "No_data"
@@ -287,7 +252,7 @@ def feature_extraction_fn(feature_gdf, server_download_path, property_name, i):
     return export_file_path
 
 
-def all_data_export_fn(gdf, server_download_path, property_name, i):
+def all_data_export_fn(gdf, server_download_path, property_name, i, force_refresh=False):
 
     if server_download_path == 'No_data':
         print('='*50)
@@ -298,44 +263,184 @@ def all_data_export_fn(gdf, server_download_path, property_name, i):
         print('property: ', property_name, " - property/district error in infrastructure data")
         print('=' * 50)
     else:
+        written = write_partition_fn(
+            gdf, "{0}\\{1}_{2}.shp".format(server_download_path, property_name.title().replace(" ", "_"), i.title()),
+            force_refresh)
         print('=' * 50)
-        print('property: ', property_name, " - infrastructure data downloaded")
+        if written:
+            print('property: ', property_name, " - infrastructure data downloaded")
+        else:
+            print('property: ', property_name, " - infrastructure data unchanged")
         print('=' * 50)
-        gdf.to_file(
-            "{0}\\{1}_{2}.shp".format(server_download_path, property_name.title().replace(" ", "_"), i.title()),
-            driver="ESRI Shapefile")
 
 
 
 def date_reformat_fn(gdf):
-    insp_date_list = []
-    for date_ in gdf['DATE_INSP']:
-        # print(date_)
+    """ Zero pad the month and day of the DATE_INSP (YYYY-M-D) values - vectorised over the whole dataframe.
 
-        if '-' in date_:
-            # print(date_)
-            year, month, day = date_.split('-')
-            new_date = '{0}-{1}-{2}'.format(year, month, day)
+    :param gdf: geo-dataframe object containing the DATE_INSP column.
+    :return gdf: geo-dataframe object with the reformatted DATE_INSP column.
+    """
 
-            if len(day) == 1:
-                day_ = '0{0}'.format(day)
-            else:
-                day_ = day
-            if len(month) == 1:
-                month_ = '0{0}'.format(month)
-            else:
-                month_ = month
+    date_series = gdf['DATE_INSP']
+    part_df = date_series.str.extract(r'^([^-]*)-([^-]*)-([^-]*)$')
+    new_date = part_df[0] + '-' + part_df[1].str.zfill(2) + '-' + part_df[2].str.zfill(2)
+    # values without a dash are left unchanged.
+    gdf['DATE_INSP'] = new_date.where(part_df[0].notna(), date_series)
 
-            new_date = "{0}-{1}-{2}".format(year, month_, day_)
-            # print('new_date: ', new_date)
+    return gdf
 
-        # print('='*50)
 
-        insp_date_list.append(new_date)
-    # print(insp_date_list)
-    gdf['DATE_INSP'] = insp_date_list
+def prepare_layer_fn(shape_gdf):
+    """ Reformat the inspection dates and insert the DELETE and STATUS columns once for a whole layer.
 
-    return gdf
+    :param shape_gdf: geo-dataframe object containing a corporate infrastructure layer.
+    :return shape_gdf: geo-dataframe object ready to be partitioned by property.
+    """
+
+    shape_gdf = date_reformat_fn(shape_gdf)
+    # insert a delete column
+    shape_gdf.insert(12, 'DELETE', 0)
+    shape_gdf.insert(13, 'STATUS', 'Existing')
+
+    return shape_gdf
+
+
+def partition_fingerprint_fn(gdf):
+    """ Calculate a content fingerprint of a property partition.
+
+    Columns are sorted by name and rows by value, so the fingerprint only changes when the attributes or geometry
+    (WKB) of the property's features change - not when the corporate layer is re-ordered.
+
+    :param gdf: geo-dataframe object containing the property partition.
+    :return: string object containing the hexadecimal sha1 digest.
+    """
+
+    attribute_df = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+    attribute_df = attribute_df[sorted(attribute_df.columns)].astype(str)
+    attribute_df['WKB'] = [geometry.wkb_hex if geometry is not None else '' for geometry in gdf.geometry]
+    attribute_df = attribute_df.sort_values(attribute_df.columns.tolist())
+
+    return hashlib.sha1(attribute_df.to_csv(index=False).encode('utf-8')).hexdigest()
+
+
+def fingerprint_path_fn(export_file_path):
+    """ Return the path to the fingerprint (<Property>_<Key>.fingerprint) stored next to a Server_Download shapefile. """
+
+    return os.path.splitext(export_file_path)[0] + '.fingerprint'
+
+
+def write_partition_fn(gdf, export_file_path, force_refresh=False):
+    """ Write one property partition to its Server_Download directory unless its content is unchanged.
+
+    The fingerprint is that of the corporate partition, not of the shapefile on disk: step6_2
+    (step6_2.write_merged_fn) appends the Server_Upload field data to the shapefile and leaves the fingerprint as
+    written here. A merged shapefile is therefore kept until the corporate partition changes, and is then replaced by
+    the corporate data alone until step6_2 runs again (append_field_data argument). Changing either side of that
+    contract (i.e. fingerprinting the written file) requires the other to change with it.
+
+    :param gdf: geo-dataframe object containing the property partition.
+    :param export_file_path: string object containing the path to the output shapefile.
+    :param force_refresh: boolean object - write even when the stored fingerprint matches.
+    :return written: boolean object - True if the shapefile was written.
+    """
+
+    fingerprint = partition_fingerprint_fn(gdf)
+    fingerprint_path = fingerprint_path_fn(export_file_path)
+
+    if not force_refresh and os.path.isfile(export_file_path):
+        try:
+            with open(fingerprint_path) as f:
+                if f.read().strip() == fingerprint:
+                    return False
+        except (IOError, OSError):
+            pass
+
+    # GDAL is not thread safe - a write in the stage thread waits for the other GIS threads (the worker processes of
+    # partitioned_export_fn each hold their own lock and GDAL, so their writes run concurrently).
+    with stage_scheduler.gis_lock:
+        gdf.to_file(export_file_path, driver="ESRI Shapefile")
+    run_instrumentation.count_fn('files_created')
+    run_instrumentation.count_fn('rows_out', len(gdf.index))
+
+    # the fingerprint is only recorded once the shapefile has been written.
+    with open(fingerprint_path + '.tmp', 'w') as f:
+        f.write(fingerprint)
+    os.replace(fingerprint_path + '.tmp', fingerprint_path)
+
+    return True
+
+
+def partitioned_export_fn(shape_gdf, key, infrastructure_directory, pastoral_districts_path, max_workers=4,
+                          force_refresh=False):
+    """ Group a prepared layer by PROPERTY once and write each property partition in a bounded writer pool.
+
+    Output paths (and the Server_Download directories) are resolved in this thread; the pool fingerprints the
+    partitions and writes the changed shapefiles. The writers are processes - GDAL is not thread safe, and separate
+    processes write separate datasets concurrently without holding stage_scheduler.gis_lock in this process.
+
+    :param shape_gdf: geo-dataframe object created by prepare_layer_fn.
+    :param key: string object containing the layer type (points, lines, polygons or paddocks).
+    :param infrastructure_directory: string object containing the path to the corporate infrastructure layers.
+    :param pastoral_districts_path: string object containing the path to the Pastoral_Districts directory.
+    :param max_workers: integer object containing the number of writer processes.
+    :param force_refresh: boolean object - write every partition, even when its fingerprint is unchanged.
+    :return written_list: list object containing the paths to the shapefiles written.
+    """
+
+    import property_directory_resolver
+
+    partition_dict = dict(list(shape_gdf.groupby("PROPERTY", sort=False)))
+
+    job_list = []
+    skipped_list = []
+    canonical_list = []
+    for layer_property in partition_dict.keys():
+        # aliased properties are filed under (and exported from) the canonical property rows.
+        property_ = property_directory_resolver.canonical_property_fn(layer_property)
+        if property_ in canonical_list:
+            continue
+        canonical_list.append(property_)
+
+        gdf = partition_dict.get(property_)
+        if gdf is None:
+            print("*" * 50)
+            print('property: ', layer_property, " - skipped, its canonical property ", property_, " is not in ", key)
+            skipped_list.append(layer_property)
+            continue
+
+        server_download_path = output_path_fn(property_, gdf, infrastructure_directory, pastoral_districts_path, key)
+        print("server_download_path: ", server_download_path)
+
+        if server_download_path == "No_directory":
+            print("ERROR")
+            print("Can't locate property directory.....")
+            continue
+
+        export_file_path = feature_extraction_fn(gdf, server_download_path, property_, key)
+        job_list.append((property_, gdf, export_file_path))
+
+    written_list = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        future_dict = {executor.submit(run_instrumentation.process_task_fn, write_partition_fn,
+                                       (gdf, export_file_path, force_refresh)):
+                       (property_, export_file_path) for property_, gdf, export_file_path in job_list}
+        for future in as_completed(future_dict):
+            property_, export_file_path = future_dict[future]
+            written, worker_counter_dict = future.result()
+            # the files and rows counted in the worker process are added to this run.
+            for name, value in worker_counter_dict.items():
+                run_instrumentation.count_fn(name, value)
+            if written:
+                print('property: ', property_, " - infrastructure data downloaded")
+                written_list.append(export_file_path)
+
+    print(key, ": ", len(written_list), " of ", len(job_list), " properties written - the remainder are unchanged.")
+    if skipped_list:
+        print(key, ": ", len(skipped_list), " properties skipped (canonical property not in the layer): ",
+              ', '.join(skipped_list))
+
+    return written_list
 
 
 def buffer_fn(prop, pastoral_estate, export_dir):
@@ -374,126 +479,67 @@ def buffer_fn(prop, pastoral_estate, export_dir):
     return adjacent_property_names_list_
 
 
+@run_instrumentation.stage_fn('step6_1_download_adjacent_infrastructure')
 def main_routine(pastoral_districts_path, start_date, primary_export_dir, property_enquire, infrastructure_directory,
-                 pastoral_estate, odk_all_list):
+                 pastoral_estate, odk_all_list, max_workers=4, force_refresh=False):
     """ Search for neighbouring properties and download infrastructure shapefiles to the server download folders.
 
+    :param max_workers: integer object containing the number of shapefile writer processes (ALL mode).
+    :param force_refresh: boolean object - rewrite shapefiles whose content fingerprint is unchanged.
     """
 
+    import property_directory_resolver
+
     directory_dict = {"points": "Points", "lines": "Lines", "polygons": "Polys_Other", "paddocks": "Polys_Paddocks"}
 
     # create subdirectories within the export directory
     dir_folders_fn(primary_export_dir, directory_dict)
 
+    # call the infrastructure_mirror to refresh the local copy of the corporate layers (changed layers only).
+    import infrastructure_mirror
+    mirror = infrastructure_mirror.get_mirror_fn(infrastructure_directory)
+    mirror.refresh(list(directory_dict.keys()))
+
+    # the neighbours of the enquired properties (ALL_ODK or a single property) - only their partitions are loaded.
+    if property_enquire == 'ALL':
+        adjacent_dict = {}
+        load_list = None
+    else:
+        enquire_list = odk_all_list if property_enquire == 'ALL_ODK' else [property_enquire]
+        adjacent_dict = dict((i, buffer_fn(i, pastoral_estate, primary_export_dir)) for i in enquire_list)
+        load_list = sorted(set(property_directory_resolver.canonical_property_fn(i)
+                               for adjacent_list in adjacent_dict.values() if adjacent_list for i in adjacent_list))
+
     for key, value in directory_dict.items():
 
         print(key, ": ", value)
         print(("{0}\\*{1}.shp".format(infrastructure_directory, value)))
 
-        for shape in glob("{0}\\*{1}.shp".format(infrastructure_directory, value)):
-            shape_gdf = gpd.read_file(shape)
-            # confirm that shapefiles contain data
+        # the layer is read from the local mirror - the corporate drive is only read when the source has changed.
+        shape_gdf = mirror.load_layer(key, load_list)
+        # confirm that shapefiles contain data
+        if shape_gdf is not None and len(shape_gdf.index) > 0:
             print("len shapefile: ", len(shape_gdf.index))
-            if len(shape_gdf.index) > 0:
-
-                if property_enquire == 'ALL':
-                    # print("property_enquire: ", property_enquire)
-                    property_name_list = shape_gdf.PROPERTY.unique().tolist()
-                    # Loop through all property namesUntitled
-                    for property_ in property_name_list:
-                        # print("Property: ", property_)
-                        # adjacent_properties_list = buffer_fn(prop, pastoral_estate, primary_export_dir)
-                        # # identity_df_fn(buffer_gda94, pastoral_estate_gdf)
-                        # if adjacent_properties_list:
-                        #     #print('adjacent_properties_list: ', adjacent_properties_list)
-                        #     for property_ in adjacent_properties_list:
-                        # print("adjacent property: ", property_)
-                        if property_ == "TIPPERARY WEST" or property_ == "TIPPERARY EAST":
-                            property_ = "TIPPERARY"
-
-
-                        # print("adjacent property: ", property_)
-                        gdf = shape_gdf.loc[shape_gdf["PROPERTY"] == property_]
-                        if len(gdf.index) > 0:
 
-                            server_download_path = output_path_fn(property_, gdf, infrastructure_directory,
-                                                                  pastoral_districts_path, key)
+            # reformat dates and insert the DELETE and STATUS columns once per layer.
+            shape_gdf = prepare_layer_fn(shape_gdf)
 
-                            print("server_download_path: ", server_download_path)
+            if property_enquire == 'ALL':
+                partitioned_export_fn(shape_gdf, key, infrastructure_directory, pastoral_districts_path,
+                                      max_workers, force_refresh)
 
-                            if not server_download_path == "No_directory":
+            elif property_enquire == 'ALL_ODK':
 
-                                gdf1 = date_reformat_fn(gdf)
-                                # gdf1 = date_reformat2_fn(gdf1)
-                                # insert a delete column
-                                gdf1.insert(12, 'DELETE', 0)
-                                gdf1.insert(13, 'STATUS', 'Existing')
-                                export_file_path = feature_extraction_fn(gdf, server_download_path, property_, key)
-                                print(export_file_path)
-                                all_data_export_fn(gdf1, server_download_path, property_, key)
-
-                            else:
-                                print("ERROR")
-                                print(export_file_path)
-                                print("Can't locate property directory.....")
-
-                        else:
-                            print("*"*50)
-                            print(property_, " not found in ", value)
-
-                elif property_enquire == 'ALL_ODK':
-
-                    for property_enq in odk_all_list:
-
-                        adjacent_properties_list = buffer_fn(property_enq, pastoral_estate, primary_export_dir)
-                        print("adjacent_properties_list: ", adjacent_properties_list)
-                        # identity_df_fn(buffer_gda94, pastoral_estate_gdf)
-                        if adjacent_properties_list:
-
-                            for property_ in adjacent_properties_list:
-                                print("adjacent property: ", property_)
-                                if property_ == "TIPPERARY WEST" or property_ == "TIPPERARY EAST":
-                                    property_ = "TIPPERARY"
-
-                                print("adjacent property: ", property_)
-                                gdf = shape_gdf.loc[shape_gdf["PROPERTY"] == property_]
-                                if len(gdf.index) > 0:
-
-                                    server_download_path = output_path_fn(property_, gdf, infrastructure_directory,
-                                                                          pastoral_districts_path, key)
-                                    print("server_download_path: ", server_download_path)
-                                    if not server_download_path == "No_directory":
-                                        gdf1 = date_reformat_fn(gdf)
-                                        # gdf1 = date_reformat2_fn(gdf1)
-                                        # insert a delete column
-                                        gdf1.insert(12, 'DELETE', 0)
-                                        gdf1.insert(13, 'STATUS', 'Existing')
-
-                                        export_file_path = feature_extraction_fn(gdf, server_download_path, property_, key)
-                                        print(export_file_path)
-                                        all_data_export_fn(gdf1, server_download_path, property_, key)
-
-                                    else:
-                                        print("ERROR")
-                                        print(export_file_path)
-                                        print("Can't locate property directory.....")
-                                else:
-                                    print("*"*50)
-                                    print(property_, " not found in ", value)
+                for property_enq in odk_all_list:
 
-
-
-                else:
-
-                    adjacent_properties_list = buffer_fn(property_enquire, pastoral_estate, primary_export_dir)
+                    adjacent_properties_list = adjacent_dict[property_enq]
                     print("adjacent_properties_list: ", adjacent_properties_list)
-                    #identity_df_fn(buffer_gda94, pastoral_estate_gdf)
+                    # identity_df_fn(buffer_gda94, pastoral_estate_gdf)
                     if adjacent_properties_list:
 
                         for property_ in adjacent_properties_list:
                             print("adjacent property: ", property_)
-                            if property_ == "TIPPERARY WEST" or property_ == "TIPPERARY EAST":
-                                property_ = "TIPPERARY"
+                            property_ = property_directory_resolver.canonical_property_fn(property_)
 
                             print("adjacent property: ", property_)
                             gdf = shape_gdf.loc[shape_gdf["PROPERTY"] == property_]
@@ -503,31 +549,60 @@ def main_routine(pastoral_districts_path, start_date, primary_export_dir, proper
                                                                       pastoral_districts_path, key)
                                 print("server_download_path: ", server_download_path)
                                 if not server_download_path == "No_directory":
-                                    gdf1 = date_reformat_fn(gdf)
-                                    # gdf1 = date_reformat2_fn(gdf1)
-                                    # insert a delete column
-                                    gdf1.insert(12, 'DELETE', 0)
-                                    gdf1.insert(13, 'STATUS', 'Existing')
-                                    #print("this is else: ", gdf1.columns)
-                                    #print('server_download_path: ', server_download_path)
-
-
 
                                     export_file_path = feature_extraction_fn(gdf, server_download_path, property_, key)
                                     print(export_file_path)
-                                    all_data_export_fn(gdf1, server_download_path, property_, key)
+                                    all_data_export_fn(gdf, server_download_path, property_, key, force_refresh)
 
                                 else:
                                     print("ERROR")
                                     print(export_file_path)
                                     print("Can't locate property directory.....")
-
                             else:
                                 print("*"*50)
                                 print(property_, " not found in ", value)
 
+
+
             else:
-                print('shape_gdf.index length is:  ', str(len(shape_gdf.index)))
+
+                adjacent_properties_list = adjacent_dict[property_enquire]
+                print("adjacent_properties_list: ", adjacent_properties_list)
+                #identity_df_fn(buffer_gda94, pastoral_estate_gdf)
+                if adjacent_properties_list:
+
+                    for property_ in adjacent_properties_list:
+                        print("adjacent property: ", property_)
+                        property_ = property_directory_resolver.canonical_property_fn(property_)
+
+                        print("adjacent property: ", property_)
+                        gdf = shape_gdf.loc[shape_gdf["PROPERTY"] == property_]
+                        if len(gdf.index) > 0:
+
+                            server_download_path = output_path_fn(property_, gdf, infrastructure_directory,
+                                                                  pastoral_districts_path, key)
+                            print("server_download_path: ", server_download_path)
+                            if not server_download_path == "No_directory":
+                                #print("this is else: ", gdf1.columns)
+                                #print('server_download_path: ', server_download_path)
+
+
+
+                                export_file_path = feature_extraction_fn(gdf, server_download_path, property_, key)
+                                print(export_file_path)
+                                all_data_export_fn(gdf, server_download_path, property_, key, force_refresh)
+
+                            else:
+                                print("ERROR")
+                                print(export_file_path)
+                                print("Can't locate property directory.....")
+
+                        else:
+                            print("*"*50)
+                            print(property_, " not found in ", value)
+
+        else:
+            print('No infrastructure data located for: ', value)
 
 
 
@@ -26,7 +26,10 @@ import argparse
 import shutil
 import sys
 import warnings
+import run_instrumentation
 from glob import glob
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 from datetime import datetime
@@ -119,76 +122,6 @@ def assets_search_fn(search_criteria, folder):
     return files
 
 
-def extract_paths_fn(upload_list, transition_dir, year):
-    # transition_dir = r'Z:\Scratch\Zonal_Stats_Pipeline\Infrastructure_transition_DO_NOT_EDIT'
-    year = '2021'
-    folder_list = ['points', 'lines', 'polygons']
-    print('upload list: ', upload_list)
-    points_list = []
-    lines_list = []
-    poly_list = []
-
-    for i in upload_list:
-        # print(i)
-        for n in folder_list:
-
-            direct = os.path.join(i, year, n)
-            output_dir = os.path.join(transition_dir, n)
-            check_folder = os.path.isdir(direct)
-            if check_folder:
-                for files in glob(direct + '\\*.shp'):
-
-                    # if not files.endswith('.shp.xml'):
-                    gdf = gpd.read_file(files)
-                    # shutil.copy(files, output_dir)
-
-                    if n == 'points':
-                        points_list.append(gdf)
-                        # points_df = df_concat
-                    elif n == 'lines':
-                        lines_list.append(gdf)
-                        # lines_df = df_concat
-                    elif n == 'polygons':
-                        poly_list.append(gdf)
-                        # poly_df = df_concat
-                    else:
-                        pass
-                    """else:
-                        print(files, 'not copied')"""
-
-    return points_list, lines_list, poly_list
-
-
-def check_column_names(df_list, asset_dir, file_end):
-    """ Sort input dataframe based on correct column headings.
-
-    :param df_list: list object containing open dataframes extracted from the pastoral districts directory.
-    :param asset_dir: directory containing correct empty dataframe structures.
-    :param file_end: string object containing the file name.
-    :return checked_list: list object containing dataframes that matched.
-    :return faulty_list: list objet containing dataframes that did not match.
-    """
-    accurate_df = gpd.read_file('{0}\\{1}'.format(asset_dir, file_end), index_col=0)
-
-    checked_list = []
-    faulty_list = []
-
-    for test_df in df_list:
-        # create two lists from the correctly formatted csv (accurate) and the data for upload (test)
-        accurate_cols = accurate_df.columns.tolist()
-        test_cols = test_df.columns.tolist()
-        # check that the columns have the same number of headers as the accurate version.
-        if len(accurate_cols) == len(test_cols):
-            # check that the column headers match the accurate version.
-            if accurate_cols == test_cols:
-                checked_list.append(test_df)
-
-        else:
-            faulty_list.append(test_df)
-
-    return checked_list, faulty_list
-
-
 def check_dirs_fn(i, infrastructure_directory):
     file_path = os.path.join(infrastructure_directory, i)
 
@@ -321,63 +254,368 @@ def buffer_fn(prop, pastoral_estate, export_dir):
     return adjacent_property_names_list_
 
 
-def main_routine(pastoral_districts_path, start_date, primary_export_dir, property_enquire, infrastructure_directory,
-                 pastoral_estate):
-    """ Search for neighbouring properties and download infrastructure shapefiles to the server download folders.
+# upload folder -> Server_Download key directory and schema template.
+folder_dict = {"points": ["Points", "Pastoral_Infra_Points_Template.shp"],
+               "lines": ["Lines", "Pastoral_Infra_Lines_Template.shp"],
+               "polygons": ["Polygons", "Pastoral_Infra_Polygons_Template.shp"]}
+
+
+def cmd_args_fn():
+    p = argparse.ArgumentParser(
+        description="""Append Server_Upload field data to the Server_Download infrastructure of each property.""")
+
+    p.add_argument("-pd", "--pastoral_districts_directory",
+                   help="Enter path to the Pastoral_Districts directory in the Spatial\\Working drive)",
+                   default=r'U:\Pastoral_Districts')
+
+    p.add_argument('-a', '--assets_dir', type=str, help='Directory path containing required shapefile structure.',
+                   default=r'E:\DEPWS\code\rangeland_monitoring\rmb_mapping_pipeline\assets\shapefiles\templates')
+
+    p.add_argument("-y", "--year", type=str, help="Server_Upload year directory (default current year).",
+                   default=str(date.today().year))
+
+    p.add_argument("-pe", "--property_enquire", action="append",
+                   help="Property directory (i.e. PA1234_Property_Name) to merge - repeat for more (default all).")
+
+    p.add_argument("-tol", "--tolerance", type=float,
+                   help="Distance (m) within which an uploaded feature duplicates a downloaded feature.", default=1.0)
+
+    p.add_argument("-w", "--max_workers", type=int, help="Number of shapefile reader threads.", default=8)
+
+    p.add_argument("-i", "--infrastructure_directory", type=str,
+                   help="Corporate infrastructure directory - existing features are read from its local mirror "
+                        "(default: read the Server_Download shapefiles).", default=None)
+
+    cmd_args = p.parse_args()
 
+    return cmd_args
+
+
+def read_shapefile_fn(job):
+    """ Read one shapefile and tag each row with its property directory and source path (reader pool worker).
+
+    :param job: list object containing the property directory and the shapefile path.
+    :return gdf: geo-dataframe object containing PROP_DIR and SOURCE columns (None when empty or unreadable).
+    :return column_list: list object containing the shapefile columns as written.
     """
-    print('step6_1')
-    year = start_date[:4]
 
-    directory_dict = {"points": "Points", "lines": "Lines", "polygons": "Other", "paddocks": "Paddocks"}
+    prop_dir, shape_path = job
+    try:
+        gdf = gpd.read_file(shape_path)
+    except Exception as error:
+        print(' - unable to read: ', shape_path, error)
+        return None, []
 
-    # create subdirectories within the export directory
-    dir_folders_fn(primary_export_dir, directory_dict)
+    column_list = gdf.columns.tolist()
+    if len(gdf.index) == 0:
+        return None, column_list
 
-    for key, value in directory_dict.items():
+    gdf['PROP_DIR'] = prop_dir
+    gdf['SOURCE'] = shape_path
+
+    return gdf, column_list
+
+
+def concat_shapefiles_fn(job_list, max_workers=8):
+    """ Read a list of shapefiles in a thread pool and concatenate them into one geo-dataframe.
+
+    :param job_list: list object containing [property directory, shapefile path] lists.
+    :param max_workers: integer object containing the number of reader threads.
+    :return gdf: geo-dataframe object (None when no features were read) - coordinates are converted to the crs of the
+    first shapefile.
+    :return schema_df: pandas dataframe object containing the SOURCE path and column SCHEMA (| joined) of each file.
+    """
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        result_list = list(executor.map(read_shapefile_fn, job_list))
+
+    schema_df = pd.DataFrame({'SOURCE': [shape_path for prop_dir, shape_path in job_list],
+                              'SCHEMA': ['|'.join(column_list) for gdf, column_list in result_list]})
+
+    gdf_list = [gdf for gdf, column_list in result_list if gdf is not None]
+    if not gdf_list:
+        return None, schema_df
+
+    crs = gdf_list[0].crs
+    gdf_list = [gdf.to_crs(crs) if gdf.crs is not None and gdf.crs != crs else gdf for gdf in gdf_list]
+    gdf = gpd.GeoDataFrame(pd.concat(gdf_list, ignore_index=True), crs=crs)
+
+    return gdf, schema_df
+
+
+def validate_schema_fn(upload_gdf, schema_df, template_path):
+    """ Drop every uploaded feature whose source shapefile does not have the template columns (in order).
+
+    :param upload_gdf: geo-dataframe object created by concat_shapefiles_fn.
+    :param schema_df: pandas dataframe object created by concat_shapefiles_fn.
+    :param template_path: string object containing the path to the template shapefile.
+    :return checked_gdf: geo-dataframe object containing the features of matching shapefiles.
+    :return faulty_list: list object containing the paths of the shapefiles that did not match.
+    """
+
+    template_schema = '|'.join(gpd.read_file(template_path).columns.tolist())
+
+    faulty_list = schema_df.loc[schema_df['SCHEMA'] != template_schema, 'SOURCE'].tolist()
+    checked_gdf = upload_gdf[~upload_gdf['SOURCE'].isin(faulty_list)]
+
+    return checked_gdf, faulty_list
+
+
+def duplicate_index_fn(upload_gdf, download_gdf, tolerance=1.0):
+    """ Identify uploaded features already held in the Server_Download data of the same property.
+
+    Candidate pairs are found with a spatial index join (upload buffered by tolerance) and kept when they share the
+    property directory; points are duplicates within tolerance metres, lines and polygons when their Hausdorff
+    distance is within tolerance metres.
+
+    :param upload_gdf: geo-dataframe object containing the validated uploads.
+    :param download_gdf: geo-dataframe object containing the Server_Download features.
+    :param tolerance: float object containing the duplicate distance in metres.
+    :return: pandas index object containing the duplicate upload_gdf index values.
+    """
 
-        for shape in glob("{0}\\*{1}.shp".format(infrastructure_directory, value)):
-            shape_gdf = gpd.read_file(shape)
-            # confirm that shapefiles contain data
-            if len(shape_gdf.index) > 0:
+    if download_gdf is None or len(download_gdf.index) == 0 or len(upload_gdf.index) == 0:
+        return upload_gdf.index[:0]
+
+    # measure in metres - Australian Albers.
+    upload_albers = upload_gdf[['PROP_DIR', 'geometry']].to_crs(epsg=3577)
+    download_albers = download_gdf[['PROP_DIR', 'geometry']].to_crs(epsg=3577)
+
+    buffer_gdf = upload_albers.copy()
+    buffer_gdf['geometry'] = upload_albers.buffer(tolerance)
+    try:
+        pair_df = gpd.sjoin(buffer_gdf, download_albers, how='inner', predicate='intersects')
+    except TypeError:
+        # geopandas < 0.10
+        pair_df = gpd.sjoin(buffer_gdf, download_albers, how='inner', op='intersects')
+
+    # keyed join - only compare features of the same property.
+    pair_df = pair_df[pair_df['PROP_DIR_left'] == pair_df['PROP_DIR_right']]
+    if len(pair_df.index) == 0:
+        return upload_gdf.index[:0]
+
+    upload_geometry = upload_albers.geometry.loc[pair_df.index].values
+    download_geometry = download_albers.geometry.loc[pair_df['index_right']].values
+    distance = np.array([u.hausdorff_distance(d) for u, d in zip(upload_geometry, download_geometry)])
+
+    return pd.Index(pair_df.index[distance <= tolerance].unique())
+
+
+def download_target_fn(prop_path, year, key):
+    """ Return the Server_Download shapefile that new features of a property are appended to (when it has none).
+
+    :param prop_path: string object containing the path to the property directory.
+    :param year: string object containing the year directory.
+    :param key: string object containing the Server_Download key directory (i.e. Points).
+    :return: string object containing the shapefile path.
+    """
 
-                if property_enquire == 'All':
-                    property_name_list = shape_gdf.PROPERTY.unique().tolist()
-                    # Loop through all property names
-                    for prop in property_name_list:
+    prop_dir = os.path.basename(prop_path)
+    name = prop_dir.split('_', 1)[1] if '_' in prop_dir else prop_dir
 
-                        adjacent_properties_list = buffer_fn(prop, pastoral_estate, primary_export_dir)
-                        # identity_df_fn(buffer_gda94, pastoral_estate_gdf)
-                        for property_ in adjacent_properties_list:
-                            gdf = shape_gdf.loc[shape_gdf["PROPERTY"] == property_]
-                            server_download_path = output_path_fn(property_, gdf, infrastructure_directory,
-                                                                  pastoral_districts_path, key)
-                            gdf1 = date_reformat_fn(gdf)
-                            # gdf1 = date_reformat2_fn(gdf1)
+    return os.path.join(prop_path, 'Infrastructure', 'Server_Download', year, 'Raw', key,
+                        '{0}_{1}.shp'.format(name, key))
 
-                            # feature_extraction_fn(gdf, server_download_path, property_, key)
-                            all_data_export_fn(gdf1, server_download_path, property_, key)
 
-                else:
+def write_merged_fn(gdf, target_path):
+    """ Write a merged Server_Download shapefile.
+
+    The .fingerprint beside it is left as step6_1 wrote it (the corporate partition), so step6_1 only replaces the
+    merged file when the corporate data of the property changes (see step6_1.write_partition_fn).
+
+    :param gdf: geo-dataframe object containing the Server_Download and appended features.
+    :param target_path: string object containing the path to the shapefile.
+    """
+
+    import stage_scheduler
+
+    with stage_scheduler.gis_lock:
+        gdf.to_file(target_path, driver="ESRI Shapefile")
+    run_instrumentation.count_fn('files_created')
+    run_instrumentation.count_fn('rows_out', len(gdf.index))
+
+
+def mirror_download_fn(mirror, layer, prop_dir_list, pastoral_districts_path):
+    """ Load the corporate features of the listed properties from the infrastructure mirror, prepared and addressed as
+    step6_1 writes them to Server_Download.
+
+    :param mirror: infrastructure_mirror.InfrastructureMirror object.
+    :param layer: string object containing the mirror layer key (points, lines or polygons).
+    :param prop_dir_list: list object containing property directory names (<PROP_TAG>_<Property_Name>).
+    :param pastoral_districts_path: string object containing the path to the Pastoral_Districts directory.
+    :return download_gdf: geo-dataframe object containing PROP_DIR and SOURCE (step6_1 shapefile path) columns (None
+    when no property has corporate features).
+    """
+
+    import step6_1_download_adjacent_infrastructure
+
+    gdf_list = []
+    for prop_dir in prop_dir_list:
+        gdf = mirror.load_property(prop_tag=prop_dir.split('_', 1)[0], layer_list=[layer])[layer]
+        if gdf is None or len(gdf.index) == 0:
+            continue
+
+        gdf = step6_1_download_adjacent_infrastructure.prepare_layer_fn(gdf.reset_index(drop=True))
+        property_ = gdf['PROPERTY'].iloc[0]
+        server_download_path = step6_1_download_adjacent_infrastructure.output_path_fn(
+            property_, gdf, mirror.source, pastoral_districts_path, layer)
+        if server_download_path in ['No_data', 'No_directory']:
+            continue
+
+        gdf['PROP_DIR'] = prop_dir
+        gdf['SOURCE'] = step6_1_download_adjacent_infrastructure.feature_extraction_fn(gdf, server_download_path,
+                                                                                     property_, layer)
+        gdf_list.append(gdf)
+
+    if not gdf_list:
+        return None
+
+    return gpd.GeoDataFrame(pd.concat(gdf_list, ignore_index=True), crs=gdf_list[0].crs)
+
+
+def merge_folder_fn(prop_path_list, folder, year, assets_dir, tolerance=1.0, max_workers=8, mirror=None,
+                    pastoral_districts_path=None):
+    """ Merge the Server_Upload features of one geometry type into the Server_Download partitions.
+
+    :param prop_path_list: list object containing the paths to the property directories.
+    :param folder: string object containing the upload folder (points, lines or polygons).
+    :param year: string object containing the year directory.
+    :param assets_dir: string object containing the path to the shapefile templates.
+    :param tolerance: float object containing the duplicate distance in metres.
+    :param max_workers: integer object containing the number of reader threads.
+    :param mirror: infrastructure_mirror.InfrastructureMirror object - the Server_Download shapefiles are rebuilt from
+    the local corporate partitions and the uploads (None = the Server_Download shapefiles are read and appended to).
+    :param pastoral_districts_path: string object containing the path to the Pastoral_Districts directory (mirror).
+    :return summary_dict: dictionary object containing the uploaded, faulty, duplicate and appended counts.
+    """
+
+    key, template = folder_dict[folder]
+    path_dict = dict((os.path.basename(i), i) for i in prop_path_list)
+
+    upload_job_list = []
+    download_job_list = []
+    for prop_dir, prop_path in path_dict.items():
+        infrastructure_path = os.path.join(prop_path, 'Infrastructure')
+        for shape_path in glob(os.path.join(infrastructure_path, 'Server_Upload', year, folder, '*.shp')):
+            upload_job_list.append([prop_dir, shape_path])
+
+    summary_dict = {'uploaded': 0, 'faulty': 0, 'duplicate': 0, 'appended': 0}
+    if not upload_job_list:
+        return summary_dict
+
+    # concatenate every upload of this geometry type once.
+    upload_gdf, schema_df = concat_shapefiles_fn(upload_job_list, max_workers)
+    if upload_gdf is None:
+        return summary_dict
+    summary_dict['uploaded'] = len(upload_gdf.index)
+
+    upload_gdf, faulty_list = validate_schema_fn(upload_gdf, schema_df, os.path.join(assets_dir, template))
+    summary_dict['faulty'] = len(faulty_list)
+    for shape_path in faulty_list:
+        print(' - columns do not match the template: ', shape_path)
+
+    if mirror is not None:
+        # the corporate features of the properties with uploads are read from the local mirror - the network copies
+        # are not read, and re-running the merge rebuilds the same files.
+        download_gdf = mirror_download_fn(mirror, folder, upload_gdf['PROP_DIR'].unique(), pastoral_districts_path)
+    else:
+        # only the Server_Download partitions of properties with uploads are read.
+        for prop_dir in upload_gdf['PROP_DIR'].unique():
+            download_dir = os.path.join(path_dict[prop_dir], 'Infrastructure', 'Server_Download', year, 'Raw', key)
+            for shape_path in glob(os.path.join(download_dir, '*.shp')):
+                download_job_list.append([prop_dir, shape_path])
+
+        download_gdf, _ = concat_shapefiles_fn(download_job_list, max_workers)
+    if download_gdf is not None and upload_gdf.crs is not None and download_gdf.crs is not None:
+        upload_gdf = upload_gdf.to_crs(download_gdf.crs)
+
+    duplicate_index = duplicate_index_fn(upload_gdf, download_gdf, tolerance)
+    summary_dict['duplicate'] = len(duplicate_index)
+    append_gdf = upload_gdf.drop(duplicate_index)
+    summary_dict['appended'] = len(append_gdf.index)
+
+    if len(append_gdf.index) == 0:
+        return summary_dict
+
+    # each appended feature is written to the first Server_Download shapefile of its property.
+    if download_gdf is not None:
+        target_dict = download_gdf.groupby('PROP_DIR')['SOURCE'].min().to_dict()
+    else:
+        target_dict = {}
+    append_gdf['SOURCE'] = append_gdf['PROP_DIR'].map(
+        lambda prop_dir: target_dict.get(prop_dir) or download_target_fn(path_dict[prop_dir], year, key))
+
+    # field data is appended as Raw with the Server_Download columns (step6_1 prepare_layer_fn) in the same order.
+    append_gdf = append_gdf.copy()
+    append_gdf['DELETE'] = 0
+    append_gdf['STATUS'] = 'Raw'
+    if download_gdf is not None:
+        column_list = download_gdf.columns.tolist()
+    else:
+        column_list = [i for i in append_gdf.columns if i not in ['DELETE', 'STATUS']]
+        column_list[12:12] = ['DELETE', 'STATUS']
+    for column in [i for i in append_gdf.columns if i not in column_list]:
+        print(' - column not in the Server_Download data (dropped): ', column)
+    append_gdf = append_gdf.reindex(columns=column_list)
+
+    frame_list = [append_gdf] if download_gdf is None else [download_gdf, append_gdf]
+    merged_gdf = gpd.GeoDataFrame(pd.concat(frame_list, ignore_index=True), crs=frame_list[0].crs)
+    merged_gdf = merged_gdf[merged_gdf['SOURCE'].isin(append_gdf['SOURCE'].unique())]
+
+    for target_path, gdf in merged_gdf.groupby('SOURCE'):
+        if not os.path.isdir(os.path.dirname(target_path)):
+            os.makedirs(os.path.dirname(target_path))
+        write_merged_fn(gdf.drop(columns=['PROP_DIR', 'SOURCE']), target_path)
+
+    return summary_dict
+
+
+@run_instrumentation.stage_fn('step6_2_append_field_data_to_server_download_data')
+def main_routine(pastoral_districts_path, assets_dir, year=None, property_list=None, tolerance=1.0, max_workers=8,
+                 infrastructure_directory=None):
+    """ Append the Server_Upload field data of each property to its Server_Download infrastructure.
+
+    Uploads are concatenated once per geometry type, validated against the templates in bulk and joined to the
+    Server_Download data by property directory, with spatial-index based duplicate suppression.
+
+    :param pastoral_districts_path: string object containing the path to the Pastoral_Districts directory.
+    :param assets_dir: string object containing the path to the shapefile templates.
+    :param year: string object containing the year directory (default current year).
+    :param property_list: list object containing property names or directory names (None = all properties).
+    :param tolerance: float object containing the duplicate distance in metres.
+    :param max_workers: integer object containing the number of reader threads.
+    :param infrastructure_directory: string object containing the path to the corporate infrastructure layers - the
+    existing features are read from the local infrastructure mirror (None = read the Server_Download shapefiles).
+    :return summary_dict: dictionary object mapping each upload folder to its counts.
+    """
+
+    import property_directory_resolver
 
-                    adjacent_properties_list = buffer_fn(property_enquire, pastoral_estate, primary_export_dir)
-                    # identity_df_fn(buffer_gda94, pastoral_estate_gdf)
-                    for property_ in adjacent_properties_list:
-                        gdf = shape_gdf.loc[shape_gdf["PROPERTY"] == property_]
-                        server_download_path = output_path_fn(property_, gdf, infrastructure_directory,
-                                                         pastoral_districts_path, key)
-                        gdf1 = date_reformat_fn(gdf)
-                        # gdf1 = date_reformat2_fn(gdf1)
+    year = str(year or date.today().year)
+    resolver = property_directory_resolver.get_resolver_fn(pastoral_districts_path)
+    prop_path_list = resolver.property_path_list()
+    if property_list:
+        # property names (i.e. the ODK property list) or property directory names.
+        path_set = set(os.path.normcase(i) for i in [resolver.resolve(i) for i in property_list] if i is not None)
+        property_set = set(property_directory_resolver.normalise_name_fn(i) for i in property_list)
+        prop_path_list = [i for i in prop_path_list if os.path.normcase(i) in path_set or
+                          property_directory_resolver.normalise_name_fn(os.path.basename(i)) in property_set]
 
-                        print('server_download_path: ', server_download_path)
+    mirror = None
+    if infrastructure_directory is not None:
+        import infrastructure_mirror
+        mirror = infrastructure_mirror.get_mirror_fn(infrastructure_directory)
 
-                        # feature_extraction_fn(gdf, server_download_path, property_, key)
-                        all_data_export_fn(gdf1, server_download_path, property_, key)
+    summary_dict = {}
+    for folder in folder_dict.keys():
+        summary_dict[folder] = merge_folder_fn(prop_path_list, folder, year, assets_dir, tolerance, max_workers,
+                                               mirror, pastoral_districts_path)
+        print(folder, ': ', summary_dict[folder])
 
-    print('The following properties infrastructure have been downloaded: ')
-    for i in adjacent_properties_list:
-        print(' - ', i)
+    return summary_dict
 
 
 if __name__ == '__main__':
-    main_routine()
+    cmd_args = cmd_args_fn()
+    main_routine(cmd_args.pastoral_districts_directory, cmd_args.assets_dir, cmd_args.year, cmd_args.property_enquire,
+                 cmd_args.tolerance, cmd_args.max_workers, cmd_args.infrastructure_directory)
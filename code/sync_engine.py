@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import json
+import shutil
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+import photo_hash_index
+import run_instrumentation
+
+warnings.filterwarnings("ignore")
+
+manifest_name = '.sync_manifest.json'
+
+
+def load_manifest_fn(manifest_root):
+    """ Read the destination manifest (relative path -> size, source mtime and sha1 of the last copy).
+
+    :param manifest_root: string object containing the destination directory holding the manifest.
+    :return manifest_dict: dictionary object (empty if the manifest does not exist or is unreadable).
+    """
+
+    manifest_path = os.path.join(manifest_root, manifest_name)
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest_dict = json.load(f)
+    except (IOError, OSError, ValueError):
+        manifest_dict = {}
+
+    return manifest_dict
+
+
+def save_manifest_fn(manifest_root, manifest_dict):
+    """ Write the destination manifest (temporary file renamed into place).
+
+    :param manifest_root: string object containing the destination directory holding the manifest.
+    :param manifest_dict: dictionary object created by load_manifest_fn.
+    """
+
+    manifest_path = os.path.join(manifest_root, manifest_name)
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(manifest_dict, f, indent=0, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+
+def relative_key_fn(dest, manifest_root):
+    """ Create the manifest key of a destination file (relative path with forward slashes).
+
+    :param dest: string object containing the destination path.
+    :param manifest_root: string object containing the destination directory holding the manifest.
+    :return key: string object.
+    """
+
+    return os.path.relpath(dest, manifest_root).replace('\\', '/')
+
+
+def source_state_fn(src, sha1_dict, compare):
+    """ Collect the size, mtime and (hash comparison) sha1 of a source file (thread pool worker).
+
+    :param src: string object containing the source path.
+    :param sha1_dict: dictionary object mapping source paths to known sha1 digests (i.e. photo_hash_index).
+    :param compare: string object - 'hash' compares content, 'size_mtime' compares size and modified time only.
+    :return state_dict: dictionary object containing size, mtime and sha1 (None when not calculated).
+    """
+
+    stat = os.stat(src)
+    sha1 = sha1_dict.get(src)
+    if sha1 is None and compare == 'hash':
+        sha1 = photo_hash_index.byte_hash_fn(src)
+
+    state_dict = {'size': stat.st_size, 'mtime': int(stat.st_mtime), 'sha1': sha1}
+
+    return state_dict
+
+
+def unchanged_fn(entry, state_dict, compare):
+    """ Decide whether the last copy recorded in the manifest matches the source.
+
+    :param entry: dictionary object containing the manifest entry (None if never copied).
+    :param state_dict: dictionary object created by source_state_fn.
+    :param compare: string object - 'hash' or 'size_mtime'.
+    :return: boolean object - True if the file does not need to be copied.
+    """
+
+    if not entry or entry.get('size') != state_dict['size']:
+        return False
+
+    if compare == 'hash':
+        return entry.get('sha1') == state_dict['sha1']
+
+    return entry.get('mtime') == state_dict['mtime']
+
+
+def copy_file_fn(src, dest):
+    """ Copy a file to a temporary name beside the destination and rename it into place.
+
+    :param src: string object containing the source path.
+    :param dest: string object containing the destination path.
+    """
+
+    temp_path = '{0}.{1}.sync'.format(dest, threading.current_thread().name)
+    try:
+        shutil.copy2(src, temp_path)
+        os.replace(temp_path, dest)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def sync_files_fn(pair_list, manifest_root, max_workers=16, compare='hash', sha1_dict=None, snapshot=None,
+                  redirect_fn=None):
+    """ Copy new or changed files to the destination, skipping files the manifest shows are already there.
+
+    Source files are re-created on every run, so the default comparison is by content (sha1) - the destination is
+    never read back over the network. Every file is copied - files with the same content are not linked, as GIS users
+    edit the Raw and Photos copies independently.
+
+    :param pair_list: list object containing (source path, destination path) tuples.
+    :param manifest_root: string object containing the destination directory holding the manifest.
+    :param max_workers: integer object containing the number of copy threads (SMB latency bound, not cpu bound).
+    :param compare: string object - 'hash' (default) or 'size_mtime'.
+    :param sha1_dict: dictionary object mapping source paths to known sha1 digests (i.e. photo_hash_index).
+    :param snapshot: DirectorySnapshot object containing the destination (directory checks answered from memory and
+    copied files recorded).
+    :param redirect_fn: function object mapping a destination path to the path actually written (i.e.
+    StagedPublish.staged_path) - the manifest stays keyed by the destination path, and a redirected copy is only
+    recorded once it is published (record_published_fn).
+    :return stats_dict: dictionary object containing the files and bytes copied, skipped and failed, and the manifest
+    entries of the redirected copies (pending_dict - destination path: manifest entry).
+    """
+
+    if sha1_dict is None:
+        sha1_dict = {}
+
+    stats_dict = {'files_copied': 0, 'bytes_copied': 0, 'files_skipped': 0, 'bytes_skipped': 0, 'files_failed': 0,
+                  'pending_dict': {}}
+    if not pair_list:
+        return stats_dict
+
+    manifest_dict = load_manifest_fn(manifest_root)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        state_list = list(executor.map(lambda pair: source_state_fn(pair[0], sha1_dict, compare), pair_list))
+
+        # plan: skip unchanged files and copy the rest.
+        copy_list = []
+        for (src, dest), state_dict in zip(pair_list, state_list):
+            key = relative_key_fn(dest, manifest_root)
+            # the live file is checked - a redirected (staged) destination only holds this run's writes.
+            dest_exists = snapshot.isfile(dest) if snapshot is not None else os.path.isfile(dest)
+            if unchanged_fn(manifest_dict.get(key), state_dict, compare) and dest_exists:
+                stats_dict['files_skipped'] += 1
+                stats_dict['bytes_skipped'] += state_dict['size']
+                continue
+
+            copy_list.append((src, dest if redirect_fn is None else redirect_fn(dest), key, state_dict, dest))
+
+        for dest_dir in set(os.path.dirname(job[1]) for job in copy_list):
+            if snapshot is not None:
+                snapshot.queue_makedirs(dest_dir)
+            elif not os.path.isdir(dest_dir):
+                os.makedirs(dest_dir)
+        if snapshot is not None:
+            snapshot.flush()
+
+        future_list = [(job, executor.submit(copy_file_fn, job[0], job[1])) for job in copy_list]
+        for job, future in future_list:
+            try:
+                future.result()
+                stats_dict['files_copied'] += 1
+                stats_dict['bytes_copied'] += job[3]['size']
+                if job[1] == job[4]:
+                    manifest_dict[job[2]] = job[3]
+                else:
+                    stats_dict['pending_dict'][job[4]] = job[3]
+                if snapshot is not None:
+                    snapshot.add_file(job[1])
+            except Exception as err:
+                stats_dict['files_failed'] += 1
+                print(' -- copy failed: ', job[0], err)
+
+    save_manifest_fn(manifest_root, manifest_dict)
+
+    return stats_dict
+
+
+def record_published_fn(manifest_root, pending_dict, published_list):
+    """ Record the redirected copies that have been published in the destination manifest - a copy that was not
+    published is copied again by the next run.
+
+    :param manifest_root: string object containing the destination directory holding the manifest.
+    :param pending_dict: dictionary object created by sync_files_fn (stats_dict['pending_dict']).
+    :param published_list: list object containing the destination paths published (i.e. StagedPublish.commit).
+    :return recorded: integer object containing the number of manifest entries recorded.
+    """
+
+    # the published paths are mapped back from staging - compared normalised.
+    published_set = set(os.path.normcase(os.path.normpath(i)) for i in published_list)
+    recorded_list = [i for i in pending_dict if os.path.normcase(os.path.normpath(i)) in published_set]
+    if not recorded_list:
+        return 0
+
+    manifest_dict = load_manifest_fn(manifest_root)
+    for dest in recorded_list:
+        manifest_dict[relative_key_fn(dest, manifest_root)] = pending_dict[dest]
+    save_manifest_fn(manifest_root, manifest_dict)
+
+    return len(recorded_list)
+
+
+def main_routine(pair_list, manifest_root, max_workers=16, compare='hash', sha1_dict=None, snapshot=None,
+                 redirect_fn=None):
+    """ Synchronise a list of files to the working drive and report what was transferred and skipped.
+
+    :param pair_list: list object containing (source path, destination path) tuples.
+    :param manifest_root: string object containing the destination directory holding the manifest.
+    :param max_workers: integer object containing the number of copy threads.
+    :param compare: string object - 'hash' (default) or 'size_mtime'.
+    :param sha1_dict: dictionary object mapping source paths to known sha1 digests (i.e. photo_hash_index).
+    :param snapshot: DirectorySnapshot object containing the destination (None = query the file system).
+    :param redirect_fn: function object mapping a destination path to the path actually written (None = unchanged).
+    :return stats_dict: dictionary object created by sync_files_fn.
+    """
+
+    stats_dict = sync_files_fn(pair_list, manifest_root, max_workers, compare, sha1_dict, snapshot, redirect_fn)
+    run_instrumentation.count_fn('files_created', stats_dict['files_copied'])
+    run_instrumentation.count_fn('bytes_written', stats_dict['bytes_copied'])
+    run_instrumentation.count_fn('files_skipped', stats_dict['files_skipped'])
+
+    print(' - files copied: ', stats_dict['files_copied'], ' (', round(stats_dict['bytes_copied'] / 1048576.0, 2),
+          'MB) skipped: ', stats_dict['files_skipped'], ' (',
+          round(stats_dict['bytes_skipped'] / 1048576.0, 2), 'MB) failed: ', stats_dict['files_failed'])
+
+    return stats_dict
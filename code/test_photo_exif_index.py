@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Import modules
+from __future__ import print_function, division
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+pytest.importorskip('PIL')
+
+import photo_exif_index
+
+
+def test_numbered_photo_name():
+    match = photo_exif_index.photo_name_regex.search('PA1234_20210615_infra_points_uid12_photo2.jpg')
+
+    assert match.groups() == ('20210615', '12', '2')
+
+
+def test_step4_3_photo_name():
+    # step4_3 photo_path_fn: {prop_code}_{date_label}_{photo_name}_uid{uid}_photo.jpg
+    match = photo_exif_index.photo_name_regex.search('PA1234_20210615_habit1_uid3_photo.jpg')
+
+    assert match.groups() == ('20210615', '3', '')
+
+
+def test_index_unnumbered_photo(tmp_path):
+    photo_dir = tmp_path / 'PA1234_Property' / 'unidentified' / 'photos'
+    photo_dir.mkdir(parents=True)
+    photo = photo_dir / 'PA1234_20210615_habit1_uid3_photo.jpg'
+    photo.write_bytes(b'not a jpeg')
+
+    index_list = photo_exif_index.index_photo_fn(str(photo))
+
+    assert index_list[1:6] == ['PA1234_Property', 'unidentified', '20210615', '3', 1]
+
+
+def test_cross_check_float_uid():
+    import pandas as pd
+
+    exif_df = pd.DataFrame({'uid': ['12', ''], 'exif_lat': [-12.5, -12.5], 'exif_lon': [131.0, 131.0],
+                            'exif_date': ['20210615', '20210615'], 'date_label': ['20210615', '20210615']})
+    # a uid column with a missing value is read from the csv as float (12.0).
+    photo_df = pd.DataFrame({'uid': [12.0, None], 'lat1': [-12.5, -13.0], 'lon1': [131.0, 131.0],
+                             'dist1': [0, 0], 'bear1': [0, 0]})
+
+    check_df = photo_exif_index.cross_check_fn(exif_df, photo_df, 'uid')
+
+    assert check_df['uid'].tolist() == ['12', '']
+    assert check_df['loc_flag'].tolist() == ['OK', 'No uid']
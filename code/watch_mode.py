@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+
+"""
+Copyright 2021 Robert McGregor
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+documentation files (the "Software"), to deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the
+Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON INFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Import modules
+from __future__ import print_function, division
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import argparse
+import threading
+import warnings
+import tempfile
+from datetime import date, datetime, timedelta
+
+warnings.filterwarnings("ignore")
+
+
+def cmd_args_fn():
+    # long options only - the short options of step1_1 are passed through untouched.
+    p = argparse.ArgumentParser(allow_abbrev=False, description="""Watch the ODK Mapping Results csv and process the properties with new or edited submissions.
+        Arguments not listed here are passed to the pipeline (see step1_1_initiate_mapping_pipeline.py -h).""")
+
+    p.add_argument('--interval', type=float, help='Seconds between checks of the results csv.', default=60)
+
+    p.add_argument('--settle', type=float,
+                   help='Seconds the results csv must be unchanged before it is read (the file is still being '
+                        'copied or synced).', default=30)
+
+    p.add_argument('--queue_size', type=int, help='Maximum number of properties waiting to be processed.',
+                   default=8)
+
+    p.add_argument('--batch_size', type=int, help='Maximum number of properties processed in one run.',
+                   default=4)
+
+    p.add_argument('--once', action='store_true',
+                   help='Check the results csv once, process the affected properties and exit.')
+
+    p.add_argument('--mark_existing', action='store_true',
+                   help='Record the current submissions as processed without processing them (first start).')
+
+    cmd_args, argument_list = p.parse_known_args()
+
+    return cmd_args, argument_list
+
+
+def state_dir_fn():
+    import property_directory_resolver
+
+    state_dir = os.path.join(property_directory_resolver.default_cache_dir_fn(), 'watch')
+    if not os.path.isdir(state_dir):
+        os.makedirs(state_dir)
+
+    return state_dir
+
+
+def submission_digest_fn(district_df):
+    """ Digest each submission so new and edited submissions can be told apart from processed ones.
+
+    :param district_df: pandas dataframe object returned by step2_1.odk_property_df_fn.
+    :return digest_dict: dictionary object mapping the meta:instanceID of each submission to a row digest.
+    """
+
+    import pandas as pd
+
+    row_hash = pd.util.hash_pandas_object(district_df.astype(str), index=False)
+    digest_dict = dict(zip(district_df["meta:instanceID"].astype(str), row_hash.astype(str)))
+
+    return digest_dict
+
+
+def refresh_caches_fn(pastoral_districts_path, property_list):
+    """ Refresh the cached working drive listings the next run files into - the rest of the snapshot is kept warm.
+
+    :param pastoral_districts_path: string object containing the path to the Pastoral Districts directory.
+    :param property_list: list object containing the property names about to be processed.
+    """
+
+    if not os.path.isdir(pastoral_districts_path):
+        return
+
+    import directory_snapshot
+    import property_directory_resolver
+    snapshot = directory_snapshot.get_snapshot_fn(pastoral_districts_path)
+    resolver = property_directory_resolver.get_resolver_fn(pastoral_districts_path)
+
+    if resolver.loaded and resolver.load_cache() is None:
+        # a district or property directory was added or removed since the last run - list the tree again.
+        snapshot.invalidate()
+        resolver.load(refresh=True)
+
+    for prop_name in property_list:
+        prop_path = resolver.resolve(prop_name)
+        if prop_path is not None:
+            snapshot.invalidate(prop_path)
+
+
+class WatchMode(object):
+    """ Process new ODK Mapping submissions as they arrive.
+
+    The main thread checks the results csv every interval seconds; once the file has settled the submissions are
+    compared with those already processed and the properties with new or edited submissions are placed on a bounded
+    queue. A worker thread takes up to batch_size properties at a time and processes them through one PipelineSession,
+    so the assets and working drive listings stay loaded between runs. Submissions are recorded as processed only when
+    their run succeeds - a failed property is retried after a growing delay and an interrupted one at the next start.
+    """
+
+    def __init__(self, session, interval=60, settle=30, queue_size=8, batch_size=4, state_path=None):
+        """
+        :param session: pipeline_session.PipelineSession object used for every run.
+        :param interval: float object containing the seconds between checks of the results csv.
+        :param settle: float object containing the seconds the results csv must be unchanged before it is read.
+        :param queue_size: integer object containing the maximum number of properties waiting to be processed.
+        :param batch_size: integer object containing the maximum number of properties processed in one run.
+        :param state_path: string object containing the path to the processed submissions file (None = default).
+        """
+
+        self.session = session
+        self.interval = interval
+        self.settle = settle
+        self.batch_size = max(1, int(batch_size))
+        self.work_queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+        self.state_path = state_path or os.path.join(
+            state_dir_fn(), 'processed_{0}.json'.format(session.args.version))
+        self.processed_dict = self.load()
+        self.pending_dict = {}
+        self.running_dict = {}
+        self.retry_dict = {}
+        self.last_stat = None
+        self.checked_stat = None
+
+        self.run_count = 0
+        self.failed_list = []
+        self.worker = None
+
+    def load(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def save(self):
+        with open(self.state_path + '.tmp', 'w') as f:
+            json.dump(self.processed_dict, f)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def date_range(self):
+        """ :return: start and end date filters - with no end_date argument the range includes today. """
+
+        args = self.session.args
+        end_date = args.end_date if args.end_date else (date.today() + timedelta(days=1)).strftime("%Y-%m-%d")
+
+        return args.start_date, end_date
+
+    def check(self, settled=False):
+        """ Compare the settled results csv with the processed submissions.
+
+        :param settled: boolean object - True reads the csv without waiting for it to settle.
+        :return property_dict: dictionary object mapping each property with new or edited submissions to the digests
+        of its submissions (empty while the csv is missing, unchanged or still being written).
+        """
+
+        odk_csv = self.session.odk_csv()
+        if not os.path.isfile(odk_csv):
+            return {}
+
+        stat = os.stat(odk_csv)
+        stat = (stat.st_size, stat.st_mtime)
+        settling = not settled and (stat != self.last_stat or time.time() - stat[1] < self.settle)
+        self.last_stat = stat
+        if settling or (not settled and stat == self.checked_stat):
+            return {}
+
+        start_date, end_date = self.date_range()
+        # the property identification outputs are not kept - the watch state directory holds only the state.
+        with tempfile.TemporaryDirectory(prefix='rmb_watch_') as temp_dir:
+            district_df = self.session.district_df(start_date, end_date, temp_dir)
+        digest_dict = submission_digest_fn(district_df)
+        property_dict = {}
+        deferred = False
+        with self.lock:
+            for key, prop_name in zip(district_df["meta:instanceID"].astype(str), district_df["PROPERTY"]):
+                digest = digest_dict[key]
+                if prop_name == "UNKNOWN" or digest in (self.processed_dict.get(key), self.running_dict.get(key)):
+                    continue
+                # properties whose last run failed wait out their retry delay.
+                if not settled and self.retry_dict.get(prop_name, (0, 0))[1] > time.time():
+                    deferred = True
+                    continue
+                property_dict.setdefault(prop_name, {})[key] = digest
+            self.checked_stat = None if deferred else stat
+
+        return property_dict
+
+    def enqueue(self, property_dict):
+        """ Queue the affected properties - a property already waiting is not queued twice. Blocks while the queue is
+        full (the check waits for the worker) unless the watch is stopping.
+
+        :param property_dict: dictionary object returned by check.
+        """
+
+        for prop_name in sorted(property_dict):
+            with self.lock:
+                waiting = prop_name in self.pending_dict
+                self.pending_dict.setdefault(prop_name, {}).update(property_dict[prop_name])
+            if waiting:
+                continue
+
+            while not self.stop_event.is_set():
+                try:
+                    self.work_queue.put(prop_name, timeout=1)
+                    print(' - queued: ', prop_name)
+                    break
+                except queue.Full:
+                    pass
+
+    def process(self, property_list):
+        """ Run the pipeline for a batch of properties and record their submissions as processed.
+
+        :param property_list: list object containing the property names.
+        """
+
+        with self.lock:
+            digest_dict = {}
+            for prop_name in property_list:
+                digest_dict.update(self.pending_dict.pop(prop_name, {}))
+            self.running_dict.update(digest_dict)
+
+        start_date, end_date = self.date_range()
+        self.run_count += 1
+        print('=' * 50)
+        print('{0} watch run {1}: {2} ({3} submissions)'.format(
+            datetime.now().strftime('%H:%M:%S'), self.run_count, ', '.join(property_list), len(digest_dict)))
+
+        try:
+            refresh_caches_fn(self.session.args.pastoral_districts_directory, property_list)
+            self.session.run(properties=property_list, start_date=start_date, end_date=end_date)
+
+        except Exception as error:
+            print(' - run failed, the properties will be retried: ', repr(error))
+            with self.lock:
+                self.failed_list.append([datetime.now().isoformat(), property_list, repr(error)])
+                for key in digest_dict:
+                    self.running_dict.pop(key, None)
+                # retry after 2, 4, 8 ... check intervals (at most an hour).
+                for prop_name in property_list:
+                    failures = self.retry_dict.get(prop_name, (0, 0))[0] + 1
+                    self.retry_dict[prop_name] = (failures,
+                                                  time.time() + min(3600, self.interval * 2 ** failures))
+                self.checked_stat = None
+
+        else:
+            with self.lock:
+                for key in digest_dict:
+                    self.running_dict.pop(key, None)
+                for prop_name in property_list:
+                    self.retry_dict.pop(prop_name, None)
+                self.processed_dict.update(digest_dict)
+                self.save()
+
+    def work(self):
+        """ Worker thread - process the queued properties until the watch stops. """
+
+        while not self.stop_event.is_set():
+            try:
+                property_list = [self.work_queue.get(timeout=1)]
+            except queue.Empty:
+                continue
+
+            while len(property_list) < self.batch_size:
+                try:
+                    property_list.append(self.work_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self.process(property_list)
+
+    def mark_existing(self):
+        """ Record every current submission as processed. """
+
+        property_dict = self.check(settled=True)
+        with self.lock:
+            for digest_dict in property_dict.values():
+                self.processed_dict.update(digest_dict)
+            self.save()
+        print('Submissions recorded as processed: ', sum(len(i) for i in property_dict.values()))
+
+    def stop(self, signum=None, frame=None):
+        """ Stop after the run in progress (signal handler) - a second Ctrl+C stops at once. """
+
+        if not self.stop_event.is_set():
+            print('Stopping once the current run has finished (Ctrl+C again to stop now).')
+            self.stop_event.set()
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    def run(self, once=False):
+        """ Check the results csv and process the affected properties until stopped (SIGINT or SIGTERM).
+
+        :param once: boolean object - check once (without waiting for the csv to settle), process and return.
+        """
+
+        signal.signal(signal.SIGINT, self.stop)
+        if hasattr(signal, 'SIGTERM'):
+            signal.signal(signal.SIGTERM, self.stop)
+
+        # assets are loaded before the first submissions arrive.
+        self.session.warm()
+
+        if once:
+            property_dict = self.check(settled=True)
+            for prop_name in sorted(property_dict):
+                self.pending_dict[prop_name] = property_dict[prop_name]
+            property_list = sorted(property_dict)
+            for i in range(0, len(property_list), self.batch_size):
+                if self.stop_event.is_set():
+                    break
+                self.process(property_list[i:i + self.batch_size])
+            return
+
+        self.worker = threading.Thread(target=self.work, name='watch_worker')
+        self.worker.start()
+        print('Watching {0} every {1} seconds.'.format(self.session.odk_csv(), self.interval))
+
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    self.enqueue(self.check())
+                except Exception as error:
+                    print(' - check failed: ', repr(error))
+                self.stop_event.wait(self.interval)
+        finally:
+            self.stop_event.set()
+            self.worker.join()
+            print('Watch stopped - runs: {0}, failed: {1}, properties still failing: {2}, '
+                  'properties not processed: {3}'.format(self.run_count, len(self.failed_list),
+                                                         len(self.retry_dict), len(self.pending_dict)))
+
+
+def main_routine():
+    """ Watch the ODK Mapping Results csv (directory_odk) and file the properties with new submissions. """
+
+    cmd_args, argument_list = cmd_args_fn()
+
+    import pipeline_session
+    session = pipeline_session.PipelineSession(argument_list=argument_list)
+    if not [i for i in argument_list if i == '-e' or i.startswith('--end_date')]:
+        # the end date moves with the calendar in a long running watch.
+        session.args.end_date = None
+
+    watch = WatchMode(session, cmd_args.interval, cmd_args.settle, cmd_args.queue_size, cmd_args.batch_size)
+    if cmd_args.mark_existing:
+        watch.mark_existing()
+    else:
+        watch.run(cmd_args.once)
+
+    # properties retried successfully are cleared from retry_dict - only those whose last run failed set the exit code.
+    sys.exit(1 if watch.retry_dict else 0)
+
+
+if __name__ == "__main__":
+    main_routine()